@@ -0,0 +1,206 @@
+"""
+File for the 'app/backends' module.
+Numeric backends decide what kind of number the calculator computes with:
+- 'float'    (default) Python floats: fast, but 0.1 + 0.2 is 0.30000000000000004
+- 'decimal'  decimal.Decimal with a configurable context (precision and rounding)
+- 'fraction' fractions.Fraction: exact rational arithmetic, e.g. 1 / 3 is exactly 1/3
+- 'interval' Interval [lo, hi] of floats, guaranteed to contain the exact result, so its width bounds
+             the rounding error: 0.1 + 0.2 is [0.29999999999999993, 0.3000000000000001]
+
+A backend converts the user's input into its number type (convert), runs an operation in its
+arithmetic context (run), and adds up many values (sum). The Operation methods themselves work with
+any of these number types, so the same operator registry is used with every backend.
+
+The backend can be chosen:
+- per call:     calculate('+', '0.1', '0.2', backend='decimal')
+- per session:  set_backend('decimal'), or 'with using_backend("fraction"): ...'
+The session backend is stored in a context variable, so threads and asyncio tasks each keep their own.
+The REPL, batch mode, the server and expressions all use the session backend.
+
+The 'decimal' and 'fraction' backends live in app.backends.exact and the 'interval' backend in
+app.backends.interval. These modules are only imported the first time one of their backends is used,
+so a calculator that only uses floats does not pay for importing decimal and fractions.
+
+Sums of floats use math.fsum (exactly rounded) by default, or Neumaier's compensated summation,
+instead of adding the values one by one, so rounding errors do not pile up over millions of values.
+
+The 'fraction' and 'interval' backends read number text exactly, so '1e200000000' would be a 200-million-digit
+integer (minutes of CPU time for one operand). They refuse number text with more than MAX_DIGITS digits or
+a power of ten beyond MAX_EXPONENT (see check_size).
+
+"""
+
+import importlib
+import math
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, Union
+
+from app.registry import registry
+
+if TYPE_CHECKING:
+    from app.backends.exact import DecimalBackend, FractionBackend
+    from app.backends.interval import IntervalBackend
+
+# Summation methods supported by FloatBackend.
+SUMMATION_METHODS = ('fsum', 'neumaier', 'naive')
+
+# Largest number of digits, and largest power of ten (positive or negative), of number text read exactly.
+MAX_DIGITS = 10_000
+MAX_EXPONENT = 10_000
+
+
+def check_size(text: str) -> None:
+    """
+    Raises a ValueError if the number text has more than MAX_DIGITS digits or an exponent beyond MAX_EXPONENT.
+    Text that is not a number is left for the backend to refuse.
+    """
+    mantissa, _, exponent = text.strip().lower().partition('e')
+    if sum(c.isdigit() for c in mantissa) > MAX_DIGITS:
+        raise ValueError(f"The number has more than {MAX_DIGITS:,} digits.")
+    try:
+        too_far = abs(int(exponent)) > MAX_EXPONENT if exponent else False
+    except ValueError:
+        return
+    if too_far:
+        raise ValueError(f"The exponent of the number is beyond {MAX_EXPONENT:,}.")
+
+
+def neumaier_sum(values: Iterable[float]) -> float:
+    """
+    Returns the sum of values using Neumaier's compensated summation (an improved Kahan summation).
+    The rounding error of every addition is kept in a separate compensation term and added back at the end.
+    """
+    total = 0.0
+    compensation = 0.0
+    for value in values:
+        t = total + value
+        if abs(total) >= abs(value):
+            compensation += (total - t) + value
+        else:
+            compensation += (value - t) + total
+        total = t
+    return total + compensation
+
+
+class FloatBackend:
+    """
+    Computes with Python floats.
+    summation - how sum() adds values: 'fsum' (math.fsum, default), 'neumaier' or 'naive' (plain sum())
+    """
+
+    name = 'float'
+
+    def __init__(self, summation: str = 'fsum'):
+        if summation not in SUMMATION_METHODS:
+            raise ValueError(f"Unknown summation method: {summation!r}. Use one of {SUMMATION_METHODS}.")
+        self.summation = summation
+        self._sum = {'fsum': math.fsum, 'neumaier': neumaier_sum, 'naive': sum}[summation]
+
+    # float() already raises a ValueError for text that is not a number.
+    convert = staticmethod(float)
+
+    @staticmethod
+    def run(func: Callable, *operands):
+        """Returns func(*operands); floats need no arithmetic context."""
+        return func(*operands)
+
+    def sum(self, values: Iterable[float]) -> float:
+        """Returns the sum of values using the configured summation method."""
+        return self._sum(values)
+
+    def __repr__(self) -> str:
+        return f"FloatBackend(summation={self.summation!r})"
+
+
+Backend = Union[FloatBackend, 'DecimalBackend', 'FractionBackend', 'IntervalBackend']
+
+# The names of the backends that can be chosen, and the module (in app.backends) and class of the ones
+# created on first use.
+BACKEND_NAMES = ('float', 'decimal', 'fraction', 'interval')
+_LAZY_BACKENDS = {
+    'decimal': ('exact', 'DecimalBackend'),
+    'fraction': ('exact', 'FractionBackend'),
+    'interval': ('interval', 'IntervalBackend'),
+}
+
+
+def _lazy_class(module: str, name: str) -> type:
+    """Imports app.backends.<module> and returns its class called name."""
+    return getattr(importlib.import_module(f"{__name__}.{module}"), name)
+
+
+class _BackendTable(dict):
+    """The backends by name. The lazy backends are created (and their module imported) the first time they are looked up."""
+
+    def __missing__(self, name: str) -> Backend:
+        if name not in _LAZY_BACKENDS:
+            raise KeyError(name)
+        backend = self[name] = _lazy_class(*_LAZY_BACKENDS[name])()
+        return backend
+
+
+# The backends that can be chosen by name.
+BACKENDS: Dict[str, Backend] = _BackendTable(float=FloatBackend())
+
+
+def __getattr__(name: str):
+    """Imports DecimalBackend, FractionBackend and IntervalBackend from their modules when they are first used."""
+    for module, class_name in _LAZY_BACKENDS.values():
+        if name == class_name:
+            return _lazy_class(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+_current: ContextVar = ContextVar('calculator_backend', default=BACKENDS['float'])
+
+
+def get_backend(backend: Union[str, Backend, None] = None) -> Backend:
+    """Returns the backend with the given name, the backend itself if one is passed, or the session backend for None."""
+    if backend is None:
+        return _current.get()
+    if isinstance(backend, str):
+        try:
+            return BACKENDS[backend]
+        except KeyError:
+            raise ValueError(f"Unknown backend: {backend!r}. Use one of {BACKEND_NAMES}.") from None
+    return backend
+
+
+def current_backend() -> Backend:
+    """Returns the backend of the current session (the float backend unless another one was set)."""
+    return _current.get()
+
+
+def set_backend(backend: Union[str, Backend]) -> Token:
+    """Makes backend the session backend. Returns a token that reset_backend() can use to undo it."""
+    return _current.set(get_backend(backend))
+
+
+def reset_backend(token: Token) -> None:
+    """Restores the session backend that was in use before set_backend() returned token."""
+    _current.reset(token)
+
+
+@contextmanager
+def using_backend(backend: Union[str, Backend]) -> Iterator[Backend]:
+    """Uses backend as the session backend inside a with block."""
+    token = set_backend(backend)
+    try:
+        yield _current.get()
+    finally:
+        reset_backend(token)
+
+
+def calculate(symbol: str, *operands, backend: Union[str, Backend, None] = None):
+    """
+    Computes the registered operator symbol on the operands with the given backend (the session backend by default).
+    Operands may be text or numbers; they are converted to the backend's number type first.
+    """
+    backend = get_backend(backend)
+    return backend.run(registry.dispatch, symbol, *[backend.convert(x) for x in operands])
+
+
+def sum_values(values: Iterable, backend: Union[str, Backend, None] = None):
+    """Converts values to the backend's number type and returns their sum, using the backend's summation."""
+    backend = get_backend(backend)
+    return backend.sum(map(backend.convert, values))
@@ -0,0 +1,103 @@
+"""
+File for the 'app/backends/exact.py' module.
+The exact numeric backends: 'decimal' (decimal.Decimal) and 'fraction' (fractions.Fraction).
+
+They are kept apart from app.backends so that the decimal and fractions modules are only imported
+when one of these backends is used (see BACKENDS in app.backends). Import them from app.backends.
+
+"""
+
+from decimal import MAX_EMAX, MAX_PREC, MIN_EMIN, ROUND_HALF_EVEN, Context, Decimal, DecimalException, localcontext
+from fractions import Fraction
+from typing import Callable, Iterable
+
+from app.backends import check_size
+
+
+class DecimalBackend:
+    """
+    Computes with decimal.Decimal in its own context.
+    precision - number of significant digits kept by every operation (default 28)
+    rounding  - decimal rounding mode (default ROUND_HALF_EVEN)
+    context   - a complete decimal.Context to use instead of precision and rounding
+    """
+
+    name = 'decimal'
+
+    def __init__(self, precision: int = 28, rounding: str = ROUND_HALF_EVEN, context: Context = None):
+        self.context = context if context is not None else Context(prec=precision, rounding=rounding)
+
+    @staticmethod
+    def convert(x) -> Decimal:
+        """
+        Converts text or a number to a Decimal. Floats are converted from their shortest repr,
+        so 0.1 becomes Decimal('0.1') rather than the binary value of the float.
+        Raises a ValueError if x is not a number.
+        """
+        try:
+            return Decimal(repr(x) if isinstance(x, float) else x)
+        except (DecimalException, TypeError):
+            raise ValueError(f"Invalid decimal number: {x!r}") from None
+
+    def run(self, func: Callable, *operands):
+        """
+        Returns func(*operands) computed in this backend's decimal context.
+        Decimal signals trapped by the context (e.g. Infinity - Infinity) are raised as ValueError,
+        like the other calculation errors.
+        """
+        with localcontext(self.context):
+            try:
+                return func(*operands)
+            except DecimalException as e:
+                raise ValueError(f"Invalid decimal operation ({type(e).__name__}).") from None
+
+    def sum(self, values: Iterable[Decimal]) -> Decimal:
+        """
+        Returns the sum of values rounded once to the context precision, like math.fsum for floats:
+        the values are added exactly (a context without a precision limit), so no digit is lost on the way.
+        Decimal signals (e.g. Infinity + -Infinity) are raised as ValueError, like in run().
+        """
+        exact = Context(prec=MAX_PREC, Emax=MAX_EMAX, Emin=MIN_EMIN)
+        try:
+            total = Decimal(0)
+            for value in values:
+                total = exact.add(total, value)
+            return self.context.plus(total)
+        except DecimalException as e:
+            raise ValueError(f"Invalid decimal operation ({type(e).__name__}).") from None
+
+    def __repr__(self) -> str:
+        return f"DecimalBackend(precision={self.context.prec}, rounding={self.context.rounding!r})"
+
+
+class FractionBackend:
+    """Computes exactly with fractions.Fraction."""
+
+    name = 'fraction'
+
+    @staticmethod
+    def convert(x) -> Fraction:
+        """
+        Converts text or a number to a Fraction. Floats are converted from their shortest repr,
+        so 0.1 becomes Fraction(1, 10). Raises a ValueError if x is not a finite number,
+        or if it is text too large to read exactly (see app.backends.check_size).
+        """
+        if isinstance(x, str):
+            check_size(x)
+        try:
+            return Fraction(repr(x) if isinstance(x, float) else x)
+        except (TypeError, ZeroDivisionError):
+            raise ValueError(f"Invalid fraction: {x!r}") from None
+
+    @staticmethod
+    def run(func: Callable, *operands):
+        """Returns func(*operands); fractions are exact and need no context."""
+        return func(*operands)
+
+    @staticmethod
+    def sum(values: Iterable[Fraction]) -> Fraction:
+        """Returns the exact sum of values."""
+        return sum(values, Fraction(0))
+
+    def __repr__(self) -> str:
+        return "FractionBackend()"
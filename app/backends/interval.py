@@ -0,0 +1,445 @@
+"""
+File for the 'app/backends/interval.py' module.
+The 'interval' numeric backend: every number is an Interval [lo, hi] of floats that is guaranteed to contain the
+exact result, so the width of a result shows how much floating-point error could have piled up on the way.
+
+Every operation is computed on the endpoints with floats and then rounded outward: the lower bound moves one float
+down and the upper bound one float up (math.nextafter). A rounded float result is at most half a unit in the last
+place away from the exact result, so the exact result always stays inside. (Exact results are widened as well:
+checking for them would cost more than the extra float.)
+- add, subtract: [a + c, b + d] and [a - d, b - c]
+- multiply: the smallest and largest of the four endpoint products (0 * inf counts as 0)
+- divide: the four endpoint quotients, when the divisor does not contain zero. A divisor that contains zero is
+  handled explicitly: dividing by exactly [0, 0] raises "Cannot divide by zero." like Operation.divide (which checks
+  b == 0), 0 / [c, d] is [0, 0], and otherwise the result is the smallest interval around all the possible quotients,
+  which reaches to -inf or inf: [1, 2] / [0, 4] is [0.25, inf] and [1, 2] / [-1, 1] is [-inf, inf].
+
+Numbers are converted to the interval that contains their exact decimal value: '0.1' (or the float 0.1, which
+stands for 0.1 like with the exact backends) is [0.09999999999999999, 0.1], while '0.5' is exactly [0.5, 0.5].
+Text in the form '[lo, hi]' gives those float bounds as they are.
+
+IntervalArray is the vectorized form for NumPy arrays of bounds, with the same rules and the same results, to
+compute the bounds of millions of values with NumPy ufuncs instead of one Interval at a time (the cost is mostly
+np.nextafter: about 20 times plain NumPy floats, and about 40 times faster than Interval objects).
+Its divide() can also give NaN or raise for divisors that contain zero.
+
+"""
+
+import math
+from decimal import Decimal
+from functools import reduce
+from typing import Callable, Iterable, Tuple
+
+from app.backends import check_size
+
+_INF = math.inf
+_nextafter = math.nextafter
+
+
+def _down(x: float) -> float:
+    """The next float below x (the lower bound of a rounded result)."""
+    return _nextafter(x, -_INF)
+
+
+def _up(x: float) -> float:
+    """The next float above x (the upper bound of a rounded result)."""
+    return _nextafter(x, _INF)
+
+
+def _times(x: float, y: float) -> float:
+    """x * y, with 0 * inf = 0: a zero bound times an unbounded one contributes 0 to a product of intervals."""
+    return 0.0 if x == 0 or y == 0 else x * y
+
+
+class Interval:
+    """
+    A closed interval [lo, hi] of floats that contains an exact value.
+    An interval with NaN bounds stands for an invalid result, like a NaN float.
+    """
+
+    __slots__ = ('lo', 'hi')
+
+    def __init__(self, lo: float, hi: float):
+        if lo > hi:
+            raise ValueError(f"The lower bound {lo!r} is above the upper bound {hi!r}.")
+        self.lo = lo
+        self.hi = hi
+
+    @staticmethod
+    def parse(text: str) -> 'Interval':
+        """Reads '[lo, hi]' (the str() of an Interval). Raises a ValueError for any other text."""
+        inner = text.strip()
+        if not (inner.startswith('[') and inner.endswith(']')):
+            raise ValueError(f"Invalid interval: {text!r}")
+        bounds = inner[1:-1].split(',')
+        if len(bounds) != 2:
+            raise ValueError(f"Invalid interval: {text!r}")
+        return Interval(float(bounds[0]), float(bounds[1]))
+
+    @property
+    def width(self) -> float:
+        """hi - lo, rounded up: how far the exact value can be from either bound."""
+        return _up(self.hi - self.lo)
+
+    @property
+    def midpoint(self) -> float:
+        """The float in the middle of the interval."""
+        return self.lo / 2 + self.hi / 2
+
+    def __contains__(self, value) -> bool:
+        """True if the number value (float, int, Decimal or Fraction, compared exactly) is inside the interval."""
+        return self.lo <= value <= self.hi
+
+    def __neg__(self) -> 'Interval':
+        return Interval(-self.hi, -self.lo)
+
+    def __pos__(self) -> 'Interval':
+        return self
+
+    def __add__(self, other) -> 'Interval':
+        other = _coerce(other)
+        if other is None:
+            return NotImplemented
+        return Interval(_down(self.lo + other.lo), _up(self.hi + other.hi))
+
+    __radd__ = __add__
+
+    def __sub__(self, other) -> 'Interval':
+        other = _coerce(other)
+        if other is None:
+            return NotImplemented
+        return Interval(_down(self.lo - other.hi), _up(self.hi - other.lo))
+
+    def __rsub__(self, other) -> 'Interval':
+        other = _coerce(other)
+        return NotImplemented if other is None else other - self
+
+    def __mul__(self, other) -> 'Interval':
+        other = _coerce(other)
+        if other is None:
+            return NotImplemented
+        if self.lo != self.lo or other.lo != other.lo:  # NaN
+            return Interval(math.nan, math.nan)
+        products = (self.lo * other.lo, self.lo * other.hi, self.hi * other.lo, self.hi * other.hi)
+        total = products[0] + products[1] + products[2] + products[3]
+        if total != total:  # a NaN product (0 * inf), or products of both infinite signs
+            products = (_times(self.lo, other.lo), _times(self.lo, other.hi),
+                        _times(self.hi, other.lo), _times(self.hi, other.hi))
+        return Interval(_down(min(products)), _up(max(products)))
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other) -> 'Interval':
+        other = _coerce(other)
+        if other is None:
+            return NotImplemented
+        a, b, c, d = self.lo, self.hi, other.lo, other.hi
+        if a != a or c != c:  # NaN
+            return Interval(math.nan, math.nan)
+        if c > 0 or d < 0:
+            quotients = (a / c, a / d, b / c, b / d)
+            if c == -_INF or d == _INF:
+                # inf / inf has no value; the other quotients still bound the result.
+                quotients = [q for q in quotients if q == q]
+            if not quotients:
+                return Interval(math.nan, math.nan)
+            return Interval(_down(min(quotients)), _up(max(quotients)))
+        if c == d == 0:
+            raise ValueError("Cannot divide by zero.")
+        if a == b == 0:
+            return Interval(0.0, 0.0)
+        if c == 0:  # divisors in (0, d]
+            if a >= 0:
+                return Interval(_down(a / d), _INF)
+            if b <= 0:
+                return Interval(-_INF, _up(b / d))
+        elif d == 0:  # divisors in [c, 0)
+            if a >= 0:
+                return Interval(-_INF, _up(a / c))
+            if b <= 0:
+                return Interval(_down(b / c), _INF)
+        return Interval(-_INF, _INF)
+
+    def __rtruediv__(self, other) -> 'Interval':
+        other = _coerce(other)
+        return NotImplemented if other is None else other / self
+
+    def __eq__(self, other) -> bool:
+        """Intervals are equal if their bounds are; a number equals the interval [number, number]."""
+        other = _coerce(other)
+        if other is None:
+            return NotImplemented
+        return self.lo == other.lo and self.hi == other.hi
+
+    def __hash__(self) -> int:
+        return hash(self.lo) if self.lo == self.hi else hash((self.lo, self.hi))
+
+    def __repr__(self) -> str:
+        return f"Interval({self.lo!r}, {self.hi!r})"
+
+    def __str__(self) -> str:
+        return f"[{self.lo!r}, {self.hi!r}]"
+
+
+def _coerce(value):
+    """Returns value as an Interval if it is an Interval, float or int (taken exactly), else None."""
+    if isinstance(value, Interval):
+        return value
+    if isinstance(value, (float, int)):
+        value = float(value)
+        return Interval(value, value)
+    return None
+
+
+def enclose(value: float, exact) -> Interval:
+    """Returns the interval of floats around value (the nearest float to exact) that contains exact."""
+    if value != value:  # NaN
+        return Interval(value, value)
+    if value < exact:
+        return Interval(value, _up(value))
+    if value > exact:
+        return Interval(_down(value), value)
+    return Interval(value, value)
+
+
+class IntervalBackend:
+    """Computes with Intervals, so every result comes with guaranteed bounds (see the module documentation)."""
+
+    name = 'interval'
+
+    @staticmethod
+    def convert(x) -> Interval:
+        """
+        Converts text, a number or an Interval to an Interval.
+        Numbers and number text give the smallest interval around their exact decimal value (floats are read
+        from their shortest repr, so 0.1 means 0.1), and '[lo, hi]' gives those bounds.
+        Raises a ValueError for anything else.
+        """
+        if isinstance(x, Interval):
+            return x
+        if isinstance(x, str) and x.strip().startswith('['):
+            return Interval.parse(x)
+        try:
+            value = float(x)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid number: {x!r}") from None
+        if isinstance(x, str):
+            check_size(x)
+            exact = Decimal(x.strip())
+        elif isinstance(x, float):
+            # Whole floats up to 2**53 are exactly their repr, without building a Decimal.
+            exact = x if x.is_integer() and abs(x) <= 2**53 else Decimal(repr(x))
+        else:  # int, Decimal and Fraction compare exactly with floats
+            exact = x
+        return enclose(value, exact)
+
+    @staticmethod
+    def run(func: Callable, *operands):
+        """Returns func(*operands); intervals round their own results and need no context."""
+        return func(*operands)
+
+    @staticmethod
+    def sum(values: Iterable[Interval]) -> Interval:
+        """Returns the sum of values: each bound is added with math.fsum (rounded once) and then rounded outward."""
+        values = list(values)
+        try:
+            return Interval(_down(math.fsum(v.lo for v in values)), _up(math.fsum(v.hi for v in values)))
+        except (OverflowError, ValueError):  # an overflow, or inf - inf, in the middle of fsum
+            return reduce(lambda total, value: total + value, values, Interval(0.0, 0.0))
+
+    def __repr__(self) -> str:
+        return "IntervalBackend()"
+
+
+#----------------------------------------------------------------
+# Vectorized intervals
+#----------------------------------------------------------------
+
+# What IntervalArray.divide() does with divisors that contain zero.
+ZERO_DIVISOR_POLICIES = ('widen', 'nan', 'raise')
+
+
+def _numpy():
+    """Returns the numpy module; IntervalArray needs it, the scalar intervals do not."""
+    import numpy  # pylint: disable=import-outside-toplevel
+    return numpy
+
+
+def _bounds(value) -> Tuple:
+    """Returns the (lo, hi) bounds of an IntervalArray, an Interval or a number (taken exactly)."""
+    if isinstance(value, IntervalArray):
+        return value.lo, value.hi
+    interval = _coerce(value)
+    if interval is None:
+        raise TypeError(f"Cannot compute with an IntervalArray and a {type(value).__name__}.")
+    return interval.lo, interval.hi
+
+
+class IntervalArray:
+    """
+    Many intervals at once: lo and hi are float64 NumPy arrays of the same shape.
+    The operators +, -, * and / work element by element, with arrays, Intervals or numbers,
+    with the same rules (and the same results) as Interval.
+    """
+
+    __slots__ = ('lo', 'hi')
+
+    def __init__(self, lo, hi):
+        np = _numpy()
+        self.lo = np.asarray(lo, dtype=np.float64)
+        self.hi = np.asarray(hi, dtype=np.float64)
+        if self.lo.shape != self.hi.shape:
+            raise ValueError("The lower and upper bounds must have the same shape.")
+        if (self.lo > self.hi).any():
+            raise ValueError("A lower bound is above its upper bound.")
+
+    @classmethod
+    def from_values(cls, values) -> 'IntervalArray':
+        """Returns the point intervals [x, x] of the float values, taken exactly."""
+        values = _numpy().asarray(values, dtype=float)
+        return cls(values, values)
+
+    @property
+    def width(self):
+        """hi - lo for every interval, rounded up."""
+        np = _numpy()
+        return np.nextafter(self.hi - self.lo, np.inf)
+
+    @property
+    def midpoint(self):
+        """The float in the middle of every interval."""
+        return self.lo / 2 + self.hi / 2
+
+    def contains(self, values):
+        """Returns a boolean array: True where the value is inside its interval."""
+        return (self.lo <= values) & (values <= self.hi)
+
+    def __len__(self) -> int:
+        return len(self.lo)
+
+    def __getitem__(self, index) -> Interval:
+        return Interval(float(self.lo[index]), float(self.hi[index]))
+
+    def __neg__(self) -> 'IntervalArray':
+        return _array(-self.hi, -self.lo)
+
+    def __add__(self, other) -> 'IntervalArray':
+        np = _numpy()
+        c, d = _bounds(other)
+        return _array(np.nextafter(self.lo + c, -np.inf), np.nextafter(self.hi + d, np.inf))
+
+    __radd__ = __add__
+
+    def __sub__(self, other) -> 'IntervalArray':
+        np = _numpy()
+        c, d = _bounds(other)
+        return _array(np.nextafter(self.lo - d, -np.inf), np.nextafter(self.hi - c, np.inf))
+
+    def __rsub__(self, other) -> 'IntervalArray':
+        return -self + other
+
+    def __mul__(self, other) -> 'IntervalArray':
+        np = _numpy()
+        c, d = _bounds(other)
+        a, b = self.lo, self.hi
+        with np.errstate(invalid='ignore'):
+            products = (a * c, a * d, b * c, b * d)
+            lo = np.minimum(np.minimum(products[0], products[1]), np.minimum(products[2], products[3]))
+            # A NaN product (0 * inf, or a NaN bound) makes the smallest product NaN. Those arrays take the
+            # slower path that counts 0 * inf as 0.
+            if np.isnan(lo).any():
+                products = [np.where((x == 0) | (y == 0), 0.0, x * y) for x, y in ((a, c), (a, d), (b, c), (b, d))]
+                lo = np.minimum(np.minimum(products[0], products[1]), np.minimum(products[2], products[3]))
+            hi = np.maximum(np.maximum(products[0], products[1]), np.maximum(products[2], products[3]))
+        return _with_nan_rows(np, a, c, np.nextafter(lo, -np.inf, out=lo), np.nextafter(hi, np.inf, out=hi))
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other) -> 'IntervalArray':
+        return self.divide(other)
+
+    def __rtruediv__(self, other) -> 'IntervalArray':
+        return IntervalArray(*_broadcast(_bounds(other), self.lo.shape)).divide(self)
+
+    def divide(self, other, on_zero: str = 'widen') -> 'IntervalArray':
+        """
+        Divides every interval by other. on_zero says what to do with divisors that contain zero:
+            'widen' - the same rules as Interval (default); a divisor of exactly [0, 0] gives NaN bounds
+            'nan'   - NaN bounds for those rows
+            'raise' - raise a ValueError if there is any
+        """
+        if on_zero not in ZERO_DIVISOR_POLICIES:
+            raise ValueError(f"Unknown zero divisor policy: {on_zero!r}. Use one of {ZERO_DIVISOR_POLICIES}.")
+        np = _numpy()
+        c, d = _bounds(other)
+        a, b = self.lo, self.hi
+        has_zero = np.any((c <= 0) & (d >= 0))
+        if on_zero == 'raise' and has_zero:
+            raise ValueError("Cannot divide by an interval that contains zero.")
+        with np.errstate(divide='ignore', invalid='ignore'):
+            quotients = (a / c, a / d, b / c, b / d)
+            lo = np.minimum(np.minimum(quotients[0], quotients[1]), np.minimum(quotients[2], quotients[3]))
+            if has_zero or np.isnan(lo).any():
+                return _divide_special(np, a, b, c, d, on_zero)
+            hi = np.maximum(np.maximum(quotients[0], quotients[1]), np.maximum(quotients[2], quotients[3]))
+        return _array(np.nextafter(lo, -np.inf, out=lo), np.nextafter(hi, np.inf, out=hi))
+
+    def __repr__(self) -> str:
+        return f"IntervalArray({self.lo!r}, {self.hi!r})"
+
+
+def _array(lo, hi) -> IntervalArray:
+    """Returns an IntervalArray of the bounds lo and hi without checking them (for results, which are valid)."""
+    result = object.__new__(IntervalArray)
+    result.lo = lo
+    result.hi = hi
+    return result
+
+
+def _with_nan_rows(np, a, c, lo, hi) -> IntervalArray:
+    """Returns the IntervalArray of the bounds lo and hi, with NaN bounds where an operand (bounds a or c) is NaN."""
+    invalid = np.isnan(a) | np.isnan(c)
+    if invalid.any():
+        lo, hi = np.where(invalid, np.nan, lo), np.where(invalid, np.nan, hi)
+    return _array(lo, hi)
+
+
+def _divide_special(np, a, b, c, d, on_zero: str) -> IntervalArray:
+    """
+    The slower path of IntervalArray.divide(), for arrays with divisors that contain zero or NaN quotients.
+    NaN quotients (inf / inf) are skipped, like in Interval, and NaN operands give NaN bounds.
+    """
+    shape = np.broadcast_shapes(np.shape(a), np.shape(c))
+    a, b, c, d = (np.broadcast_to(x, shape) for x in (a, b, c, d))
+    has_zero = (c <= 0) & (d >= 0)
+    quotients = [a / c, a / d, b / c, b / d]
+    lo = np.nextafter(np.fmin.reduce(quotients), -np.inf)
+    hi = np.nextafter(np.fmax.reduce(quotients), np.inf)
+    if on_zero == 'nan':
+        lo, hi = np.where(has_zero, np.nan, lo), np.where(has_zero, np.nan, hi)
+    else:
+        lo, hi = _divide_by_zero_intervals(np, a, b, c, d, has_zero, lo, hi)
+    return _with_nan_rows(np, a, c, lo, hi)
+
+
+def _broadcast(bounds: Tuple, shape) -> Tuple:
+    """Returns the bounds broadcast to shape."""
+    np = _numpy()
+    return tuple(np.broadcast_to(np.asarray(x, dtype=np.float64), shape) for x in bounds)
+
+
+def _divide_by_zero_intervals(np, a, b, c, d, has_zero, lo, hi):
+    """Returns lo and hi with the rows whose divisor [c, d] contains zero replaced, following Interval.__truediv__."""
+    inf = np.inf
+    cases = [
+        has_zero & (c == 0) & (d == 0),   # exactly zero: no quotient at all
+        has_zero & (a == 0) & (b == 0),   # 0 / [c, d]
+        has_zero & (c == 0) & (a >= 0),   # divisors in (0, d]
+        has_zero & (c == 0) & (b <= 0),
+        has_zero & (d == 0) & (a >= 0),   # divisors in [c, 0)
+        has_zero & (d == 0) & (b <= 0),
+        has_zero,                         # both signs: everything
+    ]
+    lows = [np.nan, 0.0, np.nextafter(a / d, -inf), -inf, -inf, np.nextafter(b / c, -inf), -inf]
+    highs = [np.nan, 0.0, inf, np.nextafter(b / d, inf), np.nextafter(a / c, inf), inf, inf]
+    return np.select(cases, lows, lo), np.select(cases, highs, hi)
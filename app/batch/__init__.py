@@ -0,0 +1,129 @@
+"""
+File for the 'app/batch' module.
+A non-interactive batch mode for the calculator.
+
+Instead of prompting for an operation and two numbers, batch mode reads one calculation per line
+in the form 'op a b' (for example '+ 4 5' or '/ 1 3') from a file or from standard input,
+and writes one result per line. There are no prompts and no banners.
+
+The records flow through a pipeline of generators (read -> evaluate -> write), so only one chunk of
+output is held in memory at a time, no matter how large the input is.
+Blank lines and lines starting with '#' are skipped.
+A bad line never stops the run; it produces an 'error: ...' line in its place.
+
+"""
+
+import sys
+from functools import partial
+from itertools import islice
+from time import perf_counter
+from typing import Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from app import instrumentation
+from app.backends import current_backend
+from app.registry import registry
+
+# Number of output lines collected before they are written out in one call.
+DEFAULT_CHUNK_SIZE = 4096
+
+
+def read_records(lines: Iterable[str]) -> Iterator[List[str]]:
+    """
+    Yields each record as a list of fields ['op', 'a', 'b'].
+    Blank lines and comment lines (starting with '#') are skipped.
+    """
+    for line in lines:
+        fields = line.split()
+        if fields and not fields[0].startswith('#'):
+            yield fields
+
+
+def evaluate_record(fields: List[str]) -> str:
+    """
+    Computes one record and returns the text of its output line.
+    A record is the operator symbol followed by its operands ('op a b', or 'op a' for one-operand operators).
+    Errors are returned as 'error: <message>' so that one bad record does not stop the batch.
+    """
+    if not fields:
+        instrumentation.record_error('invalid_input')
+        return "error: Expected a record in the form 'op a b'."
+
+    spec = registry.get(fields[0])
+    if spec is None:
+        instrumentation.record_error('invalid_operation')
+        return "error: Invalid operation."
+    if len(fields) != spec.arity + 1:
+        instrumentation.record_error('invalid_input')
+        form = 'op a b' if spec.arity == 2 else 'op a'
+        return f"error: Expected a record in the form '{form}'."
+
+    # The numbers are read and computed with the session's numeric backend (float by default).
+    backend = current_backend()
+    metrics = instrumentation.active
+    started = perf_counter() if metrics is not None else 0.0
+    try:
+        operands = [backend.convert(field) for field in fields[1:]]
+    except ValueError:
+        instrumentation.record_error('invalid_input')
+        return "error: Invalid input. Please enter numeric values for the numbers."
+    if metrics is not None:
+        metrics.observe_phase('parse', perf_counter() - started)
+
+    try:
+        return str(backend.run(registry.functions[fields[0]], *operands))
+    except ValueError as e:  # division by zero
+        return f"error: {e}"
+
+
+def evaluate_records(records: Iterable[List[str]]) -> Iterator[str]:
+    """Yields the output line for every record, in input order."""
+    return map(evaluate_record, records)
+
+
+def write_results(results: Iterable[str], out: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[int, int]:
+    """
+    Writes the result lines to out, chunk_size lines per write() call.
+    Returns a tuple (number of records, number of error records).
+    """
+    results = iter(results)
+    total = 0
+    errors = 0
+    while True:
+        chunk = list(islice(results, chunk_size))
+        if not chunk:
+            break
+        out.write("\n".join(chunk))
+        out.write("\n")
+        total += len(chunk)
+        errors += sum(1 for line in chunk if line.startswith("error: "))
+    return total, errors
+
+
+def run_batch(lines: Iterable[str], out: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[int, int]:
+    """
+    Runs the whole batch pipeline: reads the records from lines, computes them and writes the results to out.
+    Returns a tuple (number of records, number of error records).
+    """
+    return write_results(evaluate_records(read_records(lines)), out, chunk_size)
+
+
+def run_batch_path(path: str, out: TextIO = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   workers: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Runs the batch pipeline on the file at path, or on standard input if path is '-'.
+    Results go to out (standard output by default).
+    If workers is given, the records are computed across that many processes by app.parallel,
+    chunk_size records per chunk.
+    """
+    if out is None:
+        out = sys.stdout
+    if workers is None:
+        runner = partial(run_batch, chunk_size=chunk_size)
+    else:
+        from app.parallel import run_batch_parallel  # pylint: disable=import-outside-toplevel
+        runner = partial(run_batch_parallel, workers=workers, chunksize=chunk_size)
+
+    if path == '-':
+        return runner(sys.stdin, out)
+    with open(path, encoding="utf-8") as source:
+        return runner(source, out)
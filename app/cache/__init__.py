@@ -0,0 +1,188 @@
+"""
+File for the 'app/cache' module.
+An opt-in cache of Operation results, for workloads that repeat the same (operation, a, b) calls.
+
+ResultCache keeps the most recently used results up to maxsize entries (LRU eviction),
+and can also expire entries ttl seconds after they were stored. It counts hits, misses and evictions,
+and a lock makes it safe to share one cache between threads.
+
+A cache can be turned on:
+- per call site, by wrapping one operation:   cached_add = cache.wrap(Operation.add)
+- globally, for every operator in the operator registry (used by the REPL, batch mode,
+  the parallel runner, the server and expressions):   install(cache) ... uninstall()
+
+Keys are built so that different floats never share a result:
+0.0 and -0.0 are different keys (their results can differ in sign), 1 and 1.0 are different keys
+(their results have different types), and calls with a NaN operand are never cached,
+because NaN is not equal to itself. Decimal operands are keyed by their digits and exponent (1.0 + 1 is 2.0,
+but 1.00 + 1 is 2.00) together with the precision and rounding of the decimal context they are used in,
+so a result computed with 5 digits is never returned for a call with 40 digits.
+Errors such as division by zero are never cached; they are raised again on every call.
+
+"""
+
+import math
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Hashable, NamedTuple, Optional
+
+from app.registry import registry
+
+# Default number of results kept by a ResultCache.
+DEFAULT_MAXSIZE = 4096
+
+
+class CacheStats(NamedTuple):
+    """Counters of a ResultCache."""
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+
+
+def operand_key(x) -> Optional[Hashable]:
+    """
+    Returns the part of a cache key for one operand, or None if calls with this operand must not be cached.
+    Non-zero floats are their own key (the common case, so it allocates nothing);
+    any other operand is keyed together with its type, and zeros also carry their sign.
+    A Decimal is keyed by its text (which keeps the exponent and the sign of zero) and the decimal context.
+    """
+    if type(x) is float and x == x and x != 0.0:  # pylint: disable=unidiomatic-typecheck
+        return x
+    if type(x).__name__ == 'Decimal':  # told apart by name, so decimal is not imported for float sessions
+        if x.is_nan():
+            return None
+        context = sys.modules['decimal'].getcontext()
+        return ('Decimal', str(x), context.prec, context.rounding)
+    try:
+        if x != x:  # NaN
+            return None
+        if x == 0:
+            return (type(x), x, math.copysign(1.0, x))
+        key = (type(x), x)
+        hash(key)
+    except (TypeError, ValueError):  # unhashable or array-like operands
+        return None
+    return key
+
+
+class ResultCache:
+    """
+    A thread-safe LRU cache of operation results with optional time-to-live.
+    maxsize - largest number of results kept
+    ttl     - seconds after which a stored result expires (None: never)
+    clock   - function returning the current time in seconds (time.monotonic by default)
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE, ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1.")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be positive.")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (result, expiry time or None)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def call(self, func: Callable[[float, float], float], a, b):
+        """Returns func(a, b), from the cache if it is there, otherwise computing and storing it."""
+        key_a = operand_key(a)
+        key_b = operand_key(b)
+        if key_a is None or key_b is None:
+            with self._lock:
+                self.misses += 1
+            return func(a, b)
+
+        key = (func, key_a, key_b)
+        now = self._clock() if self.ttl is not None else None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, expires = entry
+                if expires is None or expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return result
+                del self._entries[key]
+                self.evictions += 1
+            self.misses += 1
+
+        # Computed outside the lock so that slow operations do not block other threads.
+        result = func(a, b)
+
+        with self._lock:
+            self._entries[key] = (result, None if now is None else now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def wrap(self, func: Callable[[float, float], float]) -> Callable[[float, float], float]:
+        """Returns a version of func that goes through this cache."""
+
+        @wraps(func)
+        def cached(a, b):
+            return self.call(func, a, b)
+
+        cached.cache = self
+        return cached
+
+    def stats(self) -> CacheStats:
+        """Returns the hit, miss and eviction counters and the current number of entries."""
+        with self._lock:
+            return CacheStats(self.hits, self.misses, self.evictions, len(self._entries))
+
+    def clear(self) -> None:
+        """Removes all entries and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# The cache installed by install() and the registry layer that puts operators behind it, if any.
+_installed: Optional[ResultCache] = None
+_layer = None
+
+
+def install(cache: Optional[ResultCache] = None) -> ResultCache:
+    """
+    Puts every operator of the operator registry behind cache (a new ResultCache by default)
+    and returns the cache. Calling install() again replaces the previous cache.
+    Only binary operators are cached; one-operand operators are left as they are.
+    """
+    global _installed, _layer  # pylint: disable=global-statement
+    uninstall()
+    cache = cache if cache is not None else ResultCache()
+
+    def layer(spec, func):
+        return cache.wrap(func) if spec.arity == 2 else func
+
+    registry.add_layer(layer)
+    _installed, _layer = cache, layer
+    return cache
+
+
+def uninstall() -> None:
+    """Removes the installed cache from the operator registry, if there is one."""
+    global _installed, _layer  # pylint: disable=global-statement
+    if _layer is None:
+        return
+    registry.remove_layer(_layer)
+    _installed = _layer = None
+
+
+def installed() -> Optional[ResultCache]:
+    """Returns the globally installed cache, or None."""
+    return _installed
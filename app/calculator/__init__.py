@@ -5,28 +5,141 @@ Addition, Subtraction, Multiplication, and Division
 
 This module is designed to be used as a REPL (Read-Eval-Print Loop) for basic arithmetic operations.
 It allows users to perform calculations interactively by entering numbers and selecting operations.
-It uses the Operation class from the operations module to perform the calculations.
+It uses the Operation class from the operations module to perform the calculations,
+looking the operations up by their symbol in the operator registry (app.registry).
+
+Besides the single operations, the user can type an expression after '=' at the operation prompt,
+e.g. '= (1 + 2) * 3 / 2'. An expression can be stored in a variable with '= x = 4 / 2'
+and the variable can be used in later expressions, e.g. '= x * 10'.
+
+The numeric backend of the session can be changed with 'backend <name>' at the operation prompt,
+e.g. 'backend decimal' or 'backend fraction' (see app.backends); 'backend' alone shows the current one.
+
+Every calculation is kept in the session history (see app.history):
+- 'history' at the operation prompt lists the entries with their numbers,
+- '!3' runs entry 3 again (with the current backend and variables),
+- '_' is the last result: it can be typed at a number prompt, or used in an expression, e.g. '= _ * 2'.
+The history can also be written to a journal file, so a later session can be rebuilt from it.
+
+The state of the session (history, variables, backend and journal) is kept in an app.session.Session object.
 
 """
 
-# First we import the Operation class from the operations module.
+from time import perf_counter
+from typing import Optional
+
+# First we import the operator registry, which maps each symbol to a method of the Operation class.
 # The calculator module will use methods such as add, subtract, multiply, and divide from the Operation class to perform calculations.
-from app.operations import Operation
+from app import instrumentation
+from app.history import Entry, History, Journal
+from app.registry import registry
+from app.session import Session, parse_assignment
+
+
+def run_expression(text: str, variables: dict, backend=None):
+    """
+    Evaluates the expression typed after '=' with the numeric backend, prints the result and returns it.
+    If the text is an assignment ('x = ...'), the result is stored in variables under that name.
+    Errors (syntax errors, unknown variables, division by zero) are printed instead of raised, and None is returned.
+    """
+    name, text = parse_assignment(text)
+
+    # The expression engine is only imported the first time an expression is typed, so the REPL starts faster.
+    from app.expressions import evaluate  # pylint: disable=import-outside-toplevel
+    try:
+        result = evaluate(text, variables, backend)
+    except ValueError as e:
+        print(e)
+        return None
+
+    if name:
+        variables[name] = result
+        print(f"{name} = {result}")
+    else:
+        print(f"The result of {text} is: {result}")
+    return result
+
+
+def read_number(prompt: str, backend, history: Optional[History] = None):
+    """
+    Asks the user for a number and converts it with the backend (raises ValueError for non-numeric input).
+    '_' is the last result in the history.
+    When instrumentation is enabled, the conversion time is recorded as parse time.
+    """
+    text = input(prompt)
+    if text.strip() == '_' and history is not None and history.last is not None:
+        return history.last.result
+    metrics = instrumentation.active
+    if metrics is None:
+        return backend.convert(text)
+    started = perf_counter()
+    try:
+        return backend.convert(text)
+    finally:
+        metrics.observe_phase('parse', perf_counter() - started)
+
+
+def run_operation(operation: str, operands: tuple, backend):
+    """
+    Performs the operation with the function registered for its symbol, in the backend's arithmetic context,
+    prints the result and returns it. Errors raised by the operation (e.g. division by zero) are printed
+    instead, and None is returned.
+    """
+    try:
+        result = backend.run(registry.functions[operation], *operands)
+    except ValueError as e:
+        print(e)
+        return None
+
+    # Display the result of the operation.
+    if len(operands) == 2:
+        print(f"The result of {operands[0]} {operation} {operands[1]} is: {result}")
+    else:
+        print(f"The result of {operation} {operands[0]} is: {result}")
+    return result
+
+
+def rerun(entry: Entry, variables: dict, backend):
+    """Runs a history entry again with the backend, prints the new result and returns it (None if it failed)."""
+    if entry.op == '=':
+        return run_expression(entry.a, variables, backend)
+    if entry.op not in registry:  # the operator was unregistered since
+        print("Invalid operation. Please try again.")
+        return None
+    return run_operation(entry.op, tuple(map(backend.convert, entry.operands)), backend)
+
+
+def operations_help() -> str:
+    """Returns the line that lists the available operations, e.g. "Type '+' for addition, ..."."""
+    choices = [f"'{spec.symbol}' for {spec.description or spec.name}" for spec in registry.specs.values()]
+    return (f"Type {', '.join(choices)}, '= <expression>' for an expression, "
+            "'history' or '!<number>' for the history, or 'exit' to quit.")
+
 
 # we create a main function called calculator that will serve as the entry point for the calculator REPL.
 # This function will handle user input, perform calculations, and display results.
 
-def calculator():
-    """Basic calculator function that performs arithmetic operations."""
+def calculator(history: Optional[History] = None, journal: Optional[Journal] = None, variables: Optional[dict] = None):
+    """
+    Basic calculator function that performs arithmetic operations.
+    history - where the calculations are kept (a new History by default)
+    journal - if given, every calculation is also appended to this journal
+    variables - the variables of the session, e.g. rebuilt from a journal (empty by default)
+    """
 
     # Welcome message for the user.
     print("Welcome to the Calculator REPL! Type 'exit' to quit.")
 
+    # The session keeps the variables assigned with '= name = expression', the history of the calculations
+    # (also written to the journal, if there is one) and the numeric backend (float unless changed).
+    session = Session(history, variables, journal=journal)
+    history, variables, record = session.history, session.variables, session.record
+
     # Start an infinite loop to keep the calculator running until the user decides to exit.
     while True:
 
         # Display the available operations to the user.
-        print("Type '+' for addition, '-' for subtraction, '*' for multiplication, '/' for division, or 'exit' to quit.")
+        print(operations_help())
 
         # Prompt the user to enter an operation.
         operation = input("Enter operation: ").strip() # .strip() is used to remove any leading or trailing whitespace from the input.
@@ -37,45 +150,73 @@ def calculator():
             print("Exiting the app...") # Display a message indicating that the app is exiting.
             break
 
+        # Evaluate an expression if the input starts with '='.
+        if operation.startswith('='):
+            text = ' '.join(operation[1:].split())
+            record('=', text, None, run_expression(text, variables, session.backend))
+            continue
 
-        # Validate the operation input.
-        # If the operation is not one of the expected symbols, prompt the user to try again.
-        # This ensures that the user can only perform valid operations.
-        # Valid operations are: addition (+), subtraction (-), multiplication (*), and division (/).
-        if operation not in ['+', '-', '*', '/']:
-            print("Invalid operation. Please try again.")
+        # List the history with 'history'.
+        if operation == 'history':
+            for number, entry in history:
+                print(f"{number}: {entry}")
+            if not len(history):
+                print("The history is empty.")
             continue
 
-        try:
-            # Get user input for the first number.
-            a = float(input("Enter first number (use digits, e.g., 5 or 2.15): "))
-
-            # Get user input for the second number.
-            b = float(input("Enter second number (use digits, e.g., 5 or 2.15): "))
-
-            # Perform the operation based on user input.
-            if operation == '+':
-                result = Operation.add(a, b) # Call the add method from the Operation class to perform addition.
-            
-            elif operation == '-':
-                result = Operation.subtract(a, b) # Call the subtract method from the Operation class to perform subtraction.
-            
-            elif operation == '*':
-                result = Operation.multiply(a, b) # Call the multiply method from the Operation class to perform multiplication.
-            
-            else: # else part of the if statement, which means the operation is division.
-                # For division, we need to handle the case where the second number is zero.
-                # If b is zero, we raise a ValueError to prevent division by zero.
+        # Run an earlier calculation again with '!<number>'.
+        if operation.startswith('!'):
+            if not operation[1:].isdigit():
+                print("Use '!<number>' to run an entry of the history again, e.g. '!3'.")
+                continue
+            try:
+                entry = history.get(int(operation[1:]))
+            except ValueError as e:
+                print(e)
+                continue
+            record(entry.op, entry.a, entry.b, rerun(entry, variables, session.backend))
+            continue
+
+        # Change (or show) the numeric backend with 'backend <name>'.
+        if operation.split()[:1] == ['backend']:
+            name = operation[len('backend'):].strip()
+            if name:
                 try:
-                    result = Operation.divide(a, b) # Call the divide method from the Operation class to perform division.
+                    session.set_backend(name)
                 except ValueError as e:
                     print(e)
                     continue
-            # Display the result of the operation.
-            print(f"The result of {a} {operation} {b} is: {result}")
+            print(f"Using the {session.backend.name} backend.")
+            continue
+
+        # Look the operation up in the operator registry.
+        # If the operation is not a registered symbol, prompt the user to try again.
+        # This ensures that the user can only perform valid operations.
+        # The basic operations are: addition (+), subtraction (-), multiplication (*), and division (/).
+        spec = registry.get(operation)
+        backend = session.backend
+        if spec is None:
+            instrumentation.record_error('invalid_operation')
+            print("Invalid operation. Please try again.")
+            continue
+
+        try:
+            # Get user input for the first number.
+            a = read_number("Enter first number (use digits, e.g., 5 or 2.15): ", backend, history)
+
+            # Get user input for the second number, unless the operator only takes one.
+            if spec.arity == 2:
+                b = read_number("Enter second number (use digits, e.g., 5 or 2.15): ", backend, history)
 
         except ValueError:
             # Handle the case where the user inputs a non-numeric value.
+            instrumentation.record_error('invalid_input')
             print("Invalid input. Please enter numeric values for the numbers.")
-        
+            continue
 
+        # Perform the operation with the function registered for the symbol, in the backend's arithmetic context.
+        # Operations can raise a ValueError, e.g. division by zero, which is shown to the user.
+        if spec.arity == 2:
+            record(operation, a, b, run_operation(operation, (a, b), backend))
+        else:
+            record(operation, a, None, run_operation(operation, (a,), backend))
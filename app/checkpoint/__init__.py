@@ -0,0 +1,185 @@
+"""
+File for the 'app/checkpoint' module.
+Checkpointed batch jobs: a long batch run that crashes can be resumed from where it stopped instead of starting over.
+
+run_checkpointed() computes the 'op a b' records of an input file like batch mode (app.batch) and writes the
+results to an output file. Every `every` input lines it saves a checkpoint:
+1. the output written so far is flushed to disk (fsync),
+2. a small JSON file records how far the input was read and how long the output was (byte offsets),
+   with the record and error counts so far and a SHA-256 hash of the input read so far. It is written to
+   a temporary file that is then renamed over the old checkpoint, so a crash leaves either the old or the new
+   checkpoint, never half of one.
+
+When the job is started again with the same checkpoint file, the input up to the saved offset is hashed again
+and the job refuses to resume if it was changed (lines appended after the offset are fine). The output is cut
+back to the length saved in the checkpoint (dropping the results written after it), the input is read again
+from the saved offset, and the job goes on. Every result therefore appears exactly once, and the output of
+a resumed job is byte for byte the output of a job that never crashed. The checkpoint file is removed when the job finishes.
+
+The checkpoint interval trades I/O against lost work: a checkpoint costs two fsync calls, and a crash loses
+at most `every` lines of work. With workers, the records are computed across processes by app.parallel,
+and checkpoints are saved between chunks.
+
+"""
+
+import hashlib
+import json
+import os
+from collections import deque
+from functools import partial
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from app.backends import Backend, current_backend
+from app.batch import DEFAULT_CHUNK_SIZE
+from app.parallel import evaluate_lines, installed_store, ordered_map
+
+# Input lines computed between two checkpoints.
+DEFAULT_CHECKPOINT_EVERY = 100_000
+
+# Bytes read at a time when the input read before a checkpoint is hashed again on resume.
+_HASH_BLOCK_SIZE = 1 << 20
+
+
+class Checkpoint(NamedTuple):
+    """
+    The progress of a job.
+    input_offset  - bytes of the input file already computed
+    output_offset - bytes of the output file that hold their results
+    records       - number of records computed (output lines)
+    errors        - number of error records among them
+    input_sha256  - SHA-256 (hex) of the input bytes before input_offset
+    """
+    input_offset: int = 0
+    output_offset: int = 0
+    records: int = 0
+    errors: int = 0
+    input_sha256: str = hashlib.sha256().hexdigest()
+
+
+def load_checkpoint(path: str, input_path: str, backend: Backend) -> Optional[Checkpoint]:
+    """
+    Returns the checkpoint saved at path, or None if there is none.
+    Raises a ValueError if it was saved by a job with another input file or backend.
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    if data["input"] != os.path.abspath(input_path) or data["backend"] != repr(backend):
+        raise ValueError(f"The checkpoint {path} belongs to another job "
+                         f"(input {data['input']}, backend {data['backend']}).")
+    return Checkpoint(*data["progress"])
+
+
+def save_checkpoint(path: str, checkpoint: Checkpoint, input_path: str, backend: Backend) -> None:
+    """Saves a checkpoint atomically: the file at path is replaced by a complete new one, or left as it was."""
+    data = {"input": os.path.abspath(input_path), "backend": repr(backend), "progress": list(checkpoint)}
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    # The rename itself is only durable once the directory is flushed too.
+    directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+def _hash_prefix(source, size: int):
+    """Reads the first size bytes of the binary file source and returns their SHA-256 hash object."""
+    digest = hashlib.sha256()
+    source.seek(0)
+    while size > 0:
+        block = source.read(min(size, _HASH_BLOCK_SIZE))
+        if not block:
+            break
+        digest.update(block)
+        size -= len(block)
+    return digest
+
+
+def _read_chunks(source, size: int, ends: deque, digest) -> Iterator[List[str]]:
+    """
+    Yields the lines of the binary file source in chunks of up to size lines, decoded as text.
+    digest is the SHA-256 hash object of the input before the current position; it is updated with every chunk.
+    For every chunk, (input offset after the chunk, number of lines, hex hash of the input up to there)
+    is appended to ends.
+    """
+    offset = source.tell()
+    while True:
+        raw = []
+        for line in source:
+            raw.append(line)
+            if len(raw) == size:
+                break
+        if not raw:
+            return
+        data = b"".join(raw)
+        offset += len(data)
+        digest.update(data)
+        ends.append((offset, len(raw), digest.hexdigest()))
+        yield [line.decode('utf-8') for line in raw]
+
+
+def run_checkpointed(input_path: str, output_path: str, checkpoint_path: Optional[str] = None,
+                     every: int = DEFAULT_CHECKPOINT_EVERY, workers: Optional[int] = 1,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[int, int]:
+    """
+    Runs the batch job on the file input_path and writes the results to output_path, saving a checkpoint
+    to checkpoint_path (output_path + '.checkpoint' by default) every `every` input lines.
+    If the checkpoint file exists, the job resumes from it; a ValueError is raised if the input was changed
+    before the checkpointed offset.
+    workers is the number of processes that compute the records (1: this process; None: one per CPU core).
+    Returns a tuple (number of records, number of error records) for the whole job, resumed parts included.
+    """
+    if every < 1:
+        raise ValueError("The checkpoint interval must be at least 1 line.")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1 or chunk_size < 1:
+        raise ValueError("workers and chunk_size must be at least 1.")
+    checkpoint_path = checkpoint_path or f"{output_path}.checkpoint"
+    backend = current_backend()
+    state = load_checkpoint(checkpoint_path, input_path, backend)
+
+    with open(input_path, 'rb') as source, open(output_path, 'wb' if state is None else 'r+b') as out:
+        if state is None:
+            state = Checkpoint()
+            digest = hashlib.sha256()
+        else:
+            digest = _hash_prefix(source, state.input_offset)
+            if source.tell() != state.input_offset or digest.hexdigest() != state.input_sha256:
+                raise ValueError(f"The input file {input_path} was changed since the checkpoint was saved.")
+            if os.fstat(out.fileno()).st_size < state.output_offset:
+                raise ValueError(f"The output file {output_path} is shorter than the checkpoint says.")
+            out.truncate(state.output_offset)
+            out.seek(state.output_offset)
+
+        ends = deque()
+        chunks = _read_chunks(source, min(chunk_size, every), ends, digest)
+        results = ordered_map(partial(evaluate_lines, backend=backend, store=installed_store()), chunks, workers)
+        records, errors = state.records, state.errors
+        lines_since_checkpoint = 0
+        for lines in results:
+            input_offset, count, input_sha256 = ends.popleft()
+            if lines:
+                out.write(("\n".join(lines) + "\n").encode('utf-8'))
+                records += len(lines)
+                errors += sum(1 for line in lines if line.startswith("error: "))
+            lines_since_checkpoint += count
+            if lines_since_checkpoint >= every:
+                out.flush()
+                os.fsync(out.fileno())
+                save_checkpoint(checkpoint_path, Checkpoint(input_offset, out.tell(), records, errors, input_sha256),
+                                input_path, backend)
+                lines_since_checkpoint = 0
+        out.flush()
+        os.fsync(out.fileno())
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return records, errors
@@ -0,0 +1,107 @@
+"""
+File for the 'app/client' module.
+An asyncio client for the calculator server (see app/server) with a pool of persistent connections.
+
+Each request borrows a connection from the pool and gives it back afterwards, so connections are
+reused instead of opening a new one per request. calculate_many() pipelines a list of requests on one
+connection: it sends all of them before reading the responses, which saves a round trip per request.
+
+Results come back as floats. A request that fails on the server raises (or, in calculate_many,
+returns) a ValueError with the server's message, e.g. "Cannot divide by zero.".
+
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterable, List, Tuple, Union
+
+from app.connect import parse_address
+
+# Number of connections the pool keeps open at most.
+DEFAULT_POOL_SIZE = 8
+
+Connection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+Request = Tuple[str, float, float]
+
+
+def parse_response(line: bytes) -> Union[float, ValueError]:
+    """Turns one response line into a float, or into a ValueError for an 'error: ' response."""
+    text = line.decode().rstrip("\n")
+    if text.startswith("error: "):
+        return ValueError(text[len("error: "):])
+    return float(text)
+
+
+class ClientPool:
+    """
+    A pool of up to size connections to the calculator server at address ('host:port' or 'unix:/path').
+    Use it as an async context manager, or call close() when done.
+    """
+
+    def __init__(self, address: str, size: int = DEFAULT_POOL_SIZE):
+        if size < 1:
+            raise ValueError("size must be at least 1.")
+        self.address = address
+        self.size = size
+        self._idle: List[Connection] = []
+        self._slots = asyncio.Semaphore(size)
+
+    async def _connect(self) -> Connection:
+        """Opens a new connection to the server."""
+        where = parse_address(self.address)
+        if isinstance(where, str):
+            return await asyncio.open_unix_connection(where)
+        return await asyncio.open_connection(*where)
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[Connection]:
+        """
+        Borrows a connection from the pool, opening one if none is idle.
+        A connection that failed during use is closed instead of being returned to the pool.
+        """
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else await self._connect()
+            try:
+                yield connection
+            except BaseException:
+                connection[1].close()
+                raise
+            self._idle.append(connection)
+
+    async def calculate_many(self, requests: Iterable[Request]) -> List[Union[float, ValueError]]:
+        """
+        Sends all the (op, a, b) requests pipelined on one connection and returns their results in order.
+        Failed requests give a ValueError as their result.
+        """
+        payload = "".join(f"{op} {a!r} {b!r}\n" for op, a, b in requests).encode()
+        count = payload.count(b"\n")
+        async with self.connection() as (reader, writer):
+            writer.write(payload)
+            await writer.drain()
+            results = []
+            for _ in range(count):
+                line = await reader.readline()
+                if not line:
+                    raise ConnectionError("Connection closed by the server.")
+                results.append(parse_response(line))
+            return results
+
+    async def calculate(self, op: str, a: float, b: float) -> float:
+        """Computes one request on the server and returns the result; raises ValueError if it failed."""
+        result = (await self.calculate_many([(op, a, b)]))[0]
+        if isinstance(result, ValueError):
+            raise result
+        return result
+
+    async def close(self) -> None:
+        """Closes all idle connections."""
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+            await writer.wait_closed()
+
+    async def __aenter__(self) -> 'ClientPool':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
@@ -0,0 +1,278 @@
+"""
+File for the 'app/columnar' module.
+A binary columnar file format for very large calculation files.
+
+Parsing text like '123.456' into a float is slow compared with the calculation itself, so for huge
+files the operands are stored as raw float64 numbers instead. The format is the NumPy '.npy' format
+(version 1.0, little-endian float64, C order), so the files can also be opened with numpy.load():
+- an operand file has the shape (columns, rows): all the 'a' values, then all the 'b' values.
+  Every column is one contiguous block of doubles.
+- a result file has the shape (rows,).
+
+Reading is zero-copy: the file is memory-mapped and every column is a memoryview of the mapped bytes,
+so no number is parsed or copied until the Operation batch methods read it.
+
+Typical use:
+    csv_to_columns('operands.csv', 'operands.npy')        # one-off conversion, 'a,b' per line
+    compute_columns('+', 'operands.npy', 'results.npy')   # results[i] = a[i] + b[i]
+
+"""
+
+import ast
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from shutil import copyfileobj
+from typing import List, Optional, Tuple
+
+from app.operations import Operation
+
+MAGIC = b'\x93NUMPY'
+
+# The '.npy' dtype of the stored numbers: float64 in the byte order of this machine.
+DESCR = '<f8' if sys.byteorder == 'little' else '>f8'
+
+# Size of the header written by this module. It is fixed, so the header can be written again
+# with the real row count once a file has been streamed out.
+HEADER_SIZE = 128
+
+# A file being written is called '<target>.partial' until it is complete, so a failed conversion or computation
+# never leaves a target file that looks valid but holds only some of the rows.
+PARTIAL_SUFFIX = '.partial'
+
+# Number of rows computed (and held in memory) at a time.
+DEFAULT_CHUNK_ROWS = 1 << 20
+
+# The Operation batch method for every symbol that can be computed over columns.
+COLUMN_OPERATIONS = {
+    '+': Operation.add_many,
+    '-': Operation.subtract_many,
+    '*': Operation.multiply_many,
+    '/': Operation.divide_many,
+}
+
+
+def _header(shape: Tuple[int, ...]) -> bytes:
+    """Returns the HEADER_SIZE bytes of the '.npy' header for a float64 array of the given shape."""
+    text = repr({'descr': DESCR, 'fortran_order': False, 'shape': shape})
+    size = HEADER_SIZE - len(MAGIC) - 4  # magic, version (2 bytes) and header length (2 bytes)
+    return MAGIC + b'\x01\x00' + struct.pack('<H', size) + text.ljust(size - 1).encode('latin1') + b'\n'
+
+
+def _read_header(data) -> Tuple[Tuple[int, ...], int]:
+    """
+    Checks the '.npy' header at the start of data and returns (shape, offset of the first number).
+    Raises a ValueError if data is not a float64 '.npy' file this module can read.
+    """
+    if bytes(data[:len(MAGIC)]) != MAGIC or bytes(data[6:8]) != b'\x01\x00':
+        raise ValueError("Not a version 1.0 .npy file.")
+    (size,) = struct.unpack('<H', data[8:10])
+    try:
+        header = ast.literal_eval(bytes(data[10:10 + size]).decode('latin1'))
+        shape = tuple(header['shape'])
+        valid = header['descr'] == DESCR and header['fortran_order'] is False and len(shape) in (1, 2)
+    except (SyntaxError, ValueError, TypeError, KeyError):
+        valid = False
+    if not valid:
+        raise ValueError(f"Expected a C-order array of {DESCR} numbers with 1 or 2 dimensions.")
+    return shape, 10 + size
+
+
+class ColumnFile:
+    """
+    A memory-mapped '.npy' file of float64 numbers.
+
+    columns is a list of memoryviews of doubles, one per column (a file with shape (rows,) has one column).
+    They point straight into the mapped file: nothing is read or copied until they are used.
+    Use it as a context manager, so the file is unmapped when you are done with it.
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.shape, offset = _read_header(self._map)
+            rows = self.shape[-1]
+            count = 1 if len(self.shape) == 1 else self.shape[0]
+            if len(self._map) != offset + 8 * rows * count:
+                raise ValueError(f"The file size does not match the shape {self.shape}.")
+            self._data = memoryview(self._map)[offset:].cast('d')
+        except ValueError:
+            self._map.close()
+            raise
+        self.columns: List[memoryview] = [self._data[i * rows:(i + 1) * rows] for i in range(count)]
+
+    @property
+    def rows(self) -> int:
+        """Number of rows (numbers per column)."""
+        return self.shape[-1]
+
+    def close(self) -> None:
+        """
+        Releases the views of the columns and unmaps the file.
+        If a buffer of the file is still in use somewhere (for example a NumPy array kept alive by the
+        traceback of an exception), the file is unmapped when that buffer is garbage collected instead.
+        """
+        self.columns = []
+        try:
+            self._data.release()
+            self._map.close()
+        except BufferError:
+            pass
+
+    def __enter__(self) -> 'ColumnFile':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def open_columns(path: str) -> ColumnFile:
+    """Memory-maps the '.npy' file at path. Use it as 'with open_columns(path) as f: ...'."""
+    return ColumnFile(path)
+
+
+class ColumnWriter:
+    """
+    Streams float64 rows into a '.npy' file with the shape (rows,) or (columns, rows).
+
+    The number of rows does not need to be known in advance: the first column is written straight after
+    the header and the other columns are spooled to temporary files, then everything is put together and
+    the header is written again with the real row count when the writer is closed.
+    Until then the rows go to the file path + PARTIAL_SUFFIX, which close() renames to path and discard() removes
+    (used as a context manager, the writer discards the file when the block raises an exception).
+    """
+
+    def __init__(self, path: str, columns: int = 1):
+        self.path = os.fspath(path)
+        self._file = open(self.path + PARTIAL_SUFFIX, 'wb')  # pylint: disable=consider-using-with
+        self._file.write(_header((0,) if columns == 1 else (columns, 0)))
+        self._spools = [tempfile.TemporaryFile() for _ in range(columns - 1)]  # pylint: disable=consider-using-with
+        self.columns = columns
+        self.rows = 0
+
+    def write(self, *values) -> None:
+        """
+        Appends one chunk of rows: one buffer of doubles per column (array('d'), NumPy float64 array or memoryview).
+        All the buffers must have the same length.
+        """
+        lengths = {len(column) for column in values}
+        if len(values) != self.columns or len(lengths) != 1:
+            raise ValueError(f"Expected {self.columns} column(s) of the same length.")
+        self._file.write(values[0])
+        for spool, column in zip(self._spools, values[1:]):
+            spool.write(column)
+        self.rows += lengths.pop()
+
+    def close(self) -> None:
+        """Appends the spooled columns and writes the final header."""
+        for spool in self._spools:
+            spool.seek(0)
+            copyfileobj(spool, self._file)
+            spool.close()
+        self._file.seek(0)
+        self._file.write(_header((self.rows,) if self.columns == 1 else (self.columns, self.rows)))
+        self._file.close()
+        os.replace(self._file.name, self.path)
+
+    def discard(self) -> None:
+        """Stops writing and removes the partial file; the file at path is left as it was."""
+        for spool in self._spools:
+            spool.close()
+        self._file.close()
+        os.remove(self._file.name)
+
+    def __enter__(self) -> 'ColumnWriter':
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def csv_to_columns(source: str, target: str, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> int:
+    """
+    Converts a CSV file of numbers (one row per line, e.g. 'a,b') to a columnar '.npy' file at target.
+    Blank lines and lines starting with '#' are skipped. Every row must have as many numbers as the first one.
+    Returns the number of rows. Raises a ValueError that names the line of the first bad row;
+    the target file is then not written at all.
+    """
+    writer: Optional[ColumnWriter] = None
+    chunks: List[array] = []
+    with open(source, encoding='utf-8') as f:
+        try:
+            for number, line in enumerate(f, start=1):
+                if not line.strip() or line.startswith('#'):
+                    continue
+                fields = line.split(',')
+                if writer is None:
+                    writer = ColumnWriter(target, columns=len(fields))
+                    chunks = [array('d') for _ in fields]
+                if len(fields) != writer.columns:
+                    raise ValueError(f"Line {number}: expected {writer.columns} numbers, got {len(fields)}.")
+                try:
+                    for chunk, field in zip(chunks, fields):
+                        chunk.append(float(field))
+                except ValueError:
+                    raise ValueError(f"Line {number}: invalid number in {line.strip()!r}.") from None
+                if len(chunks[0]) == chunk_rows:
+                    writer.write(*chunks)
+                    chunks = [array('d') for _ in chunks]
+            if writer is None:
+                raise ValueError("The CSV file has no rows.")
+            writer.write(*chunks)
+        except BaseException:
+            if writer is not None:
+                writer.discard()
+            raise
+    writer.close()
+    return writer.rows
+
+
+def _numpy():
+    """Returns the numpy module, or None if NumPy is not installed (it is optional)."""
+    try:
+        import numpy  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    return numpy
+
+
+def compute_columns(symbol: str, source: str, target: str, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                    on_zero: str = 'nan') -> int:
+    """
+    Computes 'a symbol b' for every row of the operand file source and writes the results to target.
+    The operands are read zero-copy from the mapped file, chunk_rows rows at a time, and computed with
+    the Operation batch method of the operator (with NumPy ufuncs when NumPy is installed).
+    on_zero is passed to Operation.divide_many; the default 'nan' keeps one result row per input row.
+    Returns the number of result rows.
+    """
+    batch = COLUMN_OPERATIONS.get(symbol)
+    if batch is None:
+        raise ValueError(f"Operator {symbol!r} cannot be computed over columns. Use one of {list(COLUMN_OPERATIONS)}.")
+    extra = {'on_zero': on_zero} if symbol == '/' else {}
+    np = _numpy()
+
+    with open_columns(source) as operands, ColumnWriter(target) as results:
+        if len(operands.columns) != 2:
+            raise ValueError(f"Expected an operand file with 2 columns, got the shape {operands.shape}.")
+        a, b = operands.columns
+        for start in range(0, operands.rows, chunk_rows):
+            end = start + chunk_rows
+            results.write(_compute_chunk(batch, np, a[start:end], b[start:end], extra))
+    return results.rows
+
+
+def _compute_chunk(batch, np, a: memoryview, b: memoryview, extra: dict):
+    """
+    Runs the batch method over one chunk of the two columns.
+    With NumPy, the chunks are wrapped with np.frombuffer, which does not copy the mapped bytes.
+    """
+    if np is None:
+        return batch(a, b, **extra)
+    return batch(np.frombuffer(a), np.frombuffer(b), **extra)
@@ -0,0 +1,82 @@
+"""
+File for the 'app/connect' module.
+A lightweight, blocking client that forwards records to a calculator server that is already running.
+
+Starting Python and importing the calculator takes much longer than computing a few records, so scripts
+that run the calculator very often can keep one warm calculator process running (the server, see app.server)
+and forward their records to it over a local socket:
+    python main.py --serve unix:/tmp/calculator.sock &          # once: the warm worker
+    python main.py --connect unix:/tmp/calculator.sock '+ 4 5'  # every time: prints 9.0
+
+This module only uses the socket module (no asyncio and no other calculator module), so the client starts fast.
+Records and results use the batch mode format ('op a b' in, one result or 'error: ...' line out).
+
+"""
+
+import socket
+from typing import Iterable, Iterator, List, Tuple, Union
+
+# Seconds to wait for the server to accept the connection or to answer.
+DEFAULT_TIMEOUT = 30.0
+
+# Number of records sent before the client reads their results. Records are pipelined within a batch;
+# reading after every batch keeps the server from having to buffer the results of a huge input.
+DEFAULT_BATCH_SIZE = 1000
+
+
+def parse_address(address: str) -> Union[Tuple[str, int], str]:
+    """
+    Returns (host, port) for a 'host:port' address, or the socket path for a 'unix:/path' address.
+    Raises a ValueError for anything else.
+    """
+    if address.startswith('unix:'):
+        return address[len('unix:'):]
+    host, sep, port = address.rpartition(':')
+    if not sep or not port.isdigit():
+        raise ValueError(f"Invalid address: {address!r}. Use 'host:port' or 'unix:/path'.")
+    return host or '127.0.0.1', int(port)
+
+
+def open_connection(address: str, timeout: float = DEFAULT_TIMEOUT) -> socket.socket:
+    """Returns a socket connected to the server at address."""
+    where = parse_address(address)
+    if isinstance(where, str):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(where)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+    return socket.create_connection(where, timeout=timeout)
+
+
+def forward(address: str, records: Iterable[str], timeout: float = DEFAULT_TIMEOUT,
+            batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[str]:
+    """
+    Sends every record to the server at address and yields the result lines, in order.
+    Blank lines and comment lines (starting with '#') are skipped, like in batch mode.
+    Raises ConnectionError if the server closes the connection before answering every record.
+    """
+    with open_connection(address, timeout) as sock, sock.makefile('r', encoding='utf-8', newline='\n') as responses:
+        batch: List[str] = []
+        for record in records:
+            record = record.strip()
+            if record and not record.startswith('#'):
+                batch.append(record)
+            if len(batch) == batch_size:
+                yield from _exchange(sock, responses, batch)
+                batch = []
+        if batch:
+            yield from _exchange(sock, responses, batch)
+
+
+def _exchange(sock: socket.socket, responses, batch: List[str]) -> Iterator[str]:
+    """Sends a batch of records in one write and yields one result line per record."""
+    sock.sendall(('\n'.join(batch) + '\n').encode('utf-8'))
+    for _ in batch:
+        line = responses.readline()
+        if not line:
+            raise ConnectionError("The server closed the connection.")
+        yield line.rstrip('\n')
@@ -0,0 +1,404 @@
+"""
+File for the 'app/expressions' module.
+An infix expression engine for the calculator, e.g. '(a + b) * c / 2'.
+
+An expression goes through three steps:
+1. tokenize() splits the text into numbers, names, operators and parentheses.
+2. parse() builds an abstract syntax tree (AST) that respects operator precedence
+   ('*' and '/' bind tighter than '+' and '-') and parentheses.
+3. compile_tree() turns the tree into nested closures that call the Operation methods,
+   so evaluating does not walk the tree or look at node types again.
+
+compile_expression() caches compiled expressions by their source text in an LRU cache,
+so evaluating the same formula again with new variable values skips tokenizing and parsing.
+With optimize=True the tree is simplified first (constant folding, identities, strength reduction,
+see app.expressions.optimize) and repeated subexpressions are computed once per evaluation.
+A compiled expression that is evaluated SPECIALIZE_AFTER times is specialized: the whole formula is generated
+as one Python function with the arithmetic inlined (see app.expressions.specialize), which runs faster
+than the closures for formulas evaluated many times with different variable values.
+Expressions are compiled for a numeric backend (see app.backends): with the 'decimal' or 'fraction'
+backend, number literals are converted from their text, so '0.1' is the exact decimal 0.1 and
+'12345678901234567890123' keeps all its digits, rather than the nearest float.
+Variables are converted to the backend's number type too, except with the 'float' backend, where only
+a unary '+' converts its operand (so '+x' is 4.0 for x = 4, like 'x * 1').
+
+"""
+
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from time import perf_counter
+from typing import Callable, Dict, FrozenSet, List, Mapping, NamedTuple, Optional, Union
+
+from app import instrumentation
+from app.backends import Backend, get_backend
+from app.registry import registry
+
+# Binding power of the binary operators: a higher number binds tighter.
+PRECEDENCE = {'+': 1, '-': 1, '*': 2, '/': 2}
+
+# Number of compiled expressions kept in the LRU cache.
+EXPRESSION_CACHE_SIZE = 1024
+
+# Evaluations of a compiled expression after which it is specialized into generated code (0 never specializes).
+SPECIALIZE_AFTER = 1000
+
+# Deepest nesting of operators and parentheses in an expression. The parser, the compiler and the compiled
+# closures all recurse once per level, so deeper expressions would end in a RecursionError.
+MAX_DEPTH = 200
+
+
+class ExpressionError(ValueError):
+    """Raised when an expression cannot be tokenized, parsed or evaluated."""
+
+
+#----------------------------------------------------------------
+# Tokenizer
+#----------------------------------------------------------------
+
+class Token(NamedTuple):
+    """One token of an expression: its kind ('number', 'name', 'op', 'end'), its text and its position."""
+    kind: str
+    text: str
+    pos: int
+
+
+# One regular expression with a named group for every kind of token.
+_TOKEN_PATTERN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<name>[A-Za-z_]\w*)
+  | (?P<op>[-+*/()])
+""", re.VERBOSE)
+
+
+def tokenize(source: str) -> List[Token]:
+    """
+    Returns the list of tokens in source, ending with an 'end' token.
+    Raises an ExpressionError for any character that is not part of an expression.
+    """
+    tokens = []
+    pos = 0
+    while pos < len(source):
+        match = _TOKEN_PATTERN.match(source, pos)
+        if match is None:
+            raise ExpressionError(f"Unexpected character {source[pos]!r} at position {pos}.")
+        if match.lastgroup != 'space':
+            tokens.append(Token(match.lastgroup, match.group(), pos))
+        pos = match.end()
+    tokens.append(Token('end', '', pos))
+    return tokens
+
+
+#----------------------------------------------------------------
+# Syntax tree
+#----------------------------------------------------------------
+
+@dataclass(frozen=True)
+class Number:
+    """
+    A numeric literal. value is its float value; text is the literal as it was typed (None for a constant
+    computed by the optimizer, whose value already has the backend's number type). Two numbers with the
+    same value are equal, whatever their text.
+    """
+    value: float
+    text: Optional[str] = field(default=None, compare=False)
+
+    @property
+    def literal(self):
+        """What the backend converts: the typed text, so no digits are lost on the way through a float."""
+        return self.value if self.text is None else self.text
+
+
+@dataclass(frozen=True)
+class Variable:
+    """A variable whose value is supplied when the expression is evaluated."""
+    name: str
+
+
+@dataclass(frozen=True)
+class UnaryOp:
+    """A unary '+' or '-' applied to an operand."""
+    op: str
+    operand: 'Node'
+
+
+@dataclass(frozen=True)
+class BinOp:
+    """A binary operator ('+', '-', '*', '/') applied to a left and a right operand."""
+    op: str
+    left: 'Node'
+    right: 'Node'
+
+
+Node = Union[Number, Variable, UnaryOp, BinOp]
+
+
+class _Parser:
+    """Recursive-descent parser with precedence climbing for the binary operators."""
+
+    def __init__(self, source: str):
+        self.tokens = tokenize(source)
+        self.index = 0
+        self.depth = 0  # nesting of unary operators and parentheses being parsed
+
+    def peek(self) -> Token:
+        """Returns the current token without consuming it."""
+        return self.tokens[self.index]
+
+    def advance(self) -> Token:
+        """Consumes and returns the current token."""
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def parse(self) -> Node:
+        """Parses the whole token list and checks that nothing is left over and the tree is not too deep."""
+        node = self.expression(1)
+        token = self.peek()
+        if token.kind != 'end':
+            raise ExpressionError(f"Unexpected {token.text!r} at position {token.pos}.")
+        if _depth(node) > MAX_DEPTH:  # e.g. a long chain '1 + 1 + ... + 1', which is parsed without recursion
+            raise ExpressionError("Expression is nested too deeply.")
+        return node
+
+    def expression(self, min_precedence: int) -> Node:
+        """Parses binary operators whose precedence is at least min_precedence (left associative)."""
+        left = self.unary()
+        while True:
+            token = self.peek()
+            precedence = PRECEDENCE.get(token.text) if token.kind == 'op' else None
+            if precedence is None or precedence < min_precedence:
+                return left
+            self.advance()
+            right = self.expression(precedence + 1)
+            left = BinOp(token.text, left, right)
+
+    def unary(self) -> Node:
+        """Parses a unary '+'/'-' or a primary expression."""
+        self.depth += 1
+        if self.depth > MAX_DEPTH:
+            raise ExpressionError("Expression is nested too deeply.")
+        try:
+            token = self.peek()
+            if token.kind == 'op' and token.text in ('+', '-'):
+                self.advance()
+                return UnaryOp(token.text, self.unary())
+            return self.primary()
+        finally:
+            self.depth -= 1
+
+    def primary(self) -> Node:
+        """Parses a number, a variable name or a parenthesized expression."""
+        token = self.advance()
+        if token.kind == 'number':
+            return Number(float(token.text), token.text)
+        if token.kind == 'name':
+            return Variable(token.text)
+        if token.text == '(':
+            node = self.expression(1)
+            closing = self.advance()
+            if closing.text != ')':
+                raise ExpressionError(f"Expected ')' at position {closing.pos}.")
+            return node
+        if token.kind == 'end':
+            raise ExpressionError("Unexpected end of expression.")
+        raise ExpressionError(f"Unexpected {token.text!r} at position {token.pos}.")
+
+
+def _depth(node: Node) -> int:
+    """Returns the number of levels of the tree, without recursion (the tree is not checked yet)."""
+    deepest = 0
+    stack = [(node, 1)]
+    while stack:
+        node, depth = stack.pop()
+        deepest = max(deepest, depth)
+        if isinstance(node, UnaryOp):
+            stack.append((node.operand, depth + 1))
+        elif isinstance(node, BinOp):
+            stack += [(node.left, depth + 1), (node.right, depth + 1)]
+    return deepest
+
+
+def parse(source: str) -> Node:
+    """Returns the syntax tree of the expression in source. Raises an ExpressionError if it is nested too deeply."""
+    return _Parser(source).parse()
+
+
+def variables_of(node: Node) -> FrozenSet[str]:
+    """Returns the names of all the variables used in the tree."""
+    if isinstance(node, Variable):
+        return frozenset((node.name,))
+    if isinstance(node, UnaryOp):
+        return variables_of(node.operand)
+    if isinstance(node, BinOp):
+        return variables_of(node.left) | variables_of(node.right)
+    return frozenset()
+
+
+#----------------------------------------------------------------
+# Compiler
+#----------------------------------------------------------------
+
+Evaluator = Callable[[Mapping[str, float]], float]
+
+
+def compile_tree(node: Node, backend: Optional[Backend] = None, shared: Optional[Mapping[str, int]] = None) -> Evaluator:
+    """
+    Turns a syntax tree into a function that takes the variable values and returns the result.
+    Every node becomes one closure; binary nodes call the function registered for their symbol in
+    the operator registry (the Operation methods), so division by zero raises the same ValueError as Operation.divide.
+    The function is looked up when the expression is evaluated, so layers added later (e.g. a cache) are used.
+
+    Number literals and variable values are converted to the number type of backend (the session backend by default).
+    With the float backend no conversion is done, except by a unary '+'.
+
+    shared maps the repr of repeated subtrees to a key (see optimize.shared_subexpressions). Each of them is computed the first
+    time it is needed in an evaluation and then reused, so results and errors happen in the same order as without it.
+    """
+    backend = get_backend(backend)
+    if shared:
+        evaluate = _compile_node(node, backend, shared)
+        return lambda variables: evaluate(dict(variables))  # a fresh scope that also holds the shared values
+    return _compile_node(node, backend, {})
+
+
+def _compile_node(node: Node, backend: Backend, shared: Mapping[str, int]) -> Evaluator:
+    """Compiles one node of compile_tree(); shared subtrees read and store their value in the scope by their key."""
+    key = shared.get(repr(node)) if shared and isinstance(node, (UnaryOp, BinOp)) else None
+    if key is not None:
+        compute = _compile_operator(node, backend, shared)
+
+        def reuse(scope):
+            try:
+                return scope[key]
+            except KeyError:
+                value = scope[key] = compute(scope)
+                return value
+        return reuse
+    return _compile_operator(node, backend, shared)
+
+
+def _compile_operator(node: Node, backend: Backend, shared: Mapping[str, int]) -> Evaluator:
+    convert = None if backend.name == 'float' else backend.convert
+
+    if isinstance(node, Number):
+        value = node.value if convert is None else convert(node.literal)
+        return lambda variables: value
+
+    if isinstance(node, Variable):
+        name = node.name
+
+        def load(variables):
+            try:
+                value = variables[name]
+            except KeyError:
+                raise ExpressionError(f"Unknown variable: {name}") from None
+            return value if convert is None else convert(value)
+        return load
+
+    if isinstance(node, UnaryOp):
+        operand = _compile_node(node.operand, backend, shared)
+        if node.op == '-':
+            return lambda variables: -operand(variables)
+        if convert is None:
+            to_float = backend.convert
+            return lambda variables: to_float(operand(variables))
+        return operand
+
+    functions = registry.functions
+    symbol = node.op
+    left = _compile_node(node.left, backend, shared)
+    right = _compile_node(node.right, backend, shared)
+    return lambda variables: functions[symbol](left(variables), right(variables))
+
+
+class CompiledExpression:
+    """
+    A parsed and compiled expression for one numeric backend.
+    Call it with a mapping (or keyword arguments) of variable values to evaluate it.
+    With optimize=True, tree is the simplified tree (see app.expressions.optimize).
+    After SPECIALIZE_AFTER evaluations (or when specialize() is called) it runs generated code instead,
+    and specialized_source holds that code (see app.expressions.specialize).
+    """
+
+    __slots__ = ('source', 'tree', 'variables', 'backend', 'optimized', 'specialized_source', '_evaluate',
+                 '_countdown', '__weakref__')
+
+    def __init__(self, source: str, tree: Node, backend: Optional[Backend] = None, optimize: bool = False):
+        self.source = source
+        self.backend = get_backend(backend)
+        self.optimized = optimize
+        shared = None
+        if optimize:
+            from app.expressions.optimize import shared_subexpressions, simplify  # pylint: disable=import-outside-toplevel
+            tree = simplify(tree, self.backend)
+            shared = shared_subexpressions(tree)
+        self.tree = tree
+        self.variables = variables_of(tree)
+        self._evaluate = compile_tree(tree, self.backend, shared)
+        self.specialized_source: Optional[str] = None
+        self._countdown = SPECIALIZE_AFTER  # evaluations left before specializing; 0 once it is done
+
+    def __call__(self, variables: Optional[Mapping[str, float]] = None, **kwargs: float) -> float:
+        if kwargs:
+            variables = {**(variables or {}), **kwargs}
+        if self._countdown:
+            self._countdown -= 1
+            if not self._countdown:
+                self.specialize()
+        return self.backend.run(self._evaluate, variables if variables is not None else {})
+
+    def specialize(self) -> Optional[str]:
+        """
+        Replaces the closures with a generated function for the whole expression and returns its source code.
+        If the registry does not hold the Operation methods for its operators (e.g. a layer is installed),
+        the closures are kept and specialized_source stays None; the code that would have been used is returned.
+        """
+        self._countdown = 0
+        if self.specialized_source is not None:
+            return self.specialized_source
+        from app.expressions.specialize import specialize  # pylint: disable=import-outside-toplevel
+        evaluate, source = specialize(self.tree, self.backend, self._evaluate, self.source, owner=self)
+        if evaluate is not None:
+            self._evaluate, self.specialized_source = evaluate, source
+        return source
+
+    def __repr__(self) -> str:
+        return f"CompiledExpression({self.source!r})"
+
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def _compile_cached(source: str, backend: Backend, optimize: bool) -> CompiledExpression:
+    metrics = instrumentation.active
+    if metrics is None:
+        return CompiledExpression(source, parse(source), backend, optimize)
+    started = perf_counter()
+    try:
+        return CompiledExpression(source, parse(source), backend, optimize)
+    except ExpressionError:
+        metrics.record_error('invalid_input')
+        raise
+    finally:
+        metrics.observe_phase('parse', perf_counter() - started)
+
+
+def compile_expression(source: str, backend: Union[str, Backend, None] = None,
+                       optimize: bool = False) -> CompiledExpression:
+    """
+    Returns the compiled expression for source with the given backend (the session backend by default).
+    With optimize=True the expression is simplified before it is compiled (see app.expressions.optimize).
+    Results are cached by source text, backend and optimize, so the same formula is only parsed once.
+    Use compile_expression.cache_info() to see the cache hits and misses.
+    """
+    return _compile_cached(source, get_backend(backend), optimize)
+
+
+compile_expression.cache_info = _compile_cached.cache_info
+compile_expression.cache_clear = _compile_cached.cache_clear
+
+
+def evaluate(source: str, variables: Optional[Dict[str, float]] = None,
+             backend: Union[str, Backend, None] = None, optimize: bool = False) -> float:
+    """Evaluates the expression in source with the given variable values and backend (the session backend by default)."""
+    return compile_expression(source, backend, optimize)(variables)
@@ -0,0 +1,210 @@
+"""
+File for the 'app/expressions/optimize' module.
+An optimization pass over expression syntax trees, used by compile_expression(..., optimize=True).
+
+simplify() rewrites a tree into a cheaper tree that gives exactly the same results:
+- constant folding: '2 * 3.5 + 1' becomes 8.0, computed once with the Operation methods and the backend
+  (a constant part that raises, like '1 / 0', is left alone so the error still happens when it is evaluated)
+- algebraic identities: 'x * 1', 'x / 1', 'x - 0', '--x', 'x * -1' -> '-x', 'x - -y' -> 'x + y', ...
+- strength reduction: dividing by a constant becomes multiplying by its reciprocal when that is exact
+  ('x / 4' -> 'x * 0.25'; multiplying skips the zero check of Operation.divide)
+
+Only rewrites that are exact for the backend are made:
+- float: IEEE 754 has -0.0, inf and NaN, so 'x + 0' is not x (-0.0 + 0 is 0.0), 'x * 0' is not 0
+  (inf * 0 is NaN), '0 - x' is not -x, and only powers of two have an exact reciprocal.
+- fraction: exact arithmetic, so 'x + 0', '0 - x' and division by any constant are rewritten as well.
+- decimal: every operation rounds to the context precision (even 'x * 1'), so only constant folding is done.
+'x * 0' is never rewritten to 0 for a non-constant x: it would also hide errors in x, like an unknown variable.
+With the float backend, variables are not converted, so an int x gives 4 for 'x' but 4.0 for 'x * 1'.
+An identity that keeps an operand that may not be a float keeps it as '+x', which converts it to a float
+(e.g. 'x * 1' becomes '+x' and 'x * -1' becomes '-+x'); a number or an operation with a float operand needs no '+'.
+Constants are not moved across operators ('x + 1 + 2' is '(x + 1) + 2', and floats are not associative).
+
+shared_subexpressions() finds the subtrees that appear more than once, such as '1 + rate / 12' in a loan formula;
+compile_tree() computes each of them once per evaluation (common-subexpression elimination).
+Small subtrees used only twice, like 'x - mean', are cheaper to compute again, so they are not shared.
+
+"""
+
+import math
+import operator
+from collections import Counter
+from typing import Dict
+
+from app.backends import Backend, get_backend
+from app.expressions import BinOp, Node, Number, UnaryOp, Variable
+from app.registry import registry
+
+# Operator calls a repeated subexpression must save per evaluation before it is shared:
+# sharing costs a copy of the variables and a lookup for every use, about as much as two operator calls.
+MIN_SHARED_SAVING = 3
+
+
+def simplify(node: Node, backend: Backend = None) -> Node:
+    """Returns an equivalent tree with constants folded and identities and strength reductions applied."""
+    return _Simplifier(get_backend(backend)).visit(node)
+
+
+def shared_subexpressions(node: Node) -> Dict[str, int]:
+    """
+    Returns the operator subtrees that appear more than once in the tree, by their repr, each with a small number
+    as its key. Subtrees are compared by repr rather than with ==, because Number(0.0) == Number(-0.0).
+    Once a repeated subtree is found, its own children are not counted again (they are computed with it).
+    """
+    counts = Counter()
+    sizes = {}
+
+    def visit(node: Node) -> int:
+        """Counts the subtree and returns its number of operators."""
+        if isinstance(node, (Number, Variable)):
+            return 0
+        text = repr(node)
+        counts[text] += 1
+        if counts[text] > 1:
+            return sizes[text]
+        if isinstance(node, UnaryOp):
+            size = 1 + visit(node.operand)
+        else:
+            size = 1 + visit(node.left) + visit(node.right)
+        sizes[text] = size
+        return size
+
+    visit(node)
+    repeated = [text for text, count in counts.items() if (count - 1) * sizes[text] >= MIN_SHARED_SAVING]
+    return {text: key for key, text in enumerate(repeated)}
+
+
+
+
+def _negate(node: Node) -> Node:
+    """Returns -node, removing a double negation."""
+    if isinstance(node, UnaryOp) and node.op == '-':
+        return node.operand
+    return UnaryOp('-', node)
+
+
+class _Simplifier:
+    """Rewrites a tree bottom-up for one backend."""
+
+    def __init__(self, backend: Backend):
+        self.backend = backend
+        self.ieee = backend.name == 'float'
+        self.exact = backend.name == 'fraction'
+        self.convert = None if self.ieee else backend.convert
+
+    def constant(self, node: Number):
+        """The value of a number literal in the backend's number type."""
+        return node.value if self.convert is None else self.convert(node.literal)
+
+    def is_constant(self, node: Node, value: float) -> bool:
+        """True if node is the constant value in the backend's number type (with the same sign for zeros)."""
+        if not isinstance(node, Number):
+            return False
+        number = self.constant(node)
+        return number == value and math.copysign(1, number) == math.copysign(1, value)
+
+    def is_float(self, node: Node) -> bool:
+        """True if node is sure to compute a float with the float backend, whatever the types of the variables."""
+        if isinstance(node, Number):
+            return True
+        if isinstance(node, UnaryOp):
+            return node.op == '+' or self.is_float(node.operand)
+        if isinstance(node, BinOp):
+            return self.is_float(node.left) or self.is_float(node.right)
+        return False
+
+    def keep(self, node: Node) -> Node:
+        """Returns node as the result of an identity: wrapped in '+' if it is not sure to be a float with the float backend."""
+        if self.ieee and not self.is_float(node):
+            return UnaryOp('+', node)
+        return node
+
+    def negate(self, node: Node) -> Node:
+        """Returns -node as the result of an identity (see keep())."""
+        return _negate(self.keep(node))
+
+    def fold(self, func, *nodes: Number):
+        """Computes an operation on constants like the compiled expression would, or returns None if it raises."""
+        try:
+            return Number(self.backend.run(func, *(self.constant(node) for node in nodes)))
+        except ValueError:
+            return None
+
+    def visit(self, node: Node) -> Node:
+        if isinstance(node, UnaryOp):
+            return self.unary(node.op, self.visit(node.operand))
+        if isinstance(node, BinOp):
+            return self.binary(node.op, self.visit(node.left), self.visit(node.right))
+        return node
+
+    def unary(self, op: str, operand: Node) -> Node:
+        if op == '+':
+            return self.keep(operand)
+        if isinstance(operand, Number):
+            return self.fold(operator.neg, operand) or UnaryOp(op, operand)
+        if self.ieee or self.exact:
+            return _negate(operand)
+        return UnaryOp(op, operand)
+
+    def binary(self, op: str, left: Node, right: Node) -> Node:
+        if isinstance(left, Number) and isinstance(right, Number):
+            folded = self.fold(registry.functions[op], left, right)
+            if folded is not None:
+                return folded
+        if self.ieee or self.exact:
+            return self.identities(op, left, right)
+        return BinOp(op, left, right)
+
+    def identities(self, op: str, left: Node, right: Node) -> Node:
+        """Applies the identities that are exact for floats (and, with self.exact, for fractions)."""
+        negated_left = isinstance(left, UnaryOp) and left.op == '-'
+        negated_right = isinstance(right, UnaryOp) and right.op == '-'
+
+        if op == '+':
+            if self.is_constant(right, -0.0) or (self.exact and self.is_constant(right, 0.0)):
+                return self.keep(left)
+            if self.is_constant(left, -0.0) or (self.exact and self.is_constant(left, 0.0)):
+                return self.keep(right)
+            if negated_right:
+                return BinOp('-', left, right.operand)
+        elif op == '-':
+            if self.is_constant(right, 0.0) or (self.exact and self.is_constant(right, -0.0)):
+                return self.keep(left)
+            if self.exact and self.is_constant(left, 0.0):
+                return _negate(right)
+            if negated_right:
+                return BinOp('+', left, right.operand)
+        elif op == '*':
+            if self.is_constant(right, 1.0):
+                return self.keep(left)
+            if self.is_constant(left, 1.0):
+                return self.keep(right)
+            if self.is_constant(right, -1.0):
+                return self.negate(left)
+            if self.is_constant(left, -1.0):
+                return self.negate(right)
+            if negated_left and negated_right:
+                return BinOp('*', left.operand, right.operand)
+        else:
+            if self.is_constant(right, 1.0):
+                return self.keep(left)
+            if self.is_constant(right, -1.0):
+                return self.negate(left)
+            if negated_left and negated_right:
+                return BinOp('/', left.operand, right.operand)
+            reciprocal = self.reciprocal(right)
+            if reciprocal is not None:
+                return BinOp('*', left, reciprocal)
+        return BinOp(op, left, right)
+
+    def reciprocal(self, node: Node):
+        """Returns the constant 1 / node if multiplying by it is exactly the same as dividing by node, else None."""
+        if not isinstance(node, Number) or self.constant(node) == 0:
+            return None
+        if self.exact:
+            return Number(1 / self.constant(node))
+        mantissa, exponent = math.frexp(node.value)
+        # A power of two 2**k has the exact reciprocal 2**-k, as long as 2**-k is a normal float.
+        if abs(mantissa) == 0.5 and -1022 <= 1 - exponent <= 1023:
+            return Number(math.ldexp(math.copysign(1.0, mantissa), 1 - exponent))
+        return None
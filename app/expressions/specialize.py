@@ -0,0 +1,157 @@
+"""
+File for the 'app/expressions/specialize' module.
+Specializes a hot expression into one generated Python function, used by CompiledExpression once it has been
+evaluated SPECIALIZE_AFTER times (see app.expressions).
+
+A compiled expression is a tree of closures: every node is one Python call, and every operator is a second call
+to the Operation method registered for its symbol. generate() writes the whole expression as the body of
+one function instead, with the arithmetic inlined, and specialize() compiles it with compile(). For '(a + b) / 2':
+
+    def specialized(variables):
+        if _functions['+'] is not _add or _functions['/'] is not _divide:
+            return _interpreted(variables)
+        try:
+            v0 = variables['a']
+        except KeyError:
+            raise ExpressionError('Unknown variable: a') from None
+        ...
+        t0 = v0 + v1
+        t1 = t0 / 2.0
+        return t1
+
+The generated code gives exactly the same results and errors as the closures:
+- every operator is one statement, in the order the closures compute them, so errors come in the same order
+- division keeps the zero check of Operation.divide, with the same ValueError (only a nonzero constant divisor skips it)
+- an unknown variable raises the same ExpressionError, and variables are converted to the backend's number type
+  (with the float backend, only a unary '+' converts its operand)
+- a repeated subexpression is computed once (the first time it is needed) and then reused
+- the operator functions are inlined only while the registry still holds the plain Operation methods.
+  If a layer (e.g. the result cache) or another function is installed later, the first line sends every
+  evaluation back to the closures, which call the registered functions.
+
+To see the code of a specialized expression, use its specialized_source (or inspect.getsource() of the function).
+generate() returns the code for any tree without compiling it, e.g. print(generate(parse('(a + b) / 2'))).
+
+"""
+
+import linecache
+import math
+import weakref
+from itertools import count
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.backends import Backend, get_backend
+from app.expressions import Evaluator, ExpressionError, Node, Number, UnaryOp, Variable
+from app.operations import Operation
+from app.registry import registry
+
+# The operator symbols whose Operation method is inlined as the Python operator with the same symbol.
+INLINED = {'+': Operation.add, '-': Operation.subtract, '*': Operation.multiply, '/': Operation.divide}
+
+# Names of the Operation methods in the globals of the generated function.
+_NAMES = {'+': '_add', '-': '_subtract', '*': '_multiply', '/': '_divide'}
+
+# Numbers the file names of the generated functions, so the same source compiled for two backends
+# (or with and without optimize) gets two linecache entries.
+_file_numbers = count()
+
+
+class _Generator:
+    """Writes the statements of a generated function, one node at a time, in the order the closures evaluate them."""
+
+    def __init__(self, backend: Backend):
+        self.convert = None if backend.name == 'float' else backend.convert
+        self.lines: List[str] = []
+        self.constants: Dict[str, object] = {}  # global name -> value, for constants that are not Python literals
+        self.variables: Dict[str, str] = {}  # variable name -> local name
+        self.computed: Dict[str, str] = {}  # repr of a subtree -> local name that holds its value
+        self.symbols: List[str] = []  # operator symbols used, in order of first use
+        self.temporaries = 0
+
+    def constant(self, value) -> str:
+        """Returns the code of a constant: a literal for finite floats, else a global name."""
+        if self.convert is None and isinstance(value, float) and math.isfinite(value):
+            return repr(value)
+        name = f"_c{len(self.constants)}"
+        self.constants[name] = value if self.convert is None else self.convert(value)
+        return name
+
+    def load(self, name: str) -> str:
+        """Returns the local name of a variable, reading (and converting) it the first time it is used."""
+        local = self.variables.get(name)
+        if local is None:
+            local = self.variables[name] = f"v{len(self.variables)}"
+            self.lines += ["try:",
+                           f"    {local} = variables[{name!r}]",
+                           "except KeyError:",
+                           f"    raise ExpressionError({f'Unknown variable: {name}'!r}) from None"]
+            if self.convert is not None:
+                self.lines.append(f"{local} = _convert({local})")
+        return local
+
+    def visit(self, node: Node) -> str:
+        """Writes the statements that compute node and returns the code of its value."""
+        if isinstance(node, Number):
+            return self.constant(node.value if self.convert is None else node.literal)
+        if isinstance(node, Variable):
+            return self.load(node.name)
+        if isinstance(node, UnaryOp) and node.op == '+' and self.convert is not None:
+            return self.visit(node.operand)
+
+        key = repr(node)
+        local = self.computed.get(key)
+        if local is not None:
+            return local
+        if isinstance(node, UnaryOp):
+            operand = self.visit(node.operand)
+            code = f"-{operand}" if node.op == '-' else f"_convert({operand})"
+        else:
+            left = self.visit(node.left)
+            right = self.visit(node.right)
+            if node.op not in self.symbols:
+                self.symbols.append(node.op)
+            if node.op == '/' and not (isinstance(node.right, Number) and node.right.value != 0):
+                self.lines += [f"if {right} == 0:", "    raise ValueError('Cannot divide by zero.')"]
+            code = f"{left} {node.op} {right}"
+        local = self.computed[key] = f"t{self.temporaries}"
+        self.temporaries += 1
+        self.lines.append(f"{local} = {code}")
+        return local
+
+    def source(self, tree: Node) -> str:
+        """Returns the source code of the specialized function of tree."""
+        result = self.visit(tree)
+        body = self.lines + [f"return {result}"]
+        if self.symbols:
+            checks = " or ".join(f"_functions[{symbol!r}] is not {_NAMES[symbol]}" for symbol in self.symbols)
+            body = [f"if {checks}:", "    return _interpreted(variables)"] + body
+        return "def specialized(variables):\n" + "".join(f"    {line}\n" for line in body)
+
+
+def generate(tree: Node, backend: Optional[Backend] = None) -> str:
+    """Returns the source code of the specialized function of tree for backend (the session backend by default)."""
+    return _Generator(get_backend(backend)).source(tree)
+
+
+def specialize(tree: Node, backend: Backend, interpreted: Evaluator,
+               name: str = 'expression', owner: Any = None) -> Tuple[Optional[Evaluator], str]:
+    """
+    Compiles the specialized function of tree for backend and returns (function, source).
+    interpreted is the compiled closures of the same tree: the function falls back on them when the registry
+    no longer holds the Operation methods. The function is None if they are already replaced now.
+    name is shown in tracebacks, and the source is registered in linecache so inspect.getsource() works.
+    The linecache entry is removed when owner (e.g. the CompiledExpression), or else the function, is garbage collected.
+    """
+    generator = _Generator(backend)
+    source = generator.source(tree)
+    if any(registry.functions.get(symbol) is not INLINED[symbol] for symbol in generator.symbols):
+        return None, source
+    filename = f"<specialized {name} #{next(_file_numbers)}>"
+    namespace = {'_functions': registry.functions, '_interpreted': interpreted, '_convert': backend.convert,
+                 'ExpressionError': ExpressionError, **generator.constants}
+    namespace.update((_NAMES[symbol], function) for symbol, function in INLINED.items())
+    exec(compile(source, filename, 'exec'), namespace)  # pylint: disable=exec-used
+    linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+    function = namespace['specialized']
+    weakref.finalize(function if owner is None else owner, linecache.cache.pop, filename, None)
+    return function, source
@@ -0,0 +1,228 @@
+"""
+File for the 'app/history' module.
+The calculation history of a REPL session, and an on-disk journal to keep it between sessions.
+
+Every calculation of the REPL becomes an Entry: the operator symbol, the operands and the result
+(an expression typed after '=' is stored with the operator '=' and the expression text as its operand).
+Entries use __slots__, so each one costs a small fixed amount of memory.
+
+History keeps the most recent entries in a ring buffer with a fixed capacity: when it is full,
+the oldest entry is overwritten, so a long session never uses more memory than that.
+Entries are numbered from 1 in the order they were made, and keep their number when older ones drop out.
+
+Journal appends every entry as one tab-separated text line to a file. Lines are written through a buffer
+and the file is flushed to disk (fsync) once every sync_every entries and when the journal is closed,
+instead of once per entry. replay() reads a journal back to rebuild the history and the variables of a session.
+A last line cut off by a crash is skipped by replay(), and removed when the journal is opened again,
+so new entries never end up glued to it.
+
+"""
+
+import os
+from typing import Iterator, List, Optional, Tuple
+
+from app.backends import get_backend
+
+# Default number of entries kept in a History.
+DEFAULT_CAPACITY = 1000
+
+# Default number of entries written to a Journal between two fsync calls.
+DEFAULT_SYNC_EVERY = 64
+
+# Number of bytes read at a time when looking for the end of the last complete line of a journal.
+_TAIL_BLOCK = 4096
+
+
+class Entry:
+    """
+    One calculation: the operator symbol, its operands and the result.
+    b is None for one-operand operators. For an expression, op is '=' and a is the expression text.
+    """
+
+    __slots__ = ('op', 'a', 'b', 'result')
+
+    def __init__(self, op: str, a, b, result):
+        self.op = op
+        self.a = a
+        self.b = b
+        self.result = result
+
+    @property
+    def operands(self) -> tuple:
+        """The operands as a tuple (one or two values)."""
+        return (self.a,) if self.b is None else (self.a, self.b)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Entry):
+            return NotImplemented
+        return (self.op, self.a, self.b, self.result) == (other.op, other.a, other.b, other.result)
+
+    def __repr__(self) -> str:
+        return f"Entry({self.op!r}, {self.a!r}, {self.b!r}, {self.result!r})"
+
+    def __str__(self) -> str:
+        if self.op == '=':
+            return f"= {self.a} -> {self.result}"
+        if self.b is None:
+            return f"{self.op} {self.a} = {self.result}"
+        return f"{self.a} {self.op} {self.b} = {self.result}"
+
+
+class History:
+    """
+    The most recent entries of a session, in a ring buffer of capacity entries.
+    The buffer grows as entries are added, so a new or little-used history stays small.
+    """
+
+    __slots__ = ('capacity', 'count', '_entries')
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        if capacity < 1:
+            raise ValueError("The history capacity must be at least 1.")
+        self.capacity = capacity
+        self._entries = []
+        self.count = 0  # number of entries ever added; the newest entry has this number
+
+    def append(self, entry: Entry) -> int:
+        """Adds an entry (overwriting the oldest one when the history is full) and returns its number."""
+        if len(self._entries) < self.capacity:
+            self._entries.append(entry)
+        else:
+            self._entries[self.count % self.capacity] = entry
+        self.count += 1
+        return self.count
+
+    def restore(self, entries: List[Entry], count: int) -> None:
+        """
+        Puts back the entries of a saved history (oldest first), the newest one having the number count.
+        Used to restore a session snapshot. A history that had dropped old entries must be restored into
+        a history of the same capacity, so the entry numbers stay the same.
+        """
+        if count < len(entries) or len(entries) > self.capacity or (count > len(entries) != self.capacity):
+            raise ValueError("The saved entries do not fit this history.")
+        self.count = count - len(entries)
+        self._entries = [None] * self.capacity if self.count else []
+        for entry in entries:
+            self.append(entry)
+
+    def get(self, number: int) -> Entry:
+        """Returns the entry with the given number. Raises a ValueError if it was never made or has dropped out."""
+        if not self.count - len(self) < number <= self.count:
+            raise ValueError(f"There is no entry !{number} in the history.")
+        return self._entries[(number - 1) % self.capacity]
+
+    @property
+    def last(self) -> Optional[Entry]:
+        """The newest entry, or None if the history is empty."""
+        return self.get(self.count) if self.count else None
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def __iter__(self) -> Iterator[Tuple[int, Entry]]:
+        """Yields (number, entry) for the entries still kept, oldest first."""
+        for number in range(self.count - len(self) + 1, self.count + 1):
+            yield number, self._entries[(number - 1) % self.capacity]
+
+
+#----------------------------------------------------------------
+# Journal
+#----------------------------------------------------------------
+
+def format_entry(entry: Entry, backend_name: str) -> str:
+    """Returns the journal line of an entry: backend, operator, a, b (empty for one operand) and result."""
+    b = '' if entry.b is None else str(entry.b)
+    return f"{backend_name}\t{entry.op}\t{entry.a}\t{b}\t{entry.result}\n"
+
+
+def _complete_length(path: str) -> int:
+    """Returns the size of the file at path up to the end of its last complete line (0 if it has none)."""
+    with open(path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - _TAIL_BLOCK)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b'\n')
+            if newline >= 0:
+                return start + newline + 1
+            end = start
+    return 0
+
+
+class Journal:
+    """An append-only file of entries, flushed to disk once every sync_every entries."""
+
+    def __init__(self, path: str, sync_every: int = DEFAULT_SYNC_EVERY):
+        self.path = path
+        self.sync_every = sync_every
+        self.pending = 0  # entries written since the last fsync
+        if os.path.exists(path):
+            # A last line without a newline was cut off by a crash; it is removed so the next entry starts a new line.
+            size = _complete_length(path)
+            if size != os.path.getsize(path):
+                os.truncate(path, size)
+        self._file = open(path, 'a', encoding='utf-8')  # pylint: disable=consider-using-with
+
+    def append(self, entry: Entry, backend_name: str = 'float') -> None:
+        """Writes one entry. The numbers are written with the backend they were computed with."""
+        self._file.write(format_entry(entry, backend_name))
+        self.pending += 1
+        if self.pending >= self.sync_every:
+            self.sync()
+
+    def sync(self) -> None:
+        """Flushes the written entries to disk."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.pending = 0
+
+    def close(self) -> None:
+        """Flushes the remaining entries to disk and closes the file."""
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def __enter__(self) -> 'Journal':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def replay(path: str, history: Optional[History] = None, variables: Optional[dict] = None) -> Tuple[History, dict]:
+    """
+    Reads the journal at path and rebuilds a session from it: the entries are added to history
+    (a new History by default), and the variables assigned with '= x = ...' are set in variables,
+    together with '_', the last result. Results are read from the journal, not computed again.
+    Returns (history, variables).
+
+    A last line without a newline (cut off by a crash while it was written) is skipped;
+    opening a Journal on the file removes it.
+    Raises a ValueError that names the line for any other line that cannot be read.
+    """
+    history = History() if history is None else history
+    variables = {} if variables is None else variables
+    convert = {}  # backend name -> convert function
+    result = None
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, start=1):
+            if not line.endswith('\n'):
+                break
+            try:
+                backend_name, op, a, b, text = line[:-1].split('\t')
+                to_number = convert.get(backend_name)
+                if to_number is None:
+                    to_number = convert[backend_name] = get_backend(backend_name).convert
+                result = to_number(text)
+                if op == '=':
+                    name, sep, _ = a.partition('=')
+                    if sep and name.strip().isidentifier():
+                        variables[name.strip()] = result
+                    history.append(Entry(op, a, None, result))
+                else:
+                    history.append(Entry(op, to_number(a), to_number(b) if b else None, result))
+            except ValueError as e:
+                raise ValueError(f"{path}, line {number}: cannot read the entry ({e}).") from None
+    if result is not None:
+        variables['_'] = result
+    return history, variables
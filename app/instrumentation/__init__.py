@@ -0,0 +1,280 @@
+"""
+File for the 'app/instrumentation' module.
+Optional metrics for the calculator's hot paths, to see where time goes when it slows down.
+
+When enabled, it records:
+- calls per operator and a latency histogram per operator (every call through the operator registry)
+- error counts by kind: 'divide_by_zero', 'operation_error', 'invalid_operation', 'invalid_input'
+- a histogram of parse time (turning text into numbers or expressions) and of compute time
+
+Metrics can be exported as a Prometheus text snapshot (to_prometheus) or as a JSON dump (to_json).
+
+Instrumentation is off by default and then costs (almost) nothing: the operator functions are not wrapped
+at all, and the REPL, batch mode and expressions only check 'instrumentation.active is not None'.
+Metrics are collected per process, so work done by app.parallel worker processes is not included.
+
+    from app import instrumentation
+    metrics = instrumentation.enable()
+    ...
+    print(metrics.to_prometheus())
+    instrumentation.disable()
+
+"""
+
+import threading
+from bisect import bisect_left
+from collections import Counter
+from time import perf_counter
+from typing import Dict, List, Optional, Sequence
+
+from app.registry import registry
+
+# Upper bounds (in seconds) of the latency histogram buckets, from 100 nanoseconds to 10 seconds.
+DEFAULT_BUCKETS = (
+    1e-7, 2.5e-7, 5e-7, 1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+    1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Message of the ValueError raised by Operation.divide, used to tell division by zero from other errors.
+DIVIDE_BY_ZERO_MESSAGE = "Cannot divide by zero."
+
+
+class Histogram:
+    """A cumulative histogram with fixed bucket upper bounds, like a Prometheus histogram."""
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last slot is the +Inf bucket
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Adds one observation."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[int]:
+        """Returns the number of observations <= each bucket bound, ending with the total (+Inf)."""
+        total = 0
+        result = []
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+    def to_dict(self) -> dict:
+        """Returns the histogram as a JSON-ready dict."""
+        return {
+            "buckets": [*self.buckets, "+Inf"],
+            "cumulative_counts": self.cumulative(),
+            "count": self.count,
+            "sum": self.sum,
+        }
+
+
+def _label(value: str) -> str:
+    """Escapes a Prometheus label value."""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """
+    The metrics collected while instrumentation is enabled. All methods are thread-safe.
+
+    To keep operator calls cheap, every thread records its calls and phases into its own histograms (no lock
+    on the hot path); the per-thread histograms are merged when the metrics are read.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self._buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._shards: Dict[str, List[Histogram]] = {}  # operator symbol -> one histogram per thread
+        self._recorded: Dict[str, Histogram] = {}  # histograms filled by observe_call()
+        self.errors: Counter = Counter()
+        self._phase_shards: Dict[str, List[Histogram]] = {}  # phase -> one histogram per thread
+        self._local = threading.local()  # .phases: this thread's histogram per phase
+
+    def _merge(self, histograms: List[Histogram]) -> Histogram:
+        merged = Histogram(self._buckets)
+        for histogram in histograms:
+            merged.counts = [x + y for x, y in zip(merged.counts, histogram.counts)]
+            merged.count += histogram.count
+            merged.sum += histogram.sum
+        return merged
+
+    def _merge_shards(self, shards: Dict[str, List[Histogram]]) -> Dict[str, Histogram]:
+        """Merges the per-thread histograms of every key, leaving out keys with no observations yet."""
+        with self._lock:
+            shards = {key: list(histograms) for key, histograms in shards.items()}
+        merged = {key: self._merge(histograms) for key, histograms in shards.items()}
+        return {key: histogram for key, histogram in merged.items() if histogram.count}
+
+    @property
+    def latency(self) -> Dict[str, Histogram]:
+        """Latency histogram per operator symbol (only operators that were called)."""
+        return self._merge_shards(self._shards)
+
+    @property
+    def calls(self) -> Dict[str, int]:
+        """Number of calls per operator symbol."""
+        return {symbol: histogram.count for symbol, histogram in self.latency.items()}
+
+    @property
+    def phases(self) -> Dict[str, Histogram]:
+        """Histograms per phase. 'compute' is the total of all operator latencies."""
+        latency = self.latency
+        phases = self._merge_shards(self._phase_shards)
+        if latency:
+            phases['compute'] = self._merge(list(latency.values()))
+        return phases
+
+    def _new_shard(self, shards: Dict[str, List[Histogram]], key: str) -> Histogram:
+        """Creates a new histogram for one thread and registers it in shards under key (an operator or a phase)."""
+        histogram = Histogram(self._buckets)
+        with self._lock:
+            shards.setdefault(key, []).append(histogram)
+        return histogram
+
+    def observe_call(self, symbol: str, seconds: float) -> None:
+        """Records one call of the operator symbol that took seconds."""
+        with self._lock:
+            histogram = self._recorded.get(symbol)
+            if histogram is None:
+                histogram = self._recorded[symbol] = Histogram(self._buckets)
+                self._shards.setdefault(symbol, []).append(histogram)
+            histogram.observe(seconds)
+
+    def observe_phase(self, phase: str, seconds: float) -> None:
+        """Records seconds spent in a phase, e.g. 'parse', in this thread's histogram for it."""
+        try:
+            histograms = self._local.phases
+        except AttributeError:  # first phase recorded in this thread
+            histograms = self._local.phases = {}
+        histogram = histograms.get(phase)
+        if histogram is None:
+            histogram = histograms[phase] = self._new_shard(self._phase_shards, phase)
+        histogram.observe(seconds)
+
+    def record_error(self, kind: str) -> None:
+        """Counts one error of the given kind."""
+        with self._lock:
+            self.errors[kind] += 1
+
+    def layer(self, spec, func):
+        """Operator registry layer that times every call of func and counts its errors."""
+        symbol = spec.symbol
+        local = threading.local()
+
+        def timed(*operands):
+            started = perf_counter()
+            try:
+                return func(*operands)
+            except ValueError as e:
+                self.record_error('divide_by_zero' if str(e) == DIVIDE_BY_ZERO_MESSAGE else 'operation_error')
+                raise
+            finally:
+                elapsed = perf_counter() - started
+                try:
+                    histogram = local.histogram
+                except AttributeError:  # first call of this operator in this thread
+                    histogram = local.histogram = self._new_shard(self._shards, symbol)
+                histogram.observe(elapsed)
+
+        return timed
+
+    #----------------------------------------------------------------
+    # Export
+    #----------------------------------------------------------------
+
+    def snapshot(self) -> dict:
+        """Returns a JSON-ready copy of all the metrics."""
+        latency = self.latency
+        phases = self.phases
+        with self._lock:
+            errors = dict(self.errors)
+        return {
+            "calls": {symbol: histogram.count for symbol, histogram in latency.items()},
+            "latency_seconds": {symbol: histogram.to_dict() for symbol, histogram in latency.items()},
+            "errors": errors,
+            "phase_seconds": {phase: histogram.to_dict() for phase, histogram in phases.items()},
+        }
+
+    def to_json(self) -> str:
+        """Returns the metrics as a JSON document."""
+        import json  # pylint: disable=import-outside-toplevel
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True)
+
+    def to_prometheus(self) -> str:
+        """Returns the metrics in the Prometheus text exposition format."""
+        latency = self.latency
+        phases = self.phases
+        lines = [
+            "# HELP calculator_operations_total Operator calls.",
+            "# TYPE calculator_operations_total counter",
+        ]
+        with self._lock:
+            for symbol, histogram in sorted(latency.items()):
+                lines.append(f'calculator_operations_total{{operator="{_label(symbol)}"}} {histogram.count}')
+
+            lines += [
+                "# HELP calculator_operation_seconds Operator call latency.",
+                "# TYPE calculator_operation_seconds histogram",
+            ]
+            for symbol, histogram in sorted(latency.items()):
+                lines += self._histogram_lines("calculator_operation_seconds", f'operator="{_label(symbol)}"', histogram)
+
+            lines += [
+                "# HELP calculator_errors_total Errors by kind.",
+                "# TYPE calculator_errors_total counter",
+            ]
+            for kind, count in sorted(self.errors.items()):
+                lines.append(f'calculator_errors_total{{kind="{_label(kind)}"}} {count}')
+
+            lines += [
+                "# HELP calculator_phase_seconds Time spent parsing input and computing results.",
+                "# TYPE calculator_phase_seconds histogram",
+            ]
+            for phase, histogram in sorted(phases.items()):
+                lines += self._histogram_lines("calculator_phase_seconds", f'phase="{_label(phase)}"', histogram)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _histogram_lines(name: str, labels: str, histogram: Histogram) -> List[str]:
+        bounds = [repr(float(b)) for b in histogram.buckets] + ["+Inf"]
+        lines = [f'{name}_bucket{{{labels},le="{bound}"}} {count}'
+                 for bound, count in zip(bounds, histogram.cumulative())]
+        lines.append(f"{name}_sum{{{labels}}} {histogram.sum!r}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        return lines
+
+
+# The metrics being collected, or None while instrumentation is disabled.
+active: Optional[Metrics] = None
+
+
+def enable(metrics: Optional[Metrics] = None) -> Metrics:
+    """Starts collecting metrics into metrics (a new Metrics by default) and returns it."""
+    global active  # pylint: disable=global-statement
+    disable()
+    metrics = metrics if metrics is not None else Metrics()
+    registry.add_layer(metrics.layer)
+    active = metrics
+    return metrics
+
+
+def disable() -> None:
+    """Stops collecting metrics. The Metrics object keeps what was collected."""
+    global active  # pylint: disable=global-statement
+    if active is None:
+        return
+    registry.remove_layer(active.layer)
+    active = None
+
+
+def record_error(kind: str) -> None:
+    """Counts one error of the given kind if instrumentation is enabled."""
+    if active is not None:
+        active.record_error(kind)
@@ -7,8 +7,53 @@ Instead of creating a separate function for each operation, we will define stati
 Static methods allow us to call these methods without needing to create an instance of the class.
 This allows us to group related operations together and makes the code more organized and reusable.
 
+The class also provides batch versions of each operation (add_many, subtract_many, multiply_many, divide_many).
+These take two sequences of numbers (lists, tuples, array.array or NumPy arrays) and compute the result
+element by element in one pass, instead of calling the scalar method once per pair from Python.
+
 """
 
+import math
+import operator
+import sys
+from array import array
+
+
+# Policies supported by Operation.divide_many when a divisor is zero.
+ZERO_DIVISION_POLICIES = ('raise', 'nan', 'skip')
+
+
+def _numpy_for(a, b):
+    """
+    Returns the numpy module if a or b is a NumPy array, otherwise None.
+    We only look in sys.modules so that NumPy is never imported just to check the type;
+    if the caller passed a NumPy array, NumPy is already loaded.
+    """
+    np = sys.modules.get('numpy')
+    if np is not None and (isinstance(a, np.ndarray) or isinstance(b, np.ndarray)):
+        return np
+    return None
+
+
+def _check_lengths(a, b) -> None:
+    """Raises a ValueError if the two operand sequences do not have the same length."""
+    if len(a) != len(b):
+        raise ValueError(f"Operands must have the same length, got {len(a)} and {len(b)}.")
+
+
+def _elementwise(scalar_op, ufunc_name: str, a, b):
+    """
+    Applies a binary operator element by element over a and b.
+    NumPy arrays are handled by the matching NumPy ufunc and a float64 NumPy array is returned.
+    Any other sequences are combined with map() (the loop runs in C) into an array.array of doubles.
+    """
+    _check_lengths(a, b)
+    np = _numpy_for(a, b)
+    if np is not None:
+        return getattr(np, ufunc_name)(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64))
+    return array('d', map(scalar_op, a, b))
+
+
 class Operation:
 
     @staticmethod
@@ -64,4 +109,88 @@ class Operation:
         if b == 0:
             raise ValueError("Cannot divide by zero.")
         return a / b #math part where it will divide the two numbers and return the quotient as a float(decimal point number).
-    
+
+
+    @staticmethod
+    def add_many(a, b):
+        """
+        Returns the element-wise sum of the sequences a and b.
+        a, b - sequences of numbers with the same length (list, tuple, array.array or NumPy array)
+        The sums are returned as an array.array of floats, or as a NumPy float64 array if a NumPy array was passed in.
+
+        """
+        return _elementwise(operator.add, 'add', a, b)
+
+
+    @staticmethod
+    def subtract_many(a, b):
+        """
+        Returns the element-wise difference of the sequences a and b.
+        a, b - sequences of numbers with the same length (list, tuple, array.array or NumPy array)
+        The differences are returned as an array.array of floats, or as a NumPy float64 array if a NumPy array was passed in.
+
+        """
+        return _elementwise(operator.sub, 'subtract', a, b)
+
+
+    @staticmethod
+    def multiply_many(a, b):
+        """
+        Returns the element-wise product of the sequences a and b.
+        a, b - sequences of numbers with the same length (list, tuple, array.array or NumPy array)
+        The products are returned as an array.array of floats, or as a NumPy float64 array if a NumPy array was passed in.
+
+        """
+        return _elementwise(operator.mul, 'multiply', a, b)
+
+
+    @staticmethod
+    def divide_many(a, b, on_zero: str = 'raise'):
+        """
+        Returns the element-wise quotient of the sequences a and b.
+        a, b - sequences of numbers with the same length (list, tuple, array.array or NumPy array)
+        on_zero - what to do with the rows where the divisor is zero:
+            'raise' - raise a ValueError("Cannot divide by zero.") like Operation.divide (default)
+            'nan'   - put NaN in the result for those rows
+            'skip'  - leave those rows out of the result
+        The quotients are returned as an array.array of floats, or as a NumPy float64 array if a NumPy array was passed in.
+
+        Use Operation.zero_divisors(b) to find out which rows were affected.
+
+        """
+        if on_zero not in ZERO_DIVISION_POLICIES:
+            raise ValueError(f"Unknown zero division policy: {on_zero!r}. Use one of {ZERO_DIVISION_POLICIES}.")
+        _check_lengths(a, b)
+
+        np = _numpy_for(a, b)
+        if np is not None:
+            a = np.asarray(a, dtype=np.float64)
+            b = np.asarray(b, dtype=np.float64)
+            nonzero = b != 0
+            if nonzero.all():
+                return np.divide(a, b)
+            if on_zero == 'raise':
+                raise ValueError("Cannot divide by zero.")
+            if on_zero == 'skip':
+                return np.divide(a[nonzero], b[nonzero])
+            return np.divide(a, b, out=np.full(a.shape, np.nan), where=nonzero)
+
+        # 0 in b uses ==, so it also finds 0.0 and -0.0.
+        if 0 not in b:
+            return array('d', map(operator.truediv, a, b))
+        if on_zero == 'raise':
+            raise ValueError("Cannot divide by zero.")
+        if on_zero == 'skip':
+            return array('d', [x / y for x, y in zip(a, b) if y != 0])
+        nan = math.nan
+        return array('d', [x / y if y != 0 else nan for x, y in zip(a, b)])
+
+
+    @staticmethod
+    def zero_divisors(b):
+        """
+        Returns a list of booleans, True wherever b is zero.
+        This is the mask of rows that Operation.divide_many cannot divide.
+
+        """
+        return [y == 0 for y in b]
@@ -0,0 +1,155 @@
+"""
+File for the 'app/parallel' module.
+A job runner that spreads large calculation jobs over several CPU cores.
+
+The rows of a job are split into chunks, and every chunk is sent to a worker process of a
+concurrent.futures.ProcessPoolExecutor. Sending whole chunks instead of single rows means the cost of
+pickling and inter-process communication is paid once per chunk, not once per row.
+
+Results always come back in input order. Errors are handled per row, the same way the calculator
+handles them: a row that raises a ValueError (for example division by zero) gives that ValueError
+as its result, and the rest of the chunk is still computed.
+
+Two knobs control the runner:
+- workers: number of worker processes (default: the number of CPU cores). workers=1 runs in this process.
+- chunksize: number of rows per chunk sent to a worker.
+mp_context (a multiprocessing context such as multiprocessing.get_context('spawn')) chooses how the worker
+processes are started; by default the platform's start method is used. Nothing the workers need is inherited
+from this process: the session backend and the installed result store are sent along with every chunk.
+
+"""
+
+import os
+import sys
+from collections import deque
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+from typing import Any, Callable, Iterable, Iterator, List, Optional, TextIO, Tuple, TypeVar, Union
+
+from app.backends import Backend, current_backend, using_backend
+from app.batch import evaluate_records, read_records, write_results
+from app.registry import registry
+
+# Number of rows sent to a worker process at once.
+DEFAULT_CHUNKSIZE = 10_000
+
+# How many chunks per worker may be waiting for a result at the same time.
+# This keeps every worker busy while bounding the memory used by pending chunks.
+PENDING_CHUNKS_PER_WORKER = 2
+
+Row = Tuple[str, float, float]
+RowResult = Union[float, ValueError]
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def evaluate_rows(rows: List[Row]) -> List[RowResult]:
+    """
+    Computes a chunk of (op, a, b) rows with the operator registry and returns one result per row.
+    A row that fails gives its ValueError as the result instead of stopping the chunk.
+    """
+    results = []
+    for op, a, b in rows:
+        try:
+            results.append(registry.dispatch(op, a, b))
+        except ValueError as e:
+            results.append(e)
+    return results
+
+
+def installed_store():
+    """
+    Returns the result store installed with app.store.install(), or None.
+    We only look in sys.modules so that app.store (and sqlite3) is never imported just to check.
+    """
+    store = sys.modules.get('app.store')
+    return store.installed() if store is not None else None
+
+
+def evaluate_lines(lines: List[str], backend: Optional[Backend] = None, store: Any = None) -> List[str]:
+    """
+    Computes a chunk of 'op a b' text lines and returns the batch mode output lines.
+    backend is the numeric backend to use; worker processes do not share the parent's session backend.
+    store is the app.store.ResultStore to use (the installed one by default), for the same reason.
+    With a result store, the results of the whole chunk are looked up in it first,
+    and the new results are written to it when the chunk is done.
+    """
+    with using_backend(backend if backend is not None else current_backend()):
+        records = list(read_records(lines))
+        store = store if store is not None else installed_store()
+        if store is None:
+            return list(evaluate_records(records))
+        from app.store import using_store  # pylint: disable=import-outside-toplevel
+        with using_store(store):
+            store.prefetch(records)
+            try:
+                return list(evaluate_records(records))
+            finally:
+                store.flush()
+
+
+def chunked(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Yields lists of up to size items from items."""
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _check_knobs(workers: Optional[int], chunksize: int) -> int:
+    """Validates the workers and chunksize knobs and returns the number of workers to use."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError("workers must be at least 1.")
+    if chunksize < 1:
+        raise ValueError("chunksize must be at least 1.")
+    return workers
+
+
+def ordered_map(func: Callable[[List[T]], List[R]], chunks: Iterable[List[T]], workers: int,
+                mp_context=None) -> Iterator[List[R]]:
+    """
+    Yields func(chunk) for every chunk, in input order.
+    With more than one worker the chunks are computed in a process pool (started with mp_context), with at most
+    PENDING_CHUNKS_PER_WORKER chunks per worker in flight, so the input is never read ahead all at once.
+    """
+    if workers == 1:
+        yield from map(func, chunks)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(func, chunk))
+            if len(pending) >= workers * PENDING_CHUNKS_PER_WORKER:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def run_job(rows: Iterable[Row], workers: Optional[int] = None, chunksize: int = DEFAULT_CHUNKSIZE) -> List[RowResult]:
+    """
+    Computes every (op, a, b) row across a pool of worker processes.
+    Returns the results in input order; failed rows hold their ValueError.
+    """
+    workers = _check_knobs(workers, chunksize)
+    return list(chain.from_iterable(ordered_map(evaluate_rows, chunked(rows, chunksize), workers)))
+
+
+def run_batch_parallel(lines: Iterable[str], out: TextIO, workers: Optional[int] = None,
+                       chunksize: int = DEFAULT_CHUNKSIZE, mp_context=None) -> Tuple[int, int]:
+    """
+    Parallel version of app.batch.run_batch: computes 'op a b' lines across a pool of worker processes
+    and writes the output lines to out in input order. The workers use the caller's session backend
+    and installed result store.
+    Returns a tuple (number of records, number of error records).
+    """
+    workers = _check_knobs(workers, chunksize)
+    func = partial(evaluate_lines, backend=current_backend(), store=installed_store())
+    results = chain.from_iterable(ordered_map(func, chunked(lines, chunksize), workers, mp_context))
+    return write_results(results, out)
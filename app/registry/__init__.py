@@ -0,0 +1,209 @@
+"""
+File for the 'app/registry' module.
+The operator registry: one table that maps every operator symbol ('+', '-', ...) to the function that
+computes it, together with its arity (number of operands) and other metadata.
+
+The REPL, batch mode, the parallel runner, the server and expressions all look operators up here,
+so adding an operator means registering it once, and every lookup is a single dict access.
+
+The four basic operators come from the Operation class. More operators can be added:
+- in code:            registry.register('%', lambda a, b: a % b, name='modulo')
+- as a plugin package, through the 'calculator.operators' entry point group. The entry point name is
+  the operator symbol and the object is a function of two numbers (or an OperatorSpec), e.g. in pyproject.toml:
+      [project.entry-points."calculator.operators"]
+      "^" = "calc_power:power"
+  Plugins are loaded lazily: the package metadata is only read the first time an unknown symbol is looked up,
+  and a plugin module is only imported when its own symbol is used.
+
+Layers can wrap every operator function, e.g. the result cache (app.cache.install).
+A layer is a function layer(spec, func) that returns the function to use instead of func.
+
+Every caller only handles ValueError, so a registered function that raises an ArithmeticError (e.g.
+ZeroDivisionError from 'a % b') or a TypeError (e.g. a function that takes another number of operands
+than its arity) has that error turned into a ValueError. The four basic operators already raise ValueError,
+so they are called directly.
+
+"""
+
+from functools import wraps
+from typing import TYPE_CHECKING, Callable, Dict, List, NamedTuple, Optional
+
+from app.operations import Operation
+
+if TYPE_CHECKING:  # importlib.metadata is slow to import, so it is only imported when plugins are looked up
+    from importlib.metadata import EntryPoint
+
+# Entry point group that plugin packages use to register operators.
+ENTRY_POINT_GROUP = 'calculator.operators'
+
+
+class OperatorSpec(NamedTuple):
+    """
+    Describes one operator.
+    symbol      - what the user types, e.g. '+'
+    name        - readable name, e.g. 'add'
+    func        - function that computes the result from arity numbers
+    arity       - number of operands (1 or 2)
+    description - one line of help text
+    """
+    symbol: str
+    name: str
+    func: Callable[..., float]
+    arity: int = 2
+    description: str = ''
+
+
+Layer = Callable[[OperatorSpec, Callable[..., float]], Callable[..., float]]
+
+# The functions of the basic operators, which only raise ValueError and are called without a wrapper.
+_BASIC_FUNCTIONS = frozenset({Operation.add, Operation.subtract, Operation.multiply, Operation.divide})
+
+
+def _reporting_errors(spec: OperatorSpec) -> Callable[..., float]:
+    """Returns spec.func, turning its ArithmeticError and TypeError into a ValueError like the basic operators."""
+    func = spec.func
+
+    @wraps(func)
+    def reported(*operands):
+        try:
+            return func(*operands)
+        except ZeroDivisionError:
+            raise ValueError("Cannot divide by zero.") from None
+        except (ArithmeticError, TypeError) as e:
+            raise ValueError(f"Operator {spec.symbol!r} failed: {e}") from None
+
+    return reported
+
+
+class OperatorRegistry:
+    """
+    Maps operator symbols to OperatorSpecs and to the function used to compute them.
+    The functions dict (symbol -> function with all layers applied) is kept up to date in place,
+    so hot loops can hold on to it and index it directly.
+    """
+
+    def __init__(self, entry_point_group: Optional[str] = ENTRY_POINT_GROUP):
+        self.entry_point_group = entry_point_group
+        self.specs: Dict[str, OperatorSpec] = {}
+        self.functions: Dict[str, Callable[..., float]] = {}
+        self._layers: List[Layer] = []
+        self._plugins: Optional[Dict[str, 'EntryPoint']] = None
+
+    def register(self, symbol: str, func: Optional[Callable[..., float]] = None, *, name: Optional[str] = None,
+                 arity: int = 2, description: str = ''):
+        """
+        Registers func under symbol and returns it. Without func, returns a decorator:
+            @registry.register('%', name='modulo')
+            def modulo(a, b): ...
+        Registering an existing symbol replaces it.
+        """
+        if func is None:
+            return lambda f: self.register(symbol, f, name=name, arity=arity, description=description)
+        if arity not in (1, 2):
+            raise ValueError("arity must be 1 or 2.")
+        self.add(OperatorSpec(symbol, name or func.__name__, func, arity, description))
+        return func
+
+    def add(self, spec: OperatorSpec) -> None:
+        """Registers an OperatorSpec, replacing any operator with the same symbol."""
+        self.specs[spec.symbol] = spec
+        self.functions[spec.symbol] = self._apply_layers(spec)
+
+    def unregister(self, symbol: str) -> None:
+        """Removes the operator registered under symbol, if any."""
+        self.specs.pop(symbol, None)
+        self.functions.pop(symbol, None)
+
+    def get(self, symbol: str) -> Optional[OperatorSpec]:
+        """Returns the OperatorSpec for symbol, loading it from a plugin if needed, or None if there is none."""
+        spec = self.specs.get(symbol)
+        if spec is None and self._load_plugin(symbol):
+            spec = self.specs[symbol]
+        return spec
+
+    def function(self, symbol: str) -> Optional[Callable[..., float]]:
+        """Returns the function (with layers applied) that computes symbol, or None if there is none."""
+        func = self.functions.get(symbol)
+        if func is None and self._load_plugin(symbol):
+            func = self.functions[symbol]
+        return func
+
+    def dispatch(self, symbol: str, *operands: float) -> float:
+        """Computes symbol on the operands. Raises ValueError for an unknown operator or the wrong number of operands."""
+        spec = self.get(symbol)
+        if spec is None:
+            raise ValueError("Invalid operation.")
+        if len(operands) != spec.arity:
+            raise ValueError(f"Operator {symbol!r} takes {spec.arity} operand(s).")
+        return self.functions[symbol](*operands)
+
+    def symbols(self) -> List[str]:
+        """Returns every registered symbol, followed by the symbols of plugins that are not loaded yet."""
+        return list(self.specs) + [s for s in self._discover() if s not in self.specs]
+
+    def __contains__(self, symbol: str) -> bool:
+        return self.get(symbol) is not None
+
+    #----------------------------------------------------------------
+    # Layers
+    #----------------------------------------------------------------
+
+    def add_layer(self, layer: Layer) -> None:
+        """Adds a layer around every operator function (the last one added is the outermost)."""
+        self._layers.append(layer)
+        self._rebuild()
+
+    def remove_layer(self, layer: Layer) -> None:
+        """Removes a layer added with add_layer()."""
+        self._layers.remove(layer)
+        self._rebuild()
+
+    def _apply_layers(self, spec: OperatorSpec) -> Callable[..., float]:
+        func = spec.func if spec.func in _BASIC_FUNCTIONS else _reporting_errors(spec)
+        for layer in self._layers:
+            func = layer(spec, func)
+        return func
+
+    def _rebuild(self) -> None:
+        for symbol, spec in self.specs.items():
+            self.functions[symbol] = self._apply_layers(spec)
+
+    #----------------------------------------------------------------
+    # Plugins
+    #----------------------------------------------------------------
+
+    def _discover(self) -> Dict[str, 'EntryPoint']:
+        """Reads the plugin entry points once (without importing them) and returns them by symbol."""
+        if self._plugins is None:
+            self._plugins = {}
+            if self.entry_point_group:
+                from importlib.metadata import entry_points  # pylint: disable=import-outside-toplevel
+                for entry_point in entry_points(group=self.entry_point_group):
+                    self._plugins.setdefault(entry_point.name, entry_point)
+        return self._plugins
+
+    def _load_plugin(self, symbol: str) -> bool:
+        """Imports and registers the plugin for symbol. Returns False if no plugin provides it."""
+        entry_point = self._discover().pop(symbol, None)
+        if entry_point is None:
+            return False
+        loaded = entry_point.load()
+        if isinstance(loaded, OperatorSpec):
+            self.add(loaded._replace(symbol=symbol))
+        else:
+            self.register(symbol, loaded)
+        return True
+
+
+def default_registry() -> OperatorRegistry:
+    """Returns a new registry holding the four basic operators of the Operation class."""
+    new = OperatorRegistry()
+    new.register('+', Operation.add, name='add', description='addition')
+    new.register('-', Operation.subtract, name='subtract', description='subtraction')
+    new.register('*', Operation.multiply, name='multiply', description='multiplication')
+    new.register('/', Operation.divide, name='divide', description='division')
+    return new
+
+
+# The registry used by the calculator, batch mode, the parallel runner, the server and expressions.
+registry = default_registry()
@@ -0,0 +1,114 @@
+"""
+File for the 'app/server' module.
+An asyncio calculator server, so the calculator can be used without starting a new Python process per request.
+
+The protocol is one line per request and one line per response, using the same format as batch mode:
+    request:  'op a b\n'           e.g. '/ 1 4\n'
+    response: 'result\n'           e.g. '0.25\n'
+          or  'error: message\n'   e.g. 'error: Cannot divide by zero.\n'
+
+Connections are persistent and requests can be pipelined: a client may send many lines without waiting,
+and the responses come back in the same order. The server waits for the client to read its responses
+(writer.drain()) before reading more requests, so a client that does not read cannot make the server
+buffer unlimited output (backpressure).
+
+Addresses are written as 'host:port' for TCP or 'unix:/path/to/socket' for a Unix socket.
+A running server also works as a warm worker for short-lived scripts: see app.connect and 'main.py --connect'.
+
+"""
+
+import asyncio
+from typing import Optional, Set
+
+from app.batch import evaluate_record
+from app.connect import parse_address
+
+# Seconds that stop() lets open connections finish the requests they already sent.
+SHUTDOWN_GRACE_PERIOD = 5.0
+
+# Longest request line accepted, in bytes.
+MAX_LINE_LENGTH = 64 * 1024
+
+
+class CalculatorServer:
+    """
+    Serves calculator requests over TCP or a Unix socket.
+    Use 'await start()' to begin listening and 'await stop()' for a graceful shutdown.
+    """
+
+    def __init__(self, address: str = '127.0.0.1:0'):
+        self.address = address
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers: Set[asyncio.Task] = set()
+        self._idle: Set[asyncio.StreamWriter] = set()
+        self._closing = False
+
+    async def start(self) -> None:
+        """Starts listening. With port 0, the chosen port is written back into self.address."""
+        where = parse_address(self.address)
+        if isinstance(where, str):
+            self._server = await asyncio.start_unix_server(self._handle, path=where, limit=MAX_LINE_LENGTH)
+        else:
+            self._server = await asyncio.start_server(self._handle, *where, limit=MAX_LINE_LENGTH)
+            host, port = self._server.sockets[0].getsockname()[:2]
+            self.address = f"{host}:{port}"
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answers every request line of one connection, in order, until the client disconnects."""
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            while True:
+                # While waiting for a request the connection is idle and stop() may close it right away.
+                self._idle.add(writer)
+                try:
+                    line = await reader.readline()
+                except ValueError:  # request line longer than MAX_LINE_LENGTH
+                    break
+                finally:
+                    self._idle.discard(writer)
+                if not line or self._closing:
+                    break
+                writer.write(evaluate_record(line.decode('utf-8', 'replace').split()).encode() + b"\n")
+                # Only waits when the client is not reading its responses fast enough.
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._handlers.discard(task)
+            writer.close()
+
+    async def stop(self, grace_period: float = SHUTDOWN_GRACE_PERIOD) -> None:
+        """
+        Stops accepting new connections and closes the idle ones. Connections in the middle of
+        a request get grace_period seconds to send their response before they are cancelled.
+        """
+        if self._server is None:
+            return
+        self._closing = True
+        self._server.close()
+        for writer in list(self._idle):
+            writer.close()
+
+        if self._handlers:
+            _, pending = await asyncio.wait(set(self._handlers), timeout=grace_period)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait(pending)
+        await self._server.wait_closed()
+        self._server = None
+
+
+async def serve(address: str, stop: Optional[asyncio.Event] = None) -> None:
+    """
+    Runs a calculator server on address until stop is set (or the task is cancelled, e.g. by Ctrl+C),
+    then shuts it down gracefully.
+    """
+    server = CalculatorServer(address)
+    await server.start()
+    print(f"Calculator server listening on {server.address}", flush=True)
+    try:
+        await (stop or asyncio.Event()).wait()
+    finally:
+        await server.stop()
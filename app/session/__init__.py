@@ -0,0 +1,434 @@
+"""
+File for the 'app/session' module.
+The state of a calculator session as an object, and a manager that hosts many sessions in one process.
+
+Session holds everything one user changes while using the calculator: the history, the variables,
+the numeric backend (with its precision) and an optional journal. The REPL (app.calculator) keeps its state
+in a Session, and Session.handle() runs one request line and returns the response text, for callers
+that serve many users instead of one terminal. Requests use the REPL commands:
+    '+ 4 5' (or '+ _ 1' with the last result), '= x = (1 + 2) * 3', 'history', '!3', 'backend decimal 40'
+and errors come back as 'error: ...' lines, like in batch mode. A decimal precision above MAX_PRECISION digits
+is refused, so one session cannot make a single request run for minutes or use up the memory of the process.
+
+SessionManager keeps thousands of lightweight sessions by id:
+- idle eviction: a session not used for idle_timeout seconds is evicted (sessions are kept in order of
+  last use, so finding them is cheap). With a spill_dir, evicted sessions are saved to disk and
+  restored on their next request; without one they are dropped.
+- quotas per session: at most `rate` requests per second (with bursts of `burst`) and at most `cpu_share`
+  of a CPU core (with bursts of `cpu_burst` CPU seconds), both as token buckets. A request over quota is
+  answered with an 'error: ...' line and is not run.
+- snapshot()/restore(): all the sessions are written to one JSON file and read back.
+
+A SessionManager is not thread-safe: use it from one thread or one asyncio event loop, like the server.
+
+"""
+
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.backends import Backend, current_backend, get_backend
+from app.history import Entry, History, Journal
+from app.registry import registry
+
+# Matches an assignment such as 'x = 4 / 2' and captures the variable name and the expression.
+ASSIGNMENT = re.compile(r"^\s*([A-Za-z_]\w*)\s*=(.*)$")
+
+# Session ids are also file names in the spill directory, so only these characters are allowed.
+SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Defaults of a SessionManager.
+DEFAULT_IDLE_TIMEOUT = 600.0   # seconds
+DEFAULT_RATE = 20.0            # requests per second
+DEFAULT_BURST = 40             # requests
+DEFAULT_CPU_SHARE = 0.25       # of one core
+DEFAULT_CPU_BURST = 1.0        # CPU seconds
+DEFAULT_SESSION_HISTORY = 100  # entries kept per session
+
+# Largest decimal precision (significant digits) a session may ask for.
+MAX_PRECISION = 10_000
+
+# Decimal backends by precision, shared by all the sessions that use the same precision.
+_decimal_backends: Dict[int, Backend] = {}
+
+
+def parse_assignment(text: str) -> Tuple[Optional[str], str]:
+    """Splits 'x = 4 / 2' into ('x', '4 / 2'); text that is not an assignment gives (None, text)."""
+    match = ASSIGNMENT.match(text)
+    if match:
+        return match.group(1), match.group(2).strip()
+    return None, text.strip()
+
+
+def backend_for(name: str, precision: Optional[int] = None) -> Backend:
+    """Returns the backend called name; with a precision, a decimal backend with that many significant digits."""
+    if precision is None:
+        return get_backend(name)
+    if name != 'decimal':
+        raise ValueError("Only the decimal backend has a precision.")
+    if not 1 <= precision <= MAX_PRECISION:
+        raise ValueError(f"The precision must be between 1 and {MAX_PRECISION:,}.")
+    backend = _decimal_backends.get(precision)
+    if backend is None:
+        from app.backends.exact import DecimalBackend  # pylint: disable=import-outside-toplevel
+        backend = _decimal_backends[precision] = DecimalBackend(precision=precision)
+    return backend
+
+
+class Session:
+    """
+    The state of one calculator session.
+    history - the calculations (a new History by default)
+    variables - the variables assigned with '= x = ...' and '_', the last result
+    backend - the numeric backend (the current session backend by default)
+    journal - if given, every calculation is also appended to it
+    """
+
+    __slots__ = ('history', 'variables', 'backend', 'journal')
+
+    def __init__(self, history: Optional[History] = None, variables: Optional[dict] = None,
+                 backend: Optional[Backend] = None, journal: Optional[Journal] = None):
+        self.history = History() if history is None else history
+        self.variables = {} if variables is None else variables
+        self.backend = current_backend() if backend is None else backend
+        self.journal = journal
+
+    def record(self, op: str, a, b, result) -> None:
+        """Adds a calculation to the history (and the journal) and makes its result '_'. None means it failed."""
+        if result is None:
+            return
+        entry = Entry(op, a, b, result)
+        self.history.append(entry)
+        self.variables['_'] = result
+        if self.journal is not None:
+            self.journal.append(entry, self.backend.name)
+
+    def set_backend(self, name: str, precision: Optional[int] = None) -> Backend:
+        """Switches to the backend called name (with a precision for decimal) and returns it."""
+        self.backend = backend_for(name, precision)
+        return self.backend
+
+    #----------------------------------------------------------------
+    # Requests
+    #----------------------------------------------------------------
+
+    def handle(self, line: str) -> str:
+        """Runs one request line and returns the response text ('history' gives one line per entry)."""
+        text = line.strip()
+        try:
+            if text.startswith('='):
+                return self._expression(' '.join(text[1:].split()))
+            if text == 'history':
+                return '\n'.join(f"{number}: {entry}" for number, entry in self.history) or "The history is empty."
+            if text.startswith('!'):
+                return self._rerun(text[1:])
+            fields = text.split()
+            if fields[:1] == ['backend']:
+                return self._backend(fields[1:])
+            return self._operation(fields)
+        except (ValueError, ArithmeticError) as e:  # ArithmeticError: e.g. a registered operator that overflows
+            return f"error: {e}"
+
+    def _operation(self, fields: List[str]) -> str:
+        """'op a b' or 'op a': converts the operands ('_' is the last result) and runs the operator."""
+        spec = registry.get(fields[0]) if fields else None
+        if spec is None:
+            raise ValueError("Invalid operation.")
+        if len(fields) != spec.arity + 1:
+            raise ValueError(f"Expected a request in the form '{'op a b' if spec.arity == 2 else 'op a'}'.")
+        last = self.history.last
+        return self._run(fields[0], [last.result if field == '_' and last is not None else field
+                                     for field in fields[1:]])
+
+    def _run(self, op: str, operands: list) -> str:
+        """Converts the operands with the backend, runs the operator and records the calculation."""
+        try:
+            operands = [self.backend.convert(operand) for operand in operands]
+        except ValueError:
+            raise ValueError("Invalid input. Please enter numeric values for the numbers.") from None
+        result = self.backend.run(registry.functions[op], *operands)
+        self.record(op, operands[0], operands[1] if len(operands) == 2 else None, result)
+        return str(result)
+
+    def _expression(self, text: str) -> str:
+        """'= expression' or '= x = expression'."""
+        from app.expressions import evaluate  # pylint: disable=import-outside-toplevel
+        name, expression = parse_assignment(text)
+        result = evaluate(expression, self.variables, self.backend)
+        if name:
+            self.variables[name] = result
+        self.record('=', text, None, result)
+        return f"{name} = {result}" if name else str(result)
+
+    def _rerun(self, number: str) -> str:
+        """'!3': runs entry 3 of the history again with the current backend and variables."""
+        if not number.isdigit():
+            raise ValueError("Use '!<number>' to run an entry of the history again, e.g. '!3'.")
+        entry = self.history.get(int(number))
+        if entry.op == '=':
+            return self._expression(entry.a)
+        if entry.op not in registry:  # the operator was unregistered since
+            raise ValueError("Invalid operation.")
+        return self._run(entry.op, list(entry.operands))
+
+    def _backend(self, args: List[str]) -> str:
+        """'backend', 'backend <name>' or 'backend decimal <precision>'."""
+        if len(args) > 2 or (len(args) == 2 and not args[1].isdigit()):
+            raise ValueError("Use 'backend <name>' or 'backend decimal <precision>'.")
+        if args:
+            self.set_backend(args[0], int(args[1]) if len(args) == 2 else None)
+        return f"Using the {self.backend.name} backend."
+
+    #----------------------------------------------------------------
+    # Snapshots
+    #----------------------------------------------------------------
+
+    def to_dict(self) -> dict:
+        """Returns the session as plain data for a JSON snapshot (the journal is not part of it)."""
+        shared = get_backend(self.backend.name) is self.backend
+        precision = None if shared else self.backend.context.prec
+        return {
+            "backend": self.backend.name,
+            "precision": precision,
+            "variables": {name: encode_value(value) for name, value in self.variables.items()},
+            "capacity": self.history.capacity,
+            "count": self.history.count,
+            "history": [[entry.op, encode_value(entry.a), encode_value(entry.b), encode_value(entry.result)]
+                        for _, entry in self.history],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Session':
+        """Rebuilds a session from to_dict() data."""
+        history = History(data["capacity"])
+        history.restore([Entry(op, decode_value(a), decode_value(b), decode_value(result)) for op, a, b, result in data["history"]],
+                        data["count"])
+        variables = {name: decode_value(value) for name, value in data["variables"].items()}
+        return cls(history, variables, backend_for(data["backend"], data["precision"]))
+
+
+# Snapshot values keep their number type: 'f:' float, 'd:' Decimal, 'q:' Fraction, 'i:' int, 's:' text.
+# The types are told apart by name, so the REPL does not import decimal and fractions to save a float session.
+_TAGS = {'float': 'f', 'Decimal': 'd', 'Fraction': 'q', 'Interval': 'v', 'int': 'i', 'str': 's'}
+
+
+def encode_value(value) -> Optional[str]:
+    """Returns the snapshot text of a value (None stays None)."""
+    if value is None:
+        return None
+    tag = _TAGS.get(type(value).__name__)
+    if tag is None:
+        raise ValueError(f"Cannot save a value of type {type(value).__name__}.")
+    return f"{tag}:{value!r}" if tag == 'f' else f"{tag}:{value}"
+
+
+def decode_value(text: Optional[str]):
+    """Returns the value of a snapshot text made by encode_value()."""
+    if text is None:
+        return None
+    tag, _, value = text.partition(':')
+    if tag == 'd':
+        from decimal import Decimal  # pylint: disable=import-outside-toplevel
+        return Decimal(value)
+    if tag == 'q':
+        from fractions import Fraction  # pylint: disable=import-outside-toplevel
+        return Fraction(value)
+    if tag == 'v':
+        from app.backends.interval import Interval  # pylint: disable=import-outside-toplevel
+        return Interval.parse(value)
+    return {'f': float, 'i': int, 's': str}[tag](value)
+
+
+class _TokenBucket:
+    """A budget that refills at rate per second up to capacity. Used for the request rate and the CPU time."""
+
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, capacity: float, now: float):
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, rate: float, capacity: float, now: float) -> float:
+        """Adds the tokens earned since the last refill and returns the tokens available."""
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        return self.tokens
+
+
+class _Tenant:
+    """A hosted session with its quota buckets and the time it was last used."""
+
+    __slots__ = ('session', 'last_used', 'requests', 'cpu')
+
+    def __init__(self, session: Session, now: float, burst: float, cpu_burst: float):
+        self.session = session
+        self.last_used = now
+        self.requests = _TokenBucket(burst, now)
+        self.cpu = _TokenBucket(cpu_burst, now)
+
+
+class SessionManager:
+    """
+    Hosts many sessions by id, with idle eviction, request and CPU quotas, and snapshots.
+    rate, burst - requests per second per session, and how many may come at once (None: no limit)
+    cpu_share, cpu_burst - fraction of a CPU core per session, and CPU seconds that may be used at once (None: no limit)
+    idle_timeout - seconds without a request before a session is evicted
+    spill_dir - if given, evicted sessions are saved there and restored on their next request
+    history_capacity - entries kept in the history of every new session
+    clock, cpu_clock - time sources (time.monotonic and time.thread_time), replaceable in tests
+    """
+
+    def __init__(self, rate: Optional[float] = DEFAULT_RATE, burst: float = DEFAULT_BURST,
+                 cpu_share: Optional[float] = DEFAULT_CPU_SHARE, cpu_burst: float = DEFAULT_CPU_BURST,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT, spill_dir: Optional[str] = None,
+                 history_capacity: int = DEFAULT_SESSION_HISTORY, backend: Optional[Backend] = None,
+                 clock: Callable[[], float] = time.monotonic, cpu_clock: Callable[[], float] = time.thread_time):
+        self.rate, self.burst = rate, burst
+        self.cpu_share, self.cpu_burst = cpu_share, cpu_burst
+        self.idle_timeout = idle_timeout
+        self.spill_dir = spill_dir
+        self.history_capacity = history_capacity
+        self.backend = get_backend(backend)
+        self.clock, self.cpu_clock = clock, cpu_clock
+        self._tenants: 'OrderedDict[str, _Tenant]' = OrderedDict()  # least recently used first
+        self.rejected = 0  # requests refused because of a quota
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._tenants)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._tenants
+
+    def open(self, session_id: Optional[str] = None) -> str:
+        """Creates a session (with a random id by default) and returns its id."""
+        session_id = os.urandom(8).hex() if session_id is None else session_id
+        if not SESSION_ID.match(session_id):
+            raise ValueError(f"Invalid session id: {session_id!r}.")
+        if session_id in self._tenants or self._spill_path(session_id, exists=True):
+            raise ValueError(f"The session {session_id} already exists.")
+        self._add(session_id, Session(History(self.history_capacity), {}, self.backend))
+        return session_id
+
+    def get(self, session_id: str) -> Session:
+        """Returns the session with the given id, restoring it from the spill directory if it was evicted."""
+        return self._tenant(session_id, self.clock()).session
+
+    def close(self, session_id: str) -> None:
+        """Removes a session (and its spilled copy)."""
+        path = self._spill_path(session_id, exists=True)
+        if self._tenants.pop(session_id, None) is None and path is None:
+            raise ValueError(f"There is no session {session_id}.")
+        if path is not None:
+            os.remove(path)
+
+    def handle(self, session_id: str, line: str) -> str:
+        """
+        Runs one request line in a session and returns the response text.
+        A request over one of the session's quotas is not run, and gets an 'error: ...' response.
+        """
+        now = self.clock()
+        try:
+            tenant = self._tenant(session_id, now)
+        except ValueError as e:
+            return f"error: {e}"
+        if self.rate is not None:
+            if tenant.requests.refill(self.rate, self.burst, now) < 1:
+                self.rejected += 1
+                return "error: Too many requests. Please slow down."
+            tenant.requests.tokens -= 1
+        if self.cpu_share is not None and tenant.cpu.refill(self.cpu_share, self.cpu_burst, now) <= 0:
+            self.rejected += 1
+            return "error: CPU quota exceeded. Please try again later."
+
+        started = self.cpu_clock()
+        response = tenant.session.handle(line)
+        if self.cpu_share is not None:
+            tenant.cpu.tokens -= self.cpu_clock() - started
+        self.evict_idle(now)
+        return response
+
+    #----------------------------------------------------------------
+    # Eviction and spilling
+    #----------------------------------------------------------------
+
+    def evict_idle(self, now: Optional[float] = None) -> List[str]:
+        """Evicts the sessions idle for longer than idle_timeout (spilling them if there is a spill_dir)."""
+        now = self.clock() if now is None else now
+        evicted = []
+        while self._tenants:
+            session_id, tenant = next(iter(self._tenants.items()))
+            if now - tenant.last_used <= self.idle_timeout:
+                break
+            del self._tenants[session_id]
+            if self.spill_dir is not None:
+                _write_json(os.path.join(self.spill_dir, f"{session_id}.json"), tenant.session.to_dict())
+            evicted.append(session_id)
+        self.evicted += len(evicted)
+        return evicted
+
+    def _spill_path(self, session_id: str, exists: bool = False) -> Optional[str]:
+        if self.spill_dir is None or not SESSION_ID.match(session_id):
+            return None
+        path = os.path.join(self.spill_dir, f"{session_id}.json")
+        return path if not exists or os.path.exists(path) else None
+
+    def _tenant(self, session_id: str, now: float) -> _Tenant:
+        """Returns the tenant of a session and marks it as used now."""
+        tenant = self._tenants.get(session_id)
+        if tenant is None:
+            path = self._spill_path(session_id, exists=True)
+            if path is None:
+                raise ValueError(f"There is no session {session_id}.")
+            session = Session.from_dict(_read_json(path))
+            os.remove(path)
+            tenant = self._add(session_id, session)
+        tenant.last_used = now
+        self._tenants.move_to_end(session_id)
+        return tenant
+
+    def _add(self, session_id: str, session: Session) -> _Tenant:
+        tenant = self._tenants[session_id] = _Tenant(session, self.clock(), self.burst, self.cpu_burst)
+        self._tenants.move_to_end(session_id)
+        return tenant
+
+    #----------------------------------------------------------------
+    # Snapshots
+    #----------------------------------------------------------------
+
+    def snapshot(self, path: str) -> int:
+        """Writes every session in memory to one JSON file (atomically) and returns how many were written."""
+        _write_json(path, {"sessions": {session_id: tenant.session.to_dict()
+                                        for session_id, tenant in self._tenants.items()}})
+        return len(self._tenants)
+
+    def restore(self, path: str) -> int:
+        """Adds the sessions of a snapshot file (replacing sessions with the same id) and returns how many."""
+        sessions = _read_json(path)["sessions"]
+        for session_id, data in sessions.items():
+            self._add(session_id, Session.from_dict(data))
+        return len(sessions)
+
+
+def _read_json(path: str):
+    """Returns the data of a JSON file."""
+    import json  # pylint: disable=import-outside-toplevel
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_json(path: str, data) -> None:
+    """Writes data as JSON to a temporary file next to path, then renames it, so path is never half written."""
+    import json  # pylint: disable=import-outside-toplevel
+    import tempfile  # pylint: disable=import-outside-toplevel
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
@@ -0,0 +1,223 @@
+"""
+File for the 'app/sheet' module.
+A spreadsheet-like engine of named cells, for chains of calculations where each result feeds the next.
+
+A cell holds either a number or a formula: an expression (see app.expressions) whose variables are
+other cells, written with a leading '=' like in a spreadsheet:
+    sheet = Sheet()
+    sheet.update({'price': 20, 'qty': 3, 'total': '= price * qty', 'with_tax': '= total * 1.08'})
+    sheet['with_tax']   # 64.8
+
+The sheet keeps a dependency graph (which cells every formula reads, and which formulas read every cell).
+When cells change, only the cells downstream of them are computed again, in topological order
+(every cell after the cells it reads), so a small edit in a huge sheet stays cheap.
+A change that would make a cell depend on itself raises a CycleError and leaves the sheet unchanged.
+
+Errors are handled per cell, the way batch mode handles them per record: a formula that fails
+(division by zero, a reference to a cell that does not exist) stores its ValueError as its value,
+reading that cell raises it, and every formula that reads it gets the same error.
+
+"""
+
+import re
+from decimal import Decimal
+from fractions import Fraction
+from typing import Dict, Iterator, List, Mapping, Optional, Set, Union
+
+from app.backends import Backend, get_backend
+from app.expressions import CompiledExpression, compile_expression
+
+# A cell name is written like a variable in an expression.
+_NAME_PATTERN = re.compile(r'[A-Za-z_]\w*\Z')
+
+# The number types a cell can hold as they are (other content must be text).
+_NUMBER_TYPES = (int, float, Decimal, Fraction)
+
+Content = Union[int, float, Decimal, Fraction, str]
+Value = Union[float, ValueError]
+
+
+class CycleError(ValueError):
+    """Raised when a change would make a cell depend on itself."""
+
+
+class Sheet:
+    """A set of named cells holding numbers or formulas, recomputed incrementally when they change."""
+
+    def __init__(self, backend: Union[str, Backend, None] = None):
+        self.backend = get_backend(backend)
+        self._values: Dict[str, Value] = {}
+        self._formulas: Dict[str, CompiledExpression] = {}
+        self._dependents: Dict[str, Set[str]] = {}  # cell -> formulas that read it
+
+    #----------------------------------------------------------------
+    # Reading cells
+    #----------------------------------------------------------------
+
+    def __getitem__(self, name: str) -> float:
+        """Returns the value of a cell. Raises its error if the formula failed, or KeyError for an unknown cell."""
+        value = self._values[name]
+        if isinstance(value, ValueError):
+            raise value
+        return value
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._values
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def formula(self, name: str) -> Optional[str]:
+        """Returns the formula of a cell (with its leading '='), or None if the cell holds a number."""
+        compiled = self._formulas.get(name)
+        return None if compiled is None else '= ' + compiled.source
+
+    def dependents(self, name: str) -> Set[str]:
+        """Returns the names of the formulas that read the cell directly."""
+        return set(self._dependents.get(name, ()))
+
+    #----------------------------------------------------------------
+    # Changing cells
+    #----------------------------------------------------------------
+
+    def __setitem__(self, name: str, content: Content) -> None:
+        self.update({name: content})
+
+    def __delitem__(self, name: str) -> None:
+        self.delete(name)
+
+    def update(self, cells: Mapping[str, Content]) -> List[str]:
+        """
+        Sets many cells at once and recomputes everything downstream of them only once.
+        A content is a number, a string with a number, or a formula starting with '='.
+        Returns the names of the formulas that were computed, in the order they were computed.
+
+        Nothing is changed if a name or a formula is invalid (ValueError / ExpressionError)
+        or if the change would create a cycle (CycleError).
+        """
+        parsed = {name: self._parse(name, content) for name, content in cells.items()}
+        previous = {name: (self._formulas.get(name, self._values[name]), self._values[name])
+                    for name in parsed if name in self._values}
+        for name, content in parsed.items():
+            self._define(name, content)
+        try:
+            order = self._order(parsed)
+        except CycleError:
+            # Put the old cells back; nothing downstream was computed yet, so their values are still right.
+            for name in parsed:
+                self._undefine(name)
+            for name, (content, value) in previous.items():
+                self._define(name, content)
+                self._values[name] = value
+            raise
+        return self._recompute(order)
+
+    def delete(self, name: str) -> List[str]:
+        """
+        Removes a cell. Formulas that read it get an 'Unknown variable' error until it is set again.
+        Returns the names of the formulas that were computed.
+        """
+        if name not in self._values:
+            raise KeyError(name)
+        downstream = set(self._dependents.get(name, ()))
+        self._undefine(name)
+        return self._recompute(self._order(downstream))
+
+    def _parse(self, name: str, content: Content) -> Union[float, CompiledExpression]:
+        """
+        Checks the cell name and turns the content into a number or a compiled formula.
+        Raises a ValueError for content that is neither text nor an int, float, Decimal or Fraction (bool included).
+        """
+        if not isinstance(name, str) or not _NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid cell name: {name!r}")
+        if isinstance(content, str):
+            text = content.strip()
+            if text.startswith('='):
+                return compile_expression(text[1:].strip(), self.backend)
+            return self.backend.convert(text)
+        if not isinstance(content, _NUMBER_TYPES) or isinstance(content, bool):
+            raise ValueError(f"Invalid content for cell {name!r}: {content!r}. Use a number or text.")
+        return content
+
+    def _define(self, name: str, content: Union[float, CompiledExpression]) -> None:
+        """Stores the content of a cell and links a formula into the dependency graph (not computed yet)."""
+        self._undefine(name)
+        if isinstance(content, CompiledExpression):
+            self._formulas[name] = content
+            for precedent in content.variables:
+                self._dependents.setdefault(precedent, set()).add(name)
+            self._values[name] = ValueError("Not computed yet.")
+        else:
+            self._values[name] = content
+
+    def _undefine(self, name: str) -> None:
+        """Removes the content of a cell and unlinks its formula, but keeps the cells that read it linked."""
+        compiled = self._formulas.pop(name, None)
+        if compiled is not None:
+            for precedent in compiled.variables:
+                readers = self._dependents[precedent]
+                readers.discard(name)
+                if not readers:
+                    del self._dependents[precedent]
+        self._values.pop(name, None)
+
+    #----------------------------------------------------------------
+    # Recomputing
+    #----------------------------------------------------------------
+
+    def _order(self, changed) -> List[str]:
+        """
+        Returns the changed cells and every cell downstream of them in topological order (Kahn's algorithm).
+        Only this part of the graph is visited. Raises a CycleError if it contains a cycle.
+        """
+        dependents = self._dependents
+        affected: Set[str] = set()
+        stack = list(changed)
+        while stack:
+            name = stack.pop()
+            if name not in affected:
+                affected.add(name)
+                stack.extend(dependents.get(name, ()))
+
+        waiting = dict.fromkeys(affected, 0)  # number of affected cells each cell still waits for
+        for name in affected:
+            for reader in dependents.get(name, ()):
+                waiting[reader] += 1
+        ready = [name for name, count in waiting.items() if count == 0]
+        order = []
+        while ready:
+            name = ready.pop()
+            order.append(name)
+            for reader in dependents.get(name, ()):
+                waiting[reader] -= 1
+                if waiting[reader] == 0:
+                    ready.append(reader)
+
+        if len(order) != len(affected):
+            # A new cycle always goes through a changed cell, since the graph had no cycle before the change.
+            cells = sorted(name for name in changed if waiting[name])
+            raise CycleError(f"Circular reference through cell(s): {', '.join(cells)}")
+        return order
+
+    def _recompute(self, order: List[str]) -> List[str]:
+        """Computes the formulas among the cells in order and returns their names."""
+        values = self._values
+        formulas = self._formulas
+        computed = []
+        for name in order:
+            compiled = formulas.get(name)
+            if compiled is None:  # a number, or a deleted cell
+                continue
+            computed.append(name)
+            error = next((values[p] for p in compiled.variables if isinstance(values.get(p), ValueError)), None)
+            if error is not None:
+                values[name] = error
+                continue
+            try:
+                values[name] = compiled(values)
+            except ValueError as e:  # division by zero, unknown cell
+                values[name] = e
+        return computed
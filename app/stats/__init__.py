@@ -0,0 +1,370 @@
+"""
+File for the 'app/stats' module.
+Single-pass streaming statistics over a stream of operation results, in bounded memory.
+
+StreamStats sees every value once and never keeps the values themselves. It tracks:
+- count, min and max
+- the sum, kept exactly (every float is an integer multiple of 2**-1127, so the sum is kept as one Python int)
+  and rounded once when it is read, like math.fsum
+- mean and variance with Welford's algorithm (numerically stable, no sum of squares)
+- quantiles with a KLL sketch (QuantileSketch): a few hundred values in a stack of compactors,
+  with a rank error of about 1% for the default k=200, no matter how many values were added
+
+Aggregates of separate shards (e.g. the chunks of a parallel job) can be merged:
+count, sum, min and max merge exactly (the merged result is identical to one pass over all the values),
+mean and variance merge with Chan's formula for Welford aggregates, and merged sketches keep the same error bound.
+
+Attach it to any stream of results with tap(), which passes the results through unchanged:
+    stats = StreamStats()
+    for result in stats.tap(run_job(rows)):    # ValueErrors and 'error: ...' lines are counted as errors
+        ...
+    stats.summary()
+
+With NumPy arrays, update() works on whole chunks at a time instead of value by value.
+
+"""
+
+import math
+import random
+import sys
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+# Default size parameter of the quantile sketch (the largest compactor holds k values).
+DEFAULT_K = 200
+
+# Every finite float is an integer multiple of 2**-SUM_SCALE (the smallest subnormal is 2**-1074,
+# and NumPy chunks split the 53-bit mantissas off, which needs 53 more bits).
+SUM_SCALE = 1127
+
+# Number of values of a NumPy array handled at once. Keeps the per-exponent bucket sums exact (below 2**53).
+ARRAY_CHUNK = 1 << 16
+
+# The quantiles reported by summary().
+SUMMARY_QUANTILES = (0.5, 0.9, 0.99)
+
+
+class ExactSum:
+    """The exact sum of floats, rounded once (correctly) when it is read. Merging two sums is exact."""
+
+    __slots__ = ('_total', '_nan', '_pos_inf', '_neg_inf')
+
+    def __init__(self):
+        self._total = 0  # the sum of the finite values, in units of 2**-SUM_SCALE
+        self._nan = self._pos_inf = self._neg_inf = False
+
+    def add(self, x: float) -> None:
+        """Adds one value."""
+        if x - x == 0.0:  # finite
+            numerator, denominator = x.as_integer_ratio()
+            self._total += numerator << (SUM_SCALE - denominator.bit_length() + 1)
+        elif x != x:
+            self._nan = True
+        elif x > 0:
+            self._pos_inf = True
+        else:
+            self._neg_inf = True
+
+    def add_array(self, values) -> None:
+        """
+        Adds every finite value of a float64 NumPy array (at most ARRAY_CHUNK values).
+        Each value is split into its exponent and its 53-bit mantissa (in two halves of 26 and 27 bits);
+        the halves are summed per exponent with np.bincount, which is exact because every partial sum stays
+        below 2**53, and only the per-exponent totals are added to the Python int.
+        """
+        np = sys.modules['numpy']
+        mantissa, exponent = np.frexp(values)
+        scaled = (mantissa * 2.0 ** 53).astype(np.int64)  # exact: mantissa has at most 53 bits
+        buckets = exponent + (SUM_SCALE - 53)  # value = scaled * 2**(bucket - SUM_SCALE), bucket >= 0
+        high = np.bincount(buckets, weights=(scaled >> 26).astype(np.float64))
+        low = np.bincount(buckets, weights=(scaled & ((1 << 26) - 1)).astype(np.float64))
+        total = 0
+        for bucket in np.flatnonzero((high != 0) | (low != 0)).tolist():
+            total += ((int(high[bucket]) << 26) + int(low[bucket])) << bucket
+        self._total += total
+
+    def merge(self, other: 'ExactSum') -> None:
+        """Adds the values of another sum."""
+        self._total += other._total
+        self._nan |= other._nan
+        self._pos_inf |= other._pos_inf
+        self._neg_inf |= other._neg_inf
+
+    def value(self) -> float:
+        """Returns the sum rounded to the nearest float (inf, -inf or nan like math.fsum for non-finite values)."""
+        if self._nan or (self._pos_inf and self._neg_inf):
+            return math.nan
+        if self._pos_inf or self._neg_inf:
+            return math.inf if self._pos_inf else -math.inf
+        try:
+            return self._total / (1 << SUM_SCALE)  # int / int is correctly rounded
+        except OverflowError:
+            return math.inf if self._total > 0 else -math.inf
+
+    def divide(self, count: int) -> float:
+        """Returns the sum divided by count, rounded once (used for the mean)."""
+        if self._nan or self._pos_inf or self._neg_inf:
+            return self.value() / count
+        return self._total / (count << SUM_SCALE)
+
+
+class QuantileSketch:
+    """
+    A KLL quantile sketch (Karnin, Lang and Liberty): a stack of compactors of decreasing capacity.
+    A value in compactor h stands for 2**h values. When the sketch is full, the lowest full compactor is sorted
+    and every other value (starting at a random offset) moves up one level, so memory stays at about 3*k values.
+    """
+
+    def __init__(self, k: int = DEFAULT_K, seed: Optional[int] = 0):
+        if k < 8:
+            raise ValueError("k must be at least 8.")
+        self.k = k
+        self.count = 0  # number of values added (the total weight)
+        self._levels: List[List[float]] = [[]]
+        self._rng = random.Random(seed)
+        self._size = 0
+        self._max_size = self._capacity(0)
+
+    def _capacity(self, level: int) -> int:
+        """Capacity of a compactor: k at the top, shrinking by 2/3 per level below it."""
+        depth = len(self._levels) - level - 1
+        return max(2, int(self.k * (2 / 3) ** depth))
+
+    def _grow(self) -> None:
+        self._levels.append([])
+        self._max_size = sum(self._capacity(level) for level in range(len(self._levels)))
+
+    def _compress(self) -> None:
+        """Compacts the lowest compactor that is over its capacity."""
+        # The sketch is full, so at least one compactor is at or over its capacity.
+        level = next(level for level, items in enumerate(self._levels) if len(items) >= self._capacity(level))
+        if level + 1 == len(self._levels):
+            self._grow()
+        items = self._levels[level]
+        items.sort()
+        leftover = [items.pop()] if len(items) % 2 else []
+        self._levels[level + 1].extend(items[self._rng.random() < 0.5::2])
+        self._levels[level] = leftover
+        self._size = sum(map(len, self._levels))
+
+    def add(self, x: float) -> None:
+        """Adds one value (NaN must be filtered out by the caller)."""
+        self._levels[0].append(x)
+        self.count += 1
+        self._size += 1
+        if self._size >= self._max_size:
+            self._compress()
+
+    def extend(self, values: Sequence[float]) -> None:
+        """Adds many values at once."""
+        self._levels[0].extend(values)
+        self.count += len(values)
+        self._size += len(values)
+        while self._size >= self._max_size:
+            self._compress()
+
+    def extend_array(self, values) -> None:
+        """
+        Adds a float64 NumPy array without NaN values. The array is sorted with NumPy and compacted
+        (every other value moves up one level) until it fits in a compactor, like add() would do one value at a time.
+        """
+        np = sys.modules['numpy']
+        self.count += len(values)
+        values = np.sort(values)
+        level = 0
+        while len(values) >= self._capacity(level):
+            if level + 1 == len(self._levels):
+                self._grow()
+            if len(values) % 2:
+                self._levels[level].append(float(values[-1]))
+                values = values[:-1]
+            values = values[self._rng.random() < 0.5::2]
+            level += 1
+        self._levels[level].extend(values.tolist())
+        self._size = sum(map(len, self._levels))
+        while self._size >= self._max_size:
+            self._compress()
+
+    def merge(self, other: 'QuantileSketch') -> None:
+        """Adds the values summarized by another sketch."""
+        while len(self._levels) < len(other._levels):
+            self._grow()
+        for level, items in enumerate(other._levels):
+            self._levels[level].extend(items)
+        self.count += other.count
+        self._size = sum(map(len, self._levels))
+        while self._size >= self._max_size:
+            self._compress()
+
+    def __len__(self) -> int:
+        """Number of values stored (not the number added)."""
+        return self._size
+
+    def quantile(self, q: float) -> float:
+        """Returns an estimate of the q-quantile (0 <= q <= 1), or nan if no value was added."""
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs: Sequence[float]) -> List[float]:
+        """Returns an estimate of every q-quantile in qs, with one sort of the stored values."""
+        if any(not 0 <= q <= 1 for q in qs):
+            raise ValueError("Quantiles must be between 0 and 1.")
+        weighted = sorted((x, 1 << level) for level, items in enumerate(self._levels) for x in items)
+        if not weighted:
+            return [math.nan] * len(qs)
+        # The q-quantile is the first value whose cumulative weight reaches q times the total weight.
+        cumulative = list(accumulate(weight for _, weight in weighted))
+        return [weighted[bisect_left(cumulative, q * cumulative[-1])][0] for q in qs]
+
+
+class StreamStats:
+    """
+    Streaming count, sum, mean, variance, min, max and quantiles of a stream of numbers.
+    Statistics of an empty stream are nan. NaN values are counted and make the sum, mean and variance nan;
+    infinite values make the variance nan.
+    """
+
+    def __init__(self, k: int = DEFAULT_K, seed: Optional[int] = 0):
+        self.count = 0
+        self.errors = 0  # results that were errors (see tap())
+        self._sum = ExactSum()
+        self._finite = 0  # number of finite values, seen by Welford's algorithm
+        self._mean = 0.0
+        self._m2 = 0.0  # sum of squared differences from the mean
+        self._min = math.inf
+        self._max = -math.inf
+        self.sketch = QuantileSketch(k, seed)
+
+    #----------------------------------------------------------------
+    # Adding values
+    #----------------------------------------------------------------
+
+    def add(self, x: float) -> None:
+        """Adds one value."""
+        x = float(x)
+        self.count += 1
+        self._sum.add(x)
+        if x != x:  # NaN
+            return
+        if x < self._min:
+            self._min = x
+        if x > self._max:
+            self._max = x
+        self.sketch.add(x)
+        if x - x == 0.0:
+            # Welford's update of the running mean and of the sum of squared differences.
+            self._finite += 1
+            delta = x - self._mean
+            self._mean += delta / self._finite
+            self._m2 += delta * (x - self._mean)
+
+    def update(self, values: Iterable[float]) -> 'StreamStats':
+        """Adds every value (a NumPy array is handled in chunks) and returns self."""
+        np = sys.modules.get('numpy')
+        if np is not None and isinstance(values, np.ndarray):
+            values = values.astype(np.float64, copy=False).ravel()
+            for start in range(0, len(values), ARRAY_CHUNK):
+                self._update_array(np, values[start:start + ARRAY_CHUNK])
+        else:
+            for x in values:
+                self.add(x)
+        return self
+
+    def _update_array(self, np, values) -> None:
+        """Adds one chunk of a float64 NumPy array with vectorized operations."""
+        finite = np.isfinite(values)
+        if not finite.all():
+            for x in values[~finite].tolist():
+                self.add(x)
+            values = values[finite]
+        if not len(values):
+            return
+        self.count += len(values)
+        self._sum.add_array(values)
+        self._min = min(self._min, float(values.min()))
+        self._max = max(self._max, float(values.max()))
+        self.sketch.extend_array(values)
+        mean = float(values.mean())
+        self._merge_moments(len(values), mean, float(np.square(values - mean).sum()))
+
+    def _merge_moments(self, count: int, mean: float, m2: float) -> None:
+        """Combines the Welford aggregate of other values into this one (Chan's parallel formula)."""
+        total = self._finite + count
+        delta = mean - self._mean
+        self._mean += delta * count / total
+        self._m2 += m2 + delta * delta * self._finite * count / total
+        self._finite = total
+
+    def tap(self, results: Iterable) -> Iterator:
+        """
+        Yields every result unchanged while adding it to the statistics.
+        Results can be numbers or result lines (e.g. '9.0'); ValueErrors and 'error: ...' lines are counted in errors.
+        """
+        for result in results:
+            if isinstance(result, ValueError) or (isinstance(result, str) and result.startswith('error')):
+                self.errors += 1
+            else:
+                self.add(result)
+            yield result
+
+    def merge(self, other: 'StreamStats') -> 'StreamStats':
+        """Adds the values aggregated by other (e.g. another shard of a parallel job) and returns self."""
+        self.count += other.count
+        self.errors += other.errors
+        self._sum.merge(other._sum)
+        self._min = min(self._min, other._min)
+        self._max = max(self._max, other._max)
+        self.sketch.merge(other.sketch)
+        if other._finite:
+            self._merge_moments(other._finite, other._mean, other._m2)
+        return self
+
+    #----------------------------------------------------------------
+    # Reading the statistics
+    #----------------------------------------------------------------
+
+    @property
+    def sum(self) -> float:
+        """The exact sum of the values, rounded once."""
+        return self._sum.value()
+
+    @property
+    def mean(self) -> float:
+        """The mean of the values, from the exact sum."""
+        return self._sum.divide(self.count) if self.count else math.nan
+
+    @property
+    def variance(self) -> float:
+        """The sample variance (divided by count - 1), nan for fewer than two values or non-finite values."""
+        if self._finite < 2 or self._finite != self.count:
+            return math.nan
+        return self._m2 / (self._finite - 1)
+
+    @property
+    def stdev(self) -> float:
+        """The sample standard deviation."""
+        return math.sqrt(self.variance)
+
+    @property
+    def min(self) -> float:
+        """The smallest value (NaN values are ignored)."""
+        return self._min if self.sketch.count else math.nan
+
+    @property
+    def max(self) -> float:
+        """The largest value (NaN values are ignored)."""
+        return self._max if self.sketch.count else math.nan
+
+    def quantile(self, q: float) -> float:
+        """An estimate of the q-quantile, e.g. quantile(0.5) for the median."""
+        return self.sketch.quantile(q)
+
+    def summary(self, quantiles: Sequence[float] = SUMMARY_QUANTILES) -> Dict[str, float]:
+        """Returns all the statistics as a dict, with the quantiles as 'p50', 'p90', ..."""
+        summary = {
+            "count": self.count, "errors": self.errors, "sum": self.sum, "mean": self.mean,
+            "variance": self.variance, "stdev": self.stdev, "min": self.min, "max": self.max,
+        }
+        for q, value in zip(quantiles, self.sketch.quantiles(quantiles)):
+            summary[f"p{q * 100:g}"] = value
+        return summary
@@ -0,0 +1,464 @@
+"""
+File for the 'app/store' module.
+A persistent result store that several processes share: a result computed once, by any process or by an
+earlier run, is looked up instead of computed again.
+
+The store is an SQLite database in WAL mode (write-ahead log), so many processes can read it while one of them
+writes, and a process that finds the database busy waits for it (timeout seconds) instead of failing.
+Every result is stored under a content address: a 16-byte BLAKE2b digest of the normalized call, which is
+the operator (symbol and name), every operand with its type ('f:0.1', 'i:1', 'd:1.50', see
+app.session.encode_value) and, for Decimal operands, the precision and rounding of the decimal context.
+So 1 and 1.0, or 0.0 and -0.0, never share a result, like with app.cache.ResultCache. Calls with a NaN operand
+or an operand of another type (e.g. a NumPy array) are not stored, and neither are errors.
+
+Every row keeps a CRC-32 checksum of its key and value. A row whose checksum does not match (a damaged file)
+is treated as a miss and removed; verify() checks the whole database.
+The store holds about max_entries results: when a process has added a tenth of that, the rows used least
+recently are removed until max_entries are left. A hit marks its row as used, unless the row was already
+used in the last TOUCH_AFTER seconds: eviction does not need exact times, and rewriting the use time of every
+hit would cost more than the lookup itself.
+
+Writes are batched: new results (and the use times of hits) are kept in memory and written in one transaction
+by flush(), which runs every flush_every new results, when the store is closed or uninstalled, and after every
+chunk of a batch job. Until then only this process sees them.
+
+The store plugs in like the result cache, as a layer in front of every operator of the operator registry:
+install(ResultStore('results.db')) ... uninstall(). Batch jobs (app.parallel.evaluate_lines, used by
+--workers and checkpointed jobs) also look up all the records of a chunk in one query first (prefetch()).
+A ResultStore can be sent to worker processes (it is pickled as its settings): every process opens its own
+connection to the database, and the chunks a worker receives share one store in that worker. The batch runners
+send the installed store with every chunk and install it in the worker, so it does not matter whether the
+workers are started by fork, forkserver or spawn.
+
+"""
+
+import hashlib
+import os
+import sys
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.backends import current_backend
+from app.registry import OperatorSpec, registry
+from app.session import decode_value, encode_value
+
+# Default number of results kept in a store.
+DEFAULT_MAX_ENTRIES = 1_000_000
+
+# Default number of new results kept in memory before they are written to the database.
+DEFAULT_FLUSH_EVERY = 1000
+
+# Version of the database layout; a store made by another version is refused.
+SCHEMA_VERSION = 1
+
+# Seconds during which a hit on a row does not write its use time again.
+TOUCH_AFTER = 60.0
+
+# Largest number of results this process keeps in memory (prefetched, or written recently) between two flushes.
+_MEMO_LIMIT = 100_000
+
+# Largest number of keys looked up in one SELECT (SQLite limits the number of parameters of a statement).
+_LOOKUP_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS results (
+    key BLOB PRIMARY KEY,
+    value TEXT NOT NULL,
+    checksum INTEGER NOT NULL,
+    used REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS results_used ON results (used);
+"""
+
+
+class StoreStats(NamedTuple):
+    """Counters of a ResultStore in this process, and the number of results in the database."""
+    hits: int
+    misses: int
+    stored: int
+    evictions: int
+    corrupted: int
+    size: int
+
+
+def call_key(spec: OperatorSpec, operands: Sequence) -> Optional[bytes]:
+    """
+    Returns the content address of the call spec.func(*operands), or None if it must not be stored
+    (a NaN operand, or an operand whose type the store cannot write).
+    """
+    parts = [spec.symbol, spec.name]
+    decimal_operands = False
+    for x in operands:
+        try:
+            if x != x:  # NaN
+                return None
+            parts.append(encode_value(x))
+        except (ValueError, ArithmeticError):  # a type that encode_value() does not know, arrays, or sNaN
+            return None
+        decimal_operands = decimal_operands or type(x).__name__ == 'Decimal'
+    if decimal_operands:
+        # Decimal results depend on the context they are computed in, so it is part of the key.
+        context = sys.modules['decimal'].getcontext()
+        parts.append(f"{context.prec}:{context.rounding}")
+    return hashlib.blake2b("\x1f".join(parts).encode('utf-8'), digest_size=16).digest()
+
+
+def _checksum(key: bytes, value: str) -> int:
+    """Returns the CRC-32 checksum stored next to a row."""
+    return zlib.crc32(key + value.encode('utf-8'))
+
+
+class ResultStore:
+    """
+    A result store in the SQLite database file at path, shared by every process that opens the same file.
+    max_entries - number of results the store is trimmed back to
+    flush_every - number of new results kept in memory before they are written
+    timeout     - seconds a process waits for the database when another one is writing
+    clock       - function returning the current time in seconds (time.time by default), for the use times
+    """
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES, flush_every: int = DEFAULT_FLUSH_EVERY,
+                 timeout: float = 30.0, clock: Callable[[], float] = time.time):
+        if max_entries < 1 or flush_every < 1:
+            raise ValueError("max_entries and flush_every must be at least 1.")
+        self.path = path
+        self.max_entries = max_entries
+        self.flush_every = flush_every
+        self.timeout = timeout
+        self._clock = clock
+        self._setup()
+        self._connect()
+
+    def _setup(self) -> None:
+        """Sets up the state of this process (the connection is opened later)."""
+        self._connections = {}  # process id -> connection, so a forked process never uses its parent's
+        self._lock = threading.RLock()
+        self._memo: Dict[bytes, object] = {}  # results of this process not flushed yet, and prefetched ones
+        self._pending: Dict[bytes, str] = {}  # new results to write: key -> encoded value
+        self._touched = set()  # keys of hits whose use time must be written
+        self._used: Dict[bytes, float] = {}  # use times of the rows in _memo, as read or written by this process
+        self._added = 0  # results added since the last trim
+        self.hits = self.misses = self.stored = self.evictions = self.corrupted = 0
+
+    def __reduce__(self):
+        """
+        A store is sent to another process as its settings. The process opens its own connection,
+        and every copy with the same settings received by one process is the same store (see _receive()).
+        """
+        return _receive, (self.path, self.max_entries, self.flush_every, self.timeout, self._clock)
+
+    def _connect(self):
+        """Returns the connection of this process, opening it (and creating the tables) the first time."""
+        connection = self._connections.get(os.getpid())
+        if connection is None:
+            import sqlite3  # pylint: disable=import-outside-toplevel
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # A crash may lose the last flush, but never corrupts the database; results can be computed again.
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with connection:
+                connection.executescript(_SCHEMA)
+                connection.execute("INSERT OR IGNORE INTO meta VALUES ('version', ?)", (str(SCHEMA_VERSION),))
+            version = connection.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()[0]
+            if version != str(SCHEMA_VERSION):
+                connection.close()
+                raise ValueError(f"The result store {self.path} has version {version}, expected {SCHEMA_VERSION}.")
+            self._connections[os.getpid()] = connection
+        return connection
+
+    #----------------------------------------------------------------
+    # Lookups and writes
+    #----------------------------------------------------------------
+
+    def get_many(self, keys: Iterable[bytes]) -> Dict[bytes, object]:
+        """
+        Returns {key: result} for the keys found in the database, looked up a few hundred keys per query.
+        Rows that fail their checksum are removed and left out.
+        """
+        keys = list(dict.fromkeys(keys))
+        found, damaged = {}, []
+        with self._lock:
+            if len(self._used) > _MEMO_LIMIT:
+                self._memo.clear()
+                self._used.clear()
+            connection = self._connect()
+            for start in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[start:start + _LOOKUP_BATCH]
+                rows = connection.execute(
+                    f"SELECT key, value, checksum, used FROM results WHERE key IN ({','.join('?' * len(batch))})",
+                    batch)
+                for key, value, checksum, used in rows:
+                    if checksum == _checksum(key, value):
+                        found[key] = decode_value(value)
+                        self._used[key] = used
+                    else:
+                        damaged.append(key)
+            if damaged:
+                self._remove_damaged(damaged)
+        return found
+
+    def put_many(self, items: Iterable[Tuple[bytes, object]]) -> None:
+        """Writes (key, result) pairs to the database in one transaction. Results of unknown types are skipped."""
+        with self._lock:
+            for key, result in items:
+                self._add(key, result)
+            self.flush()
+
+    def _add(self, key: bytes, result) -> None:
+        """Keeps a new result in memory until the next flush()."""
+        try:
+            self._pending[key] = encode_value(result)
+        except ValueError:
+            return
+        self._memo[key] = result
+        if len(self._pending) >= self.flush_every:
+            self._write()
+            if len(self._memo) > _MEMO_LIMIT:
+                self._memo.clear()
+                self._used.clear()
+
+    def flush(self) -> None:
+        """
+        Writes the new results and the use times of the hits, then trims the store if it has grown too big.
+        The results this process kept in memory are dropped; later lookups read the database again.
+        """
+        with self._lock:
+            self._write()
+            self._memo.clear()
+            self._used.clear()
+
+    def _write(self) -> None:
+        """Writes what is pending in one transaction."""
+        if not (self._pending or self._touched):
+            return
+        now = self._clock()
+        connection = self._connect()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                                   [(key, value, _checksum(key, value), now)
+                                    for key, value in self._pending.items()])
+            connection.executemany("UPDATE results SET used = ? WHERE key = ?",
+                                   [(now, key) for key in self._touched])
+        self._used.update(dict.fromkeys(self._pending, now))
+        self._used.update(dict.fromkeys(self._touched, now))
+        self.stored += len(self._pending)
+        self._added += len(self._pending)
+        self._pending.clear()
+        self._touched.clear()
+        if self._added >= max(1, self.max_entries // 10):
+            self.trim()
+
+    def trim(self) -> int:
+        """Removes the least recently used results until max_entries are left. Returns the number removed."""
+        with self._lock:
+            self._added = 0
+            connection = self._connect()
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                size = connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+                extra = size - self.max_entries
+                if extra <= 0:
+                    return 0
+                connection.execute(
+                    "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY used LIMIT ?)", (extra,))
+            self.evictions += extra
+            return extra
+
+    def _remove_damaged(self, keys: List[bytes]) -> None:
+        """Deletes rows whose checksum does not match."""
+        connection = self._connect()
+        with connection:
+            connection.executemany("DELETE FROM results WHERE key = ?", [(key,) for key in keys])
+        self.corrupted += len(keys)
+
+    #----------------------------------------------------------------
+    # Operator calls
+    #----------------------------------------------------------------
+
+    def call(self, spec: OperatorSpec, func: Callable, *operands):
+        """Returns func(*operands), from the store if it is there, otherwise computing and storing it."""
+        key = call_key(spec, operands)
+        if key is None:
+            with self._lock:
+                self.misses += 1
+            return func(*operands)
+        with self._lock:
+            if key in self._memo:
+                result = self._memo[key]
+            else:
+                result = self.get_many([key]).get(key, self)  # the store itself stands for 'not found'
+            if result is not self:
+                self.hits += 1
+                if self._used.get(key, 0.0) < self._clock() - TOUCH_AFTER:
+                    self._touched.add(key)
+                return result
+            self.misses += 1
+
+        # Computed outside the lock, so slow operations do not block other threads.
+        result = func(*operands)
+        with self._lock:
+            self._add(key, result)
+        return result
+
+    def wrap(self, spec: OperatorSpec, func: Callable) -> Callable:
+        """Returns a version of the operator function func (of spec) that goes through this store."""
+
+        def stored(*operands):
+            return self.call(spec, func, *operands)
+
+        stored.store = self
+        return stored
+
+    def prefetch(self, records: Iterable[List[str]]) -> int:
+        """
+        Looks up the results of many batch records (fields ['op', 'a', 'b']) with the session backend in a few
+        queries, so computing the records afterwards needs no query per record. Invalid records are skipped.
+        The results are kept until the next flush(). Returns the number of results found.
+        """
+        backend = current_backend()
+
+        def keys() -> List[bytes]:
+            found = []
+            for fields in records:
+                spec = registry.get(fields[0])
+                if spec is None or len(fields) != spec.arity + 1:
+                    continue
+                try:
+                    key = call_key(spec, [backend.convert(field) for field in fields[1:]])
+                except ValueError:
+                    continue
+                if key is not None:
+                    found.append(key)
+            return found
+
+        # The keys are built in the backend's arithmetic context, like the calls themselves.
+        results = self.get_many(backend.run(keys))
+        with self._lock:
+            self._memo.update(results)
+        return len(results)
+
+    #----------------------------------------------------------------
+    # Maintenance
+    #----------------------------------------------------------------
+
+    def verify(self) -> int:
+        """
+        Checks the database file (SQLite quick_check) and the checksum of every row.
+        Removes the damaged rows and returns their number. Raises a ValueError if the file itself is damaged.
+        """
+        with self._lock:
+            self.flush()
+            connection = self._connect()
+            problems = [row[0] for row in connection.execute("PRAGMA quick_check")]
+            if problems != ['ok']:
+                raise ValueError(f"The result store {self.path} is damaged: {'; '.join(problems)}")
+            damaged = [key for key, value, checksum in connection.execute("SELECT key, value, checksum FROM results")
+                       if checksum != _checksum(key, value)]
+            if damaged:
+                self._remove_damaged(damaged)
+            return len(damaged)
+
+    def stats(self) -> StoreStats:
+        """Returns the counters of this process and the number of results in the database."""
+        with self._lock:
+            size = self._connect().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            return StoreStats(self.hits, self.misses, self.stored, self.evictions, self.corrupted, size)
+
+    def clear(self) -> None:
+        """Removes every result from the database and resets the counters."""
+        with self._lock:
+            self._pending.clear()
+            self._touched.clear()
+            self._memo.clear()
+            self._used.clear()
+            connection = self._connect()
+            with connection:
+                connection.execute("DELETE FROM results")
+            self.hits = self.misses = self.stored = self.evictions = self.corrupted = 0
+
+    def close(self) -> None:
+        """Writes what is pending and closes the connection of this process."""
+        with self._lock:
+            self.flush()
+            self._connections.pop(os.getpid()).close()
+        for settings, store in list(_received.items()):
+            if store is self:
+                del _received[settings]
+
+
+# Stores received from another process (unpickled), by their settings.
+_received: Dict[tuple, ResultStore] = {}
+
+
+def _receive(*settings) -> ResultStore:
+    """
+    Returns the store with these settings received earlier by this process, or opens it.
+    A worker process gets the store with every chunk it computes; this way they all use one store and one connection.
+    """
+    store = _received.get(settings)
+    if store is None:
+        store = _received[settings] = ResultStore(*settings)
+    return store
+
+
+# The store installed by install() and the registry layer that puts operators in front of it, if any.
+_installed: Optional[ResultStore] = None
+_layer = None
+
+
+def install(store: ResultStore) -> ResultStore:
+    """
+    Puts every operator of the operator registry behind store and returns it.
+    Calling install() again replaces the previous store (which is flushed).
+    Only this process uses the installed store: the batch runners send it to their worker processes
+    themselves (see using_store()).
+    """
+    global _installed, _layer  # pylint: disable=global-statement
+    uninstall()
+
+    def layer(spec, func):
+        return store.wrap(spec, func)
+
+    registry.add_layer(layer)
+    _installed, _layer = store, layer
+    return store
+
+
+def uninstall() -> None:
+    """Flushes the installed store and removes it from the operator registry, if there is one."""
+    global _installed, _layer  # pylint: disable=global-statement
+    if _layer is None:
+        return
+    registry.remove_layer(_layer)
+    _installed.flush()
+    _installed = _layer = None
+
+
+def installed() -> Optional[ResultStore]:
+    """Returns the installed store, or None."""
+    return _installed
+
+
+@contextmanager
+def using_store(store: ResultStore) -> Iterator[ResultStore]:
+    """
+    Installs store for the duration of a 'with' block, then puts back the store installed before (if any).
+    Used by worker processes to compute a chunk with the store sent along with it.
+    """
+    previous = _installed
+    if previous is store:
+        yield store
+        return
+    install(store)
+    try:
+        yield store
+    finally:
+        uninstall()
+        if previous is not None:
+            install(previous)
@@ -0,0 +1 @@
+"""Benchmarks for the calculator. Run the regression suite with 'python -m benchmarks.suite'."""
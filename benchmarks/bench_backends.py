@@ -0,0 +1,49 @@
+"""
+Benchmark for the numeric backends: cost next to accuracy.
+
+It sums a ledger of amounts with two decimal places (e.g. '1234.56'), as text like it would come
+from a file, with every backend and summation method, and prints the time taken and the error of
+the result against the exact sum (computed with fractions).
+
+Usage:
+    python benchmarks/bench_backends.py [rows]
+"""
+
+import random
+import sys
+import time
+from fractions import Fraction
+from pathlib import Path
+
+# Make the 'app' package importable when the script is run directly.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.backends import DecimalBackend, FloatBackend, FractionBackend, sum_values  # pylint: disable=wrong-import-position
+
+
+def main(rows: int = 1_000_000) -> None:
+    """Sums the same ledger with every backend and prints time and error."""
+    rng = random.Random(42)
+    ledger = [f"{rng.uniform(-10_000, 10_000):.2f}" for _ in range(rows)]
+    exact = sum((Fraction(x) for x in ledger), Fraction(0))
+
+    backends = {
+        "float naive": FloatBackend('naive'),
+        "float neumaier": FloatBackend('neumaier'),
+        "float fsum": FloatBackend('fsum'),
+        "decimal (28 digits)": DecimalBackend(),
+        "decimal (12 digits)": DecimalBackend(precision=12),
+        "fraction": FractionBackend(),
+    }
+
+    print(f"{'backend':<22} {'seconds':>9} {'rows/s':>14} {'abs error':>12}")
+    for name, backend in backends.items():
+        started = time.perf_counter()
+        total = sum_values(ledger, backend)
+        elapsed = time.perf_counter() - started
+        error = abs(Fraction(total) - exact) if not isinstance(total, Fraction) else total - exact
+        print(f"{name:<22} {elapsed:>9.3f} {rows / elapsed:>14,.0f} {float(error):>12.3g}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
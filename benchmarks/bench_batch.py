@@ -0,0 +1,55 @@
+"""
+Benchmark for the batch methods of the Operation class.
+
+It compares the throughput (rows per second) of calling the scalar method once per pair
+in a Python loop against the batch method (add_many, divide_many, ...) on the same data.
+If NumPy is installed, the batch methods are also timed with NumPy arrays.
+
+Usage:
+    python benchmarks/bench_batch.py [rows]
+"""
+
+import random
+import sys
+import timeit
+from pathlib import Path
+
+# Make the 'app' package importable when the script is run directly.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.operations import Operation  # pylint: disable=wrong-import-position
+
+
+def best_time(func, repeat: int = 5) -> float:
+    """Returns the best wall-clock time in seconds of func() over repeat runs."""
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main(rows: int = 1_000_000) -> None:
+    """Runs the benchmark for every operation and prints one line per case."""
+    rng = random.Random(42)
+    a = [rng.uniform(-1e6, 1e6) for _ in range(rows)]
+    b = [rng.uniform(1.0, 1e6) for _ in range(rows)]
+
+    try:
+        import numpy as np  # pylint: disable=import-outside-toplevel
+        a_np, b_np = np.asarray(a), np.asarray(b)
+    except ImportError:
+        np = None
+
+    print(f"{'operation':<10} {'scalar loop':>14} {'batch':>14} {'batch numpy':>14}  (rows/s)")
+    for name in ("add", "subtract", "multiply", "divide"):
+        scalar = getattr(Operation, name)
+        batch = getattr(Operation, name + "_many")
+
+        scalar_time = best_time(lambda: [scalar(x, y) for x, y in zip(a, b)])
+        batch_time = best_time(lambda: batch(a, b))
+        numpy_rate = "n/a"
+        if np is not None:
+            numpy_rate = f"{rows / best_time(lambda: batch(a_np, b_np)):,.0f}"
+
+        print(f"{name:<10} {rows / scalar_time:>14,.0f} {rows / batch_time:>14,.0f} {numpy_rate:>14}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
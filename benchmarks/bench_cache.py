@@ -0,0 +1,72 @@
+"""
+Benchmark for the Operation result cache.
+
+It replays two traces of (operation, a, b) calls, with and without a ResultCache:
+- hit-heavy:  calls drawn from a small set of repeated operand pairs
+- miss-heavy: calls with (almost) unique operand pairs
+Each trace is run against the plain Operation methods and against a simulated expensive
+operation (a pure-Python loop), because caching only pays off when computing costs more than a lookup.
+
+Usage:
+    python benchmarks/bench_cache.py [calls]
+"""
+
+import random
+import sys
+import timeit
+from pathlib import Path
+
+# Make the 'app' package importable when the script is run directly.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.cache import ResultCache  # pylint: disable=wrong-import-position
+from app.operations import Operation  # pylint: disable=wrong-import-position
+
+
+def expensive_add(a: float, b: float) -> float:
+    """Operation.add plus some busy work, standing in for a costly operation."""
+    total = 0.0
+    for i in range(200):
+        total += i
+    return Operation.add(a, b) + total * 0.0
+
+
+def make_trace(calls: int, distinct: int, seed: int = 42):
+    """Returns calls operand pairs drawn from distinct different pairs."""
+    rng = random.Random(seed)
+    pairs = [(rng.uniform(-1e6, 1e6), rng.uniform(1, 1e6)) for _ in range(distinct)]
+    return [pairs[rng.randrange(distinct)] for _ in range(calls)]
+
+
+def run(func, trace, cache):
+    """Replays the trace through func, with the cache if one is given."""
+    if cache is None:
+        for a, b in trace:
+            func(a, b)
+    else:
+        call = cache.call
+        for a, b in trace:
+            call(func, a, b)
+
+
+def main(calls: int = 200_000) -> None:
+    """Runs every trace/operation combination and prints the throughput and hit rate."""
+    traces = {
+        "hit-heavy": make_trace(calls, distinct=1_000),
+        "miss-heavy": make_trace(calls, distinct=calls * 10),
+    }
+    operations = {"Operation.add": Operation.add, "expensive_add": expensive_add}
+
+    print(f"{'trace':<11} {'operation':<14} {'uncached calls/s':>17} {'cached calls/s':>15} {'hit rate':>9}")
+    for trace_name, trace in traces.items():
+        for op_name, func in operations.items():
+            uncached = min(timeit.repeat(lambda: run(func, trace, None), number=1, repeat=3))
+            cache = ResultCache(maxsize=10_000)
+            cached = min(timeit.repeat(lambda: run(func, trace, cache), number=1, repeat=3))
+            stats = cache.stats()
+            hit_rate = stats.hits / (stats.hits + stats.misses)
+            print(f"{trace_name:<11} {op_name:<14} {calls / uncached:>17,.0f} {calls / cached:>15,.0f} {hit_rate:>9.1%}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
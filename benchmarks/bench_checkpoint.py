@@ -0,0 +1,55 @@
+"""
+Benchmark of checkpointed batch jobs: what the checkpoint interval costs in I/O and saves in lost work.
+
+The script writes a job of random 'op a b' lines, runs it with plain batch mode and then with checkpoints every
+N lines for several N, and prints the time of each run, the number of checkpoints and the work a crash would lose
+at most (N lines). Every checkpointed output is checked against the plain output.
+
+Usage:
+    python -m benchmarks.bench_checkpoint [lines]
+"""
+
+import os
+import random
+import sys
+import tempfile
+from time import perf_counter
+
+from app.batch import run_batch_path
+from app.checkpoint import run_checkpointed
+
+INTERVALS = [1_000_000, 100_000, 10_000, 1000, 100]
+
+
+def main(lines: int = 500_000) -> None:
+    """Times the job with every checkpoint interval and prints the results."""
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as directory:
+        job = os.path.join(directory, "job.txt")
+        with open(job, "w", encoding="utf-8") as f:
+            for _ in range(lines):
+                f.write(f"{rng.choice('+-*/')} {rng.uniform(-1e3, 1e3):.4f} {rng.randint(0, 99)}\n")
+
+        plain = os.path.join(directory, "plain.txt")
+        started = perf_counter()
+        with open(plain, "w", encoding="utf-8") as out:
+            run_batch_path(job, out)
+        baseline = perf_counter() - started
+        print(f"{lines:,} lines, batch mode without checkpoints: {baseline:.2f} s\n")
+        print(f"{'every (lines)':>14} {'checkpoints':>12} {'seconds':>8} {'overhead':>9} {'max lost lines':>15}")
+
+        with open(plain, "rb") as f:
+            expected = f.read()
+        for every in INTERVALS:
+            output = os.path.join(directory, f"out-{every}.txt")
+            started = perf_counter()
+            run_checkpointed(job, output, every=every)
+            seconds = perf_counter() - started
+            with open(output, "rb") as f:
+                assert f.read() == expected, every
+            print(f"{every:>14,} {lines // every:>12,} {seconds:>8.2f} {seconds / baseline - 1:>8.1%} "
+                  f"{min(every, lines):>15,}")
+
+
+if __name__ == "__main__":
+    main(int(float(sys.argv[1])) if len(sys.argv) > 1 else 500_000)
@@ -0,0 +1,95 @@
+"""
+Benchmark of text parsing against memory-mapped binary input.
+
+It writes the same random operand pairs twice, as a CSV file ('a,b' per line) and as a columnar
+'.npy' file, then times adding every pair:
+- batch text:   the batch mode ('+ a b' records in, one text line out per record)
+- csv + batch:  parsing the CSV into floats, then Operation.add_many over them
+- mapped npy:   compute_columns('+', ...), which maps the binary file and reads it zero-copy
+The one-off CSV -> npy conversion is timed too. Every case runs once, since the files are large.
+
+Usage:
+    python -m benchmarks.bench_columnar [rows] [directory]
+
+The default of 100 million rows needs about 6 GB of free disk space and takes a while;
+pass a smaller row count for a quick run.
+"""
+
+import os
+import random
+import sys
+import tempfile
+from array import array
+from time import perf_counter
+from typing import Optional
+
+from app.batch import run_batch
+from app.columnar import ColumnWriter, compute_columns, csv_to_columns
+from app.operations import Operation
+
+# Rows generated and written at a time.
+CHUNK_ROWS = 1 << 20
+
+
+def write_operands(rows: int, csv_path: str, npy_path: str) -> None:
+    """Writes rows random operand pairs to both files, one chunk at a time."""
+    rng = random.Random(42)
+    with open(csv_path, "w", encoding="utf-8") as csv_file, ColumnWriter(npy_path, columns=2) as writer:
+        for start in range(0, rows, CHUNK_ROWS):
+            count = min(CHUNK_ROWS, rows - start)
+            a = array('d', [rng.uniform(-1e6, 1e6) for _ in range(count)])
+            b = array('d', [rng.uniform(1.0, 1e6) for _ in range(count)])
+            csv_file.writelines(f"{x!r},{y!r}\n" for x, y in zip(a, b))
+            writer.write(a, b)
+
+
+def batch_text(csv_path: str, out_path: str) -> None:
+    """Adds every pair with the text batch mode."""
+    with open(csv_path, encoding="utf-8") as f, open(out_path, "w", encoding="utf-8") as out:
+        run_batch(("+ " + line.replace(",", " ") for line in f), out)
+
+
+def csv_and_batch(csv_path: str, out_path: str) -> None:
+    """Parses the CSV chunk by chunk and adds every pair with Operation.add_many."""
+    with open(csv_path, encoding="utf-8") as f, ColumnWriter(out_path) as writer:
+        a, b = array('d'), array('d')
+        for line in f:
+            x, y = line.split(",")
+            a.append(float(x))
+            b.append(float(y))
+            if len(a) == CHUNK_ROWS:
+                writer.write(Operation.add_many(a, b))
+                a, b = array('d'), array('d')
+        writer.write(Operation.add_many(a, b))
+
+
+def timed(func, *args) -> float:
+    """Returns the wall-clock time in seconds of one call of func(*args)."""
+    started = perf_counter()
+    func(*args)
+    return perf_counter() - started
+
+
+def main(rows: int = 100_000_000, directory: Optional[str] = None) -> None:
+    """Generates the files, runs every case once and prints the throughput."""
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        csv_path = os.path.join(tmp, "operands.csv")
+        npy_path = os.path.join(tmp, "operands.npy")
+        print(f"writing {rows:,} rows ...")
+        write_operands(rows, csv_path, npy_path)
+        print(f"csv {os.path.getsize(csv_path) / 1e6:,.0f} MB, npy {os.path.getsize(npy_path) / 1e6:,.0f} MB\n")
+
+        cases = [
+            ("batch text", batch_text, csv_path, os.path.join(tmp, "results.txt")),
+            ("csv + batch", csv_and_batch, csv_path, os.path.join(tmp, "results_csv.npy")),
+            ("csv -> npy", csv_to_columns, csv_path, os.path.join(tmp, "converted.npy")),
+            ("mapped npy", compute_columns, "+", npy_path, os.path.join(tmp, "results.npy")),
+        ]
+        print(f"{'case':<14} {'seconds':>10} {'rows/s':>16}")
+        for name, func, *args in cases:
+            seconds = timed(func, *args)
+            print(f"{name:<14} {seconds:>10.2f} {rows / seconds:>16,.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000_000, sys.argv[2] if len(sys.argv) > 2 else None)
@@ -0,0 +1,69 @@
+"""
+Benchmark of the calculation history and the session journal.
+
+It measures:
+- the memory used per history entry (with tracemalloc), for a full History of float calculations,
+  next to the same records stored as dicts for comparison
+- how fast a journal is written (with the default batched fsync)
+- how fast a journal is replayed to rebuild a session
+
+Usage:
+    python -m benchmarks.bench_history [entries]
+
+The default is 1 million entries (the journal is about 65 MB).
+"""
+
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+
+from app.history import Entry, History, Journal, replay
+
+
+def memory_per_entry(entries: int, make) -> float:
+    """Returns the bytes allocated per entry when entries records made by make(a, b) are kept in a History."""
+    rng = random.Random(42)
+    tracemalloc.start()
+    history = History(capacity=entries)
+    for _ in range(entries):
+        a, b = rng.random(), rng.random()
+        history.append(make(a, b))
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / entries
+
+
+def main(entries: int = 1_000_000) -> None:
+    """Runs every measurement and prints the results."""
+    print(f"{entries:,} entries\n")
+    slots = memory_per_entry(entries, lambda a, b: Entry('+', a, b, a + b))
+    dicts = memory_per_entry(entries, lambda a, b: {'op': '+', 'a': a, 'b': b, 'result': a + b})
+    print(f"memory per entry: {slots:,.0f} bytes (as dicts: {dicts:,.0f} bytes), numbers included")
+
+    rng = random.Random(42)
+    calculations = []
+    for _ in range(entries):
+        a, b = rng.random(), rng.random()
+        calculations.append(Entry('+', a, b, a + b))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "journal.txt")
+        started = perf_counter()
+        with Journal(path) as journal:
+            for entry in calculations:
+                journal.append(entry)
+        seconds = perf_counter() - started
+        print(f"journal write: {seconds:.2f} s, {entries / seconds:,.0f} entries/s "
+              f"({os.path.getsize(path) / 1e6:,.0f} MB)")
+
+        started = perf_counter()
+        history, _ = replay(path, History(capacity=entries))
+        seconds = perf_counter() - started
+        print(f"journal replay: {seconds:.2f} s, {history.count / seconds:,.0f} entries/s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
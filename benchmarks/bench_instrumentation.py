@@ -0,0 +1,40 @@
+"""
+Benchmark of the instrumentation overhead.
+
+It times the same work with instrumentation disabled and enabled:
+- operator calls through the registry functions table (the hot path of every mode)
+- the streaming batch mode (parse + compute per record)
+- the REPL end to end with scripted input
+and prints the cost per operation in both states and the overhead of enabling it.
+"Disabled" should match a run of the benchmark suite, since nothing is wrapped then.
+
+Usage:
+    python -m benchmarks.bench_instrumentation
+"""
+
+from app import instrumentation
+from benchmarks.harness import Benchmark, measure
+from benchmarks.suite import BENCHMARKS
+
+# The suite benchmarks that go through the instrumented paths.
+NAMES = ("registry.dispatch", "expression.evaluate", "batch.run_batch", "repl.calculation")
+
+
+def main() -> None:
+    """Measures every benchmark with instrumentation off and on and prints the overhead."""
+    selected = [b for b in BENCHMARKS if b.name in NAMES]
+    print(f"{'benchmark':<24} {'disabled ns/op':>15} {'enabled ns/op':>15} {'overhead':>10}")
+    for benchmark in selected:
+        disabled = measure(benchmark)
+        metrics = instrumentation.enable()
+        try:
+            enabled = measure(Benchmark(benchmark.name, benchmark.func, benchmark.inner))
+        finally:
+            instrumentation.disable()
+        overhead = enabled.best / disabled.best - 1.0
+        print(f"{benchmark.name:<24} {disabled.best * 1e9:>15,.1f} {enabled.best * 1e9:>15,.1f} {overhead:>+10.1%}")
+    print(f"\nlast run recorded {sum(metrics.calls.values()):,} operator calls")
+
+
+if __name__ == "__main__":
+    main()
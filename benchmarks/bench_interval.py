@@ -0,0 +1,75 @@
+"""
+Benchmark of error bounds: interval arithmetic next to rerunning the calculation with high precision.
+
+The script evaluates the formula (a * b - c) / (a + c) over arrays of random values in four ways:
+- floats with NumPy (the result without any bound, the baseline),
+- IntervalArray (vectorized intervals): guaranteed bounds for every value,
+- Interval one value at a time (the 'interval' backend),
+- Decimal with 50 digits one value at a time (the usual way to check how wrong the float result is).
+All of them start from the exact values of the floats. The two scalar ways are timed on a sample and scaled
+to all the values. The script checks that Interval and IntervalArray give the same bounds, that every
+50-digit result lies inside its interval, and prints the time per value, the slowdown against floats,
+and the mean width of the intervals next to the mean error of the float results.
+
+Usage:
+    python -m benchmarks.bench_interval [values]
+"""
+
+import random
+import sys
+from decimal import Decimal
+from time import perf_counter
+
+import numpy as np
+
+from app.backends import DecimalBackend
+from app.backends.interval import Interval, IntervalArray
+
+# Values computed one by one with the scalar ways (they are much slower).
+SAMPLE = 20_000
+
+
+def formula(a, b, c):
+    """(a * b - c) / (a + c), for any number type (floats, NumPy arrays, Decimals, Intervals or IntervalArrays)."""
+    return (a * b - c) / (a + c)
+
+
+def timed(func, *args):
+    """Returns (result, seconds) of func(*args)."""
+    started = perf_counter()
+    result = func(*args)
+    return result, perf_counter() - started
+
+
+def main(values: int = 1_000_000) -> None:
+    """Times every way of computing the formula and prints the results."""
+    rng = random.Random(3)
+    columns = [np.array([rng.uniform(1, 100) for _ in range(values)]) for _ in range(3)]
+    sample = min(SAMPLE, values)
+
+    floats, float_seconds = timed(formula, *columns)
+    intervals, array_seconds = timed(formula, *map(IntervalArray.from_values, columns))
+    rows = [[float(column[i]) for column in columns] for i in range(sample)]
+    scalar, scalar_seconds = timed(lambda: [formula(*(Interval(x, x) for x in row)) for row in rows])
+    assert all(value == intervals[i] for i, value in enumerate(scalar))
+    # The inputs are the exact values of the floats (Decimal(x), not the shortest repr the backend would read).
+    precise = DecimalBackend(precision=50)
+    exact, decimal_seconds = timed(lambda: [precise.run(formula, *map(Decimal, row)) for row in rows])
+    assert intervals.contains(floats).all()
+    for i, value in enumerate(exact):
+        assert intervals.lo[i] <= value <= intervals.hi[i], i
+
+    errors = [abs(float(value - Decimal(floats[i]))) for i, value in enumerate(exact)]
+    print(f"{values:,} values of (a * b - c) / (a + c), scalar ways timed on {sample:,} values\n")
+    print(f"{'method':<34} {'ns/value':>10} {'vs float':>9}")
+    per_value = float_seconds / values
+    for name, seconds in [("float (NumPy)", float_seconds), ("IntervalArray (vectorized)", array_seconds),
+                          ("Interval (one by one)", scalar_seconds * values / sample),
+                          ("Decimal, 50 digits (one by one)", decimal_seconds * values / sample)]:
+        print(f"{name:<34} {seconds / values * 1e9:>10,.1f} {seconds / values / per_value:>8.1f}x")
+    print(f"\nmean interval width {float(np.mean(intervals.width)):.3g}, "
+          f"mean float error {sum(errors) / len(errors):.3g} (all {sample:,} 50-digit results inside their bounds)")
+
+
+if __name__ == "__main__":
+    main(int(float(sys.argv[1])) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,67 @@
+"""
+Benchmark of the expression optimizer: evaluation time of everyday formulas with and without optimize=True.
+
+The formulas come from the kind of sheets people type in: prices with tax, unit conversions, loan payments,
+physics and geometry. Most of them have literal parts ('8.25 / 100', '1000 / 3600', '4 / 3 * 3.14159')
+or repeated parts ('rate / 12') that the optimizer computes once (see app.expressions.optimize).
+For every formula the script checks that both versions give exactly the same result, then prints the
+time per evaluation and the speedup.
+
+Usage:
+    python -m benchmarks.bench_optimize [evaluations]
+"""
+
+import sys
+from time import perf_counter
+
+from app.expressions import compile_expression
+
+# (formula, variable values)
+FORMULAS = [
+    ("price * qty * (1 + 8.25 / 100) - discount * (1 + 8.25 / 100)", {"price": 19.99, "qty": 3, "discount": 5.0}),
+    ("(fahrenheit - 32) * 5 / 9", {"fahrenheit": 98.6}),
+    ("kmh * 1000 / 3600 * 60 * 60 / 1000 * 0.621371", {"kmh": 88.0}),
+    ("principal * (rate / 12) / (1 - 1 / ((1 + rate / 12) * (1 + rate / 12) * (1 + rate / 12)))",
+     {"principal": 250000.0, "rate": 0.045}),
+    ("0.5 * mass * v * v + mass * 9.81 * height", {"mass": 70.0, "v": 3.2, "height": 12.0}),
+    ("4 / 3 * 3.14159265358979 * r * r * r", {"r": 2.5}),
+    ("(a + b) * (a + b) - 2 * a * b + (a + b) / 2", {"a": 3.0, "b": 4.0}),
+    ("(x - mean) / sd * (x - mean) / sd / 2", {"x": 172.0, "mean": 170.0, "sd": 7.5}),
+    ("bytes / 1024 / 1024 + bytes * 1 / 1024 - 0", {"bytes": 123456789.0}),
+    ("(hours * 60 + minutes) * 60 + seconds * 1 - -offset", {"hours": 2.0, "minutes": 30.0, "seconds": 15.0,
+                                                            "offset": 3.0}),
+]
+
+
+def time_per_call(expressions, variables, evaluations: int, repeats: int = 7):
+    """Returns the best seconds per evaluation of every expression. Repeats alternate between them to share the noise."""
+    best = [float("inf")] * len(expressions)
+    for _ in range(repeats):
+        for i, expression in enumerate(expressions):
+            started = perf_counter()
+            for _ in range(evaluations):
+                expression(variables)
+            best[i] = min(best[i], (perf_counter() - started) / evaluations)
+    return best
+
+
+def main(evaluations: int = 20_000) -> None:
+    """Times every formula and prints the results."""
+    print(f"{'formula':<62} {'plain ns':>9} {'optimized ns':>13} {'speedup':>8}")
+    total_plain = total_optimized = 0.0
+    for source, variables in FORMULAS:
+        plain = compile_expression(source, "float")
+        optimized = compile_expression(source, "float", optimize=True)
+        assert repr(plain(variables)) == repr(optimized(variables)), source
+        plain_time, optimized_time = time_per_call([plain, optimized], variables, evaluations)
+        total_plain += plain_time
+        total_optimized += optimized_time
+        name = source if len(source) <= 60 else source[:57] + "..."
+        print(f"{name:<62} {plain_time * 1e9:>9,.0f} {optimized_time * 1e9:>13,.0f} "
+              f"{plain_time / optimized_time:>7.2f}x")
+    print(f"{'whole set':<62} {total_plain * 1e9:>9,.0f} {total_optimized * 1e9:>13,.0f} "
+          f"{total_plain / total_optimized:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
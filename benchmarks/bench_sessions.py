@@ -0,0 +1,102 @@
+"""
+Benchmark of the session manager: memory per idle session and the cost of dispatching a request.
+
+Memory: the script opens many sessions in one SessionManager and measures the memory they hold with tracemalloc,
+first for fresh sessions, then after every session has made one calculation (a history entry and '_').
+
+Dispatch: the same request '+ 4 5' is run
+- directly with the registered function (the calculation alone),
+- with Session.handle (parsing, converting, recording and formatting the response),
+- with SessionManager.handle on one of the sessions (lookup, quotas, CPU accounting and idle eviction),
+and the script prints the time per request and what each layer adds.
+
+It also times a snapshot and a restore of all the sessions.
+
+Usage:
+    python -m benchmarks.bench_sessions [sessions]
+"""
+
+import os
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+
+from app.registry import registry
+from app.session import Session, SessionManager
+
+
+def memory_per_session(count: int) -> SessionManager:
+    """Opens count sessions, prints the memory held per session, and returns the manager."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    manager = SessionManager()
+    ids = [f"user-{i}" for i in range(count)]
+    for session_id in ids:
+        manager.open(session_id)
+    idle = tracemalloc.get_traced_memory()[0] - before
+    for session_id in ids:
+        manager.handle(session_id, "+ 4 5")
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(f"{count:,} sessions: {idle / count:,.0f} bytes per idle session (id included), "
+          f"{used / count:,.0f} bytes after one calculation each")
+    return manager
+
+
+def time_per_call(func, calls: int, repeats: int = 5) -> float:
+    """Returns the best seconds per call of func()."""
+    best = float("inf")
+    for _ in range(repeats):
+        started = perf_counter()
+        for _ in range(calls):
+            func()
+        best = min(best, (perf_counter() - started) / calls)
+    return best
+
+
+def dispatch_overhead(manager: SessionManager, calls: int = 50_000) -> None:
+    """Prints the time per request of every layer."""
+    add = registry.functions["+"]
+    session = Session()
+    session_id = next(iter(manager._tenants))  # pylint: disable=protected-access
+    manager.rate = manager.cpu_share = None  # the loop would use up any realistic quota
+    plain = time_per_call(lambda: str(add(4.0, 5.0)), calls)
+    direct = time_per_call(lambda: session.handle("+ 4 5"), calls)
+    managed = time_per_call(lambda: manager.handle(session_id, "+ 4 5"), calls)
+    # The quotas are checked but never reached: every session starts with its full burst.
+    quotas = SessionManager(burst=10 * calls, cpu_burst=3600.0)
+    quotas.open("user")
+    with_quotas = time_per_call(lambda: quotas.handle("user", "+ 4 5"), calls, repeats=1)
+    print(f"\n{'layer':<40} {'ns per request':>15} {'added ns':>10}")
+    rows = [("registered function", plain, plain), ("Session.handle", direct, direct - plain),
+            ("SessionManager.handle, no quotas", managed, managed - direct),
+            ("SessionManager.handle, with quotas", with_quotas, with_quotas - managed)]
+    for name, seconds, added in rows:
+        print(f"{name:<40} {seconds * 1e9:>15,.0f} {added * 1e9:>10,.0f}")
+
+
+def snapshots(manager: SessionManager) -> None:
+    """Prints the time to snapshot and restore every session."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sessions.json")
+        started = perf_counter()
+        count = manager.snapshot(path)
+        saved = perf_counter() - started
+        started = perf_counter()
+        SessionManager().restore(path)
+        restored = perf_counter() - started
+        size = os.path.getsize(path)
+    print(f"\nsnapshot of {count:,} sessions: {size / 1024:,.0f} KiB, written in {saved:.2f} s, "
+          f"restored in {restored:.2f} s")
+
+
+def main(count: int = 10_000) -> None:
+    """Runs every measurement and prints the results."""
+    manager = memory_per_session(count)
+    dispatch_overhead(manager)
+    snapshots(manager)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -0,0 +1,77 @@
+"""
+Benchmark of incremental recomputation in the spreadsheet engine.
+
+It builds a sheet of cells (half numbers x0, x1, ..., half formulas y_i = x_i * 2 + x_(i+1)),
+plus a chain of formulas z0 = y0 + 1, z1 = z0 + 1, ... that hangs off the first input,
+then times small edits:
+- single edit:  setting one random input, which recomputes the 2 formulas that read it
+- bulk edit:    one update() of 100 random inputs
+- chain edit:   setting x0, which recomputes the whole chain
+and prints the median and 99th percentile latency of each, with the number of cells recomputed.
+
+Usage:
+    python -m benchmarks.bench_sheet [cells]
+
+The default of 1 million cells takes about a minute to build and about 2 GB of memory.
+"""
+
+import random
+import sys
+from statistics import median
+from time import perf_counter
+
+from app.sheet import Sheet
+
+# Number of formulas in the chain behind x0.
+CHAIN_LENGTH = 100
+
+# Number of times every edit is timed.
+EDITS = 1000
+
+
+def build(cells: int) -> Sheet:
+    """Returns a sheet with cells cells in total (inputs, formulas and the chain)."""
+    inputs = (cells - CHAIN_LENGTH) // 2
+    contents = {f"x{i}": float(i) for i in range(inputs + 1)}
+    contents.update({f"y{i}": f"= x{i} * 2 + x{i + 1}" for i in range(inputs)})
+    contents["z0"] = "= y0 + 1"
+    contents.update({f"z{i}": f"= z{i - 1} + 1" for i in range(1, CHAIN_LENGTH)})
+    sheet = Sheet()
+    sheet.update(contents)
+    return sheet
+
+
+def time_edits(sheet: Sheet, make_edit) -> tuple:
+    """Applies EDITS edits from make_edit() and returns (median seconds, p99 seconds, cells recomputed per edit)."""
+    times = []
+    recomputed = 0
+    for _ in range(EDITS):
+        edit = make_edit()
+        started = perf_counter()
+        recomputed = len(sheet.update(edit))
+        times.append(perf_counter() - started)
+    times.sort()
+    return median(times), times[int(len(times) * 0.99)], recomputed
+
+
+def main(cells: int = 1_000_000) -> None:
+    """Builds the sheet, times every kind of edit and prints the latencies."""
+    started = perf_counter()
+    sheet = build(cells)
+    print(f"built {len(sheet):,} cells in {perf_counter() - started:.1f} s\n")
+
+    rng = random.Random(42)
+    inputs = (cells - CHAIN_LENGTH) // 2
+    cases = [
+        ("single edit", lambda: {f"x{rng.randrange(1, inputs)}": rng.random()}),
+        ("bulk edit", lambda: {f"x{rng.randrange(1, inputs)}": rng.random() for _ in range(100)}),
+        ("chain edit", lambda: {"x0": rng.random()}),
+    ]
+    print(f"{'case':<12} {'median us':>10} {'p99 us':>10} {'recomputed':>11}")
+    for name, make_edit in cases:
+        middle, p99, recomputed = time_edits(sheet, make_edit)
+        print(f"{name:<12} {middle * 1e6:>10.1f} {p99 * 1e6:>10.1f} {recomputed:>11,}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
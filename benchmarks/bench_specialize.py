@@ -0,0 +1,48 @@
+"""
+Benchmark of the specializer: evaluation time of hot formulas with the compiled closures and with generated code.
+
+Uses the everyday formulas of bench_optimize. For every formula the script builds two compiled expressions,
+one that keeps the closures (the interpreted path) and one specialized right away (see app.expressions.specialize),
+checks that they give exactly the same result, then prints the time per evaluation and the speedup.
+The last columns do the same with optimize=True, where both paths start from the simplified tree.
+
+Usage:
+    python -m benchmarks.bench_specialize [evaluations]
+"""
+
+import sys
+
+from app.expressions import CompiledExpression, parse
+from benchmarks.bench_optimize import FORMULAS, time_per_call
+
+
+def pair(source: str, optimize: bool):
+    """Returns (interpreted, specialized) compiled expressions for source."""
+    interpreted = CompiledExpression(source, parse(source), "float", optimize)
+    # A countdown of 0 means the expression is never specialized.
+    interpreted._countdown = 0  # pylint: disable=protected-access
+    specialized = CompiledExpression(source, parse(source), "float", optimize)
+    specialized.specialize()
+    return interpreted, specialized
+
+
+def main(evaluations: int = 20_000) -> None:
+    """Times every formula and prints the results."""
+    print(f"{'formula':<42} {'closures ns':>11} {'generated ns':>12} {'speedup':>8} "
+          f"{'opt. closures':>13} {'opt. generated':>14} {'speedup':>8}")
+    totals = [0.0] * 4
+    for source, variables in FORMULAS:
+        expressions = [*pair(source, False), *pair(source, True)]
+        results = {repr(expression(variables)) for expression in expressions}
+        assert len(results) == 1, source
+        times = time_per_call(expressions, variables, evaluations)
+        totals = [total + seconds for total, seconds in zip(totals, times)]
+        name = source if len(source) <= 40 else source[:37] + "..."
+        print(f"{name:<42} {times[0] * 1e9:>11,.0f} {times[1] * 1e9:>12,.0f} {times[0] / times[1]:>7.2f}x "
+              f"{times[2] * 1e9:>13,.0f} {times[3] * 1e9:>14,.0f} {times[2] / times[3]:>7.2f}x")
+    print(f"{'whole set':<42} {totals[0] * 1e9:>11,.0f} {totals[1] * 1e9:>12,.0f} {totals[0] / totals[1]:>7.2f}x "
+          f"{totals[2] * 1e9:>13,.0f} {totals[3] * 1e9:>14,.0f} {totals[2] / totals[3]:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
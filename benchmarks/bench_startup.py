@@ -0,0 +1,140 @@
+"""
+Startup benchmark: import time budget, and cold vs. warm calculator runs.
+
+Import time is measured with 'python -X importtime': the microseconds spent importing the modules
+that an entry point needs, minus what an empty interpreter already imports.
+Every entry point has a budget in STARTUP_BUDGET_MS; with --check the script exits with status 1
+when the median import time of an entry point is over its budget.
+
+Cold vs. warm compares computing one record:
+- cold:  'python main.py --batch -' (a new process imports the calculator and computes the record)
+- warm:  'python main.py --connect ADDRESS RECORD' (a new process forwards the record to a calculator
+         server that is already running, see app.connect)
+- warm, in process: app.connect.forward() from an already running Python process (the socket round trip only)
+
+Usage:
+    python -m benchmarks.bench_startup [--runs N] [--check]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from statistics import median
+from typing import Dict, List
+
+# The repository root, where main.py is.
+ROOT = Path(__file__).resolve().parent.parent
+
+# Code run for every entry point whose import time is measured.
+ENTRY_POINTS = {
+    "main": "import main",
+    "main --connect": "import main, app.connect",
+    "main --batch": "import main, app.batch",
+    "main (repl)": "import main, app.calculator",
+}
+
+# Import time budget of every entry point, in milliseconds.
+# They leave room for slow machines; the lazy imports keep the real numbers well below them.
+STARTUP_BUDGET_MS = {
+    "main": 40.0,
+    "main --connect": 60.0,
+    "main --batch": 70.0,
+    "main (repl)": 80.0,
+}
+
+
+def import_times(stderr: str) -> Dict[str, int]:
+    """Returns the cumulative import time in microseconds of every top-level import in '-X importtime' output."""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit() and not name.startswith("  "):  # nested imports are indented
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def import_time(code: str) -> int:
+    """Returns the microseconds spent importing the modules that code needs beyond an empty interpreter."""
+    def measure(source: str) -> Dict[str, int]:
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", source], cwd=ROOT,
+                                capture_output=True, text=True, check=True)
+        return import_times(result.stderr)
+
+    baseline = measure("pass")
+    return sum(us for name, us in measure(code).items() if name not in baseline)
+
+
+def run_times(args: List[str], runs: int, stdin: str = "") -> List[float]:
+    """Returns the wall-clock seconds of every run of 'python main.py args'."""
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "main.py", *args], cwd=ROOT, input=stdin, capture_output=True,
+                       text=True, check=True)
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def check_budgets(runs: int) -> List[str]:
+    """Prints the median import time of every entry point and returns the ones over budget."""
+    over = []
+    print(f"{'entry point':<16} {'import ms':>10} {'budget ms':>10}")
+    for name, code in ENTRY_POINTS.items():
+        milliseconds = median(import_time(code) for _ in range(runs)) / 1000
+        budget = STARTUP_BUDGET_MS[name]
+        flag = "  OVER BUDGET" if milliseconds > budget else ""
+        print(f"{name:<16} {milliseconds:>10.1f} {budget:>10.1f}{flag}")
+        if milliseconds > budget:
+            over.append(name)
+    return over
+
+
+def cold_vs_warm(runs: int) -> None:
+    """Prints the median time to compute one record cold, warm and warm in process."""
+    from app.connect import forward  # pylint: disable=import-outside-toplevel
+
+    with tempfile.TemporaryDirectory() as tmp:
+        address = f"unix:{os.path.join(tmp, 'calculator.sock')}"
+        server = subprocess.Popen([sys.executable, "main.py", "--serve", address], cwd=ROOT,  # pylint: disable=consider-using-with
+                                  stdout=subprocess.PIPE, text=True)
+        try:
+            server.stdout.readline()  # "Calculator server listening on ..."
+            cold = run_times(["--batch", "-"], runs, stdin="+ 4 5\n")
+            warm = run_times(["--connect", address, "+ 4 5"], runs)
+            in_process = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                list(forward(address, ["+ 4 5"]))
+                in_process.append(time.perf_counter() - started)
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"\n{'one record':<20} {'median ms':>10}")
+    for name, times in (("cold", cold), ("warm", warm), ("warm, in process", in_process)):
+        print(f"{name:<20} {median(times) * 1000:>10.1f}")
+
+
+def main(argv=None) -> int:
+    """Runs the measurements. Returns 1 if --check is given and an entry point is over its budget."""
+    parser = argparse.ArgumentParser(description="Import time budget and cold vs. warm startup.")
+    parser.add_argument("--runs", type=int, default=10, help="runs per measurement (default: 10)")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 if an import budget is exceeded")
+    args = parser.parse_args(argv)
+
+    over = check_budgets(args.runs)
+    cold_vs_warm(args.runs)
+    if args.check and over:
+        print(f"\nOver budget: {', '.join(over)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
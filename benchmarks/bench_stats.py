@@ -0,0 +1,89 @@
+"""
+Benchmark of the streaming statistics: memory stays constant however many values are aggregated.
+
+A stream of random results is generated chunk by chunk with NumPy (so the input itself is never held in memory)
+and fed to one StreamStats. At every power of ten the script prints the memory held by the statistics
+(tracemalloc, after the chunk is released), the peak memory since the start and the throughput.
+Both memory columns stay flat from a thousand values to the end; only the quantile sketch moves values around.
+
+It also prints the speed of the pure Python path (value by value) and checks the merged statistics of 8 shards
+against one pass over the same values.
+
+Usage:
+    python -m benchmarks.bench_stats [values]
+
+The default is 1 billion values (several minutes; the memory columns are the point, not the time).
+"""
+
+import sys
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+
+from app.stats import StreamStats
+
+# Values generated and aggregated at a time.
+CHUNK = 1 << 16
+
+
+def stream(rng, count: int):
+    """Yields count random values, in NumPy chunks of at most CHUNK values."""
+    for start in range(0, count, CHUNK):
+        yield rng.standard_normal(min(CHUNK, count - start)) * 1e3
+
+
+def constant_memory(total: int) -> None:
+    """Aggregates total values and prints the memory used at every power of ten."""
+    rng = np.random.default_rng(42)
+    stats = StreamStats()
+    tracemalloc.start()
+    print(f"{'values':>15} {'held KiB':>10} {'peak KiB':>10} {'values/s':>14} {'p50':>10} {'p99':>10}")
+    started = perf_counter()
+    checkpoint = 1000
+    while stats.count < total:
+        size = min(checkpoint - stats.count, total - stats.count)
+        for chunk in stream(rng, size):
+            stats.update(chunk)
+        del chunk
+        held, peak = tracemalloc.get_traced_memory()
+        rate = stats.count / (perf_counter() - started)
+        p50, p99 = stats.sketch.quantiles([0.5, 0.99])
+        print(f"{stats.count:>15,} {held / 1024:>10,.1f} {peak / 1024:>10,.1f} {rate:>14,.0f} {p50:>10.2f} {p99:>10.2f}")
+        checkpoint *= 10
+    tracemalloc.stop()
+    print(f"sum {stats.sum:.6g}, mean {stats.mean:.6g}, stdev {stats.stdev:.6g}, "
+          f"sketch {len(stats.sketch)} values (k={stats.sketch.k})")
+
+
+def python_path(count: int = 200_000) -> None:
+    """Prints the speed of adding values one at a time."""
+    values = np.random.default_rng(7).standard_normal(count).tolist()
+    started = perf_counter()
+    StreamStats().update(values)
+    seconds = perf_counter() - started
+    print(f"\npure Python path: {count / seconds:,.0f} values/s ({seconds / count * 1e9:,.0f} ns per value)")
+
+
+def shards(count: int = 1_000_000, parts: int = 8) -> None:
+    """Checks that merging the statistics of shards gives the same count, sum, min and max as one pass."""
+    values = np.random.default_rng(3).standard_normal(count) * 1e3
+    whole = StreamStats().update(values)
+    merged = StreamStats()
+    for part in np.array_split(values, parts):
+        merged.merge(StreamStats().update(part))
+    same = (merged.count, merged.sum, merged.min, merged.max) == (whole.count, whole.sum, whole.min, whole.max)
+    print(f"{parts} merged shards: count/sum/min/max identical to one pass: {same}, "
+          f"variance differs by {abs(merged.variance / whole.variance - 1):.1e}, "
+          f"median {merged.quantile(0.5):.3f} vs {whole.quantile(0.5):.3f}")
+
+
+def main(total: int = 1_000_000_000) -> None:
+    """Runs every measurement and prints the results."""
+    constant_memory(total)
+    python_path()
+    shards()
+
+
+if __name__ == "__main__":
+    main(int(float(sys.argv[1])) if len(sys.argv) > 1 else 1_000_000_000)
@@ -0,0 +1,87 @@
+"""
+Benchmark of the shared result store: batch jobs run by several worker processes, cold and warm.
+
+The script writes a job of random 'op a b' lines and runs it with app.parallel (several worker processes)
+three times for every workload: without a store, with an empty store (cold: every result is computed and
+written) and again with the filled store (warm: every result is read). Every output is checked against
+the run without a store. The workloads are:
+- the float operators + - * / (each costs well under a microsecond),
+- the same operators with the decimal backend at 2000 digits,
+- a simulated expensive operator '~' (a pure-Python loop, registered for the benchmark only).
+A lookup costs some tens of microseconds per record (building the key, reading and decoding the row), so the
+store only pays off for operations that cost more than that, like with app.cache.ResultCache.
+
+Usage:
+    python -m benchmarks.bench_store [lines] [workers]
+"""
+
+import io
+import os
+import random
+import sys
+import tempfile
+from time import perf_counter
+
+from app.backends import DecimalBackend, using_backend
+from app.operations import Operation
+from app.parallel import run_batch_parallel
+from app.registry import registry
+from app.store import ResultStore, install, uninstall
+
+
+def expensive_add(a: float, b: float) -> float:
+    """Operation.add plus some busy work, standing in for a costly operation."""
+    total = 0.0
+    for i in range(2000):
+        total += i
+    return Operation.add(a, b) + total * 0.0
+
+
+# workload name -> (backend, operator symbols)
+WORKLOADS = {
+    "float + - * /": ("float", "+-*/"),
+    "decimal 2000 digits": (DecimalBackend(2000), "+-*/"),
+    "expensive operator": ("float", "~"),
+}
+
+
+def run(lines, workers: int, store_path: str = None):
+    """Runs the job, with the store at store_path if one is given. Returns (output, seconds)."""
+    store = install(ResultStore(store_path)) if store_path else None
+    out = io.StringIO()
+    started = perf_counter()
+    try:
+        run_batch_parallel(lines, out, workers=workers, chunksize=5000)
+    finally:
+        if store is not None:
+            uninstall()
+            store.close()
+    return out.getvalue(), perf_counter() - started
+
+
+def main(count: int = 50_000, workers: int = 4) -> None:
+    """Runs every workload without a store, cold and warm, and prints the times."""
+    registry.register('~', expensive_add, name='expensive_add', description='simulated expensive operation')
+    print(f"{count:,} lines per job, {workers} worker processes\n")
+    print(f"{'workload':<20} {'distinct':>9} {'no store s':>10} {'cold s':>8} {'warm s':>8} {'warm speedup':>13}")
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for number, (name, (backend, symbols)) in enumerate(WORKLOADS.items()):
+                rng = random.Random(5)
+                # Operands from a small pool, so the job repeats records like overlapping calculation sets do.
+                lines = [f"{rng.choice(symbols)} {rng.randint(1, 999) / 7:.6f} {rng.randint(1, 99) / 3:.6f}"
+                         for _ in range(count)]
+                with using_backend(backend):
+                    expected, plain = run(lines, workers)
+                    path = os.path.join(directory, f"results{number}.db")
+                    cold_output, cold = run(lines, workers, path)
+                    warm_output, warm = run(lines, workers, path)
+                assert cold_output == warm_output == expected, name
+                print(f"{name:<20} {len(set(lines)):>9,} {plain:>10.2f} {cold:>8.2f} {warm:>8.2f} "
+                      f"{plain / warm:>12.2f}x")
+    finally:
+        registry.unregister('~')
+
+
+if __name__ == "__main__":
+    main(int(float(sys.argv[1])) if len(sys.argv) > 1 else 50_000, int(sys.argv[2]) if len(sys.argv) > 2 else 4)
@@ -0,0 +1,186 @@
+"""
+A small, stable timing harness for the benchmark suite.
+
+Every benchmark is a function that runs some work 'inner' times (e.g. 1000 calculations).
+measure() first runs it once to warm up, then picks a loop count so that one repeat takes at
+least min_time seconds (like timeit's autorange), and times several repeats with the garbage
+collector disabled. The results are reported per single operation (seconds / (loops * inner)).
+
+Results are saved as JSON together with the Python version, the platform and the git commit,
+so two runs can be compared with compare(): a benchmark whose best time got slower by more than
+the threshold (10% by default) is reported as a regression.
+"""
+
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+# Default fractional slowdown that counts as a regression (0.10 = 10% slower).
+DEFAULT_THRESHOLD = 0.10
+
+
+@dataclass
+class Result:
+    """Timing of one benchmark. All times are seconds per single operation."""
+    name: str
+    loops: int
+    inner: int
+    repeats: int
+    best: float
+    median: float
+    stdev: float
+
+    @property
+    def ops_per_sec(self) -> float:
+        """Operations per second, from the best time."""
+        return 1.0 / self.best
+
+
+@dataclass
+class Benchmark:
+    """A registered benchmark: func runs the work inner times; setup (optional) runs once before timing."""
+    name: str
+    func: Callable[[], object]
+    inner: int = 1
+    setup: Optional[Callable[[], object]] = None
+
+
+class Comparison(NamedTuple):
+    """How one benchmark changed between a baseline run and the current run."""
+    name: str
+    baseline: float
+    current: float
+    change: float  # fractional change of the best time, e.g. 0.25 = 25% slower
+    regressed: bool
+
+
+def _time_loops(func: Callable[[], object], loops: int) -> float:
+    """Returns the wall-clock seconds of calling func loops times, with the garbage collector off."""
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        return time.perf_counter() - started
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def measure(benchmark: Benchmark, repeats: int = 5, min_time: float = 0.1) -> Result:
+    """Times a benchmark and returns its Result (see the module docstring for the method)."""
+    if benchmark.setup is not None:
+        benchmark.setup()
+    func = benchmark.func
+    func()  # warm up caches and lazy imports
+
+    loops = 1
+    while True:
+        elapsed = _time_loops(func, loops)
+        if elapsed >= min_time:
+            break
+        loops *= 2 if elapsed > min_time / 10 else 10
+
+    per_op = [_time_loops(func, loops) / (loops * benchmark.inner) for _ in range(repeats)]
+    return Result(
+        name=benchmark.name,
+        loops=loops,
+        inner=benchmark.inner,
+        repeats=repeats,
+        best=min(per_op),
+        median=statistics.median(per_op),
+        stdev=statistics.stdev(per_op) if repeats > 1 else 0.0,
+    )
+
+
+def git_commit() -> Optional[str]:
+    """Returns the short hash of the current git commit, or None outside a git checkout."""
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.stdout.strip()
+
+
+def run(benchmarks: List[Benchmark], repeats: int = 5, min_time: float = 0.1,
+        report: Callable[[Result], None] = None) -> dict:
+    """
+    Measures every benchmark and returns the run as a JSON-ready dict:
+        {"meta": {...}, "results": {name: {best, median, ...}}}
+    report is called with each Result as soon as it is measured.
+    """
+    results = {}
+    for benchmark in benchmarks:
+        result = measure(benchmark, repeats, min_time)
+        results[result.name] = asdict(result)
+        if report is not None:
+            report(result)
+    return {
+        "meta": {
+            "python": sys.version.split()[0],
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "repeats": repeats,
+            "min_time": min_time,
+        },
+        "results": results,
+    }
+
+
+def save(run_data: dict, path: str) -> None:
+    """Writes a run returned by run() to path as JSON."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(run_data, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def load(path: str) -> dict:
+    """Reads a run saved by save()."""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD) -> List[Comparison]:
+    """
+    Compares the best times of the benchmarks present in both runs.
+    A benchmark regressed if its best time grew by more than threshold (a fraction).
+    """
+    comparisons = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        change = result["best"] / base["best"] - 1.0
+        comparisons.append(Comparison(name, base["best"], result["best"], change, change > threshold))
+    return comparisons
+
+
+def format_result(result: Result) -> str:
+    """Returns one line describing a Result."""
+    return (f"{result.name:<36} {result.best * 1e9:>12,.1f} ns/op  median {result.median * 1e9:>12,.1f} ns/op  "
+            f"{result.ops_per_sec:>14,.0f} ops/s")
+
+
+def format_comparison(comparisons: List[Comparison]) -> str:
+    """Returns a table of comparisons, marking regressions."""
+    lines = [f"{'benchmark':<36} {'baseline ns':>12} {'current ns':>12} {'change':>8}"]
+    for c in comparisons:
+        flag = "  REGRESSION" if c.regressed else ""
+        lines.append(f"{c.name:<36} {c.baseline * 1e9:>12,.1f} {c.current * 1e9:>12,.1f} {c.change:>+8.1%}{flag}")
+    return "\n".join(lines)
+
+
+def regressions(comparisons: List[Comparison]) -> Dict[str, float]:
+    """Returns {name: change} for the benchmarks that regressed."""
+    return {c.name: c.change for c in comparisons if c.regressed}
@@ -0,0 +1,86 @@
+"""
+Load generator for the calculator server.
+
+It opens a ClientPool to the server and runs a number of concurrent tasks, each sending requests
+one after another (or pipelined in groups with --pipeline) for a fixed duration.
+At the end it prints the requests per second and the p50/p99 latency per round trip.
+
+If no --address is given, a server is started in this process on a free local port.
+
+Usage:
+    python benchmarks/loadgen.py [--address HOST:PORT|unix:/path] [--concurrency 32]
+                                 [--pool-size 8] [--pipeline 1] [--duration 5]
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Make the 'app' package importable when the script is run directly.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.client import ClientPool  # pylint: disable=wrong-import-position
+from app.server import CalculatorServer  # pylint: disable=wrong-import-position
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    """Returns the value at the given fraction (0..1) of an already sorted list."""
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+async def worker(pool: ClientPool, pipeline: int, deadline: float, latencies: list) -> int:
+    """Sends requests until the deadline and records the latency of every round trip; returns the request count."""
+    rng = random.Random()
+    sent = 0
+    while time.perf_counter() < deadline:
+        requests = [(rng.choice('+-*/'), rng.uniform(-100, 100), rng.uniform(1, 100)) for _ in range(pipeline)]
+        started = time.perf_counter()
+        await pool.calculate_many(requests)
+        latencies.append(time.perf_counter() - started)
+        sent += pipeline
+    return sent
+
+
+async def main(args) -> None:
+    """Runs the load test and prints the summary."""
+    server = None
+    address = args.address
+    if address is None:
+        server = CalculatorServer()
+        await server.start()
+        address = server.address
+
+    latencies = []
+    async with ClientPool(address, size=args.pool_size) as pool:
+        started = time.perf_counter()
+        deadline = started + args.duration
+        counts = await asyncio.gather(
+            *(worker(pool, args.pipeline, deadline, latencies) for _ in range(args.concurrency))
+        )
+        elapsed = time.perf_counter() - started
+
+    if server is not None:
+        await server.stop()
+
+    latencies.sort()
+    print(f"address:      {address}")
+    print(f"requests:     {sum(counts):,} in {elapsed:.2f}s")
+    print(f"throughput:   {sum(counts) / elapsed:,.0f} requests/s")
+    print(f"latency p50:  {percentile(latencies, 0.50) * 1e3:.3f} ms per round trip")
+    print(f"latency p99:  {percentile(latencies, 0.99) * 1e3:.3f} ms per round trip")
+    print(f"latency mean: {statistics.fmean(latencies) * 1e3:.3f} ms per round trip")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load generator for the calculator server.")
+    parser.add_argument("--address", help="server address; default: start one in this process")
+    parser.add_argument("--concurrency", type=int, default=32, help="number of concurrent client tasks")
+    parser.add_argument("--pool-size", type=int, default=8, help="number of pooled connections")
+    parser.add_argument("--pipeline", type=int, default=1, help="requests sent per round trip")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds to run")
+    asyncio.run(main(parser.parse_args()))
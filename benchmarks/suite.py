@@ -0,0 +1,146 @@
+"""
+The benchmark suite of the calculator.
+
+It measures:
+- per-call overhead of the Operation methods and of dispatch through the operator registry
+- compiled expression evaluation
+- calculator() end to end, driven by scripted input (prompts and prints included)
+- the batch paths: Operation.add_many and the streaming batch mode
+
+Usage:
+    python -m benchmarks.suite                           # run and print
+    python -m benchmarks.suite --save results.json       # also save the results as JSON
+    python -m benchmarks.suite --compare baseline.json   # fail (exit 1) on a regression
+    python -m benchmarks.suite --filter batch --threshold 0.2 --repeats 7
+
+A typical workflow is to save a baseline on the main branch, then run --compare on a change.
+"""
+
+import argparse
+import builtins
+import contextlib
+import io
+import random
+import sys
+from typing import List
+
+from app.batch import run_batch
+from app.calculator import calculator
+from app.expressions import compile_expression
+from app.operations import Operation
+from app.registry import registry
+from benchmarks.harness import (
+    DEFAULT_THRESHOLD,
+    Benchmark,
+    compare,
+    format_comparison,
+    format_result,
+    load,
+    regressions,
+    run,
+    save,
+)
+
+# Number of operations done by one call of each benchmark function.
+CALLS = 1_000
+REPL_CALCULATIONS = 200
+BATCH_ROWS = 10_000
+VECTOR_ROWS = 100_000
+
+_rng = random.Random(42)
+_pairs = [(_rng.uniform(-1e6, 1e6), _rng.uniform(1, 1e6)) for _ in range(CALLS)]
+_xs = [_rng.uniform(-1e6, 1e6) for _ in range(VECTOR_ROWS)]
+_ys = [_rng.uniform(1, 1e6) for _ in range(VECTOR_ROWS)]
+_batch_lines = [f"{'+-*/'[i % 4]} {_rng.uniform(-1e3, 1e3):.3f} {_rng.uniform(1, 1e3):.3f}\n" for i in range(BATCH_ROWS)]
+_repl_inputs = [field for i in range(REPL_CALCULATIONS) for field in ('+-*/'[i % 4], str(i), str(i % 7 + 1))] + ['exit']
+
+
+def bench_operation_add():
+    add = Operation.add
+    for a, b in _pairs:
+        add(a, b)
+
+
+def bench_operation_divide():
+    divide = Operation.divide
+    for a, b in _pairs:
+        divide(a, b)
+
+
+def bench_registry_dispatch():
+    functions = registry.functions
+    for a, b in _pairs:
+        functions['*'](a, b)
+
+
+_formula = compile_expression("(a + b) * c / 2 - a")
+
+
+def bench_expression_evaluate():
+    formula = _formula
+    for a, b in _pairs:
+        formula({'a': a, 'b': b, 'c': 3.0})
+
+
+def bench_add_many():
+    Operation.add_many(_xs, _ys)
+
+
+def bench_batch_mode():
+    run_batch(_batch_lines, io.StringIO())
+
+
+def bench_repl_end_to_end():
+    inputs = iter(_repl_inputs)
+    original_input = builtins.input
+    builtins.input = lambda prompt="": next(inputs)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            calculator()
+    finally:
+        builtins.input = original_input
+
+
+BENCHMARKS: List[Benchmark] = [
+    Benchmark("operation.add", bench_operation_add, inner=CALLS),
+    Benchmark("operation.divide", bench_operation_divide, inner=CALLS),
+    Benchmark("registry.dispatch", bench_registry_dispatch, inner=CALLS),
+    Benchmark("expression.evaluate", bench_expression_evaluate, inner=CALLS),
+    Benchmark("batch.add_many", bench_add_many, inner=VECTOR_ROWS),
+    Benchmark("batch.run_batch", bench_batch_mode, inner=BATCH_ROWS),
+    Benchmark("repl.calculation", bench_repl_end_to_end, inner=REPL_CALCULATIONS),
+]
+
+
+def main(argv=None) -> int:
+    """Runs the suite; returns 1 if --compare found a regression, otherwise 0."""
+    parser = argparse.ArgumentParser(description="Calculator benchmark suite.")
+    parser.add_argument("--save", metavar="PATH", help="save the results as JSON to PATH")
+    parser.add_argument("--compare", metavar="PATH", help="compare with a saved baseline run")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="fractional slowdown counted as a regression (default: 0.10)")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this text")
+    parser.add_argument("--repeats", type=int, default=5, help="timed repeats per benchmark (default: 5)")
+    parser.add_argument("--min-time", type=float, default=0.1, help="minimum seconds per repeat (default: 0.1)")
+    args = parser.parse_args(argv)
+
+    selected = [b for b in BENCHMARKS if args.filter in b.name]
+    current = run(selected, args.repeats, args.min_time, report=lambda r: print(format_result(r), flush=True))
+
+    if args.save:
+        save(current, args.save)
+        print(f"Saved results to {args.save}")
+
+    if args.compare:
+        comparisons = compare(load(args.compare), current, args.threshold)
+        print()
+        print(format_comparison(comparisons))
+        regressed = regressions(comparisons)
+        if regressed:
+            print(f"\n{len(regressed)} benchmark(s) slower than the {args.threshold:.0%} threshold.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,209 @@
 # This is the main file of our program. It is responsible for starting the calculator application.
-# we import the calculator function from the calculator module.
-from app.calculator import calculator
+# Only argparse is imported at the top: every mode imports the modules it needs when it runs,
+# so short runs (e.g. --connect) do not pay for loading the whole calculator.
+import argparse
+import os
+
+
+def main(argv=None):
+    """Parses the command line, sets up the session (backend, metrics) and runs the chosen mode."""
+    parser = argparse.ArgumentParser(description="REPL calculator for basic arithmetic operations.")
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="read 'op a b' records from FILE ('-' for standard input) and print one result per line",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        metavar="N",
+        help="with --batch, compute the records across N worker processes",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=10_000,
+        metavar="ROWS",
+        help="with --batch, number of records per chunk (default: 10000)",
+    )
+    parser.add_argument(
+        "--output",
+        metavar="FILE",
+        help="with --batch, write the results to FILE instead of standard output",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        metavar="FILE",
+        help="with --batch and --output, save the progress to FILE and resume from it if it exists",
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=100_000,
+        metavar="LINES",
+        help="with --checkpoint, number of input lines between two checkpoints (default: 100000)",
+    )
+    parser.add_argument(
+        "--store",
+        metavar="FILE",
+        help="look results up in the shared result store FILE (an SQLite database) and add new ones to it",
+    )
+    parser.add_argument(
+        "--convert",
+        nargs=2,
+        metavar=("CSV", "NPY"),
+        help="convert a CSV file of operands ('a,b' per line) to the binary columnar format and exit",
+    )
+    parser.add_argument(
+        "--columns",
+        nargs=3,
+        metavar=("OP", "OPERANDS", "RESULTS"),
+        help="compute 'a OP b' for every row of a columnar OPERANDS file and write the RESULTS file",
+    )
+    parser.add_argument(
+        "--serve",
+        metavar="ADDRESS",
+        help="run the calculator server on ADDRESS ('host:port' or 'unix:/path') until Ctrl+C",
+    )
+    parser.add_argument(
+        "--connect",
+        metavar="ADDRESS",
+        help="forward the RECORDs (or standard input) to the calculator server running on ADDRESS and print the results",
+    )
+    parser.add_argument(
+        "records",
+        nargs="*",
+        metavar="RECORD",
+        help="with --connect, records to compute, e.g. '+ 4 5'",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=("float", "decimal", "fraction", "interval"),
+        default="float",
+        help="numeric backend used for the calculations (default: float)",
+    )
+    parser.add_argument(
+        "--precision",
+        type=int,
+        metavar="DIGITS",
+        help="with --backend decimal, number of significant digits (default: 28)",
+    )
+    parser.add_argument(
+        "--history",
+        type=int,
+        default=1000,
+        metavar="N",
+        help="number of calculations kept in the REPL history (default: 1000)",
+    )
+    parser.add_argument(
+        "--journal",
+        metavar="FILE",
+        help="rebuild the REPL session from the journal FILE (if it exists) and append new calculations to it",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help="collect metrics and write them to FILE on exit (JSON if FILE ends in .json, else Prometheus text)",
+    )
+    args = parser.parse_args(argv)
+    if args.checkpoint and not (args.batch and args.output):
+        parser.error("--checkpoint needs --batch FILE and --output FILE")
+
+    # A client of a warm server only needs the socket module, so it skips everything else.
+    if args.connect:
+        connect(args)
+        return
+
+    # Metrics are only collected when asked for, so normal runs do not pay for them.
+    metrics = None
+    if args.metrics:
+        from app import instrumentation  # pylint: disable=import-outside-toplevel
+        metrics = instrumentation.enable()
+
+    # Choose the numeric backend for this session.
+    from app.backends import DecimalBackend, set_backend  # pylint: disable=import-outside-toplevel
+    if args.backend == "decimal" and args.precision:
+        set_backend(DecimalBackend(precision=args.precision))
+    else:
+        set_backend(args.backend)
+
+    # With a result store, every operator looks its results up in the store before computing them.
+    store = None
+    if args.store:
+        from app import store as result_store  # pylint: disable=import-outside-toplevel
+        store = result_store.install(result_store.ResultStore(args.store))
+
+    try:
+        run(args)
+    finally:
+        if store is not None:
+            result_store.uninstall()
+            store.close()
+        if metrics is not None:
+            with open(args.metrics, "w", encoding="utf-8") as f:
+                f.write(metrics.to_json() if args.metrics.endswith(".json") else metrics.to_prometheus())
+
+
+def connect(args):
+    """Forwards the records on the command line (or standard input) to a running server and prints the results."""
+    import sys  # pylint: disable=import-outside-toplevel
+    from app.connect import forward  # pylint: disable=import-outside-toplevel
+    for line in forward(args.connect, args.records or sys.stdin):
+        print(line)
+
+
+def run(args):
+    """Runs the mode chosen on the command line: batch, columnar, server or the interactive REPL."""
+    if args.convert or args.columns:
+        # The columnar format is only imported when it is used.
+        from app.columnar import compute_columns, csv_to_columns  # pylint: disable=import-outside-toplevel
+        if args.convert:
+            print(f"Converted {csv_to_columns(*args.convert):,} rows.")
+        else:
+            print(f"Computed {compute_columns(*args.columns):,} rows.")
+    elif args.checkpoint:
+        # A checkpointed batch job resumes from its checkpoint file if it exists.
+        from app.checkpoint import run_checkpointed  # pylint: disable=import-outside-toplevel
+        records, errors = run_checkpointed(args.batch, args.output, args.checkpoint, every=args.checkpoint_every,
+                                           workers=args.workers or 1, chunk_size=args.chunksize)
+        print(f"Computed {records:,} records ({errors:,} errors).")
+    elif args.batch:
+        # Batch mode is only imported when it is used.
+        from app.batch import run_batch_path  # pylint: disable=import-outside-toplevel
+        # With a result store, the records go through the chunked runner, which looks up a whole chunk at once.
+        workers = args.workers or (1 if args.store else None)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as out:
+                run_batch_path(args.batch, out, chunk_size=args.chunksize, workers=workers)
+        else:
+            run_batch_path(args.batch, chunk_size=args.chunksize, workers=workers)
+    elif args.serve:
+        import asyncio  # pylint: disable=import-outside-toplevel
+        from app.server import serve  # pylint: disable=import-outside-toplevel
+        try:
+            asyncio.run(serve(args.serve))
+        except KeyboardInterrupt:
+            print("Server stopped.")
+    else:
+        # The history keeps the last calculations; with a journal, the previous session is replayed first.
+        from app.history import History, Journal, replay  # pylint: disable=import-outside-toplevel
+        history, variables, journal = History(args.history), {}, None
+        if args.journal:
+            if os.path.exists(args.journal):
+                replay(args.journal, history, variables)
+                print(f"Replayed {history.count:,} calculations from {args.journal}.")
+            journal = Journal(args.journal)
+
+        # Now, we import the calculator function from the calculator module and use it to start the calculator application.
+        from app.calculator import calculator  # pylint: disable=import-outside-toplevel
+        # This function will run an infinite loop, allowing the user to perform calculations until they choose to exit.
+        try:
+            calculator(history, journal, variables)
+        finally:
+            if journal is not None:
+                journal.close()
 
 
 #__name__ is a special variable in Python that is set to "__main__" when the script is run directly.
 if __name__ == "__main__":
-    # Now, we use the calculator function to start the calculator application.
-    # This function will run an infinite loop, allowing the user to perform calculations until they choose to exit.
-    calculator()
+    main()
@@ -0,0 +1,378 @@
+"""
+A randomized differential test harness for the arithmetic operations.
+
+Millions of operand pairs are generated in bulk with NumPy: random 64-bit patterns (which cover huge, tiny and
+subnormal numbers and NaN), special values (inf, -inf, NaN, 0.0, -0.0, the smallest subnormal, the largest float, ...),
+small integers, and pairs built to cancel out (b = a, b = -a, b = the next float after a).
+Every pair goes through every implementation of the four operations:
+- scalar:      Operation.add, subtract, multiply, divide
+- registry:    registry.dispatch (what the REPL, expressions and the server use)
+- rows:        app.parallel.evaluate_rows (the parallel job runner)
+- batch_text:  app.batch.evaluate_records on 'op a b' lines (parse, compute, format, parse back)
+- many_list:   Operation.*_many on lists (the pure Python batch path)
+- many_numpy:  Operation.*_many on NumPy arrays (the vectorized batch path)
+
+and every result is compared bit for bit (all NaNs count as the same value, but 0.0 and -0.0 do not) with
+reference(), which computes the exact result with fractions and rounds it once, following IEEE 754 for
+infinities, NaN and signed zeros. Division by zero must be reported by every implementation
+(a ValueError, an 'error: ...' line or the 'nan' policy of divide_many).
+
+A mismatch is shrunk to a minimal reproduction (see shrink()) before it is reported.
+Chunks of pairs are checked in parallel with app.parallel.ordered_map; every chunk has its own seed,
+so a run gives the same pairs for any number of workers.
+
+Run it from the command line for bigger runs:
+    python -m tests.differential --pairs 10000000 --workers 4 --seed 1
+
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+from fractions import Fraction
+from functools import partial
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app.batch import evaluate_records, read_records
+from app.operations import Operation
+from app.parallel import evaluate_rows, ordered_map
+from app.registry import registry
+
+# The operations under test, by symbol: (scalar method, batch method).
+OPERATIONS = {
+    '+': (Operation.add, Operation.add_many),
+    '-': (Operation.subtract, Operation.subtract_many),
+    '*': (Operation.multiply, Operation.multiply_many),
+    '/': (Operation.divide, Operation.divide_many),
+}
+
+# Values that are mixed into the generated operands on purpose.
+SPECIAL_VALUES = np.array([
+    0.0, -0.0, 1.0, -1.0, 0.5, 2.0, 3.0, 10.0, 0.1,
+    math.inf, -math.inf, math.nan,
+    5e-324, -5e-324,                                  # smallest subnormals
+    2.2250738585072014e-308, -2.2250738585072014e-308,  # smallest normal floats
+    2.225073858507201e-308,                           # largest subnormal
+    1.7976931348623157e308, -1.7976931348623157e308,  # largest floats
+    2.0 ** 53, 2.0 ** 53 + 2, 2.0 ** -1022, 2.0 ** 1023,
+])
+
+# The result of a division by zero, in every implementation's results.
+ZERO_DIVISION = 'division by zero'
+
+# Number of pairs checked by every worker task.
+DEFAULT_CHUNK = 50_000
+
+Result = object  # a float, or ZERO_DIVISION
+
+
+class Mismatch(NamedTuple):
+    """An implementation whose result differs from the reference for one pair of operands."""
+    symbol: str
+    a: float
+    b: float
+    implementation: str
+    got: Result
+    expected: Result
+
+    def __str__(self) -> str:
+        return (f"{self.implementation}: {self.a!r} {self.symbol} {self.b!r} "
+                f"({_hex(self.a)} {self.symbol} {_hex(self.b)}) gave {self.got!r}, expected {self.expected!r}")
+
+
+def _hex(x) -> str:
+    return x.hex() if isinstance(x, float) else repr(x)
+
+
+#----------------------------------------------------------------
+# Generating operands
+#----------------------------------------------------------------
+
+def generate(rng: np.random.Generator, count: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns two float64 arrays of count operands each, mixing every kind of value described above."""
+    def operands() -> np.ndarray:
+        kinds = rng.integers(0, 4, count)
+        values = rng.integers(0, 2 ** 64, count, dtype=np.uint64).view(np.float64)  # any bit pattern
+        specials = SPECIAL_VALUES[rng.integers(0, len(SPECIAL_VALUES), count)]
+        small = rng.integers(-100, 101, count).astype(np.float64)
+        ordinary = rng.standard_normal(count) * 10.0 ** rng.integers(-10, 11, count)
+        return np.select([kinds == 0, kinds == 1, kinds == 2], [values, specials, small], ordinary)
+
+    a = operands()
+    b = operands()
+    # A quarter of the pairs are built to cancel out or to be exactly equal.
+    related = rng.integers(0, 8, count)
+    b = np.where(related == 0, a, b)
+    b = np.where(related == 1, -a, b)
+    with np.errstate(all='ignore'):
+        b = np.where(related == 2, np.nextafter(a, np.inf), b)
+    return a, b
+
+
+#----------------------------------------------------------------
+# Reference semantics
+#----------------------------------------------------------------
+
+def _negative(x: float) -> bool:
+    return math.copysign(1.0, x) < 0
+
+
+def reference(symbol: str, a: float, b: float) -> Result:
+    """
+    Returns the IEEE 754 double result of a <symbol> b, computed from the exact rational result rounded once,
+    or ZERO_DIVISION for a division by zero (the calculator checks the divisor first, even for NaN).
+    """
+    if symbol == '/' and b == 0:
+        return ZERO_DIVISION
+    if math.isnan(a) or math.isnan(b):
+        return math.nan
+    if symbol == '-':
+        symbol, b = '+', -b
+    if math.isinf(a) or math.isinf(b):
+        return _infinite(symbol, a, b)
+
+    x, y = Fraction(a), Fraction(b)
+    exact = x + y if symbol == '+' else x * y if symbol == '*' else x / y
+    if exact == 0:
+        if symbol == '+':  # x + (-x) is +0.0; only -0.0 + -0.0 is -0.0
+            return -0.0 if _negative(a) and _negative(b) else 0.0
+        return -0.0 if _negative(a) != _negative(b) else 0.0
+    try:
+        return float(exact)  # int / int, correctly rounded (also for subnormal and underflowing results)
+    except OverflowError:
+        return math.inf if exact > 0 else -math.inf
+
+
+def _infinite(symbol: str, a: float, b: float) -> float:
+    """The IEEE 754 result of an addition, multiplication or division with an infinite operand."""
+    sign = -1.0 if _negative(a) != _negative(b) else 1.0
+    if symbol == '+':
+        if math.isinf(a) and math.isinf(b) and a != b:
+            return math.nan  # inf + -inf
+        return a if math.isinf(a) else b
+    if symbol == '*':
+        return math.nan if a == 0 or b == 0 else math.copysign(math.inf, sign)
+    if math.isinf(a) and math.isinf(b):
+        return math.nan  # inf / inf
+    return math.copysign(math.inf, sign) if math.isinf(a) else math.copysign(0.0, sign)
+
+
+#----------------------------------------------------------------
+# The implementations under test
+#----------------------------------------------------------------
+
+def _scalar(func: Callable, a: List[float], b: List[float]) -> List[Result]:
+    results = []
+    for x, y in zip(a, b):
+        try:
+            results.append(func(x, y))
+        except ValueError:
+            results.append(ZERO_DIVISION)
+    return results
+
+
+def run_scalar(symbol: str, a: List[float], b: List[float]) -> List[Result]:
+    """Operation.add, subtract, multiply or divide, pair by pair."""
+    return _scalar(OPERATIONS[symbol][0], a, b)
+
+
+def run_registry(symbol: str, a: List[float], b: List[float]) -> List[Result]:
+    """registry.dispatch, pair by pair."""
+    return _scalar(partial(registry.dispatch, symbol), a, b)
+
+
+def run_rows(symbol: str, a: List[float], b: List[float]) -> List[Result]:
+    """app.parallel.evaluate_rows on (op, a, b) rows."""
+    results = evaluate_rows([(symbol, x, y) for x, y in zip(a, b)])
+    return [ZERO_DIVISION if isinstance(result, ValueError) else result for result in results]
+
+
+def run_batch_text(symbol: str, a: List[float], b: List[float]) -> List[Result]:
+    """Batch mode on 'op a b' text lines, with the output lines parsed back into floats."""
+    lines = [f"{symbol} {x!r} {y!r}" for x, y in zip(a, b)]
+    return [ZERO_DIVISION if line.startswith('error: ') else float(line)
+            for line in evaluate_records(read_records(lines))]
+
+
+def _many(symbol: str, a, b) -> List[Result]:
+    """Runs the batch method, with the 'nan' zero division policy and the zero divisor mask for '/'."""
+    batch = OPERATIONS[symbol][1]
+    if symbol != '/':
+        return list(batch(a, b))
+    results = list(batch(a, b, on_zero='nan'))
+    return [ZERO_DIVISION if zero else result for result, zero in zip(results, Operation.zero_divisors(b))]
+
+
+def run_many_list(symbol: str, a: List[float], b: List[float]) -> List[Result]:
+    """Operation.*_many on lists (the pure Python batch path)."""
+    return _many(symbol, a, b)
+
+
+def run_many_numpy(symbol: str, a: List[float], b: List[float]) -> List[Result]:
+    """Operation.*_many on NumPy arrays (the vectorized batch path)."""
+    with np.errstate(all='ignore'):  # inf - inf and the like are expected here
+        return [float(x) if isinstance(x, np.floating) else x for x in _many(symbol, np.array(a), np.array(b))]
+
+
+IMPLEMENTATIONS: Dict[str, Callable[[str, List[float], List[float]], List[Result]]] = {
+    'scalar': run_scalar,
+    'registry': run_registry,
+    'rows': run_rows,
+    'batch_text': run_batch_text,
+    'many_list': run_many_list,
+    'many_numpy': run_many_numpy,
+}
+
+
+#----------------------------------------------------------------
+# Checking and shrinking
+#----------------------------------------------------------------
+
+def same(x: Result, y: Result) -> bool:
+    """True if the results are bit for bit the same float (any NaN matches any NaN) or both ZERO_DIVISION."""
+    if isinstance(x, float) and isinstance(y, float):
+        return (math.isnan(x) and math.isnan(y)) or (x == y and _negative(x) == _negative(y))
+    return x == y
+
+
+def check(symbol: str, a: List[float], b: List[float],
+          implementations: Optional[Dict[str, Callable]] = None) -> List[Mismatch]:
+    """Runs every implementation on the pairs and returns a Mismatch for every result that differs from the reference."""
+    implementations = IMPLEMENTATIONS if implementations is None else implementations
+    expected = [reference(symbol, x, y) for x, y in zip(a, b)]
+    mismatches = []
+    for name, implementation in implementations.items():
+        for x, y, got, want in zip(a, b, implementation(symbol, a, b), expected):
+            if not same(got, want):
+                mismatches.append(Mismatch(symbol, x, y, name, got, want))
+    return mismatches
+
+
+def simplicity(x: float) -> Tuple:
+    """Sort key of how simple a value is to read: finite before infinite before NaN, then small exponents and few digits."""
+    if math.isnan(x):
+        return (2,)
+    if math.isinf(x):
+        return (1, _negative(x))
+    if x == 0:
+        return (0, -1, 0, _negative(x))
+    mantissa, exponent = math.frexp(abs(x))
+    bits = 0
+    while mantissa and mantissa != int(mantissa):
+        mantissa *= 2
+        bits += 1
+    return (0, abs(exponent - 1), bits, _negative(x))
+
+
+def _candidates(x: float) -> Iterator[float]:
+    """Yields values that may be simpler than x."""
+    yield from (0.0, 1.0, -1.0, 2.0)
+    if math.isnan(x) or math.isinf(x):
+        yield 1e308
+        return
+    yield -x
+    yield float(math.trunc(x))
+    mantissa, exponent = math.frexp(x)
+    for bits in range(1, 53):  # fewer significant bits, rounded down and to nearest
+        yield math.ldexp(math.trunc(mantissa * 2 ** bits), exponent - bits)
+        yield math.ldexp(round(mantissa * 2 ** bits), exponent - bits)
+    for step in (512, 64, 8, 1):  # smaller exponents
+        if abs(exponent) > step:
+            yield math.ldexp(mantissa, exponent - step if exponent > 0 else exponent + step)
+
+
+def shrink(fails: Callable[[float, float], bool], a: float, b: float) -> Tuple[float, float]:
+    """
+    Returns the simplest pair that still fails, starting from a failing pair (a, b).
+    Each operand is repeatedly replaced by a simpler candidate (0, 1, fewer significant bits, a smaller exponent)
+    as long as the pair keeps failing; every step makes the pair strictly simpler, so this always ends.
+    """
+    pair = [a, b]
+    changed = True
+    while changed:
+        changed = False
+        for i in (0, 1):
+            for candidate in _candidates(pair[i]):
+                if simplicity(candidate) >= simplicity(pair[i]):
+                    continue
+                trial = pair.copy()
+                trial[i] = candidate
+                if fails(*trial):
+                    pair = trial
+                    changed = True
+                    break
+    return pair[0], pair[1]
+
+
+def shrink_mismatch(mismatch: Mismatch, implementations: Optional[Dict[str, Callable]] = None) -> Mismatch:
+    """Returns the minimal reproduction of a mismatch, for the same implementation."""
+    implementations = IMPLEMENTATIONS if implementations is None else implementations
+    only = {mismatch.implementation: implementations[mismatch.implementation]}
+
+    def fails(a: float, b: float) -> bool:
+        return bool(check(mismatch.symbol, [a], [b], only))
+
+    a, b = shrink(fails, mismatch.a, mismatch.b)
+    return check(mismatch.symbol, [a], [b], only)[0]
+
+
+#----------------------------------------------------------------
+# Running in bulk
+#----------------------------------------------------------------
+
+def check_chunk(task: Tuple[int, int, int], symbols: str = ''.join(OPERATIONS),
+                implementations: Optional[Dict[str, Callable]] = None) -> List[Mismatch]:
+    """
+    Generates the pairs of one chunk from its own seed (seed, index, count) and checks every operation on them.
+    Returns the shrunk mismatches, at most one per operation and implementation.
+    """
+    seed, index, count = task
+    a, b = generate(np.random.default_rng([seed, index]), count)
+    a, b = a.tolist(), b.tolist()
+    found = {}
+    for symbol in symbols:
+        for mismatch in check(symbol, a, b, implementations):
+            key = (symbol, mismatch.implementation)
+            if key not in found:
+                found[key] = shrink_mismatch(mismatch, implementations)
+    return list(found.values())
+
+
+def run(pairs: int, seed: int = 0, workers: int = 1, chunk: int = DEFAULT_CHUNK,
+        implementations: Optional[Dict[str, Callable]] = None) -> List[Mismatch]:
+    """Checks pairs random operand pairs for every operation across workers processes and returns the mismatches."""
+    tasks = [(seed, index, min(chunk, pairs - start)) for index, start in enumerate(range(0, pairs, chunk))]
+    func = partial(check_chunk, implementations=implementations)
+    mismatches = {}
+    for found in ordered_map(func, tasks, workers):
+        for mismatch in found:
+            mismatches.setdefault((mismatch.symbol, mismatch.implementation), mismatch)
+    return list(mismatches.values())
+
+
+def main(argv=None) -> int:
+    """Runs the harness and prints the mismatches. Returns 1 if there are any."""
+    parser = argparse.ArgumentParser(description="Randomized differential test of the arithmetic operations.")
+    parser.add_argument("--pairs", type=int, default=1_000_000, help="operand pairs per operation (default: 1000000)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="pairs per worker task")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    mismatches = run(args.pairs, args.seed, args.workers, args.chunk)
+    seconds = time.perf_counter() - started
+    checked = args.pairs * len(OPERATIONS) * len(IMPLEMENTATIONS)
+    print(f"{args.pairs:,} pairs x {len(OPERATIONS)} operations x {len(IMPLEMENTATIONS)} implementations "
+          f"in {seconds:.1f} s ({checked / seconds:,.0f} results/s, {args.workers} workers)")
+    for mismatch in mismatches:
+        print(mismatch)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
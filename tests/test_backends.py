@@ -0,0 +1,213 @@
+"""
+Tests for the numeric backends.
+
+This module checks converting input for each backend, computing in the backend's context,
+choosing a backend per call and per session, and the accuracy of the summation methods.
+"""
+import math
+from decimal import Decimal
+from fractions import Fraction
+
+import pytest
+
+from app.backends import (
+    BACKENDS,
+    DecimalBackend,
+    FloatBackend,
+    FractionBackend,
+    calculate,
+    current_backend,
+    get_backend,
+    neumaier_sum,
+    reset_backend,
+    set_backend,
+    sum_values,
+    using_backend,
+)
+
+
+#----------------------------------------------------------------
+# Test cases for conversion
+#----------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "backend, value, expected",
+    [
+        ("float", "0.1", 0.1),
+        ("decimal", "0.1", Decimal("0.1")),
+        ("decimal", 0.1, Decimal("0.1")),
+        ("decimal", 3, Decimal(3)),
+        ("fraction", "0.1", Fraction(1, 10)),
+        ("fraction", 0.1, Fraction(1, 10)),
+        ("fraction", "1/3", Fraction(1, 3)),
+    ],
+    ids=[
+        "float_text",
+        "decimal_text",
+        "decimal_float_uses_repr",
+        "decimal_int",
+        "fraction_text",
+        "fraction_float_uses_repr",
+        "fraction_ratio"
+    ]
+)
+def test_convert(backend: str, value, expected):
+    """Test that each backend converts text and numbers to its own number type."""
+    result = BACKENDS[backend].convert(value)
+    assert result == expected and type(result) is type(expected)
+
+
+@pytest.mark.parametrize(
+    "backend, value",
+    [
+        ("float", "abc"),
+        ("decimal", "abc"),
+        ("decimal", Fraction(1, 3)),
+        ("fraction", "abc"),
+        ("fraction", "1/0"),
+        ("fraction", None),
+        ("fraction", "1e2x"),
+        ("fraction", "1e200000000"),
+        ("fraction", "1e-10001"),
+        ("fraction", "1" * 10_001),
+        ("interval", "1e200000000"),
+        ("interval", "0." + "1" * 10_001),
+    ],
+    ids=["float_text", "decimal_text", "decimal_fraction", "fraction_text", "fraction_zero_denominator", "fraction_none",
+         "fraction_bad_exponent", "fraction_huge_exponent", "fraction_tiny_exponent", "fraction_too_many_digits", "interval_huge_exponent",
+         "interval_too_many_digits"]
+)
+def test_convert_invalid(backend: str, value):
+    """Test that invalid input raises a ValueError for every backend."""
+    with pytest.raises(ValueError):
+        BACKENDS[backend].convert(value)
+
+
+def test_convert_size_limits():
+    """Test that number text up to the size limits is still read exactly."""
+    assert BACKENDS["fraction"].convert(" 1E10000 ") == 10 ** 10_000
+    assert BACKENDS["fraction"].convert("0." + "1" * 4_000) == Fraction(int("1" * 4_000), 10 ** 4_000)
+    assert BACKENDS["interval"].convert("1e-10000").lo == 0.0
+
+
+#----------------------------------------------------------------
+# Test cases for calculate
+#----------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "backend, expected",
+    [
+        ("float", 0.30000000000000004),
+        ("decimal", Decimal("0.3")),
+        ("fraction", Fraction(3, 10)),
+    ],
+    ids=["float", "decimal", "fraction"]
+)
+def test_calculate_per_call(backend: str, expected):
+    """Test choosing the backend for one call."""
+    assert calculate('+', '0.1', '0.2', backend=backend) == expected
+
+
+def test_decimal_context_precision_and_errors():
+    """Test that a decimal backend computes in its own context and raises ValueError for decimal signals."""
+    backend = DecimalBackend(precision=5)
+    assert calculate('/', 1, 3, backend=backend) == Decimal("0.33333")
+    assert repr(backend) == "DecimalBackend(precision=5, rounding='ROUND_HALF_EVEN')"
+    with pytest.raises(ValueError, match="Invalid decimal operation"):
+        calculate('-', 'Infinity', 'Infinity', backend=backend)
+    with pytest.raises(ValueError, match="Cannot divide by zero."):
+        calculate('/', 1, 0, backend=backend)
+
+
+def test_session_backend():
+    """Test setting the session backend with set_backend/reset_backend and using_backend."""
+    assert current_backend().name == 'float'
+    token = set_backend('fraction')
+    try:
+        assert calculate('/', 1, 3) == Fraction(1, 3)
+        with using_backend(DecimalBackend(precision=3)) as backend:
+            assert current_backend() is backend
+            assert calculate('/', 2, 3) == Decimal("0.667")
+        assert current_backend().name == 'fraction'
+    finally:
+        reset_backend(token)
+    assert current_backend().name == 'float'
+
+
+def test_get_backend():
+    """Test looking backends up by name, by instance and for the session."""
+    backend = FractionBackend()
+    assert get_backend(backend) is backend
+    assert get_backend('decimal') is BACKENDS['decimal']
+    assert get_backend() is current_backend()
+    assert repr(backend) == "FractionBackend()"
+    with pytest.raises(ValueError, match="Unknown backend: 'binary'"):
+        get_backend('binary')
+    with pytest.raises(ImportError, match="cannot import name 'BinaryBackend'"):
+        from app.backends import BinaryBackend  # pylint: disable=import-outside-toplevel,unused-import
+
+
+#----------------------------------------------------------------
+# Test cases for summation
+#----------------------------------------------------------------
+
+# 0.1 ten thousand times, whose exact decimal sum is 1000.
+TENTHS = [0.1] * 10_000
+
+
+@pytest.mark.parametrize(
+    "backend, expected",
+    [
+        (FloatBackend('fsum'), math.fsum(TENTHS)),
+        (FloatBackend('neumaier'), math.fsum(TENTHS)),
+        ("decimal", Decimal(1000)),
+        ("fraction", Fraction(1000)),
+    ],
+    ids=["fsum", "neumaier", "decimal", "fraction"]
+)
+def test_sum_values(backend, expected):
+    """Test that compensated and exact summation do not accumulate the rounding error of a naive sum."""
+    result = sum_values(TENTHS, backend)
+    assert result == expected
+    assert result != sum(TENTHS)
+
+
+@pytest.mark.parametrize(
+    "values, precision, expected",
+    [
+        (["1e30"] + ["1"] * 1000 + ["-1e30"], 28, "1000"),
+        (["1.23456", "1.23456"], 5, "2.4691"),
+    ],
+    ids=["cancellation", "rounded_once"],
+)
+def test_decimal_sum_is_rounded_once(values, precision, expected):
+    """Test that the decimal sum adds exactly and rounds only the result to the context precision."""
+    assert str(sum_values(values, DecimalBackend(precision))) == expected
+
+
+def test_decimal_sum_errors():
+    """Test that Decimal signals in a sum are raised as ValueError."""
+    with pytest.raises(ValueError, match="Invalid decimal operation"):
+        sum_values(["Infinity", "-Infinity"], "decimal")
+    with pytest.raises(ValueError, match="Invalid decimal operation"):
+        sum_values(["9e999999", "9e999999"], "decimal")
+
+
+def test_naive_summation_and_repr():
+    """Test that the naive summation method is the plain built-in sum()."""
+    backend = FloatBackend('naive')
+    assert backend.sum(TENTHS) == sum(TENTHS)
+    assert repr(backend) == "FloatBackend(summation='naive')"
+
+
+def test_neumaier_sum_handles_cancellation():
+    """Test the case where plain Kahan summation loses the small term but Neumaier's does not."""
+    values = [1.0, 1e100, 1.0, -1e100]
+    assert neumaier_sum(values) == 2.0
+    assert sum(values) == 0.0
+
+
+def test_unknown_summation_method():
+    """Test that an unknown summation method raises a ValueError."""
+    with pytest.raises(ValueError, match="Unknown summation method"):
+        FloatBackend('pairwise')
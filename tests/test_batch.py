@@ -0,0 +1,120 @@
+"""
+Tests for the batch mode of the calculator.
+
+This module checks that 'op a b' records are computed in input order,
+that bad records produce error lines instead of stopping the batch,
+and that results are written out in chunks.
+"""
+import io
+
+import pytest
+
+from app.backends import using_backend
+from app.batch import evaluate_record, run_batch, run_batch_path
+from app.registry import registry
+
+
+#----------------------------------------------------------------
+# Test cases for single records
+#----------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        ("+ 4 5", "9.0"),
+        ("- 10 3", "7.0"),
+        ("* 6 7", "42.0"),
+        ("/ 8 2", "4.0"),
+        ("/ 4 0", "error: Cannot divide by zero."),
+        ("add 4 5", "error: Invalid operation."),
+        ("+ a 5", "error: Invalid input. Please enter numeric values for the numbers."),
+        ("+ 4", "error: Expected a record in the form 'op a b'."),
+    ],
+    ids=[
+        "addition",
+        "subtraction",
+        "multiplication",
+        "division",
+        "division_by_zero",
+        "invalid_operation",
+        "invalid_number",
+        "missing_operand"
+    ]
+)
+def test_evaluate_record(line: str, expected: str):
+    """Test that each record gives the same result (or error message) as the REPL."""
+    assert evaluate_record(line.split()) == expected
+
+
+def test_evaluate_record_registered_unary_operator():
+    """Test that one-operand operators from the registry take records in the form 'op a'."""
+    registry.register('neg', lambda a: -a, arity=1)
+    try:
+        assert evaluate_record(['neg', '4']) == "-4.0"
+        assert evaluate_record(['neg', '4', '5']) == "error: Expected a record in the form 'op a'."
+    finally:
+        registry.unregister('neg')
+
+
+def test_evaluate_record_session_backend():
+    """Test that records are read and computed with the session backend."""
+    with using_backend('decimal'):
+        assert evaluate_record(['+', '0.1', '0.2']) == "0.3"
+        assert evaluate_record(['+', 'x', '0.2']) == "error: Invalid input. Please enter numeric values for the numbers."
+
+
+#----------------------------------------------------------------
+# Test cases for the whole pipeline
+#----------------------------------------------------------------
+
+def test_run_batch_keeps_order_and_skips_blank_lines():
+    """Test that results come out in input order and blank/comment lines are skipped."""
+    lines = ["+ 1 2\n", "\n", "# a comment\n", "/ 1 0\n", "* 2 3\n"]
+    out = io.StringIO()
+    total, errors = run_batch(lines, out)
+    assert out.getvalue() == "3.0\nerror: Cannot divide by zero.\n6.0\n"
+    assert (total, errors) == (3, 1)
+
+
+def test_run_batch_writes_in_chunks():
+    """Test that a large generator input is written chunk_size lines per write() call."""
+
+    class CountingWriter(io.StringIO):
+        """StringIO that counts how many times write() is called."""
+        writes = 0
+
+        def write(self, s):
+            self.writes += 1
+            return super().write(s)
+
+    lines = (f"+ {i} 1" for i in range(1000))
+    out = CountingWriter()
+    total, errors = run_batch(lines, out, chunk_size=100)
+    assert (total, errors) == (1000, 0)
+    assert out.writes == 20  # the lines and the trailing newline of every chunk
+    assert out.getvalue().splitlines()[-1] == "1000.0"
+
+
+def test_run_batch_path_file(tmp_path, capsys):
+    """Test reading the records from a file and printing to standard output."""
+    source = tmp_path / "records.txt"
+    source.write_text("+ 4 5\n- 10 3\n", encoding="utf-8")
+    assert run_batch_path(str(source)) == (2, 0)
+    assert capsys.readouterr().out == "9.0\n7.0\n"
+
+
+def test_run_batch_path_stdin(monkeypatch):
+    """Test that '-' reads the records from standard input."""
+    monkeypatch.setattr('sys.stdin', io.StringIO("* 6 7\n"))
+    out = io.StringIO()
+    assert run_batch_path('-', out) == (1, 0)
+    assert out.getvalue() == "42.0\n"
+
+
+def test_run_batch_path_with_workers(tmp_path):
+    """Test that passing workers computes the records with the parallel runner, in input order."""
+    source = tmp_path / "records.txt"
+    source.write_text("+ 4 5\n/ 1 0\n- 10 3\n", encoding="utf-8")
+    out = io.StringIO()
+    assert run_batch_path(str(source), out, chunk_size=1, workers=2) == (3, 1)
+    assert out.getvalue() == "9.0\nerror: Cannot divide by zero.\n7.0\n"
@@ -0,0 +1,72 @@
+"""
+Tests for the benchmark harness and suite.
+
+The harness tests check the timing results and the regression comparison.
+Running the whole suite takes a few seconds, so that test is marked 'slow' and skipped by default
+(run it with: pytest -m slow --no-cov).
+"""
+import pytest
+
+from benchmarks.harness import Benchmark, compare, load, measure, regressions, run, save
+from benchmarks.suite import main
+
+
+def make_run(**best_times):
+    """Builds a run dict with the given best time for each benchmark name."""
+    return {"meta": {}, "results": {name: {"best": best} for name, best in best_times.items()}}
+
+
+#----------------------------------------------------------------
+# Test cases for the harness
+#----------------------------------------------------------------
+
+@pytest.mark.fast
+def test_measure_reports_per_operation_times():
+    """Test that measure() runs setup once, calibrates the loops and reports per-operation times."""
+    calls = []
+    benchmark = Benchmark("sum", lambda: sum(range(100)), inner=100, setup=lambda: calls.append("setup"))
+    result = measure(benchmark, repeats=3, min_time=0.001)
+    assert calls == ["setup"]
+    assert result.loops >= 1 and result.repeats == 3 and result.inner == 100
+    assert 0 < result.best <= result.median
+    assert result.ops_per_sec == 1 / result.best
+
+
+@pytest.mark.fast
+def test_compare_flags_regressions():
+    """Test that only benchmarks slower than the threshold are regressions, and new ones are skipped."""
+    baseline = make_run(a=100e-9, b=100e-9, c=100e-9)
+    current = make_run(a=105e-9, b=150e-9, c=50e-9, new=1e-9)
+    comparisons = compare(baseline, current, threshold=0.10)
+    assert [c.name for c in comparisons] == ["a", "b", "c"]
+    assert regressions(comparisons) == {"b": pytest.approx(0.5)}
+
+
+@pytest.mark.fast
+def test_save_and_load(tmp_path):
+    """Test that a run survives a JSON round trip, including its metadata."""
+    data = run([Benchmark("noop", lambda: None)], repeats=2, min_time=0.001)
+    path = tmp_path / "results.json"
+    save(data, str(path))
+    assert load(str(path)) == data
+    assert set(data["meta"]) >= {"python", "platform", "commit", "timestamp"}
+
+
+#----------------------------------------------------------------
+# Test cases for the suite
+#----------------------------------------------------------------
+
+@pytest.mark.slow
+def test_suite_runs_and_compares(tmp_path, capsys):
+    """Test running the whole suite, saving it and comparing a run against itself."""
+    path = tmp_path / "baseline.json"
+    assert main(["--save", str(path), "--repeats", "2", "--min-time", "0.001"]) == 0
+    baseline = load(str(path))
+    assert set(baseline["results"]) >= {"operation.add", "repl.calculation", "batch.run_batch"}
+
+    # A baseline that is 'infinitely fast' makes every benchmark a regression.
+    for result in baseline["results"].values():
+        result["best"] = 1e-15
+    save(baseline, str(path))
+    assert main(["--compare", str(path), "--filter", "operation", "--repeats", "2", "--min-time", "0.001"]) == 1
+    assert "REGRESSION" in capsys.readouterr().out
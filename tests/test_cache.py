@@ -0,0 +1,206 @@
+"""
+Tests for the Operation result cache.
+
+This module checks LRU and TTL eviction, the hit/miss/eviction counters,
+float and Decimal keys (0.0 vs -0.0, 1 vs 1.0, NaN, decimal precision), errors that must not be cached,
+sharing a cache between threads and installing a cache globally.
+"""
+import math
+import threading
+from decimal import Decimal
+
+import pytest
+
+from app.backends import DecimalBackend, calculate
+from app.batch import evaluate_record
+from app.cache import CacheStats, ResultCache, install, installed, operand_key, uninstall
+from app.expressions import evaluate
+from app.operations import Operation
+from app.registry import registry
+
+
+class CountingOperation:
+    """Wraps an operation and counts how many times it is really computed."""
+
+    def __init__(self, func):
+        self.func = func
+        self.calls = 0
+
+    def __call__(self, a, b):
+        self.calls += 1
+        return self.func(a, b)
+
+
+#----------------------------------------------------------------
+# Test cases for keys
+#----------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "x, y",
+    [
+        (0.0, -0.0),
+        (1, 1.0),
+        (True, 1),
+        (Decimal("1.0"), Decimal("1.00")),
+        (Decimal("0"), Decimal("-0")),
+    ],
+    ids=["signed_zeros", "int_and_float", "bool_and_int", "decimal_exponents", "decimal_signed_zeros"]
+)
+def test_operand_keys_differ(x, y):
+    """Test that operands that compare equal but can give different results get different keys."""
+    assert operand_key(x) != operand_key(y)
+
+
+@pytest.mark.parametrize("x", [math.nan, [1, 2], Decimal("NaN")], ids=["nan", "unhashable", "decimal_nan"])
+def test_operand_key_uncacheable(x):
+    """Test that NaN and unhashable operands are not cached."""
+    assert operand_key(x) is None
+
+
+def test_installed_cache_keeps_decimal_precision_and_exponents():
+    """Test that Decimal results computed with one precision or exponent are not returned for another."""
+    cache = install()
+    try:
+        for _ in range(2):
+            assert str(calculate('/', '1', '3', backend=DecimalBackend(precision=5))) == "0.33333"
+            assert str(calculate('/', '1', '3', backend=DecimalBackend(precision=40))) == "0." + "3" * 40
+            assert str(calculate('+', '1.0', '1', backend='decimal')) == "2.0"
+            assert str(calculate('+', '1.00', '1', backend='decimal')) == "2.00"
+        assert cache.stats() == CacheStats(hits=4, misses=4, evictions=0, size=4)
+    finally:
+        uninstall()
+
+
+#----------------------------------------------------------------
+# Test cases for ResultCache
+#----------------------------------------------------------------
+
+def test_cache_hits_and_misses():
+    """Test that a repeated call is served from the cache."""
+    add = CountingOperation(Operation.add)
+    cache = ResultCache()
+    assert cache.call(add, 1.5, 2.5) == 4.0
+    assert cache.call(add, 1.5, 2.5) == 4.0
+    assert add.calls == 1
+    assert cache.stats() == CacheStats(hits=1, misses=1, evictions=0, size=1)
+
+
+def test_cache_signed_zero_results():
+    """Test that 0.0 and -0.0 operands keep their own results."""
+    cache = ResultCache()
+    assert math.copysign(1.0, cache.call(Operation.add, -0.0, -0.0)) == -1.0
+    assert math.copysign(1.0, cache.call(Operation.add, 0.0, 0.0)) == 1.0
+    assert len(cache) == 2
+
+
+def test_cache_nan_never_cached():
+    """Test that NaN operands are always computed and never stored."""
+    add = CountingOperation(Operation.add)
+    cache = ResultCache()
+    assert math.isnan(cache.call(add, math.nan, 1.0))
+    assert math.isnan(cache.call(add, math.nan, 1.0))
+    assert add.calls == 2
+    assert cache.stats() == CacheStats(hits=0, misses=2, evictions=0, size=0)
+
+
+def test_cache_errors_not_cached():
+    """Test that division by zero raises on every call and is not stored."""
+    cache = ResultCache()
+    for _ in range(2):
+        with pytest.raises(ValueError, match="Cannot divide by zero."):
+            cache.call(Operation.divide, 1, 0)
+    assert len(cache) == 0
+
+
+def test_cache_lru_eviction():
+    """Test that the least recently used entry is evicted when the cache is full."""
+    cache = ResultCache(maxsize=2)
+    cache.call(Operation.add, 1, 1)
+    cache.call(Operation.add, 2, 2)
+    cache.call(Operation.add, 1, 1)  # 1+1 is now the most recently used
+    cache.call(Operation.add, 3, 3)  # evicts 2+2
+    assert cache.stats() == CacheStats(hits=1, misses=3, evictions=1, size=2)
+    cache.call(Operation.add, 1, 1)
+    assert cache.hits == 2
+
+
+def test_cache_ttl_expiry():
+    """Test that entries expire ttl seconds after they were stored."""
+    now = [0.0]
+    add = CountingOperation(Operation.add)
+    cache = ResultCache(ttl=10, clock=lambda: now[0])
+    cache.call(add, 1, 2)
+    now[0] = 5.0
+    cache.call(add, 1, 2)
+    now[0] = 10.0
+    cache.call(add, 1, 2)
+    assert add.calls == 2
+    assert cache.stats() == CacheStats(hits=1, misses=2, evictions=1, size=1)
+
+
+def test_cache_wrap_and_clear():
+    """Test a per call site cached operation, and clearing the cache."""
+    cache = ResultCache()
+    cached_multiply = cache.wrap(Operation.multiply)
+    assert cached_multiply(6, 7) == 42
+    assert cached_multiply(6, 7) == 42
+    assert cached_multiply.__wrapped__ is Operation.multiply
+    assert cached_multiply.cache is cache
+    cache.clear()
+    assert cache.stats() == CacheStats(0, 0, 0, 0)
+
+
+@pytest.mark.parametrize(
+    "kwargs, message",
+    [
+        ({'maxsize': 0}, "maxsize must be at least 1."),
+        ({'ttl': 0}, "ttl must be positive."),
+    ],
+    ids=["no_entries", "zero_ttl"]
+)
+def test_cache_invalid_settings(kwargs, message):
+    """Test that invalid cache settings raise a ValueError."""
+    with pytest.raises(ValueError, match=message):
+        ResultCache(**kwargs)
+
+
+def test_cache_shared_between_threads():
+    """Test that counters and results stay consistent when many threads share a cache."""
+    cache = ResultCache(maxsize=64)
+
+    def work():
+        for i in range(2000):
+            assert cache.call(Operation.add, i % 100, 1) == i % 100 + 1
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert stats.hits + stats.misses == 8 * 2000
+    assert stats.size <= 64
+
+
+#----------------------------------------------------------------
+# Test cases for the global cache
+#----------------------------------------------------------------
+
+def test_install_and_uninstall():
+    """Test that an installed cache is used by the registry, batch mode and expressions until uninstalled."""
+    registry.register('neg', lambda a: -a, arity=1)
+    cache = install()
+    try:
+        assert installed() is cache
+        assert install(cache) is cache  # installing again replaces the previous cache
+        assert registry.dispatch('+', 1.0, 2.0) == 3.0
+        assert evaluate_record(['+', '1', '2']) == "3.0"
+        assert evaluate("1 + 2") == 3.0
+        assert registry.dispatch('neg', 1.0) == -1.0  # one-operand operators are not cached
+        assert cache.stats() == CacheStats(hits=2, misses=1, evictions=0, size=1)
+    finally:
+        uninstall()
+        registry.unregister('neg')
+    assert installed() is None
+    assert registry.functions['+'] is Operation.add
+    uninstall()  # uninstalling twice is harmless
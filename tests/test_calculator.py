@@ -6,9 +6,18 @@ it will tests for correct operations and error handling scenarios.
 It uses pytest fixtures to simulate user input and capture output.
 """
 from app.calculator import calculator
+from app.registry import registry
 import pytest
 
 
+@pytest.fixture
+def negate_operator():
+    """Registers a one-operand 'neg' operator for the duration of a test."""
+    registry.register('neg', lambda a: -a, name='negate', arity=1)
+    yield
+    registry.unregister('neg')
+
+
 #helper funtion
 # This function simulates user input for the calculator REPL and captures its output.
 def run_calculator_with_inputs(monkeypatch, inputs, capsys):
@@ -98,3 +107,46 @@ def test_invalid_number_two(monkeypatch, capsys):
 
 
 
+#Test expression evaluation in the calculator REPL.
+def test_expression(monkeypatch, capsys):
+    """Test evaluating an expression with '=' in REPL."""
+    inputs = ['= (1 + 2) * 3 / 2', 'exit']
+    output = run_calculator_with_inputs(monkeypatch, inputs, capsys)
+    assert "The result of (1 + 2) * 3 / 2 is: 4.5" in output
+
+#Test variable assignment in the calculator REPL.
+def test_expression_variables(monkeypatch, capsys):
+    """Test assigning a variable and using it in a later expression in REPL."""
+    inputs = ['= x = 4 / 2', '= x * 10', 'exit']
+    output = run_calculator_with_inputs(monkeypatch, inputs, capsys)
+    assert "x = 2.0" in output
+    assert "The result of x * 10 is: 20.0" in output
+
+#Test expression errors in the calculator REPL.
+def test_expression_errors(monkeypatch, capsys):
+    """Test that expression errors are printed and the REPL keeps running."""
+    inputs = ['= 1 / 0', '= y + 1', '= 1 +', 'exit']
+    output = run_calculator_with_inputs(monkeypatch, inputs, capsys)
+    assert "Cannot divide by zero." in output
+    assert "Unknown variable: y" in output
+    assert "Unexpected end of expression." in output
+    assert "Exiting the app..." in output
+
+#Test a registered one-operand operator in the calculator REPL.
+def test_registered_unary_operator(monkeypatch, capsys, negate_operator):
+    """Test that a registered operator is offered and only prompts for the operands it needs."""
+    inputs = ['neg', '4', 'exit']
+    output = run_calculator_with_inputs(monkeypatch, inputs, capsys)
+    assert "'neg' for negate" in output
+    assert "The result of neg 4.0 is: -4.0" in output
+
+#Test changing the numeric backend in the calculator REPL.
+def test_backend_command(monkeypatch, capsys):
+    """Test that 'backend <name>' changes how numbers are read and computed in REPL."""
+    inputs = ['backend', 'backend fraction', '/', '1', '3', '= x = 1 / 3', 'backend binary', 'exit']
+    output = run_calculator_with_inputs(monkeypatch, inputs, capsys)
+    assert "Using the float backend." in output
+    assert "Using the fraction backend." in output
+    assert "The result of 1 / 3 is: 1/3" in output
+    assert "x = 1/3" in output
+    assert "Unknown backend: 'binary'" in output
@@ -0,0 +1,207 @@
+"""
+Tests for checkpointed batch jobs.
+
+This module checks that a checkpointed job writes the same output as batch mode, that a job that crashes
+(raising in this process, or killed with SIGKILL in a child process) resumes from its last checkpoint with
+every result written exactly once, and that checkpoints of another job are refused.
+"""
+import hashlib
+import io
+import json
+import os
+import signal
+import subprocess
+import sys
+
+import pytest
+
+import main
+from app.backends import current_backend, using_backend
+from app.batch import run_batch
+from app.checkpoint import Checkpoint, load_checkpoint, run_checkpointed, save_checkpoint
+from app.registry import registry
+from benchmarks.bench_startup import ROOT
+
+
+def write_job(path, count: int = 5000) -> str:
+    """Writes an input file of count lines (with errors, blanks and comments) and returns the expected batch output."""
+    lines = []
+    for i in range(count):
+        op = "+-*/"[i % 4]
+        lines.append(f"{op} {i * 0.37:.2f} {i % 7}" if i % 50 else ["", "# comment", "/ 1 0", "% 1 2", "+ x 1"][i // 50 % 5])
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    out = io.StringIO()
+    run_batch(lines, out)
+    return out.getvalue()
+
+
+class Crash:
+    """A registry layer, used with 'with', that makes the operators raise a RuntimeError after a number of calls."""
+
+    def __init__(self, calls: int):
+        self.calls = calls
+
+    def layer(self, spec, func):
+        def counted(*operands):
+            self.calls -= 1
+            if self.calls < 0:
+                raise RuntimeError("crash")
+            return func(*operands)
+        return counted
+
+    def __enter__(self):
+        registry.add_layer(self.layer)
+
+    def __exit__(self, *exc_info):
+        registry.remove_layer(self.layer)
+
+
+#----------------------------------------------------------------
+# Test cases for checkpointed jobs
+#----------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "every, chunk_size, workers",
+    [(1000, 4096, 1), (7, 3, 1), (50, 1, 1), (100_000, 4096, 1), (500, 4096, 2), (500, 4096, None)],
+    ids=["default-chunks", "small", "line-by-line", "no-checkpoint-reached", "workers", "all-cores"],
+)
+def test_same_output_as_batch_mode(tmp_path, every, chunk_size, workers):
+    """Test that a checkpointed job writes exactly the batch mode output and removes its checkpoint."""
+    expected = write_job(tmp_path / "job.txt", 2000)
+    output = tmp_path / "out.txt"
+    records, errors = run_checkpointed(str(tmp_path / "job.txt"), str(output), every=every, workers=workers,
+                                       chunk_size=chunk_size)
+    assert output.read_text(encoding="utf-8") == expected
+    assert records == len(expected.splitlines()) and errors == expected.count("error: ")
+    assert not (tmp_path / "out.txt.checkpoint").exists()
+
+
+def test_resume_after_crash(tmp_path):
+    """Test that a job that crashed resumes from its last checkpoint and writes every result exactly once."""
+    expected = write_job(tmp_path / "job.txt")
+    output, checkpoint = str(tmp_path / "out.txt"), str(tmp_path / "job.checkpoint")
+    with Crash(2345), pytest.raises(RuntimeError, match="crash"):
+        run_checkpointed(str(tmp_path / "job.txt"), output, checkpoint, every=1000, chunk_size=100)
+    saved = load_checkpoint(checkpoint, str(tmp_path / "job.txt"), current_backend())
+    assert saved.records == 1984  # 2000 lines, 16 of them blank or comments
+    assert os.path.getsize(output) > saved.output_offset  # results written after the checkpoint are lost work
+
+    records, errors = run_checkpointed(str(tmp_path / "job.txt"), output, checkpoint, every=1000, chunk_size=100)
+    assert open(output, encoding="utf-8").read() == expected
+    assert (records, errors) == (len(expected.splitlines()), expected.count("error: "))
+    assert not os.path.exists(checkpoint)
+
+
+def test_checkpoint_of_another_job(tmp_path):
+    """Test that a checkpoint saved for another input or backend, or an output cut short, is refused."""
+    (tmp_path / "job.txt").write_text("+ 1 2\n", encoding="utf-8")
+    (tmp_path / "out.txt").write_text("3.0\n", encoding="utf-8")
+    job, output, checkpoint = str(tmp_path / "job.txt"), str(tmp_path / "out.txt"), str(tmp_path / "ck")
+    input_sha256 = hashlib.sha256(b"+ 1 2\n").hexdigest()
+    with using_backend("fraction") as fraction:
+        save_checkpoint(checkpoint, Checkpoint(6, 4, 1, 0, input_sha256), job, fraction)
+    with pytest.raises(ValueError, match="belongs to another job"):
+        run_checkpointed(job, output, checkpoint)
+    with using_backend("fraction"):
+        with pytest.raises(ValueError, match="belongs to another job"):
+            run_checkpointed(str(tmp_path / "other.txt"), output, checkpoint)
+        save_checkpoint(checkpoint, Checkpoint(6, 40, 1, 0, input_sha256), job, fraction)
+        with pytest.raises(ValueError, match="shorter than the checkpoint says"):
+            run_checkpointed(job, output, checkpoint)
+    assert json.loads(open(checkpoint, encoding="utf-8").read())["progress"] == [6, 40, 1, 0, input_sha256]
+    assert not os.path.exists(checkpoint + ".tmp")
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda text: text.replace("- 0.37 1", "- 0.38 1", 1),
+        lambda text: text[:100],
+        lambda text: "\n" + text,
+    ],
+    ids=["edited", "truncated", "shifted"],
+)
+def test_changed_input_is_refused(tmp_path, change):
+    """Test that a job does not resume when its input was changed before the checkpoint, but does after it."""
+    job = tmp_path / "job.txt"
+    expected = write_job(job)
+    output, checkpoint = str(tmp_path / "out.txt"), str(tmp_path / "job.checkpoint")
+    with Crash(2345), pytest.raises(RuntimeError, match="crash"):
+        run_checkpointed(str(job), output, checkpoint, every=1000, chunk_size=100)
+    text = job.read_text(encoding="utf-8")
+    job.write_text(change(text), encoding="utf-8")
+    with pytest.raises(ValueError, match="was changed since the checkpoint was saved"):
+        run_checkpointed(str(job), output, checkpoint, every=1000, chunk_size=100)
+    assert os.path.exists(checkpoint)
+
+    job.write_text(text + "+ 1 2\n", encoding="utf-8")
+    run_checkpointed(str(job), output, checkpoint, every=1000, chunk_size=100)
+    assert open(output, encoding="utf-8").read() == expected + "3.0\n"
+
+
+@pytest.mark.parametrize(
+    "kwargs", [{"every": 0}, {"workers": 0}, {"chunk_size": 0}], ids=["every", "workers", "chunk_size"],
+)
+def test_knobs_are_validated(tmp_path, kwargs):
+    """Test that the checkpoint interval, workers and chunk size must be positive."""
+    with pytest.raises(ValueError, match="at least 1"):
+        run_checkpointed(str(tmp_path / "job.txt"), str(tmp_path / "out.txt"), **kwargs)
+
+
+def test_command_line(tmp_path, capsys):
+    """Test the --output, --checkpoint and --checkpoint-every options of batch mode."""
+    expected = write_job(tmp_path / "job.txt", 300)
+    output = tmp_path / "out.txt"
+    main.main(["--batch", str(tmp_path / "job.txt"), "--output", str(output),
+               "--checkpoint", str(tmp_path / "ck"), "--checkpoint-every", "100", "--workers", "1"])
+    assert output.read_text(encoding="utf-8") == expected
+    assert capsys.readouterr().out == "Computed 297 records (14 errors).\n"
+    output.unlink()
+    main.main(["--batch", str(tmp_path / "job.txt"), "--output", str(output)])
+    assert output.read_text(encoding="utf-8") == expected
+    with pytest.raises(SystemExit):
+        main.main(["--checkpoint", str(tmp_path / "ck")])
+
+
+#----------------------------------------------------------------
+# Test cases for a job killed in the middle of the run
+#----------------------------------------------------------------
+
+# Runs a checkpointed job in a child process that kills itself with SIGKILL after a number of operator calls.
+KILLED_JOB = """
+import os, signal, sys
+from app.checkpoint import run_checkpointed
+from app.registry import registry
+
+kill_after = int(sys.argv[1])
+calls = 0
+
+def layer(spec, func):
+    def counted(*operands):
+        global calls
+        calls += 1
+        if calls == kill_after:
+            os.kill(os.getpid(), signal.SIGKILL)
+        return func(*operands)
+    return counted
+
+registry.add_layer(layer)
+run_checkpointed(sys.argv[2], sys.argv[3], every=int(sys.argv[4]))
+"""
+
+
+def test_killed_job_resumes_with_identical_output(tmp_path):
+    """Test that a job killed several times, at different points, still ends with the uninterrupted output."""
+    expected = write_job(tmp_path / "job.txt", 20_000)
+    output = tmp_path / "out.txt"
+    env = {name: value for name, value in os.environ.items() if not name.startswith("COV_CORE")}
+    exit_codes = []
+    for kill_after in [1234, 5000, 999, 7777, 0]:
+        result = subprocess.run([sys.executable, "-c", KILLED_JOB, str(kill_after), str(tmp_path / "job.txt"),
+                                 str(output), "700"], cwd=ROOT, env=env, capture_output=True, text=True, check=False)
+        exit_codes.append(result.returncode)
+        if kill_after:
+            assert (tmp_path / "out.txt.checkpoint").exists()
+    assert exit_codes == [-signal.SIGKILL] * 4 + [0]
+    assert output.read_text(encoding="utf-8") == expected
+    assert not (tmp_path / "out.txt.checkpoint").exists()
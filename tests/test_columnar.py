@@ -0,0 +1,165 @@
+"""
+Tests for the binary columnar format.
+
+This module checks the CSV converter, that '.npy' files written here and by NumPy are mapped
+into the right columns, that bad files are rejected, and that compute_columns gives the same
+results as the Operation batch methods, with and without NumPy.
+"""
+import math
+import sys
+
+import numpy as np
+import pytest
+
+from app import columnar
+from app.columnar import ColumnWriter, compute_columns, csv_to_columns, open_columns
+
+
+@pytest.fixture
+def operands(tmp_path):
+    """Writes a small operand file (a column, then b column) and returns its path."""
+    path = tmp_path / "operands.npy"
+    np.save(path, np.array([[1.0, 3.0, 5.5, 7.0], [2.0, 0.0, 2.0, -1.0]]))
+    return path
+
+
+#----------------------------------------------------------------
+# Test cases for reading and writing
+#----------------------------------------------------------------
+
+def test_csv_to_columns(tmp_path):
+    """Test that the converter skips blank and comment lines and writes the columns in chunks."""
+    source = tmp_path / "operands.csv"
+    source.write_text("# a,b\n1,2\n\n3, 0\n5.5,2\n")
+    target = tmp_path / "operands.npy"
+    assert csv_to_columns(source, target, chunk_rows=2) == 3
+    assert np.load(target).tolist() == [[1.0, 3.0, 5.5], [2.0, 0.0, 2.0]]
+
+
+@pytest.mark.parametrize(
+    "text, message",
+    [
+        ("1,2\n3\n", "Line 2: expected 2 numbers, got 1."),
+        ("1,2\n3,x\n", "Line 2: invalid number in '3,x'."),
+        ("# only a comment\n", "The CSV file has no rows."),
+        ("1,2\n" * 5000 + "3,x\n", "Line 5001: invalid number in '3,x'."),
+    ],
+    ids=["short_row", "not_a_number", "empty", "after_written_chunks"],
+)
+def test_csv_to_columns_errors(tmp_path, text, message):
+    """Test that a bad CSV file raises a ValueError naming the problem and leaves no target file."""
+    source = tmp_path / "operands.csv"
+    source.write_text(text)
+    with pytest.raises(ValueError, match=message):
+        csv_to_columns(source, tmp_path / "operands.npy", chunk_rows=1000)
+    assert list(tmp_path.iterdir()) == [source]
+
+
+def test_open_columns(operands):
+    """Test that a file saved by NumPy is mapped into one memoryview per column."""
+    with open_columns(operands) as f:
+        assert f.shape == (2, 4)
+        assert f.rows == 4
+        assert [column.tolist() for column in f.columns] == [[1.0, 3.0, 5.5, 7.0], [2.0, 0.0, 2.0, -1.0]]
+
+
+def test_writer(tmp_path):
+    """Test that the writer streams a one-column file NumPy can load, and checks the chunks."""
+    path = tmp_path / "results.npy"
+    with ColumnWriter(path) as writer:
+        writer.write(np.array([1.0, 2.0]))
+        writer.write(np.array([3.0]))
+        with pytest.raises(ValueError, match="Expected 1 column"):
+            writer.write(np.array([1.0]), np.array([2.0]))
+    assert np.load(path).tolist() == [1.0, 2.0, 3.0]
+    with open_columns(path) as f:
+        assert f.shape == (3,)
+        assert len(f.columns) == 1
+
+
+@pytest.mark.parametrize(
+    "content, message",
+    [
+        (b"not a numpy file at all", "Not a version 1.0 .npy file."),
+        (b"\x93NUMPY\x01\x00\x05\x00{'a'}", "Expected a C-order array"),
+    ],
+    ids=["no_magic", "bad_header"],
+)
+def test_open_columns_bad_file(tmp_path, content, message):
+    """Test that files that are not float64 '.npy' arrays are rejected."""
+    path = tmp_path / "bad.npy"
+    path.write_bytes(content)
+    with pytest.raises(ValueError, match=message):
+        open_columns(path)
+
+
+@pytest.mark.parametrize(
+    "array",
+    [np.arange(3, dtype=np.int64), np.zeros((2, 2), order='F'), np.zeros((1, 1, 1))],
+    ids=["int64", "fortran_order", "three_dimensions"],
+)
+def test_open_columns_unsupported_array(tmp_path, array):
+    """Test that other dtypes, Fortran order and more than 2 dimensions are rejected."""
+    path = tmp_path / "array.npy"
+    np.save(path, array)
+    with pytest.raises(ValueError, match="Expected a C-order array"):
+        open_columns(path)
+
+
+def test_open_columns_truncated(operands):
+    """Test that a file shorter than its header says is rejected."""
+    operands.write_bytes(operands.read_bytes()[:-8])
+    with pytest.raises(ValueError, match="does not match the shape"):
+        open_columns(operands)
+
+
+#----------------------------------------------------------------
+# Test cases for computing over columns
+#----------------------------------------------------------------
+
+@pytest.mark.parametrize("use_numpy", [True, False], ids=["numpy", "pure_python"])
+@pytest.mark.parametrize(
+    "symbol, expected",
+    [
+        ('+', [3.0, 3.0, 7.5, 6.0]),
+        ('-', [-1.0, 3.0, 3.5, 8.0]),
+        ('*', [2.0, 0.0, 11.0, -7.0]),
+        ('/', [0.5, math.nan, 2.75, -7.0]),
+    ],
+    ids=["add", "subtract", "multiply", "divide"],
+)
+def test_compute_columns(monkeypatch, tmp_path, operands, symbol, expected, use_numpy):
+    """Test every operator over the mapped columns, in several chunks, with and without NumPy."""
+    if not use_numpy:
+        monkeypatch.setattr(columnar, "_numpy", lambda: None)
+    target = tmp_path / "results.npy"
+    assert compute_columns(symbol, operands, target, chunk_rows=3) == 4
+    assert np.load(target).tolist() == pytest.approx(expected, nan_ok=True)
+
+
+def test_compute_columns_zero_policies(tmp_path, operands):
+    """Test that on_zero is passed on to divide_many."""
+    target = tmp_path / "results.npy"
+    assert compute_columns('/', operands, target, on_zero='skip') == 3
+    assert np.load(target).tolist() == [0.5, 2.75, -7.0]
+    with pytest.raises(ValueError, match="Cannot divide by zero."):
+        compute_columns('/', operands, target, on_zero='raise')
+    # A failed computation leaves the previous results file as it was.
+    assert np.load(target).tolist() == [0.5, 2.75, -7.0]
+    assert not (tmp_path / "results.npy.partial").exists()
+
+
+def test_compute_columns_errors(tmp_path, operands):
+    """Test that unknown operators and files without two columns are rejected."""
+    with pytest.raises(ValueError, match="cannot be computed over columns"):
+        compute_columns('^', operands, tmp_path / "results.npy")
+    single = tmp_path / "single.npy"
+    np.save(single, np.array([1.0, 2.0]))
+    with pytest.raises(ValueError, match="Expected an operand file with 2 columns"):
+        compute_columns('+', single, tmp_path / "results.npy")
+
+
+def test_numpy_is_optional(monkeypatch):
+    """Test that _numpy() returns None when NumPy cannot be imported."""
+    monkeypatch.setitem(sys.modules, "numpy", None)
+    assert columnar._numpy() is None  # pylint: disable=protected-access
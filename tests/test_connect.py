@@ -0,0 +1,131 @@
+"""
+Tests for the lightweight client of a warm calculator server, and for the lazy imports of the entry point.
+
+The client tests run a real server in a background thread and forward records to it over TCP
+and a Unix socket. The startup tests check in a fresh interpreter that the entry point does not
+import the optional subsystems until they are used.
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import main
+from app.connect import forward, open_connection
+from app.server import CalculatorServer
+from benchmarks.bench_startup import ROOT, import_times
+
+
+@pytest.fixture(params=["tcp", "unix"])
+def server_address(request, tmp_path):
+    """Runs a calculator server in a background thread and returns its address."""
+    address = "127.0.0.1:0" if request.param == "tcp" else f"unix:{tmp_path / 'calc.sock'}"
+    loop = asyncio.new_event_loop()
+    server = CalculatorServer(address)
+    loop.run_until_complete(server.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield server.address
+    asyncio.run_coroutine_threadsafe(server.stop(), loop).result(timeout=10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+#----------------------------------------------------------------
+# Test cases for the client
+#----------------------------------------------------------------
+
+def test_forward(server_address):
+    """Test that records are answered in order, in batches, skipping blank and comment lines."""
+    records = ["+ 4 5", "", "# a comment", "/ 1 0", "* 6 7", "- 10 3", "add 1 2"]
+    results = list(forward(server_address, records, batch_size=2))
+    assert results == ["9.0", "error: Cannot divide by zero.", "42.0", "7.0", "error: Invalid operation."]
+    assert list(forward(server_address, ["+ 1 1", "+ 2 2"], batch_size=2)) == ["2.0", "4.0"]  # full batches only
+
+
+def test_main_connect(server_address, capsys, monkeypatch):
+    """Test 'main.py --connect' with records on the command line and on standard input."""
+    main.main(["--connect", server_address, "+ 4 5", "/ 1 4"])
+    assert capsys.readouterr().out == "9.0\n0.25\n"
+    monkeypatch.setattr("sys.stdin", ["* 2 3\n"])
+    main.main(["--connect", server_address])
+    assert capsys.readouterr().out == "6.0\n"
+
+
+def test_connection_refused(tmp_path):
+    """Test that connecting to a Unix socket nobody listens on raises an OSError."""
+    with pytest.raises(OSError):
+        open_connection(f"unix:{tmp_path / 'missing.sock'}")
+
+
+def test_server_closes_connection():
+    """Test that a server closing the connection before answering raises ConnectionError."""
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        port = listener.getsockname()[1]
+
+        def close_after_first_request():
+            connection, _ = listener.accept()
+            connection.recv(1024)
+            connection.close()
+
+        thread = threading.Thread(target=close_after_first_request)
+        thread.start()
+        with pytest.raises(ConnectionError, match="The server closed the connection."):
+            list(forward(f"127.0.0.1:{port}", ["+ 1 2"]))
+        thread.join()
+
+
+#----------------------------------------------------------------
+# Test cases for lazy imports
+#----------------------------------------------------------------
+
+def imported_modules(code: str) -> set:
+    """Returns the modules imported after running code in a fresh interpreter (without coverage measurement)."""
+    env = {name: value for name, value in os.environ.items() if not name.startswith("COV_CORE")}
+    result = subprocess.run([sys.executable, "-c", code + "; import sys; print(' '.join(sys.modules))"],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return set(result.stdout.split())
+
+
+@pytest.mark.parametrize(
+    "code, not_imported",
+    [
+        ("import main", {"app.calculator", "app.registry", "app.backends"}),
+        ("import main, app.connect", {"asyncio", "app.registry"}),
+        ("import main, app.batch", {"app.backends.exact", "app.backends.interval", "decimal", "fractions",
+                                    "importlib.metadata", "json", "app.store", "sqlite3"}),
+        ("import main, app.calculator", {"app.expressions", "dataclasses", "app.backends.exact",
+                                          "app.backends.interval", "asyncio"}),
+    ],
+    ids=["main", "connect", "batch", "repl"],
+)
+def test_optional_subsystems_are_not_imported(code, not_imported):
+    """Test that the entry points do not import the optional subsystems they do not use."""
+    assert not imported_modules(code) & not_imported
+
+
+def test_subsystems_load_on_first_use():
+    """Test that the exact backends and the plugin metadata are imported when they are first used."""
+    modules = imported_modules(
+        "from app.backends import get_backend; from app.registry import registry; "
+        "get_backend('fraction'); registry.get('no-such-operator')"
+    )
+    assert {"app.backends.exact", "fractions", "importlib.metadata"} <= modules
+
+
+def test_import_times():
+    """Test that only the top-level imports of '-X importtime' output are counted."""
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       100 |        100 |   nested\n"
+        "import time:       200 |        300 | top\n"
+        "some other line\n"
+    )
+    assert import_times(stderr) == {"top": 300}
@@ -0,0 +1,112 @@
+"""
+Tests for the randomized differential harness of the arithmetic operations (tests/differential.py).
+
+The fast tests check the harness itself: the reference semantics for special values, the operand generator,
+and that a planted bug is found and shrunk to a minimal reproduction.
+The full run checks a million operand pairs through every implementation, across all CPU cores,
+so it is marked 'slow' and skipped by default (run it with: pytest -m slow --no-cov). Set FUZZ_PAIRS to change
+its size.
+"""
+import math
+import os
+
+import numpy as np
+import pytest
+
+from tests.differential import (IMPLEMENTATIONS, ZERO_DIVISION, Mismatch, check, generate, reference, run, same,
+                                shrink)
+
+
+def buggy_add(symbol, a, b):
+    """An implementation with a planted bug: it adds the absolute value of b."""
+    return [x + abs(y) for x, y in zip(a, b)]
+
+
+#----------------------------------------------------------------
+# Test cases for the reference semantics
+#----------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "symbol, a, b, expected",
+    [
+        ('+', 0.1, 0.2, 0.30000000000000004),
+        ('+', 1.0, -1.0, 0.0),
+        ('+', -0.0, -0.0, -0.0),
+        ('-', -0.0, 0.0, -0.0),
+        ('-', math.inf, math.inf, math.nan),
+        ('+', -math.inf, 1.0, -math.inf),
+        ('*', 1e308, 10.0, math.inf),
+        ('*', -1e308, 10.0, -math.inf),
+        ('*', 0.0, math.inf, math.nan),
+        ('*', -2.0, 0.0, -0.0),
+        ('*', 5e-324, 0.5, 0.0),
+        ('*', -5e-324, 0.5, -0.0),
+        ('*', 5e-324, 1.5, 1e-323),
+        ('/', 1.0, 3.0, 1 / 3),
+        ('/', 1.0, -math.inf, -0.0),
+        ('/', -math.inf, 2.0, -math.inf),
+        ('/', math.inf, math.inf, math.nan),
+        ('/', math.nan, 0.0, ZERO_DIVISION),
+        ('/', 1.0, -0.0, ZERO_DIVISION),
+        ('+', math.nan, 1.0, math.nan),
+    ],
+    ids=["rounding", "cancellation", "negative_zeros", "subtract_zero", "inf_minus_inf", "minus_inf",
+         "overflow", "negative_overflow", "zero_times_inf", "negative_zero_product", "underflow",
+         "negative_underflow", "subnormal_rounding", "third", "divide_by_inf", "inf_divided",
+         "inf_over_inf", "nan_over_zero", "negative_zero_divisor", "nan"],
+)
+def test_reference(symbol, a, b, expected):
+    """Test the reference results, bit for bit, for rounding and IEEE 754 special cases."""
+    assert same(reference(symbol, a, b), expected)
+
+
+def test_same():
+    """Test that same() tells 0.0 from -0.0 but matches any NaN."""
+    assert same(math.nan, -math.nan) and same(ZERO_DIVISION, ZERO_DIVISION)
+    assert not same(0.0, -0.0) and not same(1.0, ZERO_DIVISION)
+
+
+def test_generate():
+    """Test that the generated operands include every kind of special value."""
+    a, b = generate(np.random.default_rng(0), 20_000)
+    assert a.shape == b.shape == (20_000,) and a.dtype == np.float64
+    values = np.concatenate([a, b])
+    assert np.isnan(values).any() and np.isposinf(values).any() and np.isneginf(values).any()
+    assert (np.signbit(values) & (values == 0)).any()  # -0.0
+    assert ((values != 0) & (np.abs(values) < 2.2250738585072014e-308)).any()  # subnormals
+    assert (a == b).any() and (a == -b).any()
+
+
+#----------------------------------------------------------------
+# Test cases for finding and shrinking mismatches
+#----------------------------------------------------------------
+
+def test_shrink():
+    """Test that shrinking ends at the simplest failing pair."""
+    assert shrink(lambda a, b: a > 1000 and b < 0, 123456.789, -98765.4321) == (1024.0, -1.0)
+    a, b = shrink(lambda a, b: math.isnan(a), math.nan, 3.5)
+    assert math.isnan(a) and b == 0.0
+
+
+def test_planted_bug_is_found_and_shrunk():
+    """Test that a planted bug is reported once per operation, shrunk to a minimal reproduction."""
+    implementations = {'scalar': IMPLEMENTATIONS['scalar'], 'buggy': buggy_add}
+    assert not check('+', [1.0, -0.5], [2.0, 0.0], {'scalar': IMPLEMENTATIONS['scalar']})
+    mismatches = run(4000, seed=1, workers=2, chunk=1000, implementations=implementations)
+    by_symbol = {mismatch.symbol: mismatch for mismatch in mismatches}
+    assert all(mismatch.implementation == 'buggy' for mismatch in mismatches)
+    assert by_symbol['+'] == Mismatch('+', 0.0, -1.0, 'buggy', 1.0, -1.0)
+    assert "buggy: 0.0 + -1.0 (0x0.0p+0 + -0x1.0000000000000p+0) gave 1.0, expected -1.0" == str(by_symbol['+'])
+
+
+def test_small_run_has_no_mismatches():
+    """Test a small run through every implementation."""
+    assert run(2000, seed=7) == []
+
+
+@pytest.mark.slow
+def test_differential_fuzz():
+    """Test a million random operand pairs through every implementation, across all CPU cores."""
+    pairs = int(os.environ.get("FUZZ_PAIRS", 1_000_000))
+    mismatches = run(pairs, seed=2024, workers=os.cpu_count() or 1)
+    assert not mismatches, "\n".join(map(str, mismatches))
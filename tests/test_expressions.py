@@ -0,0 +1,449 @@
+"""
+Tests for the expression engine.
+
+This module checks tokenizing, parsing (precedence, associativity, parentheses),
+evaluation through the Operation methods, error messages, the compiled expression cache,
+the optimizer (simplified trees, shared subexpressions, and the same results as without it),
+and the specializer (generated code with the same results and errors as the compiled closures).
+"""
+import gc
+import inspect
+import linecache
+import math
+from decimal import Decimal
+from fractions import Fraction
+
+import pytest
+
+from app import expressions
+from app.backends import get_backend
+from app.expressions import (
+    BinOp,
+    CompiledExpression,
+    ExpressionError,
+    Number,
+    UnaryOp,
+    Variable,
+    compile_expression,
+    evaluate,
+    parse,
+    tokenize,
+)
+from app.expressions.optimize import shared_subexpressions, simplify
+from app.expressions.specialize import generate, specialize
+from app.registry import registry
+
+
+#----------------------------------------------------------------
+# Test cases for tokenize and parse
+#----------------------------------------------------------------
+
+def test_tokenize():
+    """Test that numbers, names and operators are split into tokens with their positions."""
+    tokens = tokenize("2.5e1*(x - .5)")
+    assert [(t.kind, t.text) for t in tokens] == [
+        ('number', '2.5e1'), ('op', '*'), ('op', '('), ('name', 'x'),
+        ('op', '-'), ('number', '.5'), ('op', ')'), ('end', ''),
+    ]
+    assert tokens[3].pos == 7
+
+
+def test_parse_precedence_and_associativity():
+    """Test that '*' binds tighter than '+' and that operators are left associative."""
+    assert parse("1 + 2 * 3") == BinOp('+', Number(1.0), BinOp('*', Number(2.0), Number(3.0)))
+    assert parse("8 - 4 - 2") == BinOp('-', BinOp('-', Number(8.0), Number(4.0)), Number(2.0))
+    assert parse("-(a)") == UnaryOp('-', Variable('a'))
+
+
+#----------------------------------------------------------------
+# Test cases for evaluate
+#----------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "source, variables, expected",
+    [
+        ("1 + 2 * 3", {}, 7.0),
+        ("(1 + 2) * 3", {}, 9.0),
+        ("8 - 4 - 2", {}, 2.0),
+        ("8 / 4 / 2", {}, 1.0),
+        ("(a + b) * c / 2", {'a': 1, 'b': 2, 'c': 4}, 6.0),
+        ("-a + +3", {'a': 1}, 2.0),
+        ("--2", {}, 2.0),
+        ("1e3 / .5", {}, 2000.0),
+    ],
+    ids=[
+        "precedence",
+        "parentheses",
+        "left_associative_subtract",
+        "left_associative_divide",
+        "variables",
+        "unary_operators",
+        "double_negation",
+        "exponent_and_leading_dot"
+    ]
+)
+def test_evaluate(source: str, variables: dict, expected: float):
+    """Test evaluating expressions with precedence, parentheses, unary operators and variables."""
+    assert evaluate(source, variables) == expected
+
+
+@pytest.mark.parametrize(
+    "source, message",
+    [
+        ("1 $ 2", "Unexpected character '\\$' at position 2."),
+        ("1 +", "Unexpected end of expression."),
+        ("(1 + 2", "Expected '\\)' at position 6."),
+        ("1 2", "Unexpected '2' at position 2."),
+        ("* 2", "Unexpected '\\*' at position 0."),
+        ("x + 1", "Unknown variable: x"),
+        ("1 / (2 - 2)", "Cannot divide by zero."),
+    ],
+    ids=[
+        "bad_character",
+        "missing_operand",
+        "missing_parenthesis",
+        "missing_operator",
+        "leading_operator",
+        "unknown_variable",
+        "division_by_zero"
+    ]
+)
+def test_evaluate_errors(source: str, message: str):
+    """Test that bad expressions raise a ValueError with a helpful message."""
+    with pytest.raises(ValueError, match=message):
+        evaluate(source)
+
+
+@pytest.mark.parametrize(
+    "source",
+    ["(" * 5000 + "1" + ")" * 5000, "-" * 5000 + "1", " + ".join(["x"] * 5000), "(" * 201 + "1" + ")" * 201],
+    ids=["parentheses", "unary_minus", "long_chain", "just_over_the_limit"],
+)
+def test_deeply_nested_expressions(source):
+    """Test that expressions nested deeper than MAX_DEPTH raise an ExpressionError, not a RecursionError."""
+    with pytest.raises(ExpressionError, match="Expression is nested too deeply."):
+        evaluate(source, {"x": 1})
+
+
+@pytest.mark.parametrize("optimize", [False, True], ids=["plain", "optimized"])
+def test_nesting_up_to_the_limit(optimize):
+    """Test that expressions nested up to MAX_DEPTH levels are evaluated."""
+    assert evaluate("(" * 199 + "x" + ")" * 199, {"x": 2}, optimize=optimize) == 2.0
+    assert evaluate(" + ".join(["x"] * 200), {"x": 1}, optimize=optimize) == 200.0
+
+
+def test_syntax_errors_are_expression_errors():
+    """Test that syntax errors raise ExpressionError, a subclass of ValueError."""
+    with pytest.raises(ExpressionError):
+        parse("(")
+
+
+#----------------------------------------------------------------
+# Test cases for compiled expressions and the cache
+#----------------------------------------------------------------
+
+def test_compiled_expression_is_cached_and_reusable():
+    """Test that the same source text is compiled once and can be re-evaluated with new bindings."""
+    compile_expression.cache_clear()
+    formula = compile_expression("a * b + 1")
+    assert compile_expression("a * b + 1") is formula
+    assert compile_expression.cache_info().hits == 1
+
+    assert formula.variables == frozenset({'a', 'b'})
+    assert formula({'a': 2, 'b': 3}) == 7
+    assert formula(a=4, b=5) == 21
+    assert formula({'a': 1}, b=1) == 2
+    assert repr(formula) == "CompiledExpression('a * b + 1')"
+
+
+def test_compiled_expression_without_variables():
+    """Test that a constant expression can be called with no bindings at all."""
+    assert compile_expression("2 * 3")() == 6
+
+
+def test_expression_backends():
+    """Test that literals and variables are converted to the backend's number type."""
+    assert evaluate("0.1 + 0.2", backend="float") == 0.30000000000000004
+    assert evaluate("0.1 + 0.2", backend="decimal") == Decimal("0.3")
+    assert evaluate("x / 3", {'x': 1}, backend="fraction") == Fraction(1, 3)
+    assert compile_expression("1 / 3", "fraction") is not compile_expression("1 / 3", "decimal")
+
+
+@pytest.mark.parametrize("optimize", [False, True], ids=["plain", "optimized"])
+@pytest.mark.parametrize("specialized", [False, True], ids=["closures", "specialized"])
+@pytest.mark.parametrize(
+    "source, backend, expected",
+    [
+        ("12345678901234567890123 + 1", "fraction", Fraction(12345678901234567890124)),
+        ("x * 1.0000000000000000001", "fraction", Fraction(20000000000000000002, 10000000000000000000)),
+        ("0.1 + x", "decimal", "2.1"),
+        ("x * 1.0000000000000000001 / 1.00", "decimal", "2.0000000000000000002"),
+    ],
+    ids=["fraction_big_integer", "fraction_not_one", "decimal_tenth", "decimal_digits"],
+)
+def test_literals_keep_their_digits(source, backend, expected, optimize, specialized):
+    """Test that exact backends convert number literals from their text, not from the nearest float."""
+    expression = expressions.CompiledExpression(source, parse(source), backend, optimize)
+    if specialized:
+        expression.specialize()
+    result = expression({'x': 2})
+    assert (str(result) if backend == "decimal" else result) == expected
+
+
+#----------------------------------------------------------------
+# Test cases for the optimizer
+#----------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "source, backend, expected",
+    [
+        ("2 * 3.5 + 1", "float", "8"),
+        ("x * (2 * 3.5 + 1) / (4 - 2)", "float", "x * 8 * 0.5"),
+        ("x * 1 + 1 * y", "float", "+x + +y"),
+        ("x / 1 - 0", "float", "+x"),
+        ("x + -0", "float", "+x"),
+        ("-0 + x", "float", "+x"),
+        ("x + 0", "float", "x + 0"),
+        ("0 - x", "float", "0 - x"),
+        ("x * 0", "float", "x * 0"),
+        ("--x + +y", "float", "x + +y"),
+        ("x * -1 + -1 * y + x / -1", "float", "-+x - +y - +x"),
+        ("x - -y", "float", "x + y"),
+        ("-x * -y / (-x / -y)", "float", "x * y / (x / y)"),
+        ("x / 4 + x / 0.5", "float", "x * 0.25 + x * 2"),
+        ("x / 3", "float", "x / 3"),
+        ("x / 0", "float", "x / 0"),
+        ("1 / 0 + x", "float", "1 / 0 + x"),
+        ("x + 1 + 2", "float", "x + 1 + 2"),
+        ("x + 0 - 0 * 1", "fraction", "x"),
+        ("0 - x", "fraction", "-x"),
+        ("x / 3", "fraction", BinOp('*', Variable('x'), Number(Fraction(1, 3)))),
+        ("x * 1 + --y", "decimal", "x * 1 + --y"),
+        ("2 * 3 + x", "decimal", "6 + x"),
+        ("1 / 0 + x", "decimal", "1 / 0 + x"),
+        ("1e999 - 1e999 + x", "decimal", "0 + x"),
+    ],
+    ids=["constant", "folded_parts", "times_one", "divide_one_minus_zero", "plus_negative_zero",
+         "negative_zero_plus", "plus_zero_kept", "zero_minus_kept", "times_zero_kept", "double_negation",
+         "times_minus_one", "minus_negative", "negations_cancel", "power_of_two_divisor", "other_divisor_kept",
+         "zero_divisor_kept", "error_kept", "no_reassociation", "fraction_zeros", "fraction_zero_minus",
+         "fraction_reciprocal", "decimal_identities_kept", "decimal_folding", "decimal_error_kept",
+         "decimal_literals_not_floats"],
+)
+def test_simplify(source, backend, expected):
+    """Test the simplified trees, with only the rewrites that are exact for each backend."""
+    expected = parse(expected) if isinstance(expected, str) else expected
+    assert simplify(parse(source), backend) == expected
+
+
+@pytest.mark.parametrize(
+    "backend, values",
+    [
+        ("float", [0.0, -0.0, 1.0, -2.5, 3.0, 4, 1e308, -1e-320, math.inf, -math.inf, math.nan]),
+        ("fraction", [0, 1, -2, Fraction(1, 3), 7]),
+        ("decimal", [0, 1, -2, Decimal("0.1"), 7]),
+    ],
+    ids=["float", "fraction", "decimal"],
+)
+def test_optimized_results_match(backend, values):
+    """Test that optimized expressions give exactly the same results (or errors) as plain ones, special values included."""
+    sources = [
+        "x * 1 + 1 * y", "x / 1 - 0", "x + -0", "--x - -y", "x * -1 / -y", "x / 4 + y / 0.5",
+        "(x + y) * (x + y) * (x + y) * (x + y)", "x / y + x / y + x / y + x / y", "2 * 3.5 * x - 0 - x", "0 - x + 0",
+        "(x - y / 2) * (x - y / 2) * (x - y / 2)", "x / (y - y) * (x / y + 1) * (x / y + 1)",
+    ]
+    for source in sources:
+        plain = compile_expression(source, backend)
+        optimized = compile_expression(source, backend, optimize=True)
+        for x in values:
+            for y in values:
+                try:
+                    expected = repr(plain(x=x, y=y))
+                except ValueError as e:
+                    expected = repr(e)
+                try:
+                    got = repr(optimized(x=x, y=y))
+                except ValueError as e:
+                    got = repr(e)
+                assert got == expected, f"{source} with x={x!r}, y={y!r}"
+
+
+@pytest.mark.parametrize(
+    "source, shared",
+    [
+        ("p * r / 12 / (1 - (1 + r / 12) * (1 + r / 12) * (1 + r / 12))", ["1 + r / 12"]),
+        ("(x - mean) / sd * (x - mean) / sd", []),
+        ("(a + b) * (c + d) * 2 + (a + b) * (c + d) * 3", ["(a + b) * (c + d)"]),
+        ("-(a + b) * -(a + b) + -(a + b) * 2", ["-(a + b)"]),
+    ],
+    ids=["loan", "small_pair_not_shared", "children_not_counted_again", "unary"],
+)
+def test_shared_subexpressions(source, shared):
+    """Test which repeated subtrees are worth sharing."""
+    assert list(shared_subexpressions(parse(source))) == [repr(parse(text)) for text in shared]
+
+
+def test_shared_subexpressions_are_computed_once(monkeypatch):
+    """Test that a shared subexpression is computed once per evaluation, and again for new values."""
+    calls = []
+    add = registry.functions['+']
+    monkeypatch.setitem(registry.functions, '+', lambda a, b: calls.append((a, b)) or add(a, b))
+    source = "(a + b) * (a + b) * (a + b) * (a + b)"
+    optimized = compile_expression(source, "float", optimize=True)
+    assert optimized(a=1, b=1) == 16 and optimized(a=1, b=2) == 81
+    assert calls == [(1, 1), (1, 2)]
+    assert compile_expression(source, "float")(a=1, b=1) == 16
+    assert len(calls) == 6
+
+
+def test_optimized_expressions_are_cached_separately():
+    """Test that optimize=True is part of the cache key and the compiled expression keeps the simplified tree."""
+    plain = compile_expression("x * 1", "float")
+    optimized = compile_expression("x * 1", "float", optimize=True)
+    assert plain is not optimized and compile_expression("x * 1", "float", optimize=True) is optimized
+    assert (plain.optimized, optimized.optimized) == (False, True)
+    assert optimized.tree == UnaryOp('+', Variable('x')) and optimized.variables == frozenset({'x'})
+    assert evaluate("x / 4", {'x': 2.0}, backend="float", optimize=True) == 0.5
+
+
+@pytest.mark.parametrize("specialized", [False, True], ids=["closures", "specialized"])
+@pytest.mark.parametrize(
+    "source, expected",
+    [
+        ("x * 1", 4.0), ("1 * x", 4.0), ("x / 1", 4.0), ("x - 0", 4.0), ("x + -0", 4.0), ("x * -1", -4.0),
+        ("x / -1", -4.0), ("-(x * -1)", 4.0), ("+x", 4.0), ("--x", 4), ("-x * -x", 16),
+    ],
+    ids=["times_one", "one_times", "divide_one", "minus_zero", "plus_negative_zero", "times_minus_one",
+         "divide_minus_one", "negated_times_minus_one", "unary_plus", "double_negation", "negations_cancel"],
+)
+def test_optimized_int_variables_keep_their_type(source, expected, specialized):
+    """Test that identities give the same type as the plain expression for an int variable with the float backend."""
+    for optimize in (False, True):
+        expression = CompiledExpression(source, parse(source), "float", optimize)
+        if specialized:
+            expression.specialize()
+        result = expression(x=4)
+        assert result == expected and type(result) is type(expected)
+
+
+#----------------------------------------------------------------
+# Test cases for the specializer
+#----------------------------------------------------------------
+
+SPECIALIZER_SOURCES = [
+    "x + y * 2 - x / y", "-(x - y) * -(x - y) / 4", "x / y / (y - y)", "(x + y) * (x + y) + (x + y) / 0.1",
+    "x / 0 + z", "z + x / 0", "+x - -y", "1 / 3 + x", "2.5", "y", "x * 1e300 * 1e300 - x * 1e300 * 1e300",
+]
+
+
+@pytest.mark.parametrize(
+    "backend, values",
+    [
+        ("float", [0.0, -0.0, 1.0, -2.5, 4, 1e308, -1e-320, math.inf, math.nan]),
+        ("fraction", [0, 1, -2, Fraction(1, 3)]),
+        ("decimal", [0, 1, -2, Decimal("0.1")]),
+    ],
+    ids=["float", "fraction", "decimal"],
+)
+@pytest.mark.parametrize("optimize", [False, True], ids=["plain", "optimized"])
+def test_specialized_results_match(backend, values, optimize):
+    """Test that specialized expressions give exactly the same results and errors as the closures."""
+    for source in SPECIALIZER_SOURCES:
+        closures = CompiledExpression(source, parse(source), backend, optimize)
+        specialized = CompiledExpression(source, parse(source), backend, optimize)
+        assert specialized.specialize() == specialized.specialized_source
+        for x in values:
+            for y in values:
+                results = []
+                for expression in (closures, specialized):
+                    try:
+                        results.append(repr(expression(x=x, y=y)))
+                    except ValueError as e:
+                        results.append(repr(e))
+                assert results[0] == results[1], f"{source} with x={x!r}, y={y!r}"
+
+
+def test_specialize_after_threshold(monkeypatch):
+    """Test that an expression is specialized after SPECIALIZE_AFTER evaluations, and never with 0."""
+    monkeypatch.setattr(expressions, "SPECIALIZE_AFTER", 3)
+    expression = CompiledExpression("x * 2", parse("x * 2"), "float")
+    assert [expression(x=1), expression(x=2)] == [2, 4] and expression.specialized_source is None
+    assert expression(x=3) == 6 and expression.specialized_source is not None
+    assert expression(x=4) == 8
+    monkeypatch.setattr(expressions, "SPECIALIZE_AFTER", 0)
+    expression = CompiledExpression("x * 2", parse("x * 2"), "float")
+    for x in range(10):
+        expression(x=x)
+    assert expression.specialized_source is None
+
+
+def test_specialized_code_follows_the_registry(monkeypatch):
+    """Test that the generated code calls the registered functions again once they are replaced."""
+    calls = []
+    add = registry.functions['+']
+    expression = CompiledExpression("a + b * 2", parse("a + b * 2"), "float")
+    source = expression.specialize()
+    assert expression.specialize() is source
+    monkeypatch.setitem(registry.functions, '+', lambda a, b: calls.append((a, b)) or add(a, b))
+    assert expression(a=1, b=2) == 5 and calls == [(1, 4)]
+
+    fresh = CompiledExpression("a + b * 2", parse("a + b * 2"), "float")
+    assert fresh.specialize() == source and fresh.specialized_source is None
+    assert fresh(a=1, b=3) == 7 and calls == [(1, 4), (1, 6)]
+    assert CompiledExpression("b * 2", parse("b * 2"), "float").specialize() is not None
+
+
+def test_generated_code():
+    """Test the generated code: inlined operators, zero checks, variables read once, and how to inspect it."""
+    source = generate(parse("(a + b) / c + (a + b) / 2 + 1 / 0"), "float")
+    assert source == (
+        "def specialized(variables):\n"
+        "    if _functions['+'] is not _add or _functions['/'] is not _divide:\n"
+        "        return _interpreted(variables)\n"
+        "    try:\n"
+        "        v0 = variables['a']\n"
+        "    except KeyError:\n"
+        "        raise ExpressionError('Unknown variable: a') from None\n"
+        "    try:\n"
+        "        v1 = variables['b']\n"
+        "    except KeyError:\n"
+        "        raise ExpressionError('Unknown variable: b') from None\n"
+        "    t0 = v0 + v1\n"
+        "    try:\n"
+        "        v2 = variables['c']\n"
+        "    except KeyError:\n"
+        "        raise ExpressionError('Unknown variable: c') from None\n"
+        "    if v2 == 0:\n"
+        "        raise ValueError('Cannot divide by zero.')\n"
+        "    t1 = t0 / v2\n"
+        "    t2 = t0 / 2.0\n"
+        "    t3 = t1 + t2\n"
+        "    if 0.0 == 0:\n"
+        "        raise ValueError('Cannot divide by zero.')\n"
+        "    t4 = 1.0 / 0.0\n"
+        "    t5 = t3 + t4\n"
+        "    return t5\n"
+    )
+    expression = CompiledExpression("x * 0.1", parse("x * 0.1"), "decimal")
+    expression.specialize()
+    assert inspect.getsource(expression._evaluate) == expression.specialized_source  # pylint: disable=protected-access
+    assert "v0 = _convert(v0)" in expression.specialized_source
+    assert "t0 = v0 * _c0" in generate(parse("x * 1e999"), "float")
+
+
+def test_specialized_source_is_released():
+    """Test that each specialized function has its own linecache entry, removed with its expression."""
+    expressions_ = [CompiledExpression("x / 3", parse("x / 3"), backend) for backend in ("float", "fraction")]
+    for expression in expressions_:
+        expression.specialize()
+    filenames = [expression._evaluate.__code__.co_filename for expression in expressions_]  # pylint: disable=protected-access
+    assert filenames[0] != filenames[1] and all(filename in linecache.cache for filename in filenames)
+    del expression, expressions_
+    gc.collect()
+    assert not any(filename in linecache.cache for filename in filenames)
+    function, _ = specialize(parse("x + 1"), get_backend("float"), lambda variables: None)
+    filename = function.__code__.co_filename
+    assert linecache.getlines(filename)[0] == "def specialized(variables):\n"
+    del function
+    gc.collect()
+    assert filename not in linecache.cache
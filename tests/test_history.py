@@ -0,0 +1,232 @@
+"""
+Tests for the calculation history and the session journal.
+
+This module checks the ring buffer of the history, the REPL commands that use it
+('history', '!3' and '_'), writing a journal with batched fsync, and replaying a journal
+to rebuild the history and the variables of a session.
+"""
+from decimal import Decimal
+from fractions import Fraction
+
+import pytest
+
+from app.calculator import calculator
+from app.history import Entry, History, Journal, replay
+from tests.test_calculator import negate_operator, run_calculator_with_inputs  # pylint: disable=unused-import
+
+
+#----------------------------------------------------------------
+# Test cases for entries and the history
+#----------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "entry, text",
+    [
+        (Entry('+', 4.0, 5.0, 9.0), "4.0 + 5.0 = 9.0"),
+        (Entry('neg', 4.0, None, -4.0), "neg 4.0 = -4.0"),
+        (Entry('=', "x = 1 + 2", None, 3.0), "= x = 1 + 2 -> 3.0"),
+    ],
+    ids=["binary", "unary", "expression"],
+)
+def test_entry_text(entry, text):
+    """Test how entries are shown in the history listing."""
+    assert str(entry) == text
+
+
+def test_entry_equality():
+    """Test that entries compare by their fields, and are small fixed-size objects."""
+    entry = Entry('+', 4.0, 5.0, 9.0)
+    assert entry == Entry('+', 4.0, 5.0, 9.0)
+    assert entry != Entry('+', 4.0, 5.0, 9.5)
+    assert entry != ('+', 4.0, 5.0, 9.0)
+    assert repr(entry) == "Entry('+', 4.0, 5.0, 9.0)"
+    assert entry.operands == (4.0, 5.0)
+    assert not hasattr(entry, '__dict__')
+
+
+def test_ring_buffer():
+    """Test that a full history drops its oldest entries but keeps the entry numbers."""
+    history = History(capacity=3)
+    assert history.last is None
+    for i in range(5):
+        assert history.append(Entry('+', i, 1, i + 1)) == i + 1
+    assert len(history) == 3
+    assert [(number, entry.a) for number, entry in history] == [(3, 2), (4, 3), (5, 4)]
+    assert history.get(3).a == 2
+    assert history.last.a == 4
+    for number in (0, 2, 6):
+        with pytest.raises(ValueError, match=f"There is no entry !{number} in the history."):
+            history.get(number)
+    with pytest.raises(ValueError, match="at least 1"):
+        History(capacity=0)
+
+
+@pytest.mark.parametrize(
+    "capacity, added",
+    [(3, 0), (3, 2), (3, 3), (3, 7), (1, 4)],
+    ids=["empty", "not-full", "just-full", "wrapped", "capacity-1"],
+)
+def test_restore(capacity, added):
+    """Test that restoring the entries of a history gives the same numbers, entries and later appends."""
+    history = History(capacity)
+    for i in range(added):
+        history.append(Entry('+', i, 1, i + 1))
+    restored = History(capacity)
+    restored.restore([entry for _, entry in history], history.count)
+    assert list(restored) == list(history)
+    assert restored.append(Entry('-', 0, 0, 0)) == history.append(Entry('-', 0, 0, 0))
+    assert list(restored) == list(history)
+
+
+@pytest.mark.parametrize(
+    "capacity, entries, count",
+    [(3, 2, 1), (1, 2, 2), (4, 3, 5)],
+    ids=["count-too-small", "too-many-entries", "other-capacity"],
+)
+def test_restore_rejects(capacity, entries, count):
+    """Test that saved entries that cannot be put back with the same numbers are rejected."""
+    with pytest.raises(ValueError, match="The saved entries do not fit this history."):
+        History(capacity).restore([Entry('+', i, 1, i + 1) for i in range(entries)], count)
+
+
+#----------------------------------------------------------------
+# Test cases for the REPL commands
+#----------------------------------------------------------------
+
+def test_repl_history_commands(monkeypatch, capsys):
+    """Test listing the history, re-running entries and using '_' as a number and in expressions."""
+    inputs = ['history', '+', '4', '5', '*', '_', '2', '= _ / 3', '!1', 'history', 'exit']
+    output = run_calculator_with_inputs(monkeypatch, inputs, capsys)
+    assert "The history is empty." in output
+    assert "The result of 9.0 * 2.0 is: 18.0" in output
+    assert "The result of _ / 3 is: 6.0" in output
+    assert output.count("The result of 4.0 + 5.0 is: 9.0") == 2
+    assert "1: 4.0 + 5.0 = 9.0\n2: 9.0 * 2.0 = 18.0\n3: = _ / 3 -> 6.0\n4: 4.0 + 5.0 = 9.0" in output
+
+
+@pytest.mark.parametrize(
+    "inputs, message",
+    [
+        (['!1', 'exit'], "There is no entry !1 in the history."),
+        (['!x', 'exit'], "Use '!<number>' to run an entry of the history again"),
+        (['+', '_', 'exit'], "Invalid input. Please enter numeric values for the numbers."),
+        (['/', '1', '0', '!1', 'exit'], "There is no entry !1 in the history."),
+    ],
+    ids=["no_entry", "not_a_number", "no_last_result", "failed_calculations_are_not_kept"],
+)
+def test_repl_history_errors(monkeypatch, capsys, inputs, message):
+    """Test the messages for bad history commands."""
+    output = run_calculator_with_inputs(monkeypatch, inputs, capsys)
+    assert message in output
+
+
+def test_repl_rerun_with_current_state(monkeypatch, capsys, negate_operator):
+    """Test that re-running uses the current variables and backend."""
+    inputs = ['= x = 1', '= x * 10', '= x = 2', '!2', 'neg', '4', 'backend fraction', '!5', 'exit']
+    output = run_calculator_with_inputs(monkeypatch, inputs, capsys)
+    assert "The result of x * 10 is: 20.0" in output
+    assert "The result of neg 4.0 is: -4.0" in output
+    assert "The result of neg 4 is: -4\n" in output  # the operand is converted to the fraction backend
+
+
+def test_repl_rerun_unknown_operator(monkeypatch, capsys):
+    """Test that re-running an entry whose operator is no longer registered is reported."""
+    history = History()
+    history.append(Entry('nope', 4.0, None, -4.0))
+    monkeypatch.setattr('builtins.input', lambda _: next(inputs))
+    inputs = iter(['!1', 'exit'])
+    calculator(history)
+    assert "Invalid operation. Please try again." in capsys.readouterr().out
+
+
+#----------------------------------------------------------------
+# Test cases for the journal
+#----------------------------------------------------------------
+
+def test_journal_batches_fsync(tmp_path, monkeypatch):
+    """Test that the journal calls fsync once every sync_every entries and on close."""
+    calls = []
+    monkeypatch.setattr('app.history.os.fsync', calls.append)
+    with Journal(tmp_path / "journal.txt", sync_every=2) as journal:
+        for i in range(5):
+            journal.append(Entry('+', float(i), 1.0, i + 1.0))
+        assert len(calls) == 2
+        assert journal.pending == 1
+    assert len(calls) == 3
+    journal.close()  # closing twice is harmless
+    assert len((tmp_path / "journal.txt").read_text().splitlines()) == 5
+
+
+def test_repl_journal_and_replay(tmp_path, monkeypatch, capsys):
+    """Test that a REPL session written to a journal is rebuilt by replay()."""
+    path = tmp_path / "journal.txt"
+    inputs = ['+', '4', '5', '= x = _ * 2', 'backend decimal', '/', '1', '4', 'backend fraction', '= 1 / 3', 'exit']
+    monkeypatch.setattr('builtins.input', lambda _: next(lines))
+    lines = iter(inputs)
+    with Journal(path) as journal:
+        calculator(journal=journal)
+
+    history, variables = replay(path, History(capacity=3))
+    assert history.count == 4
+    assert [entry for _, entry in history] == [
+        Entry('=', "x = _ * 2", None, 18.0),
+        Entry('/', Decimal(1), Decimal(4), Decimal("0.25")),
+        Entry('=', "1 / 3", None, Fraction(1, 3)),
+    ]
+    assert variables == {'x': 18.0, '_': Fraction(1, 3)}
+
+    # The rebuilt session goes on where the old one stopped.
+    lines = iter(['= x + 1', '!4', 'exit'])
+    calculator(history, variables=variables)
+    output = capsys.readouterr().out
+    assert "The result of x + 1 is: 19.0" in output
+    assert "The result of 1 / 3 is: 0.333" in output
+
+
+def test_replay_skips_a_cut_off_last_line(tmp_path):
+    """Test that a last line without a newline (a crash while writing) is skipped."""
+    path = tmp_path / "journal.txt"
+    path.write_text("float\t+\t1.0\t2.0\t3.0\nfloat\t+\t1.0\t2")
+    history, variables = replay(path)
+    assert history.count == 1
+    assert variables == {'_': 3.0}
+
+
+@pytest.mark.parametrize(
+    "lines, cut_off",
+    [(0, "3"), (2000, "3"), (1, "3" + "0" * 5000), (1, "3.0\n")],
+    ids=["only_a_cut_off_line", "long_journal", "long_cut_off_line", "no_crash"],
+)
+def test_journal_after_a_crash(tmp_path, lines, cut_off):
+    """Test that new entries appended after a crash in the middle of a line start on a new line."""
+    path = tmp_path / "journal.txt"
+    path.write_text("float\t+\t1.0\t2.0\t3.0\n" * lines + "float\t+\t1.0\t2.0\t" + cut_off)
+    with Journal(path) as journal:
+        journal.append(Entry('*', 2.0, 3.0, 6.0))
+    history, variables = replay(path)
+    count = lines + 1 + cut_off.endswith("\n")
+    assert history.count == count
+    assert history.get(count) == Entry('*', 2.0, 3.0, 6.0)
+    assert variables == {'_': 6.0}
+
+
+@pytest.mark.parametrize(
+    "line",
+    ["float\t+\t1.0\t2.0\n", "float\t+\tx\t2.0\t3.0\n", "abacus\t+\t1\t2\t3\n"],
+    ids=["missing_field", "not_a_number", "unknown_backend"],
+)
+def test_replay_bad_line(tmp_path, line):
+    """Test that an unreadable line raises a ValueError naming the line."""
+    path = tmp_path / "journal.txt"
+    path.write_text("float\t+\t1.0\t2.0\t3.0\n" + line)
+    with pytest.raises(ValueError, match="line 2: cannot read the entry"):
+        replay(path)
+
+
+def test_replay_empty_journal(tmp_path):
+    """Test that an empty journal gives an empty session."""
+    path = tmp_path / "journal.txt"
+    path.write_text("")
+    history, variables = replay(path)
+    assert len(history) == 0
+    assert variables == {}
@@ -0,0 +1,186 @@
+"""
+Tests for the instrumentation (metrics) of the calculator.
+
+This module checks the histogram, what is recorded for operator calls, errors and parse time
+in the REPL, batch mode and expressions, the JSON and Prometheus exports,
+and that disabling instrumentation removes the timing wrapper.
+"""
+import json
+import threading
+
+import pytest
+
+from app import instrumentation
+from app.batch import evaluate_record
+from app.expressions import ExpressionError, compile_expression, evaluate
+from app.instrumentation import Histogram, Metrics
+from app.operations import Operation
+from app.registry import registry
+from tests.test_calculator import run_calculator_with_inputs
+
+
+@pytest.fixture
+def metrics():
+    """Enables instrumentation for one test and disables it afterwards."""
+    collected = instrumentation.enable()
+    yield collected
+    instrumentation.disable()
+
+
+#----------------------------------------------------------------
+# Test cases for the histogram
+#----------------------------------------------------------------
+
+def test_histogram():
+    """Test that observations land in the right bucket and the cumulative counts add up."""
+    histogram = Histogram(buckets=(1.0, 2.0))
+    for value in (0.5, 1.0, 1.5, 3.0):
+        histogram.observe(value)
+    assert histogram.cumulative() == [2, 3, 4]
+    assert histogram.to_dict() == {
+        "buckets": [1.0, 2.0, "+Inf"], "cumulative_counts": [2, 3, 4], "count": 4, "sum": 6.0,
+    }
+
+
+#----------------------------------------------------------------
+# Test cases for what is recorded
+#----------------------------------------------------------------
+
+def test_enable_and_disable():
+    """Test that enabling wraps the operator functions and disabling restores them."""
+    collected = instrumentation.enable()
+    assert instrumentation.enable(collected) is collected  # enabling again replaces the previous metrics
+    assert instrumentation.active is collected
+    assert registry.functions['+'] is not Operation.add
+    instrumentation.disable()
+    assert instrumentation.active is None
+    assert registry.functions['+'] is Operation.add
+    instrumentation.disable()  # disabling twice is harmless
+    instrumentation.record_error('invalid_input')  # ignored while disabled
+
+
+def test_operator_calls_and_errors(metrics):
+    """Test that calls, latencies and operation errors are recorded per operator."""
+    registry.dispatch('+', 1, 2)
+    registry.dispatch('+', 3, 4)
+    with pytest.raises(ValueError):
+        registry.dispatch('/', 1, 0)
+    def fail(a, b):
+        raise ValueError("Something else went wrong.")
+
+    registry.register('fail', fail)
+    try:
+        with pytest.raises(ValueError):
+            registry.dispatch('fail', 1, 2)
+    finally:
+        registry.unregister('fail')
+
+    assert metrics.calls == {'+': 2, '/': 1, 'fail': 1}
+    assert metrics.latency['+'].count == 2
+    assert metrics.errors == {'divide_by_zero': 1, 'operation_error': 1}
+    assert metrics.phases['compute'].count == 4
+
+
+def test_calls_from_many_threads(metrics):
+    """Test that calls made from several threads at once are all counted."""
+    def work():
+        for _ in range(1000):
+            registry.dispatch('*', 2, 3)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert metrics.calls == {'*': 4000}
+    assert metrics.phases['compute'].count == 4000
+
+
+def test_phases_from_many_threads():
+    """Test that phases recorded from several threads at once are all counted, each thread in its own histogram."""
+    metrics = Metrics()
+
+    def work():
+        for _ in range(1000):
+            metrics.observe_phase('parse', 0.001)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert metrics.phases['parse'].count == 4000
+    assert len(metrics._phase_shards['parse']) == 4  # pylint: disable=protected-access
+
+
+def test_no_calls():
+    """Test that fresh metrics have no calls and no compute phase."""
+    metrics = Metrics()
+    metrics.observe_phase('parse', 0.1)
+    assert metrics.calls == {}
+    assert list(metrics.phases) == ['parse']
+
+
+def test_repl_metrics(monkeypatch, capsys, metrics):
+    """Test that the REPL records invalid operations, invalid input and parse time."""
+    inputs = ['add', '+', 'a', '+', '4', '5', 'exit']
+    run_calculator_with_inputs(monkeypatch, inputs, capsys)
+    assert metrics.errors == {'invalid_operation': 1, 'invalid_input': 1}
+    assert metrics.calls == {'+': 1}
+    assert metrics.phases['parse'].count == 3  # 'a' (failed), '4' and '5'
+
+
+def test_batch_metrics(metrics):
+    """Test that batch mode records bad records and parse time."""
+    assert evaluate_record(['+', '1', '2']) == "3.0"
+    evaluate_record([])
+    evaluate_record(['^', '1', '2'])
+    evaluate_record(['+', '1'])
+    evaluate_record(['+', 'x', '2'])
+    assert metrics.errors == {'invalid_input': 3, 'invalid_operation': 1}
+    assert metrics.phases['parse'].count == 1
+
+
+def test_expression_metrics(metrics):
+    """Test that compiling an expression records parse time, and syntax errors count as invalid input."""
+    compile_expression.cache_clear()
+    assert evaluate("2 * 3") == 6
+    with pytest.raises(ExpressionError):
+        evaluate("2 *")
+    assert metrics.phases['parse'].count == 2
+    assert metrics.errors == {'invalid_input': 1}
+    compile_expression.cache_clear()
+
+
+#----------------------------------------------------------------
+# Test cases for the exports
+#----------------------------------------------------------------
+
+def test_json_export():
+    """Test that the JSON dump contains every kind of metric."""
+    metrics = Metrics(buckets=(1.0,))
+    metrics.observe_call('+', 0.5)
+    metrics.observe_call('+', 2.0)
+    metrics.observe_phase('parse', 2.0)
+    metrics.record_error('invalid_input')
+    data = json.loads(metrics.to_json())
+    assert data["calls"] == {'+': 2}
+    assert data["errors"] == {'invalid_input': 1}
+    assert data["latency_seconds"]['+']["cumulative_counts"] == [1, 2]
+    assert data["phase_seconds"]['parse']["cumulative_counts"] == [0, 1]
+
+
+def test_prometheus_export():
+    """Test the Prometheus text format, including label escaping."""
+    metrics = Metrics(buckets=(1.0,))
+    metrics.observe_call('"', 0.5)
+    metrics.record_error('divide_by_zero')
+    text = metrics.to_prometheus()
+    assert 'calculator_operations_total{operator="\\""} 1' in text
+    assert 'calculator_operation_seconds_bucket{operator="\\"",le="1.0"} 1' in text
+    assert 'calculator_operation_seconds_bucket{operator="\\"",le="+Inf"} 1' in text
+    assert 'calculator_operation_seconds_sum{operator="\\""} 0.5' in text
+    assert 'calculator_operation_seconds_count{operator="\\""} 1' in text
+    assert 'calculator_errors_total{kind="divide_by_zero"} 1' in text
+    assert 'calculator_phase_seconds_count{phase="compute"} 1' in text
+    assert text.endswith("\n")
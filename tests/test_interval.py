@@ -0,0 +1,264 @@
+"""
+Tests for the interval backend.
+
+This module checks that converted numbers and the results of every operation contain the exact value,
+the explicit rules for divisors that contain zero, the interval backend in calculate() and in sessions,
+and that the vectorized IntervalArray gives the same bounds as the scalar Interval.
+"""
+import contextvars
+import json
+import math
+import random
+from decimal import Decimal
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+import main
+from app.backends import IntervalBackend, calculate, get_backend, sum_values
+from app.backends.interval import Interval, IntervalArray
+from app.registry import registry
+from app.session import Session
+
+INF = math.inf
+down = lambda x: math.nextafter(x, -INF)  # pylint: disable=unnecessary-lambda-assignment
+up = lambda x: math.nextafter(x, INF)  # pylint: disable=unnecessary-lambda-assignment
+
+
+#----------------------------------------------------------------
+# Test cases for conversion
+#----------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("0.5", Interval(0.5, 0.5)),
+        (" 0.1 ", Interval(0.09999999999999999, 0.1)),
+        (0.1, Interval(0.09999999999999999, 0.1)),
+        ("0.3", Interval(0.3, 0.30000000000000004)),
+        (3, Interval(3.0, 3.0)),
+        (4.0, Interval(4.0, 4.0)),
+        (2.0**60, Interval(2.0**60, up(2.0**60))),
+        (2**53 + 1, Interval(2.0**53, up(2.0**53))),
+        (Fraction(1, 3), Interval(0.3333333333333333, 0.33333333333333337)),
+        (Decimal("0.5"), Interval(0.5, 0.5)),
+        ("[1, 2.5]", Interval(1.0, 2.5)),
+        ("1e999", Interval(1.7976931348623157e308, INF)),
+        ("-inf", Interval(-INF, -INF)),
+    ],
+    ids=["exact", "inexact-text", "inexact-float", "rounded-down", "int", "whole-float", "big-float",
+         "big-int", "fraction", "decimal", "bounds", "overflow", "infinity"],
+)
+def test_convert(value, expected):
+    """Test that a number becomes the smallest interval of floats around its exact value."""
+    interval = IntervalBackend.convert(value)
+    assert interval == expected and (interval.lo, interval.hi) == (expected.lo, expected.hi)
+    assert IntervalBackend.convert(interval) is interval
+
+
+def test_convert_nan_and_invalid():
+    """Test that NaN gives a NaN interval and that text which is not a number or an interval is refused."""
+    assert math.isnan(IntervalBackend.convert("nan").lo)
+    for value in ["abc", None, "[1]", "[1, x]", "[2, 1]", "1, 2]"]:
+        with pytest.raises(ValueError):
+            IntervalBackend.convert(value)
+    with pytest.raises(ValueError, match="Invalid interval"):
+        Interval.parse("1, 2")
+
+
+#----------------------------------------------------------------
+# Test cases for the operations
+#----------------------------------------------------------------
+
+def random_operand(rng: random.Random) -> str:
+    """Returns the text of a random number: a short decimal or an interval."""
+    if rng.random() < 0.2:
+        lo = rng.uniform(-10, 10)
+        return f"[{lo!r}, {lo + rng.uniform(0, 3)!r}]"
+    return f"{rng.uniform(-100, 100):.{rng.randint(0, 17)}f}"
+
+
+def test_results_contain_the_exact_value():
+    """Test that every operation, on thousands of random operands, gives bounds around the exact result."""
+    rng = random.Random(7)
+    for _ in range(5000):
+        a, b = random_operand(rng), random_operand(rng)
+        symbol = rng.choice("+-*/")
+        result = calculate(symbol, a, b, backend="interval")
+        for point_a in map(Fraction, (IntervalBackend.convert(a).lo, IntervalBackend.convert(a).hi)):
+            for point_b in map(Fraction, (IntervalBackend.convert(b).lo, IntervalBackend.convert(b).hi)):
+                if symbol == "/" and point_b == 0:
+                    continue
+                exact = calculate(symbol, point_a, point_b, backend="fraction")
+                assert result.lo <= exact <= result.hi, (a, symbol, b)
+        if "[" not in a + b:
+            assert calculate(symbol, a, b, backend="fraction") in result
+
+
+@pytest.mark.parametrize(
+    "a, b, expected",
+    [
+        (Interval(1, 2), Interval(4, 8), Interval(down(0.125), up(0.5))),
+        (Interval(1, 2), Interval(-8, -4), Interval(down(-0.5), up(-0.125))),
+        (Interval(1, INF), Interval(INF, INF), Interval(down(0.0), up(0.0))),
+        (Interval(0, 0), Interval(-1, 1), Interval(0, 0)),
+        (Interval(1, 2), Interval(0, 4), Interval(down(0.25), INF)),
+        (Interval(-2, -1), Interval(0, 4), Interval(-INF, up(-0.25))),
+        (Interval(1, 2), Interval(-4, 0), Interval(-INF, up(-0.25))),
+        (Interval(-2, -1), Interval(-4, 0), Interval(down(0.25), INF)),
+        (Interval(-1, 2), Interval(0, 4), Interval(-INF, INF)),
+        (Interval(-1, 2), Interval(-4, 0), Interval(-INF, INF)),
+        (Interval(1, 2), Interval(-1, 1), Interval(-INF, INF)),
+    ],
+    ids=["positive", "negative", "inf-by-inf", "zero-numerator", "zero-low", "zero-low-negative",
+         "zero-high", "zero-high-negative", "zero-low-both-signs", "zero-high-both-signs", "zero-inside"],
+)
+def test_division(a, b, expected):
+    """Test division, including the explicit rules for divisors that contain zero."""
+    assert a / b == expected
+
+
+def test_division_by_exact_zero():
+    """Test that dividing by exactly [0, 0] raises the usual error, and inf / inf alone has no value."""
+    with pytest.raises(ValueError, match="Cannot divide by zero."):
+        calculate("/", "[1, 2]", "0", backend="interval")
+    with pytest.raises(ValueError, match="Cannot divide by zero."):
+        Interval(1, 2) / Interval(0, 0)
+    assert math.isnan((Interval(INF, INF) / Interval(INF, INF)).lo)
+
+
+def test_multiplication_and_nan():
+    """Test that 0 * inf counts as 0 in products of intervals, and NaN intervals stay NaN."""
+    assert Interval(0, 1) * Interval(2, INF) == Interval(down(0.0), INF)
+    assert Interval(-1, 2) * Interval(-3, 4) == Interval(down(-6.0), up(8.0))
+    nan = Interval(math.nan, math.nan)
+    for result in [nan * 2, 2 * nan, nan / 2, Interval(1, 2) / nan]:
+        assert math.isnan(result.lo) and math.isnan(result.hi)
+
+
+def test_numbers_mix_with_intervals():
+    """Test the operators with a plain number on either side, and the other methods of Interval."""
+    x = Interval(1, 2)
+    assert 1 + x == x + 1 == Interval(down(2.0), up(3.0))
+    assert 3 - x == Interval(down(1.0), up(2.0)) and x - 1 == Interval(down(0.0), up(1.0))
+    assert 2 * x == Interval(down(2.0), up(4.0)) and 2 / x == Interval(down(1.0), up(2.0))
+    assert -x == Interval(-2, -1) and +x is x
+    assert Interval(3, 3) == 3 and hash(Interval(3, 3)) == hash(3) and len({x, Interval(1, 2)}) == 1
+    assert x != "x" and Fraction(3, 2) in x and 3 not in x
+    assert (x.width, x.midpoint) == (up(1.0), 1.5)
+    assert (repr(x), str(x)) == ("Interval(1, 2)", "[1, 2]")
+    for compute in [lambda: x + "1", lambda: x - "1", lambda: x * "1", lambda: x / "1", lambda: "1" - x,
+                    lambda: "1" / x]:
+        with pytest.raises(TypeError):
+            compute()
+
+
+def test_sum():
+    """Test that the sum of intervals is rounded once per bound, and overflows still give valid bounds."""
+    total = sum_values(["0.1"] * 10_000, backend="interval")
+    assert 1000 in total and total.width < 1e-12
+    assert sum_values(["1e308", "1e308"], backend="interval") == Interval(1.7976931348623157e308, INF)
+    assert math.isnan(sum_values(["inf", "-inf", "[1, 2]"], backend="interval").hi)
+
+
+#----------------------------------------------------------------
+# Test cases for the interval backend in sessions
+#----------------------------------------------------------------
+
+def test_session_with_interval_backend(tmp_path):
+    """Test choosing the interval backend in a session and on the command line, and saving a session."""
+    session = Session()
+    assert session.handle("backend interval") == "Using the interval backend."
+    assert session.handle("+ 0.1 0.2") == "[0.29999999999999993, 0.3000000000000001]"
+    assert session.handle("/ 1 [-1,1]") == "[-inf, inf]"
+    assert session.handle("= x = _ / 3") == "x = [-inf, inf]"
+    restored = Session.from_dict(json.loads(json.dumps(session.to_dict())))
+    assert restored.backend is get_backend("interval") and restored.variables == session.variables
+    assert repr(get_backend("interval")) == "IntervalBackend()"
+    (tmp_path / "job.txt").write_text("+ 0.1 0.2\n/ 1 [0,2]\n/ 1 0\n", encoding="utf-8")
+    # main() sets the backend of the current context; run it in a copy so the other tests keep floats.
+    contextvars.copy_context().run(main.main, ["--backend", "interval", "--batch", str(tmp_path / "job.txt"),
+                                               "--output", str(tmp_path / "out.txt")])
+    assert (tmp_path / "out.txt").read_text(encoding="utf-8").splitlines() == [
+        "[0.29999999999999993, 0.3000000000000001]", "[0.49999999999999994, inf]", "error: Cannot divide by zero."]
+
+
+#----------------------------------------------------------------
+# Test cases for IntervalArray
+#----------------------------------------------------------------
+
+# Intervals with every kind of bound: signs, zero on either side, infinities and NaN.
+SPECIAL = [Interval(lo, hi) for lo, hi in [
+    (1, 2), (-2, -1), (-1, 2), (0, 0), (0, 3), (-3, 0), (0.1, 0.30000000000000004), (-INF, 1), (2, INF),
+    (-INF, INF), (INF, INF), (1e308, 1e308), (5e-324, 5e-324), (math.nan, math.nan),
+]]
+
+
+def same(a: Interval, b: Interval) -> bool:
+    """Returns True if the bounds are equal, counting NaN as equal to NaN."""
+    return all(x == y or (math.isnan(x) and math.isnan(y)) for x, y in [(a.lo, b.lo), (a.hi, b.hi)])
+
+
+def arrays():
+    """Returns IntervalArrays of every pair of SPECIAL intervals, and the pairs."""
+    pairs = [(a, b) for a in SPECIAL for b in SPECIAL]
+    left = IntervalArray([a.lo for a, _ in pairs], [a.hi for a, _ in pairs])
+    right = IntervalArray([b.lo for _, b in pairs], [b.hi for _, b in pairs])
+    return left, right, pairs
+
+
+@pytest.mark.parametrize("symbol", ["+", "-", "*", "/"], ids=["add", "subtract", "multiply", "divide"])
+def test_array_matches_scalar(symbol):
+    """Test that every IntervalArray operation gives the bounds of the Interval operation, element by element."""
+    left, right, pairs = arrays()
+    with np.errstate(all="ignore"):
+        result = registry.dispatch(symbol, left, right)
+    assert len(result) == len(pairs)
+    for i, (a, b) in enumerate(pairs):
+        if symbol == "/" and b.lo == b.hi == 0:
+            assert math.isnan(result[i].lo)  # the scalar division raises
+            continue
+        with np.errstate(all="ignore"):
+            expected = calculate(symbol, a, b, backend="interval")
+        assert same(result[i], expected), (a, symbol, b)
+
+
+def test_array_with_scalars():
+    """Test IntervalArray operators with an Interval or a number on either side."""
+    x = IntervalArray.from_values([1.0, 2.0])
+    assert (x + 1)[0] == (1 + x)[0] == Interval(down(2.0), up(2.0))
+    assert (3 - x)[1] == Interval(down(1.0), up(1.0)) and (x - Interval(0, 1))[0] == Interval(down(0.0), up(1.0))
+    assert (2 * x)[1] == Interval(down(4.0), up(4.0))
+    assert (1 / x)[1] == Interval(down(0.5), up(0.5)) and (x / 2)[0] == Interval(down(0.5), up(0.5))
+    assert (-x)[0] == Interval(-1, -1)
+    with pytest.raises(TypeError, match="Cannot compute with an IntervalArray and a str."):
+        x + "1"  # pylint: disable=pointless-statement
+
+
+def test_array_zero_divisor_policies():
+    """Test the on_zero policies of IntervalArray.divide()."""
+    x = IntervalArray([1, 1, 1], [2, 2, 2])
+    divisors = IntervalArray([4, -1, 0], [8, 1, 0])
+    nan = x.divide(divisors, on_zero="nan")
+    assert nan[0] == Interval(down(0.125), up(0.5)) and np.isnan(nan.lo[1:]).all() and np.isnan(nan.hi[1:]).all()
+    assert x.divide(divisors)[1] == Interval(-INF, INF)
+    with pytest.raises(ValueError, match="Cannot divide by an interval that contains zero."):
+        x.divide(divisors, on_zero="raise")
+    assert x.divide(divisors[0], on_zero="raise")[1] == Interval(down(0.125), up(0.5))
+    with pytest.raises(ValueError, match="Unknown zero divisor policy"):
+        x.divide(divisors, on_zero="skip")
+
+
+def test_array_methods():
+    """Test the width, midpoint, contains, checks and repr of IntervalArray."""
+    x = IntervalArray([0.0, 1.0], [1.0, 4.0])
+    assert x.width.tolist() == [up(1.0), up(3.0)] and x.midpoint.tolist() == [0.5, 2.5]
+    assert x.contains(np.array([0.5, 5.0])).tolist() == [True, False]
+    assert repr(IntervalArray.from_values([1.5])) == "IntervalArray(array([1.5]), array([1.5]))"
+    with pytest.raises(ValueError, match="same shape"):
+        IntervalArray([1.0], [1.0, 2.0])
+    with pytest.raises(ValueError, match="above its upper bound"):
+        IntervalArray([2.0], [1.0])
+    with pytest.raises(ValueError, match="above the upper bound"):
+        Interval(2, 1)
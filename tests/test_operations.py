@@ -14,6 +14,8 @@ by checking against expected results for a variety of inputs, including edge cas
 The tests also include checks for division by zero, which should raise a ValueError.
 """
 
+import math # Importing math for math.nan in the batch division tests
+from array import array # Importing array to check the type returned by the batch methods
 import pytest # Importing pytest for testing framework
 from typing import Union # Importing Union for type hinting
 from app.operations import Operation # Importing the Operation class from the operations module
@@ -296,6 +298,103 @@ def test_divide_by_zero(a: Number, b: Number):
         Operation.divide(a, b)
 
 
+#----------------------------------------------------------------
+# Test cases for the batch methods (add_many, subtract_many, multiply_many, divide_many)
+#----------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "method, a, b, expected",
+    [
+        (Operation.add_many, [1, -1, 1.5], [4, -2, 2.5], [5.0, -3.0, 4.0]),
+        (Operation.subtract_many, (5, -1, 2.5), (3, -2, 1.5), [2.0, 1.0, 1.0]),
+        (Operation.multiply_many, array('d', [2, -1, 1.5]), array('d', [3, -2, 2.0]), [6.0, 2.0, 3.0]),
+        (Operation.divide_many, [6, -4, 5.0], [3, -2, 2.5], [2.0, 2.0, 2.0]),
+    ],
+    ids=[
+        "add_many_list",
+        "subtract_many_tuple",
+        "multiply_many_array",
+        "divide_many_list"
+    ]
+)
+def test_batch_methods(method, a, b, expected):
+    """
+    Test that each batch method gives the same result as calling the scalar method on every pair,
+    and that the result comes back as an array.array of floats.
+    """
+    result = method(a, b)
+    assert isinstance(result, array)
+    assert list(result) == expected
+
+
+@pytest.mark.parametrize(
+    "method, ufunc",
+    [
+        (Operation.add_many, "add"),
+        (Operation.subtract_many, "subtract"),
+        (Operation.multiply_many, "multiply"),
+        (Operation.divide_many, "divide"),
+    ],
+    ids=["add_many", "subtract_many", "multiply_many", "divide_many"]
+)
+def test_batch_methods_numpy(method, ufunc):
+    """Test that NumPy inputs are computed with NumPy and give a NumPy array back."""
+    np = pytest.importorskip("numpy")
+    a = np.arange(1, 6)
+    b = [2.0, 4.0, 5.0, 8.0, 10.0]
+    result = method(a, b)
+    assert isinstance(result, np.ndarray)
+    assert result.dtype == np.float64
+    assert np.array_equal(result, getattr(np, ufunc)(a, np.asarray(b)))
+
+
+def test_batch_length_mismatch():
+    """Test that operands of different lengths raise a ValueError."""
+    with pytest.raises(ValueError, match="same length"):
+        Operation.add_many([1, 2, 3], [1, 2])
+
+
+@pytest.mark.parametrize(
+    "on_zero, expected",
+    [
+        ("nan", [2.0, math.nan, 3.0, math.nan]),
+        ("skip", [2.0, 3.0]),
+    ],
+    ids=["nan_policy", "skip_policy"]
+)
+def test_divide_many_zero_policies(on_zero: str, expected):
+    """Test the 'nan' and 'skip' policies of divide_many for plain sequences and NumPy arrays."""
+    a = [4, 1, 9, -1]
+    b = [2, 0, 3, -0.0]
+    result = Operation.divide_many(a, b, on_zero=on_zero)
+    assert list(result) == pytest.approx(expected, nan_ok=True)
+
+    np = pytest.importorskip("numpy")
+    result = Operation.divide_many(np.array(a), np.array(b), on_zero=on_zero)
+    assert list(result) == pytest.approx(expected, nan_ok=True)
+
+
+def test_divide_many_raise_policy():
+    """Test that the default 'raise' policy matches Operation.divide for plain sequences and NumPy arrays."""
+    with pytest.raises(ValueError, match="Cannot divide by zero."):
+        Operation.divide_many([1, 2], [1, 0])
+
+    np = pytest.importorskip("numpy")
+    with pytest.raises(ValueError, match="Cannot divide by zero."):
+        Operation.divide_many(np.array([1, 2]), np.array([1, 0]))
+
+
+def test_divide_many_unknown_policy():
+    """Test that an unknown zero division policy raises a ValueError."""
+    with pytest.raises(ValueError, match="Unknown zero division policy"):
+        Operation.divide_many([1], [1], on_zero="ignore")
+
+
+def test_zero_divisors():
+    """Test that zero_divisors marks every zero (including -0.0) in the divisors."""
+    assert Operation.zero_divisors([1, 0, 2.5, -0.0]) == [False, True, False, True]
+
+
 # The above test cases cover the basic arithmetic operations provided by the Operation class.
 # They ensure that the methods work correctly for various types of inputs, including integers, floats, and edge cases like division by zero.
 # The use of pytest's parametrize feature allows for efficient testing of multiple scenarios with minimal code duplication.
@@ -0,0 +1,99 @@
+"""
+Tests for the parallel job runner.
+
+This module checks that results keep their input order across chunks and worker processes,
+that a failing row gives its ValueError without stopping the rest of its chunk,
+and that the workers and chunksize knobs are validated.
+"""
+import io
+
+import pytest
+
+from app.backends import BACKENDS, using_backend
+from app.parallel import chunked, evaluate_lines, evaluate_rows, run_batch_parallel, run_job
+
+
+#----------------------------------------------------------------
+# Test cases for chunks
+#----------------------------------------------------------------
+
+def test_chunked():
+    """Test that items are split into lists of up to size items."""
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_evaluate_rows_keeps_going_after_errors():
+    """Test that a division by zero or unknown operation in a chunk does not stop the other rows."""
+    results = evaluate_rows([('+', 1, 2), ('/', 1, 0), ('^', 2, 3), ('*', 2, 3)])
+    assert results[0] == 3
+    assert isinstance(results[1], ValueError) and str(results[1]) == "Cannot divide by zero."
+    assert isinstance(results[2], ValueError) and str(results[2]) == "Invalid operation."
+    assert results[3] == 6
+
+
+def test_evaluate_lines():
+    """Test that a chunk of text lines gives the same output lines as the serial batch mode."""
+    assert evaluate_lines(["+ 1 2", "# comment", "/ 1 0"]) == ["3.0", "error: Cannot divide by zero."]
+    assert evaluate_lines(["/ 1 3"], backend=BACKENDS['fraction']) == ["1/3"]
+
+
+def test_run_batch_parallel_uses_session_backend():
+    """Test that worker processes compute with the caller's session backend."""
+    out = io.StringIO()
+    with using_backend('fraction'):
+        run_batch_parallel(["/ 1 3", "+ 0.1 0.2"], out, workers=2, chunksize=1)
+    assert out.getvalue() == "1/3\n3/10\n"
+
+
+#----------------------------------------------------------------
+# Test cases for run_job and run_batch_parallel
+#----------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "workers, chunksize",
+    [
+        (1, 3),
+        (2, 3),
+        (2, 1000),
+    ],
+    ids=[
+        "in_process",
+        "pool_small_chunks",
+        "pool_single_chunk"
+    ]
+)
+def test_run_job_keeps_input_order(workers: int, chunksize: int):
+    """Test that results come back in input order whatever the number of workers and the chunk size."""
+    rows = [('+', float(i), 1.0) for i in range(50)]
+    rows[7] = ('/', 1.0, 0.0)
+    results = run_job(rows, workers=workers, chunksize=chunksize)
+    assert len(results) == 50
+    assert isinstance(results[7], ValueError)
+    assert [r for i, r in enumerate(results) if i != 7] == [i + 1.0 for i in range(50) if i != 7]
+
+
+def test_run_job_default_workers():
+    """Test that workers defaults to the number of CPU cores."""
+    assert run_job([('*', 6, 7)]) == [42]
+
+
+@pytest.mark.parametrize(
+    "workers, chunksize, message",
+    [
+        (0, 10, "workers must be at least 1."),
+        (1, 0, "chunksize must be at least 1."),
+    ],
+    ids=["no_workers", "empty_chunks"]
+)
+def test_run_job_invalid_knobs(workers: int, chunksize: int, message: str):
+    """Test that invalid workers and chunksize values raise a ValueError."""
+    with pytest.raises(ValueError, match=message):
+        run_job([], workers=workers, chunksize=chunksize)
+
+
+def test_run_batch_parallel():
+    """Test the parallel batch mode writes the same output as the serial batch mode."""
+    lines = ["+ 1 2", "", "/ 1 0", "* 2 3", "add 1 1"]
+    out = io.StringIO()
+    assert run_batch_parallel(lines, out, workers=2, chunksize=2) == (4, 2)
+    assert out.getvalue() == "3.0\nerror: Cannot divide by zero.\n6.0\nerror: Invalid operation.\n"
@@ -0,0 +1,188 @@
+"""
+Tests for the operator registry.
+
+This module checks registering and looking up operators, dispatching with the right number of operands,
+layers around the operator functions, and lazily loaded entry point plugins.
+"""
+import io
+import sys
+import textwrap
+
+import pytest
+
+from app.batch import run_batch
+from app.calculator import calculator
+from app.operations import Operation
+from app.parallel import evaluate_rows
+from app.registry import OperatorRegistry, OperatorSpec, default_registry, registry
+
+
+#----------------------------------------------------------------
+# Test cases for the default registry
+#----------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "symbol, method",
+    [
+        ('+', Operation.add),
+        ('-', Operation.subtract),
+        ('*', Operation.multiply),
+        ('/', Operation.divide),
+    ],
+    ids=["add", "subtract", "multiply", "divide"]
+)
+def test_default_operators(symbol: str, method):
+    """Test that the four basic symbols map to the Operation methods."""
+    spec = registry.get(symbol)
+    assert spec.func is method
+    assert spec.arity == 2
+    assert registry.functions[symbol] is method
+
+
+def test_dispatch_errors():
+    """Test that unknown operators and a wrong number of operands raise a ValueError."""
+    with pytest.raises(ValueError, match="Invalid operation."):
+        registry.dispatch('add', 1, 2)
+    with pytest.raises(ValueError, match="takes 2 operand"):
+        registry.dispatch('+', 1)
+    with pytest.raises(ValueError, match="Cannot divide by zero."):
+        registry.dispatch('/', 1, 0)
+
+
+#----------------------------------------------------------------
+# Test cases for registering operators and layers
+#----------------------------------------------------------------
+
+def test_register_as_function_and_decorator():
+    """Test registering operators directly and with the decorator form."""
+    ops = default_registry()
+    ops.register('%', lambda a, b: a % b, name='modulo')
+
+    @ops.register('neg', arity=1, description='negation')
+    def negate(a):
+        return -a
+
+    assert negate(2) == -2  # the decorator gives the function back unchanged
+    assert ops.dispatch('%', 7, 4) == 3
+    assert ops.dispatch('neg', 2) == -2
+    assert ops.get('neg') == OperatorSpec('neg', 'negate', negate, 1, 'negation')
+    assert '%' in ops and '^' not in ops
+    assert ops.symbols() == ['+', '-', '*', '/', '%', 'neg']
+
+    ops.unregister('%')
+    assert ops.get('%') is None and ops.function('%') is None
+
+
+def test_register_invalid_arity():
+    """Test that only one- and two-operand operators can be registered."""
+    with pytest.raises(ValueError, match="arity must be 1 or 2."):
+        OperatorRegistry().register('f', lambda a, b, c: a, arity=3)
+
+
+def test_layers():
+    """Test that layers wrap every operator function, including ones registered later, until removed."""
+    ops = default_registry()
+    calls = []
+
+    def layer(spec, func):
+        def traced(*operands):
+            calls.append(spec.name)
+            return func(*operands)
+        return traced
+
+    ops.add_layer(layer)
+    ops.register('%', lambda a, b: a % b, name='modulo')
+    assert ops.functions['+'](1, 2) == 3
+    assert ops.dispatch('%', 7, 4) == 3
+    assert calls == ['add', 'modulo']
+
+    ops.remove_layer(layer)
+    assert ops.functions['+'] is Operation.add
+
+
+@pytest.fixture(name="failing_operators")
+def fixture_failing_operators():
+    """Registers operators whose functions raise other errors than ValueError, and removes them afterwards."""
+    registry.register('%', lambda a, b: a % b, name='modulo')
+    registry.register('exp', lambda a, b: a ** b, name='power')
+    registry.register('two', lambda a: a, name='two_operands')  # registered with arity 2 but takes one operand
+    yield
+    for symbol in ['%', 'exp', 'two']:
+        registry.unregister(symbol)
+
+
+@pytest.mark.parametrize(
+    "symbol, operands, message",
+    [('%', (1.0, 0.0), "Cannot divide by zero."), ('exp', (10.0, 400.0), "Operator 'exp' failed: "),
+     ('two', (1.0, 2.0), "Operator 'two' failed: .*positional argument")],
+    ids=["zero-division", "overflow", "wrong-arity"],
+)
+def test_registered_function_errors_are_value_errors(failing_operators, symbol, operands, message):
+    """Test that ArithmeticError and TypeError from a registered function come out as a ValueError."""
+    with pytest.raises(ValueError, match=message):
+        registry.dispatch(symbol, *operands)
+
+
+def test_registered_function_errors_do_not_stop_jobs(failing_operators, monkeypatch, capsys):
+    """Test that batch mode, the parallel runner and the REPL report a failing plugin call and go on."""
+    out = io.StringIO()
+    assert run_batch(["% 1 0", "% 7 4"], out) == (2, 1)
+    assert out.getvalue() == "error: Cannot divide by zero.\n3.0\n"
+    assert [str(result) for result in evaluate_rows([('%', 1.0, 0.0), ('%', 7.0, 4.0)])] == [
+        "Cannot divide by zero.", "3.0"]
+    lines = iter(['%', '1', '0', '%', '7', '4', 'exit'])
+    monkeypatch.setattr('builtins.input', lambda _: next(lines))
+    calculator()
+    output = capsys.readouterr().out
+    assert "Cannot divide by zero." in output and "The result of 7.0 % 4.0 is: 3.0" in output
+
+
+#----------------------------------------------------------------
+# Test cases for entry point plugins
+#----------------------------------------------------------------
+
+@pytest.fixture
+def plugin_path(tmp_path, monkeypatch):
+    """Puts an installed-looking plugin distribution with two operators on sys.path."""
+    (tmp_path / "calc_power_plugin.py").write_text(textwrap.dedent("""
+        from app.registry import OperatorSpec
+
+        def power(a, b):
+            return a ** b
+
+        FLOOR_DIVIDE = OperatorSpec('//', 'floor_divide', lambda a, b: a // b, 2, 'integer division')
+    """))
+    dist_info = tmp_path / "calc_power_plugin-1.0.dist-info"
+    dist_info.mkdir()
+    (dist_info / "METADATA").write_text("Metadata-Version: 2.1\nName: calc-power-plugin\nVersion: 1.0\n")
+    (dist_info / "entry_points.txt").write_text(
+        "[calculator.operators]\n^ = calc_power_plugin:power\nidiv = calc_power_plugin:FLOOR_DIVIDE\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield tmp_path
+    sys.modules.pop("calc_power_plugin", None)
+
+
+def test_plugins_load_lazily(plugin_path):
+    """Test that plugins are listed without importing them, and imported when their symbol is used."""
+    ops = default_registry()
+    assert ops.symbols() == ['+', '-', '*', '/', '^', 'idiv']
+    assert "calc_power_plugin" not in sys.modules
+
+    assert ops.dispatch('^', 2, 10) == 1024
+    assert "calc_power_plugin" in sys.modules
+    assert ops.get('^').name == 'power'
+
+    spec = ops.get('idiv')
+    assert (spec.symbol, spec.name, spec.description) == ('idiv', 'floor_divide', 'integer division')
+    assert ops.function('idiv')(7, 2) == 3
+
+
+def test_plugins_function_lookup(plugin_path):
+    """Test that looking up a plugin's function also loads it."""
+    assert default_registry().function('^')(3, 2) == 9
+
+
+def test_plugins_disabled(plugin_path):
+    """Test that a registry without an entry point group never looks for plugins."""
+    assert OperatorRegistry(entry_point_group=None).get('^') is None
@@ -0,0 +1,224 @@
+"""
+Tests for the asyncio calculator server and its client pool.
+
+This module starts a real server on a local TCP port or Unix socket for each test,
+and checks request/response lines, pipelining, connection reuse, error responses and shutdown.
+"""
+import asyncio
+import socket
+import struct
+import time
+
+import pytest
+
+from app.client import ClientPool, parse_response
+from app.server import MAX_LINE_LENGTH, CalculatorServer, parse_address, serve
+
+
+def run(coroutine):
+    """Runs a coroutine to completion in a new event loop."""
+    return asyncio.run(coroutine)
+
+
+#----------------------------------------------------------------
+# Test cases for addresses and responses
+#----------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "address, expected",
+    [
+        ("127.0.0.1:8765", ("127.0.0.1", 8765)),
+        (":8765", ("127.0.0.1", 8765)),
+        ("unix:/tmp/calc.sock", "/tmp/calc.sock"),
+    ],
+    ids=["tcp", "tcp_default_host", "unix"]
+)
+def test_parse_address(address: str, expected):
+    """Test parsing TCP and Unix socket addresses."""
+    assert parse_address(address) == expected
+
+
+@pytest.mark.parametrize("address", ["localhost", "localhost:http"], ids=["no_port", "named_port"])
+def test_parse_address_invalid(address: str):
+    """Test that an address without a numeric port raises a ValueError."""
+    with pytest.raises(ValueError, match="Invalid address"):
+        parse_address(address)
+
+
+def test_parse_response():
+    """Test turning response lines into floats and ValueErrors."""
+    assert parse_response(b"0.25\n") == 0.25
+    error = parse_response(b"error: Cannot divide by zero.\n")
+    assert isinstance(error, ValueError) and str(error) == "Cannot divide by zero."
+
+
+#----------------------------------------------------------------
+# Test cases for requests through the client pool
+#----------------------------------------------------------------
+
+@pytest.fixture(params=["tcp", "unix"])
+def address(request, tmp_path):
+    """Address to run the server on, once over TCP and once over a Unix socket."""
+    if request.param == "tcp":
+        return "127.0.0.1:0"
+    return f"unix:{tmp_path / 'calc.sock'}"
+
+
+def test_client_requests(address: str):
+    """Test single and pipelined requests over a reused connection."""
+
+    async def scenario():
+        server = CalculatorServer(address)
+        await server.start()
+        async with ClientPool(server.address, size=2) as pool:
+            assert await pool.calculate('+', 4, 5) == 9.0
+            with pytest.raises(ValueError, match="Cannot divide by zero."):
+                await pool.calculate('/', 1, 0)
+            results = await pool.calculate_many([('*', 6, 7), ('/', 1, 0), ('-', 10, 3)])
+            assert results[0] == 42.0 and isinstance(results[1], ValueError) and results[2] == 7.0
+            # All the requests above were sent one after another, so they reused one connection.
+            assert len(pool._idle) == 1
+        await server.stop()
+
+    run(scenario())
+
+
+def test_client_concurrent_requests_share_pool():
+    """Test many concurrent requests are served by at most pool size connections."""
+
+    async def scenario():
+        server = CalculatorServer()
+        await server.start()
+        async with ClientPool(server.address, size=3) as pool:
+            results = await asyncio.gather(*(pool.calculate('+', i, 1) for i in range(50)))
+            assert results == [i + 1.0 for i in range(50)]
+            assert len(pool._idle) <= 3
+        await server.stop()
+
+    run(scenario())
+
+
+def test_client_pool_invalid_size():
+    """Test that a pool needs at least one connection."""
+    with pytest.raises(ValueError, match="size must be at least 1."):
+        ClientPool("127.0.0.1:1", size=0)
+
+
+def test_client_connection_closed_by_server():
+    """Test that a pooled connection closed by the server raises and is not returned to the pool."""
+
+    async def scenario():
+        server = CalculatorServer()
+        await server.start()
+        pool = ClientPool(server.address, size=1)
+        assert await pool.calculate('+', 1, 1) == 2.0
+        await server.stop()  # closes the idle pooled connection
+        with pytest.raises(ConnectionError):
+            await pool.calculate_many([('+', 1, 1)])
+        assert not pool._idle
+
+    run(scenario())
+
+
+def test_server_closes_on_eof_after_pipeline():
+    """Test a raw pipelined request stream answered line by line until the client closes its side."""
+
+    async def scenario():
+        server = CalculatorServer()
+        await server.start()
+        reader, writer = await asyncio.open_connection(*parse_address(server.address))
+        writer.write(b"+ 1 2\n\n/ 1 0\n")
+        writer.write_eof()
+        assert await reader.read() == b"3.0\nerror: Expected a record in the form 'op a b'.\nerror: Cannot divide by zero.\n"
+        writer.close()
+        await server.stop()
+
+    run(scenario())
+
+
+def test_server_rejects_long_lines():
+    """Test that a request line longer than MAX_LINE_LENGTH closes the connection."""
+
+    async def scenario():
+        server = CalculatorServer()
+        await server.start()
+        reader, writer = await asyncio.open_connection(*parse_address(server.address))
+        writer.write(b"1" * (MAX_LINE_LENGTH + 10) + b"\n")
+        assert await reader.read() == b""
+        writer.close()
+        await server.stop()
+
+    run(scenario())
+
+
+def test_server_survives_connection_reset():
+    """Test that a client resetting its connection only ends that connection."""
+
+    async def scenario():
+        server = CalculatorServer()
+        await server.start()
+        _, writer = await asyncio.open_connection(*parse_address(server.address))
+        writer.write(b"+ 1 1\n" * 100)
+        await asyncio.sleep(0.1)
+        # SO_LINGER with a zero timeout makes closing the socket send a reset instead of a normal close.
+        writer.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+        writer.transport.abort()
+        await asyncio.sleep(0.1)
+        async with ClientPool(server.address) as pool:
+            assert await pool.calculate('+', 1, 1) == 2.0
+        await server.stop()
+
+    run(scenario())
+
+
+#----------------------------------------------------------------
+# Test cases for shutdown
+#----------------------------------------------------------------
+
+def test_stop_closes_idle_connections_immediately():
+    """Test that stop() does not wait for the grace period when connections are idle."""
+
+    async def scenario():
+        server = CalculatorServer()
+        await server.start()
+        pool = ClientPool(server.address)
+        assert await pool.calculate('+', 1, 1) == 2.0
+        started = time.perf_counter()
+        await server.stop(grace_period=10)
+        assert time.perf_counter() - started < 5
+        await server.stop()  # stopping twice is harmless
+        await pool.close()
+
+    run(scenario())
+
+
+def test_stop_cancels_connections_after_grace_period(tmp_path):
+    """Test that a connection blocked on a client that never reads is cancelled after the grace period."""
+
+    async def scenario():
+        path = tmp_path / "calc.sock"
+        server = CalculatorServer(f"unix:{path}")
+        await server.start()
+        reader, writer = await asyncio.open_unix_connection(str(path))
+        writer.write(b"/ 1 3\n" * 100_000)  # far more responses than the socket buffers hold
+        await asyncio.sleep(0.5)
+        started = time.perf_counter()
+        await server.stop(grace_period=0.1)
+        assert time.perf_counter() - started < 5
+        writer.close()
+
+    run(scenario())
+
+
+def test_serve_until_stopped(capsys):
+    """Test serve() prints its address and shuts down when the stop event is set."""
+
+    async def scenario():
+        stop = asyncio.Event()
+        task = asyncio.create_task(serve("127.0.0.1:0", stop))
+        await asyncio.sleep(0.1)
+        stop.set()
+        await task
+
+    run(scenario())
+    assert "Calculator server listening on 127.0.0.1:" in capsys.readouterr().out
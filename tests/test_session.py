@@ -0,0 +1,339 @@
+"""
+Tests for the session state and the session manager.
+
+This module checks the request lines handled by a Session, the snapshot of a session to plain data,
+and the SessionManager: opening and closing sessions, idle eviction (with and without a spill directory),
+the request rate and CPU quotas, and snapshots of all the sessions to a file.
+"""
+import json
+import math
+import os
+import time
+from decimal import Decimal
+from fractions import Fraction
+
+import pytest
+
+from app.backends import get_backend
+from app.history import Entry, History, Journal, replay
+from app.registry import registry
+from app.session import Session, SessionManager, backend_for, parse_assignment
+from tests.test_calculator import negate_operator  # pylint: disable=unused-import
+
+
+@pytest.fixture(name="exp_operator")
+def fixture_exp_operator():
+    """Registers a one-operand 'exp' operator, which raises OverflowError for large operands."""
+    registry.register('exp', math.exp, arity=1)
+    yield
+    registry.unregister('exp')
+
+
+class FakeClock:
+    """A clock that only moves when the test moves it."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+#----------------------------------------------------------------
+# Test cases for a session
+#----------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [("x = 4 / 2", ("x", "4 / 2")), (" total_2 =1+1 ", ("total_2", "1+1")), ("4 / 2", (None, "4 / 2")),
+     ("x == 2", ("x", "= 2"))],
+    ids=["assignment", "spaces", "expression", "double-equals"],
+)
+def test_parse_assignment(text, expected):
+    """Test splitting an assignment into the variable name and the expression."""
+    assert parse_assignment(text) == expected
+
+
+@pytest.mark.parametrize(
+    "lines, responses",
+    [
+        (["+ 4 5", "* _ 2"], ["9.0", "18.0"]),
+        (["= x = (1 + 2) * 3", "= x / 2", "= _ + 1"], ["x = 9.0", "4.5", "5.5"]),
+        (["+ 1 2", "= 10", "history"], ["3.0", "10.0", "1: 1.0 + 2.0 = 3.0\n2: = 10 -> 10.0"]),
+        (["history"], ["The history is empty."]),
+        (["+ 1 2", "backend fraction", "!1", "/ 1 3"], ["3.0", "Using the fraction backend.", "3", "1/3"]),
+        (["backend decimal 5", "/ 1 3", "backend"], ["Using the decimal backend.", "0.33333",
+                                                     "Using the decimal backend."]),
+        (["neg 4"], ["-4.0"]),
+        (["= x = 2", "!1", "history"], ["x = 2.0", "x = 2.0", "1: = x = 2 -> 2.0\n2: = x = 2 -> 2.0"]),
+    ],
+    ids=["operations", "expressions", "history", "empty-history", "rerun", "precision", "unary", "rerun-expression"],
+)
+def test_session_requests(negate_operator, lines, responses):
+    """Test the responses of a session to request lines."""
+    session = Session()
+    assert [session.handle(line) for line in lines] == responses
+
+
+@pytest.mark.parametrize(
+    "line, error",
+    [
+        ("", "Invalid operation."),
+        ("% 1 2", "Invalid operation."),
+        ("+ 1", "Expected a request in the form 'op a b'."),
+        ("neg 1 2", "Expected a request in the form 'op a'."),
+        ("+ 1 x", "Invalid input. Please enter numeric values for the numbers."),
+        ("/ 1 0", "Cannot divide by zero."),
+        ("= 1 +", "Unexpected end of expression."),
+        ("!x", "Use '!<number>' to run an entry of the history again, e.g. '!3'."),
+        ("!4", "There is no entry !4 in the history."),
+        ("backend abacus", "Unknown backend: 'abacus'"),
+        ("backend float 10", "Only the decimal backend has a precision."),
+        ("backend decimal 0", "The precision must be between 1 and 10,000."),
+        ("backend decimal 10001", "The precision must be between 1 and 10,000."),
+        ("backend decimal 99999999999999999999", "The precision must be between 1 and 10,000."),
+        ("exp 1000", "Operator 'exp' failed: math range error"),
+        ("backend decimal x", "Use 'backend <name>' or 'backend decimal <precision>'."),
+        ("+ _ 1", "Invalid input. Please enter numeric values for the numbers."),
+    ],
+    ids=["empty", "unknown", "missing-operand", "extra-operand", "not-a-number", "division-by-zero", "syntax",
+         "bad-rerun", "missing-entry", "unknown-backend", "float-precision", "zero-precision", "large-precision",
+         "huge-precision", "overflow", "bad-precision", "no-last-result"],
+)
+def test_session_errors(negate_operator, exp_operator, line, error):
+    """Test that errors come back as 'error: ...' responses and leave the history unchanged."""
+    session = Session()
+    response = session.handle(line)
+    assert response.startswith(f"error: {error}")
+    assert len(session.history) == 0
+
+
+def test_rerun_unregistered_operator(negate_operator):
+    """Test that running an entry again fails when its operator was unregistered since."""
+    session = Session()
+    session.history.append(Entry('%', 1.0, 2.0, 1.0))
+    assert session.handle("!1") == "error: Invalid operation."
+
+
+def test_session_journal(tmp_path):
+    """Test that a session writes its calculations to the journal with the backend they were computed with."""
+    path = tmp_path / "session.journal"
+    with Journal(str(path)) as journal:
+        session = Session(journal=journal)
+        for line in ["+ 1 2", "backend fraction", "/ 1 3", "= y = _ * 3"]:
+            session.handle(line)
+    history, variables = replay(str(path))
+    assert [entry.result for _, entry in history] == [3.0, Fraction(1, 3), Fraction(1)]
+    assert variables == {"y": 1, "_": 1}
+
+
+def test_decimal_backends_are_shared():
+    """Test that sessions with the same decimal precision share one backend object."""
+    assert backend_for("decimal", 12) is backend_for("decimal", 12)
+    assert backend_for("decimal", 12) is not backend_for("decimal", 13)
+    assert backend_for("float") is get_backend("float")
+
+
+def test_session_snapshot():
+    """Test that a session rebuilt from its snapshot data has the same backend, variables and history."""
+    session = Session(History(3))
+    for line in ["+ 1.5 2", "backend decimal 40", "/ 1 3", "backend fraction", "= half = 1 / 2",
+                 "= neg = 0 - 1e0", "backend decimal 40"]:
+        session.handle(line)
+    session.variables["count"] = 7
+    session.variables["inf"] = float("inf")
+    data = json.loads(json.dumps(session.to_dict()))
+    restored = Session.from_dict(data)
+    assert restored.backend is session.backend
+    assert restored.variables == session.variables
+    assert [type(value) for value in restored.variables.values()] == [type(value) for value in
+                                                                      session.variables.values()]
+    assert list(restored.history) == list(session.history)
+    assert restored.history.count == 4
+    assert isinstance(restored.history.get(2).result, Decimal)
+    assert restored.handle("/ 2 3") == "0.6666666666666666666666666666666666666667"
+
+
+def test_snapshot_default_backends():
+    """Test that the shared backends are saved by name only, and unknown values are refused."""
+    session = Session(backend=get_backend("decimal"))
+    assert session.to_dict()["precision"] is None
+    assert Session.from_dict(session.to_dict()).backend is get_backend("decimal")
+    session.variables["x"] = [1, 2]
+    with pytest.raises(ValueError, match="Cannot save a value of type list."):
+        session.to_dict()
+
+
+#----------------------------------------------------------------
+# Test cases for the session manager
+#----------------------------------------------------------------
+
+def test_open_and_close():
+    """Test opening sessions (with given and random ids), using them, and closing them."""
+    manager = SessionManager()
+    first = manager.open()
+    assert len(first) == 16 and first in manager
+    manager.open("alice")
+    assert len(manager) == 2
+    assert manager.handle("alice", "+ 1 2") == "3.0"
+    assert manager.handle("alice", "* _ 2") == "6.0"
+    assert manager.handle(first, "* _ 2").startswith("error: Invalid input.")
+    assert manager.get("alice").variables["_"] == 6.0
+    manager.close("alice")
+    assert "alice" not in manager
+    assert manager.handle("alice", "+ 1 2") == "error: There is no session alice."
+    with pytest.raises(ValueError, match="There is no session alice."):
+        manager.close("alice")
+    with pytest.raises(ValueError, match="already exists"):
+        manager.open(first)
+    for bad in ["", "../etc", "a b", "x" * 65]:
+        with pytest.raises(ValueError, match="Invalid session id"):
+            manager.open(bad)
+
+
+def test_manager_refuses_huge_precisions():
+    """Test that a tenant asking for a huge decimal precision gets an error line and leaves the server working."""
+    manager = SessionManager()
+    session_id = manager.open()
+    for precision in ["99999999999999999999", "999999999999999999"]:
+        response = manager.handle(session_id, f"backend decimal {precision}")
+        assert response == "error: The precision must be between 1 and 10,000."
+    assert manager.handle(session_id, "/ 1 4") == "0.25"
+    assert manager.handle(session_id, "backend decimal 10000") == "Using the decimal backend."
+    assert len(manager.handle(session_id, "/ 1 3")) == 10_002
+
+
+def test_manager_refuses_huge_operands():
+    """Test that a huge exponent under the fraction backend is an error line, not minutes of building one integer."""
+    manager = SessionManager()
+    session_id = manager.open()
+    assert manager.handle(session_id, "backend fraction") == "Using the fraction backend."
+    start = time.perf_counter()
+    assert manager.handle(session_id, "+ 1e200000000 1").startswith("error: ")
+    assert time.perf_counter() - start < 1.0
+    assert manager.handle(session_id, "+ 1e3 1") == "1001"
+
+
+def test_manager_backend_and_history_capacity():
+    """Test that new sessions get the manager's backend and a small history."""
+    manager = SessionManager(backend="fraction", history_capacity=2)
+    session_id = manager.open()
+    for line in ["+ 1 2", "/ 1 3", "- 1 1"]:
+        manager.handle(session_id, line)
+    session = manager.get(session_id)
+    assert session.backend.name == "fraction"
+    assert [number for number, _ in session.history] == [2, 3]
+
+
+def test_idle_eviction():
+    """Test that sessions idle for longer than idle_timeout are evicted, and used sessions are kept."""
+    clock = FakeClock()
+    manager = SessionManager(idle_timeout=10, clock=clock)
+    for name in ["a", "b", "c"]:
+        manager.open(name)
+    clock.now = 8
+    manager.handle("b", "+ 1 1")
+    clock.now = 12
+    assert manager.evict_idle() == ["a", "c"]
+    assert list(manager._tenants) == ["b"]  # pylint: disable=protected-access
+    clock.now = 30
+    assert manager.handle("d", "+ 1 1") == "error: There is no session d."
+    manager.open("d")
+    assert manager.handle("d", "+ 1 1") == "2.0"
+    assert "b" not in manager and manager.evicted == 3
+
+
+def test_spilled_sessions_come_back(tmp_path):
+    """Test that evicted sessions are saved in the spill directory and restored on their next request."""
+    clock = FakeClock()
+    manager = SessionManager(idle_timeout=10, spill_dir=str(tmp_path), clock=clock)
+    manager.open("alice")
+    manager.open("bob")
+    manager.handle("alice", "= x = 21")
+    clock.now = 11
+    assert manager.evict_idle() == ["bob", "alice"]  # least recently used first
+    assert sorted(os.listdir(tmp_path)) == ["alice.json", "bob.json"]
+    assert len(manager) == 0
+    assert manager.handle("alice", "= x * 2") == "42.0"
+    assert os.listdir(tmp_path) == ["bob.json"]
+    with pytest.raises(ValueError, match="already exists"):
+        manager.open("bob")
+    manager.close("bob")
+    assert not os.listdir(tmp_path)
+    assert manager.handle("../alice", "+ 1 1") == "error: There is no session ../alice."
+
+
+def test_rate_quota():
+    """Test that a session can make burst requests at once, then rate requests per second."""
+    clock = FakeClock()
+    manager = SessionManager(rate=2, burst=3, cpu_share=None, clock=clock)
+    manager.open("a")
+    manager.open("b")
+    responses = [manager.handle("a", "+ 1 1") for _ in range(4)]
+    assert responses == ["2.0"] * 3 + ["error: Too many requests. Please slow down."]
+    assert manager.handle("b", "+ 1 1") == "2.0"  # the quota is per session
+    clock.now = 0.5
+    assert manager.handle("a", "+ 1 1") == "2.0"
+    assert manager.handle("a", "+ 1 1").startswith("error: Too many requests")
+    assert manager.rejected == 2
+
+
+def test_cpu_quota(monkeypatch):
+    """Test that a session that used up its CPU time is refused until its share has refilled."""
+    clock, cpu = FakeClock(), FakeClock()
+    manager = SessionManager(rate=None, cpu_share=0.5, cpu_burst=1.0, clock=clock, cpu_clock=cpu)
+    manager.open("busy")
+    manager.open("idle")
+    session = manager.get("busy")
+
+    def slow_handle(line):
+        cpu.now += 1.5
+        return "done"
+
+    monkeypatch.setattr(Session, "handle", lambda self, line: slow_handle(line) if self is session else "ok")
+    assert manager.handle("busy", "+ 1 1") == "done"
+    assert manager.handle("busy", "+ 1 1") == "error: CPU quota exceeded. Please try again later."
+    assert manager.handle("idle", "+ 1 1") == "ok"
+    clock.now = 2  # 0.5 CPU seconds per second: the debt of 0.5 is paid after 1 second
+    assert manager.handle("busy", "+ 1 1") == "done"
+    assert manager.rejected == 1
+
+
+def test_manager_snapshot(tmp_path):
+    """Test that a snapshot of the manager restores every session, into the same or another manager."""
+    manager = SessionManager()
+    manager.open("alice")
+    manager.open("bob")
+    manager.handle("alice", "backend fraction")
+    manager.handle("alice", "/ 1 3")
+    manager.handle("bob", "= total = 2 * 21")
+    path = str(tmp_path / "sessions.json")
+    assert manager.snapshot(path) == 2
+    assert [name for name in os.listdir(tmp_path)] == ["sessions.json"]
+
+    other = SessionManager()
+    assert other.restore(path) == 2
+    assert other.handle("alice", "* _ 3") == "1"
+    assert other.handle("bob", "= total + 1") == "43.0"
+    assert other.get("bob").history.count == 2
+
+    manager.handle("alice", "+ 1 1")
+    assert manager.restore(path) == 2
+    assert manager.get("alice").history.count == 1
+
+
+def test_snapshot_write_failure(tmp_path, monkeypatch):
+    """Test that a failed snapshot leaves no temporary file and keeps the previous snapshot."""
+    manager = SessionManager()
+    manager.open("alice")
+    path = tmp_path / "sessions.json"
+    path.write_text("previous", encoding="utf-8")
+
+    def full_disk(data, f):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(json, "dump", full_disk)
+    with pytest.raises(OSError, match="No space left on device"):
+        manager.snapshot(str(path))
+    assert os.listdir(tmp_path) == ["sessions.json"]
+    assert path.read_text(encoding="utf-8") == "previous"
@@ -0,0 +1,154 @@
+"""
+Tests for the spreadsheet engine.
+
+This module checks that formulas are computed from the cells they read, that changes only
+recompute the cells downstream of them (in topological order), that cycles are rejected without
+changing the sheet, and that errors are stored per cell and passed on to the formulas that read them.
+"""
+from decimal import Decimal
+from fractions import Fraction
+
+import pytest
+
+from app.expressions import ExpressionError
+from app.sheet import CycleError, Sheet
+
+
+@pytest.fixture
+def sheet():
+    """A small sheet: total = price * qty, with_tax = total * 2, and an unrelated cell."""
+    s = Sheet()
+    s.update({'price': 20, 'qty': 3, 'total': '= price * qty', 'with_tax': '= total * 2', 'other': '= qty + 1'})
+    return s
+
+
+#----------------------------------------------------------------
+# Test cases for values and formulas
+#----------------------------------------------------------------
+
+def test_formulas_are_computed(sheet):
+    """Test that formulas read other cells, and the read-only views of the sheet."""
+    assert sheet['total'] == 60
+    assert sheet['with_tax'] == 120
+    assert sheet.formula('total') == '= price * qty'
+    assert sheet.formula('price') is None
+    assert sheet.dependents('qty') == {'total', 'other'}
+    assert 'price' in sheet
+    assert len(sheet) == 5
+    assert sorted(sheet) == ['other', 'price', 'qty', 'total', 'with_tax']
+
+
+def test_number_types_are_stored():
+    """Test that ints, floats, Decimals and Fractions are stored as they are."""
+    s = Sheet(backend='fraction')
+    s.update({'a': 2, 'b': 0.5, 'c': Decimal('1.5'), 'd': Fraction(1, 3)})
+    assert [s['a'], s['b'], s['c'], s['d']] == [2, 0.5, Decimal('1.5'), Fraction(1, 3)]
+
+
+def test_number_strings_use_the_backend():
+    """Test that numbers written as text are converted with the sheet's backend."""
+    s = Sheet(backend='fraction')
+    s.update({'a': '0.1', 'b': '= a * 3'})
+    assert s['b'] == Fraction(3, 10)
+
+
+@pytest.mark.parametrize(
+    "name, content, error",
+    [
+        ('1abc', 5, ValueError),
+        ('a b', 5, ValueError),
+        ('a', '= 1 +', ExpressionError),
+        ('a', 'abc', ValueError),
+        ('a', None, ValueError),
+        ('a', [1, 2], ValueError),
+        ('a', True, ValueError),
+        ('a', 1 + 2j, ValueError),
+    ],
+    ids=["name_starts_with_digit", "name_with_space", "bad_formula", "bad_number", "none", "list", "bool",
+         "complex"],
+)
+def test_invalid_content(sheet, name, content, error):
+    """Test that invalid names, formulas and numbers are rejected without changing the sheet."""
+    with pytest.raises(error):
+        sheet.update({'price': 1, name: content})
+    assert sheet['price'] == 20
+
+
+#----------------------------------------------------------------
+# Test cases for incremental recomputation
+#----------------------------------------------------------------
+
+def test_only_downstream_cells_are_recomputed(sheet):
+    """Test that changing a cell recomputes only the formulas that depend on it, in order."""
+    assert sheet.update({'price': 10}) == ['total', 'with_tax']
+    assert sheet['with_tax'] == 60
+    assert sheet['other'] == 4
+
+
+def test_bulk_update_computes_each_cell_once(sheet):
+    """Test that a bulk update recomputes a cell read by several changed cells only once."""
+    assert sorted(sheet.update({'price': 1, 'qty': 2})) == ['other', 'total', 'with_tax']
+    assert sheet['total'] == 2
+
+
+def test_topological_order():
+    """Test that every formula is computed after the cells it reads."""
+    s = Sheet()
+    order = s.update({'d': '= b + c', 'c': '= a * 2', 'b': '= a + 1', 'a': 1})
+    assert order.index('d') > order.index('b')
+    assert order.index('d') > order.index('c')
+    assert s['d'] == 4
+
+
+def test_replacing_a_formula_unlinks_it(sheet):
+    """Test that a formula that no longer reads a cell is not recomputed when that cell changes."""
+    sheet['total'] = '= price'
+    assert sheet.update({'qty': 5}) == ['other']
+    assert sheet['total'] == 20
+
+
+def test_setitem_and_delete(sheet):
+    """Test setting one cell and deleting cells."""
+    sheet['qty'] = 4
+    assert sheet['total'] == 80
+    del sheet['qty']
+    with pytest.raises(ExpressionError, match="Unknown variable: qty"):
+        sheet['total']
+    sheet['qty'] = 1
+    assert sheet['with_tax'] == 40
+    del sheet['with_tax']
+    assert 'with_tax' not in sheet
+    with pytest.raises(KeyError):
+        sheet.delete('missing')
+
+
+#----------------------------------------------------------------
+# Test cases for cycles and errors
+#----------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "cells",
+    [{'price': '= with_tax'}, {'price': '= price + 1'}, {'qty': '= other', 'new': 1}],
+    ids=["indirect", "self_reference", "bulk"],
+)
+def test_cycles_are_rejected(sheet, cells):
+    """Test that a change that creates a cycle raises CycleError and leaves the sheet unchanged."""
+    with pytest.raises(CycleError, match="Circular reference through cell"):
+        sheet.update(cells)
+    assert sheet['price'] == 20
+    assert sheet['qty'] == 3
+    assert sheet.formula('price') is None
+    assert 'new' not in sheet
+    assert sheet.update({'price': 1}) == ['total', 'with_tax']
+
+
+def test_errors_propagate(sheet):
+    """Test that a failing formula stores its error and passes it to the cells that read it."""
+    sheet.update({'ratio': '= price / qty', 'half': '= ratio / 2'})
+    sheet['qty'] = 0
+    with pytest.raises(ValueError, match="Cannot divide by zero."):
+        sheet['ratio']
+    with pytest.raises(ValueError, match="Cannot divide by zero."):
+        sheet['half']
+    sheet['qty'] = 4
+    assert sheet['half'] == 2.5
@@ -0,0 +1,204 @@
+"""
+Tests for the streaming statistics.
+
+This module checks the exact sum, the Welford mean and variance, the KLL quantile sketch,
+the NumPy chunk path, merging the statistics of separate shards, and tap() on a stream of results.
+"""
+import math
+import random
+import statistics
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from app.parallel import run_job
+from app.stats import ExactSum, QuantileSketch, StreamStats
+
+
+def sample(n=20_000, seed=1):
+    """Returns n random floats of very different magnitudes, which a naive sum gets wrong."""
+    rng = random.Random(seed)
+    return [rng.gauss(0, 1) * 10 ** rng.randint(-20, 20) for _ in range(n)]
+
+
+def rank_error(values, q, estimate):
+    """Returns how far the rank of estimate is from the q-quantile, as a fraction of the values."""
+    rank = sum(1 for x in values if x <= estimate)
+    return abs(rank / len(values) - q)
+
+
+#----------------------------------------------------------------
+# Test cases for the exact sum
+#----------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        [0.1] * 10,
+        [1e100, 1.0, -1e100],
+        [5e-324, 5e-324, -1e-310],
+        sample(),
+    ],
+    ids=["tenths", "cancellation", "subnormals", "magnitudes"],
+)
+def test_exact_sum(values):
+    """Test that the sum is the exact sum rounded once, for one value at a time and for NumPy chunks."""
+    one_by_one = ExactSum()
+    for x in values:
+        one_by_one.add(x)
+    chunked = ExactSum()
+    chunked.add_array(np.array(values))
+    expected = float(sum(map(Fraction, values)))
+    assert one_by_one.value() == chunked.value() == expected == math.fsum(values)
+
+
+@pytest.mark.parametrize(
+    "values, expected",
+    [
+        ([1.0, math.inf], math.inf),
+        ([-math.inf, 1.0], -math.inf),
+        ([math.inf, -math.inf], math.nan),
+        ([1.0, math.nan], math.nan),
+        ([1e308, 1e308], math.inf),
+        ([-1e308, -1e308], -math.inf),
+    ],
+    ids=["inf", "minus_inf", "inf_minus_inf", "nan", "overflow", "negative_overflow"],
+)
+def test_exact_sum_special_values(values, expected):
+    """Test infinities, NaN and overflow of the exact sum."""
+    total = ExactSum()
+    for x in values:
+        total.add(x)
+    assert total.value() == expected or (math.isnan(expected) and math.isnan(total.value()))
+
+
+#----------------------------------------------------------------
+# Test cases for the quantile sketch
+#----------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "feed",
+    [
+        lambda sketch, values: [sketch.add(x) for x in values],
+        lambda sketch, values: [sketch.extend(values[i:i + 500]) for i in range(0, len(values), 500)],
+        lambda sketch, values: [sketch.extend_array(np.array(values[i:i + 500])) for i in range(0, len(values), 500)],
+    ],
+    ids=["add", "extend", "extend_array"],
+)
+def test_sketch_is_bounded_and_accurate(feed):
+    """Test that the sketch keeps a few hundred values of 100,000 and estimates quantiles within 2% of rank."""
+    values = sample(100_000)
+    sketch = QuantileSketch()
+    feed(sketch, values)
+    assert sketch.count == len(values)
+    assert len(sketch) < 3 * sketch.k
+    for q in (0.0, 0.01, 0.25, 0.5, 0.9, 0.99, 1.0):
+        assert rank_error(values, q, sketch.quantile(q)) < 0.02
+
+
+def test_small_sketch_is_exact():
+    """Test that quantiles of fewer values than the sketch holds are exact."""
+    sketch = QuantileSketch()
+    sketch.extend([3.0, 1.0, 2.0, 4.0])
+    assert sketch.quantiles([0.0, 0.5, 1.0]) == [1.0, 2.0, 4.0]
+    assert math.isnan(QuantileSketch().quantile(0.5))
+
+
+@pytest.mark.parametrize(
+    "make, message",
+    [
+        (lambda: QuantileSketch(k=4), "k must be at least 8."),
+        (lambda: QuantileSketch().quantile(1.5), "Quantiles must be between 0 and 1."),
+    ],
+    ids=["small_k", "bad_quantile"],
+)
+def test_sketch_errors(make, message):
+    """Test the errors of the quantile sketch."""
+    with pytest.raises(ValueError, match=message):
+        make()
+
+
+#----------------------------------------------------------------
+# Test cases for the streaming statistics
+#----------------------------------------------------------------
+
+@pytest.mark.parametrize("as_array", [False, True], ids=["iterable", "numpy"])
+def test_statistics(as_array):
+    """Test every statistic against the statistics module, for an iterable and for a NumPy array."""
+    rng = random.Random(2)
+    values = [rng.uniform(-1000, 1000) for _ in range(200_000)]
+    stats = StreamStats().update(np.array(values) if as_array else iter(values))
+    assert stats.count == len(values)
+    assert stats.sum == math.fsum(values)
+    assert stats.mean == float(sum(map(Fraction, values)) / len(values))  # rounded once
+    assert stats.mean == pytest.approx(statistics.fmean(values), rel=1e-15)
+    assert stats.variance == pytest.approx(statistics.variance(values), rel=1e-12)
+    assert stats.stdev == pytest.approx(statistics.stdev(values), rel=1e-12)
+    assert (stats.min, stats.max) == (min(values), max(values))
+    assert rank_error(values, 0.5, stats.quantile(0.5)) < 0.02
+
+
+def test_welford_is_stable():
+    """Test that the variance of values with a huge common offset is not lost to cancellation."""
+    values = [1e9 + x for x in (4.0, 7.0, 13.0, 16.0)]
+    assert StreamStats().update(values).variance == 30.0
+
+
+@pytest.mark.parametrize(
+    "values, sum_, mean, variance, minimum, maximum",
+    [
+        ([], 0.0, math.nan, math.nan, math.nan, math.nan),
+        ([2.0], 2.0, 2.0, math.nan, 2.0, 2.0),
+        ([1.0, math.nan, 3.0], math.nan, math.nan, math.nan, 1.0, 3.0),
+        ([1.0, math.inf, 3.0], math.inf, math.inf, math.nan, 1.0, math.inf),
+        ([-math.inf], -math.inf, -math.inf, math.nan, -math.inf, -math.inf),
+    ],
+    ids=["empty", "one_value", "nan", "inf", "only_inf"],
+)
+@pytest.mark.parametrize("as_array", [False, True], ids=["iterable", "numpy"])
+def test_special_streams(values, sum_, mean, variance, minimum, maximum, as_array):
+    """Test empty streams, a single value and streams with NaN or infinite values."""
+    stats = StreamStats().update(np.array(values, dtype=float) if as_array else values)
+    same = lambda a, b: a == b or (math.isnan(a) and math.isnan(b))  # pylint: disable=unnecessary-lambda-assignment
+    assert stats.count == len(values)
+    assert same(stats.sum, sum_) and same(stats.mean, mean) and same(stats.variance, variance)
+    assert same(stats.min, minimum) and same(stats.max, maximum)
+
+
+def test_merge_shards():
+    """Test that merging the statistics of shards matches one pass: exactly for count, sum, min and max."""
+    values = sample(50_000)
+    whole = StreamStats().update(values)
+    shards = [StreamStats().update(values[i::7]) for i in range(7)]
+    shards.append(StreamStats())  # an empty shard
+    shards[3] = StreamStats().update(np.array(values[3::7]))  # shards can be computed either way
+    merged = StreamStats()
+    for shard in shards:
+        merged.merge(shard)
+    assert (merged.count, merged.sum, merged.mean, merged.min, merged.max) == \
+        (whole.count, whole.sum, whole.mean, whole.min, whole.max)
+    assert merged.variance == pytest.approx(whole.variance, rel=1e-12)
+    assert len(merged.sketch) < 3 * merged.sketch.k
+    for q in (0.1, 0.5, 0.9):
+        assert rank_error(values, q, merged.quantile(q)) < 0.02
+
+
+def test_tap_results():
+    """Test that tap() passes results through unchanged and counts the errors."""
+    rows = [('+', 4, 5), ('/', 1, 0), ('*', 6, 7), ('^', 1, 2)]
+    stats = StreamStats()
+    results = list(stats.tap(run_job(rows, workers=1)))
+    assert results[0] == 9.0 and isinstance(results[1], ValueError)
+    assert list(stats.tap(["1.5", "error: Cannot divide by zero."])) == ["1.5", "error: Cannot divide by zero."]
+    assert (stats.count, stats.errors, stats.sum) == (3, 3, 52.5)
+
+
+def test_summary():
+    """Test the summary dict, with the default and custom quantiles."""
+    stats = StreamStats().update(range(1, 101))
+    summary = stats.summary()
+    assert list(summary) == ["count", "errors", "sum", "mean", "variance", "stdev", "min", "max",
+                             "p50", "p90", "p99"]
+    assert (summary["count"], summary["sum"], summary["p50"], summary["p90"]) == (100, 5050.0, 50.0, 90.0)
+    assert list(stats.summary(quantiles=(0.25, 0.999)))[-2:] == ["p25", "p99.9"]
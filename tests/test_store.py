@@ -0,0 +1,299 @@
+"""
+Tests for the shared result store.
+
+This module checks the content addresses of calls, results that survive a new store (another process or a
+later run) with their number type, errors and NaN that are never stored, size-bounded eviction of the least
+recently used results, checksums and verify(), bulk lookups for batches, and batch jobs whose worker
+processes share one store.
+"""
+import io
+import math
+import multiprocessing
+import os
+import pickle
+import sqlite3
+from decimal import Decimal, localcontext
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+import main
+from app import store as result_store
+from app.backends import calculate, using_backend
+from app.backends.interval import Interval
+from app.batch import run_batch
+from app.parallel import run_batch_parallel
+from app.registry import registry
+from app.store import ResultStore, StoreStats, call_key, install, installed, uninstall
+
+ADD = registry.get('+')
+
+
+class Forbidden:
+    """A registry layer, used with 'with', that makes every operator call fail: the results must come from the store."""
+
+    @staticmethod
+    def layer(spec, func):  # pylint: disable=unused-argument
+        def forbidden(*operands):
+            raise RuntimeError(f"computed {spec.symbol} {operands}")
+        return forbidden
+
+    def __enter__(self):
+        registry.add_layer(self.layer)
+
+    def __exit__(self, *exc_info):
+        registry.remove_layer(self.layer)
+
+
+@pytest.fixture(name="store")
+def fixture_store(tmp_path):
+    """An installed store in a temporary directory, uninstalled and closed after the test."""
+    store = install(ResultStore(str(tmp_path / "results.db"), flush_every=5))
+    yield store
+    uninstall()
+    store.close()
+
+
+#----------------------------------------------------------------
+# Test cases for keys
+#----------------------------------------------------------------
+
+@pytest.mark.parametrize(
+    "x, y",
+    [(0.0, -0.0), (1, 1.0), (Decimal("1.0"), Decimal("1.00")), (Fraction(1, 2), 0.5)],
+    ids=["signed_zeros", "int_and_float", "decimal_digits", "fraction_and_float"],
+)
+def test_call_keys_differ(x, y):
+    """Test that operands that compare equal but can give different results get different keys."""
+    assert call_key(ADD, [x, 1]) != call_key(ADD, [y, 1])
+    assert call_key(ADD, [x, 1]) == call_key(ADD, [x, 1]) and len(call_key(ADD, [x, 1])) == 16
+
+
+def test_decimal_context_is_part_of_the_key():
+    """Test that the same Decimal call under another precision has another key."""
+    with localcontext() as context:
+        context.prec = 10
+        short = call_key(registry.get('/'), [Decimal(1), Decimal(3)])
+    assert short != call_key(registry.get('/'), [Decimal(1), Decimal(3)])
+
+
+@pytest.mark.parametrize(
+    "x", [math.nan, Decimal("NaN"), Decimal("sNaN"), np.array([1.0, 2.0]), True],
+    ids=["nan", "decimal-nan", "signaling-nan", "array", "bool"],
+)
+def test_call_key_not_stored(x):
+    """Test that calls with NaN or with operands of unknown types have no key."""
+    assert call_key(ADD, [x, 1.0]) is None
+
+
+#----------------------------------------------------------------
+# Test cases for ResultStore
+#----------------------------------------------------------------
+
+def test_results_outlive_the_store(store):
+    """Test that results written by one store are found by another one on the same file, with their types."""
+    calls = [('+', '0.1', '0.2', 'float'), ('/', '1', '3', 'decimal'), ('/', '1', '3', 'fraction'),
+             ('/', '1', '3', 'interval')]
+    expected = [calculate(symbol, a, b, backend=backend) for symbol, a, b, backend in calls]
+    assert calculate('+', '0.1', '0.2') == 0.30000000000000004
+    assert store.stats() == StoreStats(hits=1, misses=4, stored=0, evictions=0, corrupted=0, size=0)
+    store.flush()
+
+    other = ResultStore(store.path)
+    with Forbidden():
+        install(other)
+        results = [calculate(symbol, a, b, backend=backend) for symbol, a, b, backend in calls]
+    assert results == expected and [type(x) for x in results] == [float, Decimal, Fraction, Interval]
+    assert str(results[1]) == "0.3333333333333333333333333333"
+    assert other.stats() == StoreStats(hits=4, misses=0, stored=0, evictions=0, corrupted=0, size=4)
+    assert installed() is other
+    other.close()
+
+
+def test_errors_and_nan_are_not_stored(store):
+    """Test that division by zero raises on every call and NaN operands are always computed."""
+    for _ in range(2):
+        with pytest.raises(ValueError, match="Cannot divide by zero."):
+            calculate('/', '1', '0')
+        assert math.isnan(calculate('+', 'nan', '1'))
+    store.flush()
+    assert store.stats() == StoreStats(hits=0, misses=4, stored=0, evictions=0, corrupted=0, size=0)
+
+
+def test_least_recently_used_results_are_evicted(tmp_path, monkeypatch):
+    """Test that the store is trimmed back to max_entries, dropping the results used least recently."""
+    monkeypatch.setattr(result_store, "_MEMO_LIMIT", 2)  # the results kept in memory are dropped too
+    now = [0.0]
+
+    def tick():
+        now[0] += result_store.TOUCH_AFTER + 1
+        return now[0]
+
+    store = ResultStore(str(tmp_path / "results.db"), max_entries=3, flush_every=1, clock=tick)
+    add = ADD.func
+    for a in [1.0, 2.0, 3.0]:
+        store.call(ADD, add, a, 1.0)
+    store.call(ADD, add, 1.0, 1.0)  # a hit: 1 + 1 is now the most recently used
+    store.flush()
+    store.call(ADD, add, 4.0, 1.0)  # evicts 2 + 1
+    assert store.stats() == StoreStats(hits=1, misses=4, stored=4, evictions=1, corrupted=0, size=3)
+    for _ in range(2):  # the second lookup drops the use times kept in memory
+        found = store.get_many(call_key(ADD, [a, 1.0]) for a in [1.0, 2.0, 3.0, 4.0])
+        assert sorted(found.values()) == [2.0, 4.0, 5.0]
+    assert store.trim() == 0
+    store.close()
+
+
+def test_damaged_rows_are_dropped(tmp_path):
+    """Test that rows failing their checksum are treated as misses, removed, and found by verify()."""
+    store = ResultStore(str(tmp_path / "results.db"))
+    store.put_many([(call_key(ADD, [a, 1.0]), a + 1.0) for a in [1.0, 2.0, 3.0]] + [(b"x", [1, 2])])
+    with sqlite3.connect(store.path) as connection:
+        connection.execute("UPDATE results SET value = 'f:7.0' WHERE value IN ('f:2.0', 'f:3.0')")
+    assert store.call(ADD, ADD.func, 1.0, 1.0) == 2.0
+    assert store.stats().corrupted == 1
+    assert store.verify() == 1
+    assert store.verify() == 0
+    assert store.stats() == StoreStats(hits=0, misses=1, stored=4, evictions=0, corrupted=2, size=2)
+    store.close()
+
+
+def test_damaged_file_and_other_versions_are_refused(tmp_path):
+    """Test that verify() raises when SQLite finds the file damaged, and stores of another version are refused."""
+    store = ResultStore(str(tmp_path / "results.db"))
+
+    class Damaged:
+        """Stands for a connection to a damaged database file."""
+        def execute(self, sql, *args):  # pylint: disable=unused-argument
+            return [("row 3 missing from index results_used",)]
+
+    store._connections[os.getpid()] = Damaged()  # pylint: disable=protected-access
+    with pytest.raises(ValueError, match="is damaged: row 3 missing"):
+        store.verify()
+    with sqlite3.connect(store.path) as connection:
+        connection.execute("UPDATE meta SET value = '0' WHERE name = 'version'")
+    with pytest.raises(ValueError, match="has version 0, expected 1"):
+        ResultStore(store.path)
+    with pytest.raises(ValueError, match="at least 1"):
+        ResultStore(store.path, max_entries=0)
+
+
+def test_wrap_clear_and_pickle(tmp_path):
+    """Test a per call site stored operation, clearing the store, and sending a store to another process."""
+    store = ResultStore(str(tmp_path / "results.db"))
+    stored_multiply = store.wrap(registry.get('*'), registry.get('*').func)
+    assert stored_multiply(6, 7) == stored_multiply(6, 7) == 42
+    assert stored_multiply.store is store
+    store.flush()
+    copy = pickle.loads(pickle.dumps(store))
+    assert copy.path == store.path and copy.stats() == StoreStats(0, 0, 0, 0, 0, 1)
+    assert copy is not store and pickle.loads(pickle.dumps(store)) is copy  # one store per process and settings
+    limited = ResultStore(store.path, max_entries=10)
+    other = pickle.loads(pickle.dumps(limited))
+    store.clear()
+    assert store.stats() == StoreStats(0, 0, 0, 0, 0, 0)
+    copy.close()
+    assert pickle.loads(pickle.dumps(store)) is not copy
+    for received in [pickle.loads(pickle.dumps(store)), other, limited, store]:
+        received.close()
+
+
+def test_using_store(tmp_path):
+    """Test that using_store() installs a store for a block and puts the previous one back."""
+    first = install(ResultStore(str(tmp_path / "first.db")))
+    second = ResultStore(str(tmp_path / "second.db"))
+    with result_store.using_store(second):
+        assert installed() is second
+        with result_store.using_store(second):
+            assert installed() is second
+    assert installed() is first
+    uninstall()
+    with result_store.using_store(second):
+        assert installed() is second
+    assert installed() is None
+    first.close()
+    second.close()
+
+
+def test_prefetch_looks_up_a_chunk_at_once(store):
+    """Test that prefetch() finds the stored results of valid records and skips the others."""
+    records = [line.split() for line in ["+ 1 2", "* 3 4", "+ 1", "% 1 2", "+ x 1", "+ nan 1", "/ 1 0", "+ 1 2"]]
+    assert store.prefetch(records) == 0
+    for fields in records[:2]:
+        calculate(*fields)
+    store.flush()
+    with Forbidden():
+        install(store)
+        assert store.prefetch(records) == 2
+        # The prefetched results are kept in memory until the next flush, so no query is needed.
+        with sqlite3.connect(store.path) as connection:
+            connection.execute("DELETE FROM results")
+        assert calculate('*', '3', '4') == 12.0
+    assert store.hits == 1
+
+
+#----------------------------------------------------------------
+# Test cases for batch jobs
+#----------------------------------------------------------------
+
+def job(count: int) -> list:
+    """Returns count batch lines with repeated records and a few errors."""
+    return [f"{'+-*/'[i % 4]} {i % 97} {i % 13 + 1}" if i % 101 else "/ 1 0" for i in range(count)]
+
+
+@pytest.mark.parametrize("workers", [1, 3], ids=["one-process", "workers"])
+def test_warm_batch_job_computes_nothing(store, workers):
+    """Test that a batch job run again with the same store reads every result from it, in every worker."""
+    lines = job(3000)
+    expected = io.StringIO()
+    run_batch(lines, expected)
+    cold = io.StringIO()
+    assert run_batch_parallel(lines, cold, workers=workers, chunksize=500) == (3000, 30)
+    assert cold.getvalue() == expected.getvalue()
+
+    # Every operator now fails below the store, so only stored results can be returned (errors are not stored).
+    with Forbidden():
+        install(store)
+        warm = io.StringIO()
+        assert run_batch_parallel([line for line in lines if line != "/ 1 0"], warm, workers=workers,
+                                  chunksize=500) == (2970, 0)
+    assert warm.getvalue() == expected.getvalue().replace("error: Cannot divide by zero.\n", "")
+
+
+@pytest.mark.parametrize("method", ["spawn", "forkserver"])
+def test_workers_started_without_fork_share_the_store(store, method):
+    """Test that worker processes that inherit nothing (spawn, forkserver) still write to and read from the store."""
+    lines = job(400)
+    expected = io.StringIO()
+    run_batch(lines, expected)
+    context = multiprocessing.get_context(method)
+    cold = io.StringIO()
+    assert run_batch_parallel(lines, cold, workers=2, chunksize=100, mp_context=context) == (400, 4)
+    assert cold.getvalue() == expected.getvalue()
+    assert store.stats().size == len(set(lines)) - 1
+
+    # Every stored result is replaced by 42.0 (with a valid checksum): the warm run can only print 42.0 if the
+    # workers read the results from the store.
+    with sqlite3.connect(store.path) as connection:
+        keys = [key for (key,) in connection.execute("SELECT key FROM results")]
+        connection.executemany("UPDATE results SET value = 'f:42.0', checksum = ? WHERE key = ?",
+                               [(result_store._checksum(key, "f:42.0"), key) for key in keys])  # pylint: disable=protected-access
+    warm = io.StringIO()
+    run_batch_parallel(lines, warm, workers=2, chunksize=100, mp_context=context)
+    assert set(warm.getvalue().splitlines()) == {"42.0", "error: Cannot divide by zero."}
+
+
+def test_command_line(tmp_path):
+    """Test the --store option: a second batch run finds every result in the store file."""
+    (tmp_path / "job.txt").write_text("\n".join(job(200)) + "\n", encoding="utf-8")
+    outputs = []
+    for _ in range(2):
+        main.main(["--batch", str(tmp_path / "job.txt"), "--output", str(tmp_path / "out.txt"),
+                   "--store", str(tmp_path / "results.db")])
+        outputs.append((tmp_path / "out.txt").read_text(encoding="utf-8"))
+    assert outputs[0] == outputs[1] and outputs[0].count("\n") == 200
+    assert installed() is None and result_store.installed() is None
+    store = ResultStore(str(tmp_path / "results.db"))
+    assert store.stats().size == len(set(job(200))) - 1
+    store.close()